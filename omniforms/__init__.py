@@ -5,6 +5,8 @@ The Omniforms app
 from __future__ import unicode_literals
 
 
+default_app_config = 'omniforms.apps.OmniFormsConfig'
+
 VERSION = ['0', '4', '0']
 
 
@@ -264,7 +264,26 @@ class SelectHandlerViewMixin(object):
         return [(content_type.pk, '{0}'.format(content_type)) for content_type in content_types]
 
 
-class CreateHandlerView(CreateView):
+class HandlerHelpTextMixin(object):
+    """
+    Applies the instance specific help texts of the handler to the handler form
+    """
+    def get_form(self, form_class=None):
+        """
+        Custom implementation of get_form
+        Sets the help texts returned by the handler instance on the form fields
+
+        :param form_class: Form class to instantiate
+        :return: Form instance
+        """
+        form = super(HandlerHelpTextMixin, self).get_form(form_class=form_class)
+        for name, help_text in form.instance.get_help_texts().items():
+            if name in form.fields:
+                form.fields[name].help_text = help_text
+        return form
+
+
+class CreateHandlerView(HandlerHelpTextMixin, CreateView):
     """
     Creates a form handler for the specified form
     """
@@ -326,7 +345,7 @@ class CreateHandlerView(CreateView):
         return context_data
 
 
-class UpdateHandlerView(UpdateView):
+class UpdateHandlerView(HandlerHelpTextMixin, UpdateView):
     """
     View class for updating an existing handler
     """
@@ -0,0 +1,32 @@
+# -*- coding:utf8 -*-
+"""
+Omni forms app config
+"""
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+class OmniFormsConfig(AppConfig):
+    """
+    Custom app config for the omni forms app
+    """
+    name = 'omniforms'
+    verbose_name = 'omniforms'
+
+    def ready(self):
+        """
+        Connects the receivers that keep form definition versions up to date
+        """
+        from omniforms import signals
+        from omniforms.cache import definition_cache
+
+        post_save.connect(signals.form_saved, dispatch_uid='omniforms_form_saved')
+        post_delete.connect(signals.form_deleted, dispatch_uid='omniforms_form_deleted')
+        post_save.connect(signals.related_changed, dispatch_uid='omniforms_related_saved')
+        post_delete.connect(signals.related_changed, dispatch_uid='omniforms_related_deleted')
+        signals.definition_changed.connect(
+            definition_cache.definition_changed,
+            dispatch_uid='omniforms_definition_cache'
+        )
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Programmatic form building for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.db import router, transaction
+from django.db.models.base import ModelBase
+from omniforms.cache import definition_cache
+from omniforms.definitions import FormDefinition, save_definitions
+from omniforms.models import OmniField
+
+
+class FormBuilder(object):
+    """
+    Builds a form, along with its fields and handlers, in code.  Nothing is saved until build (or
+    build_forms) is called, at which point the whole definition is validated in memory and saved
+    using bulk inserts.  Fields and handlers are added in order, and fields may be referred to
+    by name (for instance the recipient_field of a confirmation handler):
+
+        builder = FormBuilder('Contact us')
+        builder.add_field(OmniCharField, name='name', label='Name', required=True)
+        builder.add_field(OmniEmailField, name='email', label='Email', required=True)
+        builder.add_handler(OmniFormEmailConfirmationHandler, name='Confirm', recipient_field='email', ...)
+        form_class = builder.build()
+    """
+    def __init__(self, title, model='omniforms.omniform', content_type=None):
+        """
+        Sets up the builder
+
+        :param title: The title of the form
+        :param model: The form model class or its label (omniforms.omniform or omniforms.omnimodelform)
+        :param content_type: The model class or label the form manages (model forms only)
+        """
+        super(FormBuilder, self).__init__()
+        self.title = title
+        self.model = self._get_label(model)
+        self.content_type = self._get_label(content_type) if content_type is not None else None
+        self.fields = []
+        self.handlers = []
+        self.form = None
+
+    @staticmethod
+    def _get_label(model):
+        """
+        Gets the label for a model class, or returns the label unchanged
+
+        :param model: Model class or label
+        :return: Model label
+        """
+        if isinstance(model, ModelBase):
+            return model._meta.label_lower
+        return model
+
+    def add_field(self, field_type, **attributes):
+        """
+        Method for adding a field to the form
+
+        :param field_type: The OmniField subclass or its label
+        :param attributes: The field attributes
+        :return: The builder
+        """
+        self.fields.append(dict(attributes, type=self._get_label(field_type)))
+        return self
+
+    def add_handler(self, handler_type, **attributes):
+        """
+        Method for adding a handler to the form
+
+        :param handler_type: The OmniFormHandler subclass or its label
+        :param attributes: The handler attributes
+        :return: The builder
+        """
+        self.handlers.append(dict(attributes, type=self._get_label(handler_type)))
+        return self
+
+    def to_dict(self):
+        """
+        Method for getting the definition dict for the form (see omniforms.definitions)
+
+        :return: Definition dict
+        """
+        data = {'model': self.model, 'title': self.title, 'fields': self.fields, 'handlers': self.handlers}
+        if self.content_type is not None:
+            data['content_type'] = self.content_type
+        return data
+
+    def get_definition(self):
+        """
+        Method for validating the form in memory
+
+        :return: Unsaved FormDefinition instance
+        :raises: ValidationError if the form is not valid
+        """
+        return FormDefinition.from_dict(self.to_dict())
+
+    def build(self, using=None):
+        """
+        Method for saving the form (see build_forms)
+
+        :param using: The database alias
+        :return: The form class
+        :raises: ValidationError if the form is not valid
+        """
+        return build_forms([self], using=using)[0]
+
+
+def build_forms(builders, using=None):
+    """
+    Validates every builder in memory, then saves the forms, fields and handlers within
+    a single transaction using one INSERT statement per table.  The form classes are generated
+    from the definitions held in memory and stored in the form class cache once the transaction
+    is committed, so the forms do not need to be loaded from the database again
+
+    :param builders: List of FormBuilder instances
+    :param using: The database alias
+    :return: List of form classes, in the same order as the builders
+    :raises: ValidationError if any of the forms are not valid, in which case nothing is saved
+    """
+    builders = list(builders)
+    definitions = [builder.get_definition() for builder in builders]
+    using = using or router.db_for_write(OmniField)
+
+    form_classes = []
+    with transaction.atomic(using=using):
+        save_definitions(definitions, using=using)
+        for builder, definition in zip(builders, definitions):
+            builder.form = definition.form
+            form_class = definition.get_form_class()
+            form_classes.append(form_class)
+            transaction.on_commit(
+                lambda form=definition.form, form_class=form_class: definition_cache.store(form, form_class),
+                using=using
+            )
+    return form_classes
@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""
+Per process caching of compiled form classes for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from contextlib import contextmanager
+import threading
+import time
+
+
+class BaseInvalidationTransport(object):
+    """
+    Base class for transports used to push definition version changes to other processes.
+    Subclasses must implement publish and subscribe.  A transport backed by a message broker
+    (for instance redis pub/sub) would publish to a channel and call every subscribed callback
+    for each message received on that channel.
+    """
+    def publish(self, key, version):
+        """
+        Method for publishing a definition version change
+
+        :param key: The definition key (see FormDefinitionCache.get_key)
+        :type key: str|unicode
+
+        :param version: The new definition version, or None if the form was deleted
+        :type version: int|None
+        """
+        raise NotImplementedError('{0} must implement the publish method'.format(self.__class__.__name__))
+
+    def subscribe(self, callback):
+        """
+        Method for registering a callback to be called with (key, version) for every change published
+
+        :param callback: Callable accepting the definition key and the new version
+        """
+        raise NotImplementedError('{0} must implement the subscribe method'.format(self.__class__.__name__))
+
+
+class LocalInvalidationTransport(BaseInvalidationTransport):
+    """
+    In process transport that calls every subscriber as soon as a change is published.
+    Useful as a stand in for a broker backed transport in tests and single process deployments.
+    """
+    def __init__(self):
+        """
+        Sets up the list of subscribers
+        """
+        self.subscribers = []
+
+    def publish(self, key, version):
+        """
+        Method for publishing a definition version change to all subscribers
+
+        :param key: The definition key (see FormDefinitionCache.get_key)
+        :type key: str|unicode
+
+        :param version: The new definition version, or None if the form was deleted
+        :type version: int|None
+        """
+        for callback in list(self.subscribers):
+            callback(key, version)
+
+    def subscribe(self, callback):
+        """
+        Method for registering a callback to be called with (key, version) for every change published
+
+        :param callback: Callable accepting the definition key and the new version
+        """
+        self.subscribers.append(callback)
+
+
+class FormDefinitionCache(object):
+    """
+    Per process cache of compiled form classes keyed on the form and its definition version.
+
+    The definition version is stored on the form row and bumped whenever the form, one of its
+    fields or one of its handlers changes (see omniforms.signals).  Processes check the current
+    version through the django cache backend named by settings.OMNI_FORMS_CACHE, and remember the
+    answer locally for settings.OMNI_FORMS_VERSION_TTL seconds, meaning a change made in one process
+    is picked up by every other process within that window without a database query per request.
+    If settings.OMNI_FORMS_INVALIDATION_TRANSPORT names a transport class, changes are also pushed
+    to other processes as soon as they are committed.
+
+    Only one thread per process compiles a given form version, other threads wait for it to finish.
+    If settings.OMNI_FORMS_COMPILE_CONCURRENCY is set, the number of processes compiling the same form
+    version at once is limited using locks held in the django cache backend.
+    """
+    cache_key_prefix = 'omniforms:version:'
+    usage_key_prefix = 'omniforms:used:'
+    lock_key_prefix = 'omniforms:compile:'
+    modified_key_prefix = 'omniforms:modified:'
+    manifest_key_prefix = 'omniforms:manifest:'
+    lock_poll_interval = 0.05
+
+    def __init__(self):
+        """
+        Sets up the local version and form class stores
+        """
+        self._versions = {}
+        self._form_classes = {}
+        self._transport = None
+        self._transport_lock = threading.Lock()
+        self._compile_locks = {}
+        self._compile_locks_lock = threading.Lock()
+
+    @staticmethod
+    def get_key(model_class, pk):
+        """
+        Method for generating the definition key for a form
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :return: Definition key string
+        """
+        return '{0}:{1}'.format(model_class._meta.label_lower, pk)
+
+    @property
+    def cache(self):
+        """
+        Property for getting the django cache backend used to share definition versions
+
+        :return: Django cache backend instance
+        """
+        return caches[getattr(settings, 'OMNI_FORMS_CACHE', 'default')]
+
+    @property
+    def local_ttl(self):
+        """
+        Property for getting the number of seconds a version is trusted locally before it is checked again
+
+        :return: Number of seconds
+        """
+        return getattr(settings, 'OMNI_FORMS_VERSION_TTL', 5)
+
+    @property
+    def cache_timeout(self):
+        """
+        Property for getting the timeout for versions stored in the django cache backend
+
+        :return: Number of seconds
+        """
+        return getattr(settings, 'OMNI_FORMS_VERSION_CACHE_TIMEOUT', 3600)
+
+    @property
+    def usage_timeout(self):
+        """
+        Property for getting the number of seconds forms are remembered as used (see filter_recently_used)
+
+        :return: Number of seconds
+        """
+        return getattr(settings, 'OMNI_FORMS_USAGE_TIMEOUT', 86400)
+
+    @property
+    def compile_concurrency(self):
+        """
+        Property for getting the number of processes allowed to compile the same form version at once
+
+        :return: Number of processes or None if compilation is not limited across processes
+        """
+        return getattr(settings, 'OMNI_FORMS_COMPILE_CONCURRENCY', None)
+
+    @property
+    def compile_lock_timeout(self):
+        """
+        Property for getting the number of seconds a process waits for a compile lock.  This is
+        also the lifetime of the lock, so a process that dies while compiling cannot hold it forever
+
+        :return: Number of seconds
+        """
+        return getattr(settings, 'OMNI_FORMS_COMPILE_LOCK_TIMEOUT', 10)
+
+    def get_transport(self):
+        """
+        Method for getting the configured invalidation transport.  The transport is created, and
+        subscribed to, the first time it is needed in each process
+
+        :return: Transport instance or None if no transport is configured
+        """
+        transport_path = getattr(settings, 'OMNI_FORMS_INVALIDATION_TRANSPORT', None)
+        if not transport_path:
+            return None
+
+        if self._transport is None:
+            with self._transport_lock:
+                if self._transport is None:
+                    transport = import_string(transport_path)()
+                    transport.subscribe(self.set_local_version)
+                    self._transport = transport
+        return self._transport
+
+    def set_local_version(self, key, version):
+        """
+        Method for storing a definition version in the local store.  If the version is None
+        the form no longer exists and everything stored locally for it is discarded
+
+        :param key: The definition key
+        :type key: str|unicode
+
+        :param version: The definition version or None
+        :type version: int|None
+        """
+        if version is None:
+            self._versions.pop(key, None)
+            self._form_classes.pop(key, None)
+        else:
+            self._versions[key] = (version, time.time() + self.local_ttl)
+
+    def get_version(self, model_class, pk):
+        """
+        Method for getting the current definition version of a form.  The local store is checked first,
+        followed by the django cache backend and finally the database
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :return: Definition version
+        :raises: model_class.DoesNotExist if the form does not exist
+        """
+        key = self.get_key(model_class, pk)
+        local = self._versions.get(key)
+        if local is not None and local[1] > time.time():
+            return local[0]
+
+        cache_key = self.cache_key_prefix + key
+        version = self.cache.get(cache_key)
+        if version is None:
+            version = model_class._base_manager.filter(pk=pk).values_list('version', flat=True).get()
+            self.cache.add(cache_key, version, self.cache_timeout)
+
+        self.cache.set(self.usage_key_prefix + key, time.time(), self.usage_timeout)
+        self.set_local_version(key, version)
+        return version
+
+    def get_modified(self, model_class, pk, version):
+        """
+        Method for getting the time a version of a form was last modified.  The time is stored
+        in the django cache backend against the version, so it is read from the database at most
+        once per version (unless the cache entry is evicted)
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :param version: The definition version
+        :return: Datetime
+        :raises: model_class.DoesNotExist if the form does not exist
+        """
+        cache_key = '{0}{1}:{2}'.format(self.modified_key_prefix, self.get_key(model_class, pk), version)
+        modified = self.cache.get(cache_key)
+        if modified is None:
+            current_version, modified = model_class._base_manager.filter(pk=pk).values_list(
+                'version',
+                'modified'
+            ).get()
+            if current_version == version:
+                self.cache.add(cache_key, modified, self.cache_timeout)
+        return modified
+
+    def get_manifest(self, model_class, pk):
+        """
+        Method for getting the validation manifest of a form: its definition version along with the
+        JSON Schema describing the submissions it accepts (see FormGeneratorMixin.get_json_schema)
+        and the rules deciding which fields are shown and required (see ConditionGraph.to_list).
+        The manifest is stored in the django cache backend against the version, so the form is only
+        loaded from the database once per version (unless the cache entry is evicted)
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :return: Manifest dict
+        :raises: model_class.DoesNotExist if the form does not exist
+        """
+        key = self.get_key(model_class, pk)
+        cache_key = '{0}{1}:{2}'.format(self.manifest_key_prefix, key, self.get_version(model_class, pk))
+        manifest = self.cache.get(cache_key)
+        if manifest is None:
+            instance = model_class._default_manager.get(pk=pk)
+            manifest = {
+                'version': instance.version,
+                'schema': instance.get_json_schema(),
+                'conditions': instance.get_condition_graph().to_list()
+            }
+            self.cache.set(
+                '{0}{1}:{2}'.format(self.manifest_key_prefix, key, instance.version),
+                manifest,
+                self.cache_timeout
+            )
+        return manifest
+
+    def get_form_class(self, model_class, pk):
+        """
+        Method for getting the compiled form class for a form.  The form is only loaded
+        from the database if there is no form class stored for its current version
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :return: Form class
+        :raises: model_class.DoesNotExist if the form does not exist
+        """
+        key = self.get_key(model_class, pk)
+        version = self.get_version(model_class, pk)
+        stored = self._form_classes.get(key)
+        if stored is not None and stored[0] == version:
+            return stored[1]
+
+        with self._compile_locks_lock:
+            lock = self._compile_locks.setdefault((key, version), threading.Lock())
+
+        with lock:
+            stored = self._form_classes.get(key)
+            if stored is not None and stored[0] >= version:
+                return stored[1]
+            try:
+                with self.cache_lock(key, version):
+                    return self.compile(model_class, pk, version)
+            finally:
+                with self._compile_locks_lock:
+                    self._compile_locks.pop((key, version), None)
+
+    @contextmanager
+    def cache_lock(self, key, version):
+        """
+        Context manager limiting the number of processes compiling the same form version at once.
+        Each process tries to claim one of OMNI_FORMS_COMPILE_CONCURRENCY slots in the django cache
+        backend.  If no slot becomes free within OMNI_FORMS_COMPILE_LOCK_TIMEOUT seconds the process
+        carries on without one rather than failing the request.
+
+        :param key: The definition key
+        :type key: str|unicode
+
+        :param version: The definition version
+        :type version: int
+        """
+        concurrency = self.compile_concurrency
+        if not concurrency:
+            yield
+            return
+
+        timeout = self.compile_lock_timeout
+        deadline = time.time() + timeout
+        slot_key = None
+        while slot_key is None:
+            for slot in range(concurrency):
+                candidate = '{0}{1}:{2}:{3}'.format(self.lock_key_prefix, key, version, slot)
+                if self.cache.add(candidate, 1, timeout):
+                    slot_key = candidate
+                    break
+            else:
+                if time.time() >= deadline:
+                    break
+                time.sleep(self.lock_poll_interval)
+
+        try:
+            yield
+        finally:
+            if slot_key is not None:
+                self.cache.delete(slot_key)
+
+    def compile(self, model_class, pk, version):
+        """
+        Method for loading a form, generating its form class and storing it locally.  The form class
+        is stored against the version read with the form rather than the version that was expected,
+        so a definition read before a change is committed is never stored against the newer version
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :param version: The expected definition version
+        :return: Form class
+        """
+        return self.compile_instance(model_class._default_manager.get(pk=pk))
+
+    def compile_instance(self, instance):
+        """
+        Method for generating the form class for a form instance and storing it locally
+        against the version of the instance (see compile)
+
+        :param instance: The form instance
+        :return: Form class
+        """
+        return self.store(instance, instance.get_form_class())
+
+    def store(self, instance, form_class):
+        """
+        Method for storing a form class generated for a form instance locally
+        against the version of the instance
+
+        :param instance: The form instance
+        :param form_class: The form class generated for the instance
+        :return: Form class
+        """
+        key = self.get_key(instance.__class__, instance.pk)
+        self._form_classes[key] = (instance.version, form_class)
+        local = self._versions.get(key)
+        if local is None or instance.version > local[0]:
+            self.set_local_version(key, instance.version)
+        return form_class
+
+    def filter_recently_used(self, model_class, pks, seconds):
+        """
+        Method for filtering a list of form primary keys down to those used within the given number
+        of seconds.  Forms are marked as used whenever a process checks their version with the cache
+        backend (see get_version), so a form in use is marked at least once every OMNI_FORMS_VERSION_TTL
+        seconds by every process serving it
+
+        :param model_class: The form model class
+        :param pks: List of form primary keys
+        :param seconds: Number of seconds
+        :return: List of primary keys for forms used within the given number of seconds
+        """
+        usage_keys = {self.usage_key_prefix + self.get_key(model_class, pk): pk for pk in pks}
+        threshold = time.time() - seconds
+        used = self.cache.get_many(list(usage_keys.keys()))
+        return [pk for usage_key, pk in usage_keys.items() if used.get(usage_key, 0) >= threshold]
+
+    def warm(self, recent=None):
+        """
+        Method for compiling and storing the form classes of every form, optionally limited to the forms
+        used within the given number of seconds.  Forms that fail to compile are skipped.
+
+        :param recent: Number of seconds or None to compile every form
+        :return: List of (form model class, number of forms compiled, list of (pk, exception) failures)
+        """
+        from django.apps import apps
+        from omniforms.models import OmniFormBase
+
+        results = []
+        for model_class in apps.get_models():
+            if not issubclass(model_class, OmniFormBase):
+                continue
+
+            queryset = model_class._default_manager.all()
+            if recent is not None:
+                pks = queryset.values_list('pk', flat=True)
+                queryset = queryset.filter(pk__in=self.filter_recently_used(model_class, pks, recent))
+
+            compiled = 0
+            failures = []
+            for instance in queryset.iterator():
+                try:
+                    self.compile_instance(instance)
+                except Exception as e:
+                    failures.append((instance.pk, e))
+                else:
+                    self.cache.add(self.cache_key_prefix + self.get_key(model_class, instance.pk),
+                                   instance.version, self.cache_timeout)
+                    compiled += 1
+            results.append((model_class, compiled, failures))
+        return results
+
+    def definition_changed(self, sender, pk, version, **kwargs):
+        """
+        Receiver for the omniforms.signals.definition_changed signal.  Removes the version from the
+        django cache backend, so that the next process to check it reads the committed version from the
+        database, and stores the new version locally, then pushes it through the transport (if any).
+        Receivers for several changes to the same form may run in any order, so the cached version is
+        removed rather than overwritten, and the local version is only replaced by a newer one
+
+        :param sender: The form model class
+        :param pk: The primary key of the form
+        :param version: The new definition version or None if the form was deleted
+        :param kwargs: Default keyword args
+        """
+        key = self.get_key(sender, pk)
+        self.cache.delete(self.cache_key_prefix + key)
+        local = self._versions.get(key)
+        if version is None or local is None or version > local[0]:
+            self.set_local_version(key, version)
+
+        transport = self.get_transport()
+        if transport is not None:
+            transport.publish(key, version)
+
+    def clear(self):
+        """
+        Method for discarding everything stored locally
+        """
+        self._versions.clear()
+        self._form_classes.clear()
+
+
+definition_cache = FormDefinitionCache()
+
+
+def preload(recent=None):
+    """
+    Compiles the form classes of every form in the current process (see FormDefinitionCache.warm).
+    Intended to be called from the gunicorn on_starting hook (with preload_app enabled, so that
+    workers share the compiled form classes with the master process) or from the post_fork hook.
+    Database connections opened while compiling are closed afterwards so they are not shared
+    with forked processes.  File backed form definitions (see omniforms.definition_files) are
+    also loaded and compiled.
+
+    :param recent: Number of seconds or None to compile every form
+    :return: List of (form model class, number of forms compiled, list of (pk, exception) failures)
+    """
+    from django.db import connections
+    from omniforms.definition_files import definition_files
+
+    try:
+        definition_files.load()
+        return definition_cache.warm(recent=recent)
+    finally:
+        connections.close_all()
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional field logic for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.utils.encoding import force_text
+from collections import OrderedDict, deque
+
+
+OPERATOR_EQUALS = 'equals'
+OPERATOR_NOT_EQUALS = 'not_equals'
+OPERATOR_IN = 'in'
+OPERATOR_IS_SET = 'is_set'
+OPERATOR_IS_NOT_SET = 'is_not_set'
+OPERATOR_CHOICES = (
+    (OPERATOR_EQUALS, 'Is equal to'),
+    (OPERATOR_NOT_EQUALS, 'Is not equal to'),
+    (OPERATOR_IN, 'Is one of'),
+    (OPERATOR_IS_SET, 'Has been answered'),
+    (OPERATOR_IS_NOT_SET, 'Has not been answered'),
+)
+
+ACTION_SHOW = 'show'
+ACTION_REQUIRE = 'require'
+ACTION_CHOICES = (
+    (ACTION_SHOW, 'Only show the field when the condition is met'),
+    (ACTION_REQUIRE, 'Only require the field when the condition is met'),
+)
+
+
+def normalize_value(value):
+    """
+    Normalizes a submitted value (as read by a field widget) for comparison.  Booleans are given
+    as 'true' or 'false' and missing values as an empty string
+
+    :param value: The submitted value
+    :return: Text or list of text
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    return force_text(value).strip()
+
+
+class Condition(object):
+    """
+    Condition on the answer given for another field of the form
+    """
+    def __init__(self, field_name, operator, value='', action=ACTION_SHOW):
+        """
+        Sets up the condition
+
+        :param field_name: The name of the field the condition depends on
+        :param operator: One of the OPERATOR_CHOICES
+        :param value: The value the answer is compared with, one value per line for OPERATOR_IN
+        :param action: One of the ACTION_CHOICES
+        :raises: ValueError if the operator or action is not known
+        """
+        super(Condition, self).__init__()
+        if operator not in dict(OPERATOR_CHOICES):
+            raise ValueError('\'{0}\' is not a known condition operator'.format(operator))
+        if action not in dict(ACTION_CHOICES):
+            raise ValueError('\'{0}\' is not a known condition action'.format(action))
+        self.field_name = field_name
+        self.operator = operator
+        self.value = (value or '').strip()
+        self.values = [line.strip() for line in self.value.splitlines() if line.strip()]
+        self.action = action
+
+    def evaluate(self, value):
+        """
+        Evaluates the condition against the answer given for the field it depends on.
+        Lists of answers (for instance from multiple choice fields) meet equality conditions
+        if any of the answers does
+
+        :param value: The submitted value, as read by the field widget
+        :return: bool
+        """
+        value = normalize_value(value)
+        answers = value if isinstance(value, list) else [value]
+        if self.operator in (OPERATOR_IS_SET, OPERATOR_IS_NOT_SET):
+            is_set = any(answer not in ('', 'false') for answer in answers)
+            return is_set if self.operator == OPERATOR_IS_SET else not is_set
+        if self.operator == OPERATOR_IN:
+            return any(answer in self.values for answer in answers)
+        equal = self.value in answers
+        return equal if self.operator == OPERATOR_EQUALS else not equal
+
+    def to_dict(self):
+        """
+        Converts the condition to a dict that can be serialized as JSON
+
+        :return: Dict
+        """
+        return OrderedDict([
+            ('depends_on', self.field_name),
+            ('operator', self.operator),
+            ('value', self.values if self.operator == OPERATOR_IN else self.value),
+            ('action', self.action)
+        ])
+
+
+class ConditionGraph(object):
+    """
+    The conditions of a form compiled into a dependency graph.  Conditions are put into topological
+    order once, when the graph is created, so the visibility and required-ness of every field can be
+    evaluated in a single pass over the conditions.  Fields depending on hidden fields see them as
+    unanswered.
+    """
+    def __init__(self, conditions, field_names=None):
+        """
+        Compiles the conditions
+
+        :param conditions: Dict of Condition instances keyed by the name of the field they apply to
+        :param field_names: Names of every field of the form, used to check the fields conditions depend
+            on exist.  Conditions depending on fields that do not exist see them as unanswered if not given
+        :raises: ValueError if a field depends on itself, on a field that does not exist or the
+            conditions depend on each other in a cycle
+        """
+        super(ConditionGraph, self).__init__()
+        self.conditions = conditions
+        for name, condition in conditions.items():
+            if condition.field_name == name:
+                raise ValueError('\'{0}\' cannot depend on itself'.format(name))
+            if field_names is not None and condition.field_name not in field_names:
+                raise ValueError('\'{0}\' depends on \'{1}\' which is not a field of the form'.format(
+                    name,
+                    condition.field_name
+                ))
+        self.order = self._sort()
+
+    def _sort(self):
+        """
+        Sorts the fields holding conditions so that each comes after the field it depends on
+
+        :return: List of field names
+        :raises: ValueError if the conditions depend on each other in a cycle
+        """
+        dependents = {}
+        pending = {}
+        for name, condition in self.conditions.items():
+            pending[name] = 1 if condition.field_name in self.conditions else 0
+            dependents.setdefault(condition.field_name, []).append(name)
+
+        queue = deque(sorted(name for name, count in pending.items() if count == 0))
+        order = []
+        while queue:
+            name = queue.popleft()
+            order.append(name)
+            for dependent in sorted(dependents.get(name, [])):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    queue.append(dependent)
+
+        if len(order) != len(self.conditions):
+            raise ValueError('The conditions of {0} depend on each other'.format(
+                ', '.join('\'{0}\''.format(name) for name in sorted(self._find_cycle(order)))
+            ))
+        return order
+
+    def _find_cycle(self, order):
+        """
+        Finds a cycle among the fields that could not be sorted.  Each of those fields depends on another
+        of them, so following the dependencies from any of them leads into a cycle
+
+        :param order: The fields that could be sorted
+        :return: List of the names of the fields in the cycle
+        """
+        path = [next(name for name in sorted(self.conditions) if name not in order)]
+        while True:
+            name = self.conditions[path[-1]].field_name
+            if name in path:
+                return path[path.index(name):]
+            path.append(name)
+
+    def __bool__(self):
+        """
+        Whether or not the graph holds any conditions
+
+        :return: bool
+        """
+        return bool(self.conditions)
+
+    __nonzero__ = __bool__
+
+    def evaluate(self, get_value):
+        """
+        Evaluates every condition in a single pass
+
+        :param get_value: Callable returning the submitted value for a field name
+        :return: Tuple of the set of hidden field names and the set of field names required by their conditions
+        """
+        hidden = set()
+        required = set()
+        for name in self.order:
+            condition = self.conditions[name]
+            value = None if condition.field_name in hidden else get_value(condition.field_name)
+            met = condition.evaluate(value)
+            if condition.action == ACTION_SHOW and not met:
+                hidden.add(name)
+            elif condition.action == ACTION_REQUIRE and met:
+                required.add(name)
+        return hidden, required
+
+    def to_list(self):
+        """
+        Converts the compiled conditions to a list that can be serialized as JSON for evaluation by
+        clients, in the order they must be evaluated
+
+        :return: List of dicts
+        """
+        rules = []
+        for name in self.order:
+            rule = OrderedDict([('field', name)])
+            rule.update(self.conditions[name].to_dict())
+            rules.append(rule)
+        return rules
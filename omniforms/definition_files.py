@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+File backed form definitions for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from omniforms.definitions import FormDefinition
+import io
+import json
+import os
+import runpy
+import threading
+import time
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover
+    yaml = None
+
+
+class DefinitionFileRegistry(object):
+    """
+    Registry of form definitions stored in files within the directories listed in
+    settings.OMNI_FORMS_DEFINITION_DIRS.  Each file holds a single definition (see
+    omniforms.definitions.FormDefinition) and is registered using its file name without
+    the extension.  Supported formats are:
+
+     - Python (.py) files defining a FORM dict
+     - JSON (.json) files
+     - YAML (.yaml, .yml) files (requires PyYAML)
+
+    Every definition is compiled the first time any definition is requested (or when load is called,
+    for instance by omniforms.cache.preload) and the form classes are reused from then on.  If
+    settings.OMNI_FORMS_DEFINITION_RELOAD is True, file modification times are checked at most once
+    every OMNI_FORMS_DEFINITION_POLL_INTERVAL seconds and changed files are reloaded.
+    """
+    extensions = ('.py', '.json', '.yaml', '.yml')
+
+    def __init__(self):
+        """
+        Sets up the registry
+        """
+        super(DefinitionFileRegistry, self).__init__()
+        self._entries = None
+        self._last_poll = 0
+        self._lock = threading.RLock()
+
+    @property
+    def directories(self):
+        """
+        Property for getting the directories containing definition files
+
+        :return: List of directory paths
+        """
+        return getattr(settings, 'OMNI_FORMS_DEFINITION_DIRS', [])
+
+    @property
+    def reload(self):
+        """
+        Property for determining whether or not changed files should be reloaded
+
+        :return: bool
+        """
+        return getattr(settings, 'OMNI_FORMS_DEFINITION_RELOAD', False)
+
+    @property
+    def poll_interval(self):
+        """
+        Property for getting the minimum number of seconds between checks for changed files
+
+        :return: Number of seconds
+        """
+        return getattr(settings, 'OMNI_FORMS_DEFINITION_POLL_INTERVAL', 1)
+
+    def find_files(self):
+        """
+        Method for finding all definition files and their modification times
+
+        :return: Dict of (path, modification time) tuples keyed by definition name
+        :raises: ImproperlyConfigured if a directory does not exist or two files define the same name
+        """
+        files = {}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                raise ImproperlyConfigured('Form definition directory {0} does not exist'.format(directory))
+            for file_name in sorted(os.listdir(directory)):
+                name, extension = os.path.splitext(file_name)
+                if extension not in self.extensions or file_name.startswith(('.', '_')):
+                    continue
+
+                path = os.path.join(directory, file_name)
+                if name in files:
+                    raise ImproperlyConfigured('Form definition \'{0}\' is defined by both {1} and {2}'.format(
+                        name, files[name][0], path
+                    ))
+                files[name] = (path, os.path.getmtime(path))
+        return files
+
+    @staticmethod
+    def read_file(path):
+        """
+        Method for reading the definition dict from a file
+
+        :param path: Path to the definition file
+        :return: Definition dict
+        :raises: ImproperlyConfigured if the file cannot be read or does not hold a dict
+        """
+        extension = os.path.splitext(path)[1]
+        if extension == '.py':
+            data = runpy.run_path(path).get('FORM')
+            if not isinstance(data, dict):
+                raise ImproperlyConfigured('{0} must define a FORM dict'.format(path))
+            return data
+
+        if extension in ('.yaml', '.yml') and yaml is None:
+            raise ImproperlyConfigured('PyYAML must be installed to load {0}'.format(path))
+
+        parse_errors = (ValueError,) if yaml is None else (ValueError, yaml.YAMLError)
+        with io.open(path, encoding='utf-8') as definition_file:
+            try:
+                if extension == '.json':
+                    data = json.load(definition_file)
+                else:
+                    data = yaml.safe_load(definition_file)
+            except parse_errors as e:
+                raise ImproperlyConfigured('{0} could not be parsed: {1}'.format(path, e))
+        if not isinstance(data, dict):
+            raise ImproperlyConfigured('{0} must hold a single form definition object'.format(path))
+        return data
+
+    def load_file(self, path):
+        """
+        Method for loading, validating and compiling the definition in a file
+
+        :param path: Path to the definition file
+        :return: Tuple of FormDefinition instance and form class
+        :raises: ImproperlyConfigured if the definition is not valid
+        """
+        try:
+            definition = FormDefinition.from_dict(self.read_file(path))
+        except ValidationError as e:
+            raise ImproperlyConfigured('{0} is not a valid form definition: {1}'.format(path, '; '.join(e.messages)))
+        return definition, definition.get_form_class()
+
+    def load(self):
+        """
+        Method for (re)loading every definition file.  Files that have not changed since
+        they were last loaded are not loaded again
+        """
+        with self._lock:
+            entries = {}
+            previous = self._entries or {}
+            for name, (path, mtime) in self.find_files().items():
+                entry = previous.get(name)
+                if entry is not None and entry[0] == path and entry[1] == mtime:
+                    entries[name] = entry
+                else:
+                    entries[name] = (path, mtime) + self.load_file(path)
+            self._entries = entries
+            self._last_poll = time.time()
+
+    def poll(self):
+        """
+        Method for loading the definitions if they have not been loaded yet, or
+        reloading changed files if reloading is enabled and the poll interval has passed
+        """
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self.load()
+        elif self.reload and time.time() - self._last_poll >= self.poll_interval:
+            self.load()
+
+    def get_names(self):
+        """
+        Method for getting the names of all definitions
+
+        :return: Sorted list of definition names
+        """
+        self.poll()
+        return sorted(self._entries.keys())
+
+    def _get_entry(self, name):
+        """
+        Method for getting the registry entry for a definition
+
+        :param name: Definition name
+        :return: Tuple of (path, modification time, definition, form class)
+        :raises: KeyError if there is no definition with the given name
+        """
+        self.poll()
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError('There is no form definition named \'{0}\''.format(name))
+
+    def get_definition(self, name):
+        """
+        Method for getting a definition by name
+
+        :param name: Definition name
+        :return: FormDefinition instance
+        :raises: KeyError if there is no definition with the given name
+        """
+        return self._get_entry(name)[2]
+
+    def get_form_class(self, name):
+        """
+        Method for getting the form class for a definition by name
+
+        :param name: Definition name
+        :return: Form class
+        :raises: KeyError if there is no definition with the given name
+        """
+        return self._get_entry(name)[3]
+
+    def clear(self):
+        """
+        Method for discarding all loaded definitions
+        """
+        with self._lock:
+            self._entries = None
+            self._last_poll = 0
+
+
+definition_files = DefinitionFileRegistry()
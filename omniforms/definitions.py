@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+"""
+In memory form definitions for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.forms import modelform_factory
+from omniforms.conditions import ConditionGraph
+from omniforms.expressions import compile_expression
+from omniforms.models import (
+    OmniCalculatedField,
+    OmniField,
+    OmniFormBase,
+    OmniFormEmailHandler,
+    OmniFormHandler,
+    OmniModelFormBase
+)
+from omniforms.signals import bump_definition_version
+from collections import defaultdict
+
+
+def get_model_class(label, base_class):
+    """
+    Resolves a model label (app_label.model_name) to a concrete subclass of the given base class
+
+    :param label: Model label
+    :type label: str|unicode
+
+    :param base_class: The class the model must inherit from
+    :return: Model class
+    :raises: ValidationError if the label does not resolve to a concrete subclass of base_class
+    """
+    try:
+        model_class = apps.get_model(label)
+    except (LookupError, ValueError):
+        raise ValidationError('\'{0}\' is not a known model'.format(label))
+
+    if not issubclass(model_class, base_class) or model_class == base_class or model_class._meta.abstract:
+        raise ValidationError('\'{0}\' is not a concrete {1} model'.format(label, base_class.__name__))
+    return model_class
+
+
+class FormDefinition(object):
+    """
+    Definition of an omni form held entirely in memory.  Definitions hold unsaved form, field and handler
+    model instances, meaning they use the same field types, widgets and handler classes as forms stored
+    in the database and generate the same form classes, without reading from the database.
+
+    Definitions are usually created from a dict (see from_dict) in the following format:
+
+        {
+            'model': 'omniforms.omniform',  # Optional, or 'omniforms.omnimodelform'
+            'key': '0b4ad1ec-6a47-4a8f-9f0e-3c2a1f6c1e8b',  # Optional, identifies the form (see save_definitions)
+            'content_type': 'app_label.model_name',  # Model forms only
+            'title': 'Contact us',
+            'fields': [
+                {'type': 'omniforms.omnicharfield', 'name': 'name', 'label': 'Name', 'required': True},
+                {'type': 'omniforms.omniemailfield', 'name': 'email', 'label': 'Email'},
+            ],
+            'handlers': [
+                {
+                    'type': 'omniforms.omniformemailconfirmationhandler',
+                    'name': 'Confirmation',
+                    'recipient_field': 'email',  # Fields are referenced by name
+                    'subject': 'Thanks',
+                    'template': 'Thanks {{ name }}',
+                },
+            ],
+        }
+
+    Fields are ordered by their 'order' value, which defaults to their position in the list.  Fields
+    and handlers may also be given as unsaved model instances rather than dicts.
+    """
+    def __init__(self, form, fields, handlers):
+        """
+        Sets up the definition
+
+        :param form: Unsaved OmniForm or OmniModelForm instance
+        :param fields: List of unsaved OmniField subclass instances
+        :param handlers: List of unsaved OmniFormHandler subclass instances
+        """
+        super(FormDefinition, self).__init__()
+        self.form = form
+        self.fields = sorted(fields, key=lambda field: field.order)
+        self.handlers = sorted(handlers, key=lambda handler: handler.order)
+
+    @property
+    def field_names(self):
+        """
+        Property for getting the names of all fields in the definition
+
+        :return: List of field names
+        """
+        return [field.name for field in self.fields]
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates and validates a definition from a dict (see the class docstring for the format)
+
+        :param data: Definition dict
+        :return: FormDefinition instance
+        :raises: ValidationError if the definition is not valid
+        """
+        errors = []
+        try:
+            form = cls._build_form(data)
+        except ValidationError as e:
+            raise ValidationError(['form: {0}'.format(message) for message in e.messages])
+
+        fields = []
+        for index, spec in enumerate(data.get('fields', [])):
+            try:
+                fields.append(cls._build_related(spec, OmniField, index))
+            except ValidationError as e:
+                errors.extend(['fields[{0}]: {1}'.format(index, message) for message in e.messages])
+
+        fields_by_name = {field.name: field for field in fields}
+        handlers = []
+        for index, spec in enumerate(data.get('handlers', [])):
+            try:
+                handlers.append(cls._build_related(spec, OmniFormHandler, index, fields_by_name))
+            except ValidationError as e:
+                errors.extend(['handlers[{0}]: {1}'.format(index, message) for message in e.messages])
+
+        if errors:
+            raise ValidationError(errors)
+
+        definition = cls(form, fields, handlers)
+        definition.validate()
+        return definition
+
+    @classmethod
+    def from_instance(cls, form, fields=None, handlers=None):
+        """
+        Creates a definition from a saved form
+
+        :param form: Saved OmniForm or OmniModelForm instance
+        :param fields: List of the forms fields (as their most specific type), loaded from the form if not given
+        :param handlers: List of the forms handlers (as their most specific type), loaded from the form if not given
+        :return: FormDefinition instance
+        """
+        if fields is None:
+            fields = form.fields.all().specific()
+        if handlers is None:
+            handlers = form.handlers.all().specific()
+        return cls(form, fields, handlers)
+
+    def to_dict(self):
+        """
+        Method for converting the definition to a dict in the format accepted by from_dict
+
+        :return: Definition dict
+        """
+        data = {'model': self.form._meta.label_lower, 'key': '{0}'.format(self.form.key), 'title': self.form.title}
+        if isinstance(self.form, OmniModelFormBase):
+            data['content_type'] = '{0}.{1}'.format(self.form.content_type.app_label, self.form.content_type.model)
+
+        names_by_pk = {field.pk: field.name for field in self.fields if field.pk is not None}
+        data['fields'] = [self._instance_to_dict(field, names_by_pk) for field in self.fields]
+        data['handlers'] = [self._instance_to_dict(handler, names_by_pk) for handler in self.handlers]
+        return data
+
+    @staticmethod
+    def _instance_to_dict(instance, names_by_pk):
+        """
+        Converts a field or handler instance to a spec dict.  Foreign keys to fields are given as field names
+        and foreign keys to content types (for instance the related_type of a related field) as model labels
+
+        :param instance: Field or handler instance
+        :param names_by_pk: Dict of the definitions field names keyed by primary key
+        :return: Spec dict
+        """
+        data = {'type': instance._meta.label_lower}
+        for field in instance._meta.concrete_fields:
+            if field.primary_key or field.name in ('content_type', 'object_id', 'real_type'):
+                continue
+            if field.is_relation and issubclass(field.related_model, OmniField):
+                related = getattr(instance, field.get_cache_name(), None)
+                if related is not None:
+                    data[field.name] = related.name
+                else:
+                    data[field.name] = names_by_pk.get(getattr(instance, field.attname))
+            elif field.is_relation and issubclass(field.related_model, ContentType):
+                content_type = getattr(instance, field.name, None)
+                data[field.name] = content_type and '{0}.{1}'.format(content_type.app_label, content_type.model)
+            else:
+                data[field.name] = field.value_from_object(instance)
+        return data
+
+    @staticmethod
+    def _build_form(data):
+        """
+        Builds the unsaved form instance for a definition dict.  The content type of model forms is
+        an unsaved ContentType instance, which is enough to resolve the model without a database query
+
+        :param data: Definition dict
+        :return: Unsaved OmniForm or OmniModelForm instance
+        """
+        form_model = get_model_class(data.get('model', 'omniforms.omniform'), OmniFormBase)
+        form = form_model(title=data.get('title', ''))
+        if data.get('key'):
+            form.key = data['key']
+        if isinstance(form, OmniModelFormBase):
+            model_class = get_model_class(data.get('content_type', ''), models.Model)
+            form.content_type = ContentType(app_label=model_class._meta.app_label, model=model_class._meta.model_name)
+        return form
+
+    @staticmethod
+    def _build_related(spec, base_class, index, fields_by_name=None):
+        """
+        Builds an unsaved field or handler instance from a spec dict.  Foreign keys to fields
+        (for instance the recipient_field of a confirmation handler) are given as field names and foreign
+        keys to content types (for instance the related_type of a related field) as model labels
+
+        :param spec: Field or handler spec dict, or an unsaved instance
+        :param base_class: OmniField or OmniFormHandler
+        :param index: The position of the spec in the definition
+        :param fields_by_name: Dict of the definitions fields keyed by name
+        :return: Unsaved instance
+        """
+        if isinstance(spec, base_class):
+            instance = spec
+        else:
+            spec = dict(spec)
+            model_class = get_model_class(spec.pop('type', ''), base_class)
+            spec.setdefault('order', index)
+            if base_class == OmniField and 'widget_class' not in spec:
+                spec['widget_class'] = model_class.FORM_WIDGETS[0]
+
+            for model_field in model_class._meta.concrete_fields:
+                if not model_field.is_relation or model_field.name not in spec:
+                    continue
+                if issubclass(model_field.related_model, OmniField):
+                    field = (fields_by_name or {}).get(spec[model_field.name])
+                    if not isinstance(field, model_field.related_model):
+                        raise ValidationError('\'{0}\' is not a {1} in this definition'.format(
+                            spec[model_field.name],
+                            model_field.related_model.__name__
+                        ))
+                    spec[model_field.name] = field
+                elif issubclass(model_field.related_model, ContentType):
+                    related_model = get_model_class('{0}'.format(spec[model_field.name]), models.Model)
+                    spec[model_field.name] = ContentType.objects.get_for_model(related_model)
+
+            try:
+                instance = model_class(**spec)
+            except (TypeError, ValueError) as e:
+                raise ValidationError('{0}'.format(e))
+
+        excluded = ['content_type', 'object_id', 'real_type']
+        excluded.extend([
+            model_field.name for model_field in instance._meta.concrete_fields
+            if model_field.is_relation and isinstance(getattr(instance, model_field.name, None), OmniField)
+        ])
+        instance.clean_fields(exclude=excluded)
+        if isinstance(instance, OmniField):
+            instance.clean()
+            if instance.widget_class not in instance.FORM_WIDGETS:
+                raise ValidationError('{0} is not a permitted widget'.format(instance.widget_class))
+        return instance
+
+    def validate(self):
+        """
+        Validates the definition as a whole.  Handlers are validated using validate_definition
+        rather than clean, as they are not attached to a saved form
+
+        :raises: ValidationError if the definition is not valid
+        """
+        errors = []
+        try:
+            self.form.clean_fields(exclude=['content_type', 'version'])
+        except ValidationError as e:
+            errors.extend(['form: {0}'.format(message) for message in e.messages])
+
+        seen = set()
+        for field in self.fields:
+            if field.name in seen:
+                errors.append('fields: \'{0}\' is defined more than once'.format(field.name))
+            seen.add(field.name)
+
+        try:
+            ConditionGraph(
+                {field.name: field.get_condition() for field in self.fields if field.condition_field},
+                seen
+            )
+        except ValueError as e:
+            errors.append('fields: {0}'.format(e.args[0]))
+
+        for field in self.fields:
+            if isinstance(field, OmniCalculatedField):
+                for name in sorted(compile_expression(field.expression).names - (seen - {field.name})):
+                    errors.append('fields: \'{0}\' uses \'{1}\' which is not a field of the form'.format(
+                        field.name,
+                        name
+                    ))
+
+        if isinstance(self.form, OmniModelFormBase):
+            model_field_names = self.form.get_model_field_names()
+            for name in self.field_names:
+                if name not in model_field_names:
+                    errors.append('fields: \'{0}\' is not a field of the forms model'.format(name))
+
+        for handler in self.handlers:
+            try:
+                handler.check_condition(seen)
+                handler.validate_definition(self)
+            except ValidationError as e:
+                errors.extend(['handlers: {0}'.format(message) for message in e.messages])
+
+        if errors:
+            raise ValidationError(errors)
+
+    def get_form_class(self):
+        """
+        Method for generating the form class for the definition.  The generated class is the same as the
+        one generated by get_form_class for a form holding the same fields and handlers in the database
+
+        :return: Form class
+        """
+        base_form_class = self.form._get_base_form_class(handlers=list(self.handlers))
+        if isinstance(self.form, OmniModelFormBase):
+            fields_by_name = {field.name: field for field in self.fields}
+
+            def formfield_callback(model_field, **kwargs):
+                field = fields_by_name.get(model_field.name)
+                return field.as_form_field() if field is not None else None
+
+            return modelform_factory(
+                self.form.content_type.model_class(),
+                form=base_form_class,
+                fields=self.field_names,
+                formfield_callback=formfield_callback
+            )
+
+        return type(
+            self.form._get_form_class_name(),
+            (base_form_class,),
+            {field.name: field.as_form_field() for field in self.fields}
+        )
+
+    def save(self, using=None):
+        """
+        Saves the definition to the database (see save_definitions)
+
+        :param using: The database alias
+        :return: The saved form instance
+        """
+        save_definitions([self], using=using)
+        return self.form
+
+
+def save_definitions(definitions, using=None, update=False):
+    """
+    Saves unsaved definitions to the database within a single transaction.  Forms are inserted first,
+    followed by every field and then every handler using one INSERT statement per table (in batches),
+    rather than saving every instance individually.
+
+    Forms are matched to saved forms by their key, so a definition exported from one database can be
+    imported into another again.  If update is True, saved forms are updated from their definitions:
+    their fields and handlers are replaced, and their definition version is incremented.  Submissions
+    waiting in the digests of replaced email handlers are sent first
+
+    :param definitions: List of FormDefinition instances
+    :param using: The database alias
+    :param update: Whether or not to update saved forms with the same key as a definition
+    :return: List of FormDefinition instances
+    :raises: ValueError if a definition has the same key as a saved form and update is False
+    """
+    definitions = list(definitions)
+    using = using or router.db_for_write(OmniField)
+    content_types = ContentType.objects.db_manager(using)
+
+    forms_by_model = defaultdict(list)
+    keys = set()
+    for definition in definitions:
+        if definition.form.pk is not None:
+            raise ValueError('Definitions for saved forms cannot be saved again')
+        if definition.form.key in keys:
+            raise ValueError('The form \'{0}\' is defined more than once'.format(definition.form.key))
+        keys.add(definition.form.key)
+        if isinstance(definition.form, OmniModelFormBase):
+            definition.form.content_type = content_types.get_for_model(definition.form.content_type.model_class())
+        forms_by_model[definition.form.__class__].append(definition.form)
+
+    with transaction.atomic(using=using):
+        for form_model, forms in forms_by_model.items():
+            saved_pks = dict(form_model.objects.using(using).select_for_update().filter(
+                key__in=[form.key for form in forms]
+            ).values_list('key', 'pk'))
+            if saved_pks and not update:
+                raise ValueError('The forms {0} already exist'.format(', '.join(sorted(
+                    '\'{0}\''.format(form.title) for form in forms if form.key in saved_pks
+                ))))
+            saved_forms = [form for form in forms if form.key in saved_pks]
+            for form in saved_forms:
+                form.pk = saved_pks[form.key]
+            _replace_forms(form_model, saved_forms, using)
+            form_model.objects.using(using).bulk_insert([form for form in forms if form.pk is None])
+
+        fields = []
+        handlers = []
+        for definition in definitions:
+            content_type = content_types.get_for_model(definition.form)
+            for instance in definition.fields + definition.handlers:
+                instance.content_type = content_type
+                instance.object_id = definition.form.pk
+            fields.extend(definition.fields)
+            handlers.extend(definition.handlers)
+
+        OmniField.objects.using(using).bulk_insert(fields, bump_versions=False)
+        OmniFormHandler.objects.using(using).bulk_insert(handlers, bump_versions=False)
+    return definitions
+
+
+def _replace_forms(form_model, forms, using):
+    """
+    Updates saved forms from their definitions, removing their fields and handlers so that the fields
+    and handlers of the definitions can be inserted in their place.  Handlers are removed before fields,
+    as handlers may hold protected references to fields
+
+    :param form_model: The form model class
+    :param forms: List of form instances with the primary keys of the saved forms
+    :param using: The database alias
+    """
+    if not forms:
+        return
+
+    related_filters = {
+        'content_type': ContentType.objects.db_manager(using).get_for_model(form_model),
+        'object_id__in': [form.pk for form in forms]
+    }
+    pending_handlers = OmniFormEmailHandler.objects.using(using).filter(
+        digest_entries__isnull=False,
+        **related_filters
+    ).distinct()
+    for handler in pending_handlers:
+        handler.send_digest()
+    OmniFormHandler.objects.using(using).filter(**related_filters).bulk_delete(bump_versions=False)
+    OmniField.objects.using(using).filter(**related_filters).bulk_delete(bump_versions=False)
+
+    update_fields = ['title', 'content_type'] if issubclass(form_model, OmniModelFormBase) else ['title']
+    for form in forms:
+        form_model.objects.using(using).filter(pk=form.pk).update(
+            **{name: getattr(form, name) for name in update_fields}
+        )
+        bump_definition_version(form_model, form.pk, using)
+        form._state.adding = False
+        form._state.db = using
+        form.refresh_from_db(using=using, fields=['version', 'modified'])
+
+
+def iter_form_definitions(queryset, batch_size=100):
+    """
+    Generator yielding a definition for every form in the queryset.  Forms are loaded in batches,
+    with the fields and handlers of each batch loaded using one query per concrete type
+
+    :param queryset: OmniForm or OmniModelForm queryset
+    :param batch_size: The number of forms to load at once
+    :return: Generator of FormDefinition instances
+    """
+    content_type = ContentType.objects.db_manager(queryset.db).get_for_model(queryset.model)
+    queryset = queryset.order_by('pk')
+    if issubclass(queryset.model, OmniModelFormBase):
+        queryset = queryset.select_related('content_type')
+
+    last_pk = None
+    while True:
+        batch_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        forms = list(batch_queryset[:batch_size])
+        if not forms:
+            return
+        last_pk = forms[-1].pk
+
+        related = {}
+        for model_class in (OmniField, OmniFormHandler):
+            related[model_class] = defaultdict(list)
+            instances = model_class.objects.using(queryset.db).filter(
+                content_type=content_type,
+                object_id__in=[form.pk for form in forms]
+            ).specific()
+            for instance in instances:
+                related[model_class][instance.object_id].append(instance)
+
+        for form in forms:
+            yield FormDefinition.from_instance(
+                form,
+                fields=related[OmniField][form.pk],
+                handlers=related[OmniFormHandler][form.pk]
+            )
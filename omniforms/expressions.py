@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+"""
+Expressions for the calculated fields of the omniforms app.  Expressions are written using a restricted
+subset of the python expression syntax, and compiled into a tree of plain python callables that is
+evaluated without using eval
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.utils import timezone
+from django.utils.encoding import force_text
+from decimal import Decimal, ROUND_HALF_UP
+import ast
+import datetime
+import numbers
+import operator
+import threading
+
+
+MAX_LENGTH = 1000
+MAX_NODES = 200
+MAX_EXPONENT = 100
+MAX_POWER_BITS = 4096
+MAX_DECIMAL_DIGITS = 1000
+RESERVED_NAMES = {'True': True, 'False': False, 'None': None}
+
+
+class ExpressionError(ValueError):
+    """
+    Raised when an expression cannot be compiled
+    """
+
+
+def to_number(value):
+    """
+    Converts floats to decimals, so that arithmetic can mix values of decimal and float fields
+
+    :param value: The value
+    :return: The value, or a Decimal if the value was a float
+    """
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return value
+
+
+def limit_size(value):
+    """
+    Ensures a number is small enough for further arithmetic to take little time.  Integers may be at most
+    MAX_POWER_BITS bits long, and decimals may have at most MAX_DECIMAL_DIGITS digits before the decimal point
+
+    :param value: The value
+    :return: The value
+    :raises: ValueError if the value is a number that is too large
+    """
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        if abs(int(value)).bit_length() > MAX_POWER_BITS:
+            raise ValueError('Integers may be at most {0} bits long'.format(MAX_POWER_BITS))
+    elif isinstance(value, Decimal) and value.is_finite() and value.adjusted() >= MAX_DECIMAL_DIGITS:
+        raise ValueError('Numbers may have at most {0} digits'.format(MAX_DECIMAL_DIGITS))
+    return value
+
+
+def require_numbers(*values):
+    """
+    Ensures the values are numbers
+
+    :param values: The values
+    :raises: TypeError if any of the values is not a number
+    """
+    for value in values:
+        if not isinstance(value, numbers.Number):
+            raise TypeError('Expected a number but got {0!r}'.format(value))
+
+
+def multiply(left, right):
+    """
+    Multiplies two numbers.  Repeating strings and lists is not allowed
+
+    :return: The product
+    """
+    require_numbers(left, right)
+    if isinstance(left, numbers.Integral) and isinstance(right, numbers.Integral):
+        if abs(int(left)).bit_length() + abs(int(right)).bit_length() > MAX_POWER_BITS + 1:
+            raise ValueError('Integers may be at most {0} bits long'.format(MAX_POWER_BITS))
+    return left * right
+
+
+def divide(left, right):
+    """
+    Divides two numbers, always giving a Decimal
+
+    :return: The quotient
+    """
+    require_numbers(left, right)
+    return Decimal(left) / Decimal(right)
+
+
+def floor_divide(left, right):
+    """
+    Divides two numbers, rounding down
+
+    :return: The quotient
+    """
+    require_numbers(left, right)
+    return left // right
+
+
+def modulo(left, right):
+    """
+    Gives the remainder of the division of two numbers
+
+    :return: The remainder
+    """
+    require_numbers(left, right)
+    return left % right
+
+
+def power(left, right):
+    """
+    Raises a number to an integer power of at most MAX_EXPONENT.  The size of integer results is checked
+    before they are calculated, as raising large integers to a power takes time growing with the result.
+    Decimal results are limited to the precision of the decimal context
+
+    :return: The result
+    :raises: ValueError if the exponent is not an integer or is too large, or the result would be too large
+    """
+    require_numbers(left, right)
+    if right != int(right) or abs(right) > MAX_EXPONENT:
+        raise ValueError('Exponents must be integers no larger than {0}'.format(MAX_EXPONENT))
+    exponent = int(right)
+    if isinstance(left, numbers.Integral) and abs(int(left)).bit_length() * abs(exponent) > MAX_POWER_BITS:
+        raise ValueError('Results of powers may be at most {0} bits long'.format(MAX_POWER_BITS))
+    if exponent < 0:
+        return Decimal(left) ** exponent
+    return left ** exponent
+
+
+def today():
+    """
+    Gives the current date in the current time zone
+
+    :return: date
+    """
+    return timezone.localdate() if settings.USE_TZ else datetime.date.today()
+
+
+def to_date(value):
+    """
+    Converts datetimes to dates
+
+    :param value: date or datetime
+    :return: date
+    """
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def age(date_of_birth, on=None):
+    """
+    Gives the age in full years of someone born on the given date
+
+    :param date_of_birth: date
+    :param on: date the age is calculated on, defaults to today
+    :return: int
+    """
+    date_of_birth = to_date(date_of_birth)
+    on = to_date(on) if on is not None else today()
+    return on.year - date_of_birth.year - ((on.month, on.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def days_between(start, end):
+    """
+    Gives the number of days from one date to another
+
+    :param start: date
+    :param end: date
+    :return: int
+    """
+    return (to_date(end) - to_date(start)).days
+
+
+def to_int(value):
+    """
+    Converts a number or string to an integer, rejecting values too large to convert quickly
+
+    :param value: The value
+    :return: int
+    :raises: ValueError if the value is too large
+    """
+    if isinstance(value, (type(''), str)) and len(value.strip()) > MAX_DECIMAL_DIGITS + 1:
+        raise ValueError('Numbers may have at most {0} digits'.format(MAX_DECIMAL_DIGITS))
+    return int(limit_size(value))
+
+
+def to_text(value):
+    """
+    Converts a value to text, rejecting numbers too large to convert quickly
+
+    :param value: The value
+    :return: Text
+    :raises: ValueError if the value is too large
+    """
+    return force_text(limit_size(value))
+
+
+def round_number(value, places=0):
+    """
+    Rounds a number to the given number of decimal places, rounding halves away from zero
+
+    :param value: The number
+    :param places: The number of decimal places
+    :return: int if places is 0, otherwise Decimal
+    """
+    require_numbers(value, places)
+    rounded = Decimal(value).quantize(Decimal(1).scaleb(-int(places)), rounding=ROUND_HALF_UP)
+    return int(rounded) if not places else rounded
+
+
+FUNCTIONS = {
+    'abs': abs,
+    'age': age,
+    'days_between': days_between,
+    'int': to_int,
+    'len': len,
+    'max': max,
+    'min': min,
+    'round': round_number,
+    'str': to_text,
+    'sum': sum,
+    'today': today,
+}
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: multiply,
+    ast.Div: divide,
+    ast.FloorDiv: floor_divide,
+    ast.Mod: modulo,
+    ast.Pow: power,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+    ast.Not: operator.not_,
+}
+
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+EVALUATION_ERRORS = (ArithmeticError, AttributeError, KeyError, TypeError, ValueError)
+
+
+class Expression(object):
+    """
+    A compiled expression.  Names in the expression refer to the cleaned values of fields of the form
+    """
+    def __init__(self, source):
+        """
+        Compiles the expression
+
+        :param source: The expression source
+        :raises: ExpressionError if the expression is not valid or uses syntax that is not allowed
+        """
+        super(Expression, self).__init__()
+        self.source = source
+        self.names = set()
+        self._node_count = 0
+        if len(source) > MAX_LENGTH:
+            raise ExpressionError('Expressions may be at most {0} characters long'.format(MAX_LENGTH))
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except (SyntaxError, ValueError, MemoryError, RuntimeError):
+            raise ExpressionError('\'{0}\' is not a valid expression'.format(source))
+        self._evaluate = self._compile(tree.body)
+
+    def __deepcopy__(self, memo):
+        """
+        Compiled expressions are immutable, so are shared by the copies of form fields made for each form instance
+
+        :param memo: Default memo dict
+        :return: The expression
+        """
+        return self
+
+    def evaluate(self, values):
+        """
+        Evaluates the expression
+
+        :param values: Dict of values keyed by field name
+        :return: The result, or None if the expression cannot be evaluated for the values
+            (for instance because a value is missing or is of the wrong type)
+        """
+        try:
+            return to_number(self._evaluate(values))
+        except EVALUATION_ERRORS:
+            return None
+
+    def _compile(self, node):
+        """
+        Compiles a node of the expression syntax tree into a callable taking the dict of values
+
+        :param node: ast node
+        :return: Callable
+        :raises: ExpressionError if the node is not allowed
+        """
+        self._node_count += 1
+        if self._node_count > MAX_NODES:
+            raise ExpressionError('Expressions may hold at most {0} terms'.format(MAX_NODES))
+        method = getattr(self, '_compile_{0}'.format(node.__class__.__name__.lower()), None)
+        if method is None:
+            raise ExpressionError('{0} is not allowed in expressions'.format(node.__class__.__name__))
+        return method(node)
+
+    def _compile_value(self, value):
+        """
+        Compiles a literal value
+
+        :param value: The literal value
+        :return: Callable
+        :raises: ExpressionError if the value is not a number, string, boolean or None
+        """
+        if value is not None and not isinstance(value, (bool, numbers.Number, type(''), str)):
+            raise ExpressionError('{0!r} is not allowed in expressions'.format(value))
+        if isinstance(value, complex):
+            raise ExpressionError('Complex numbers are not allowed in expressions')
+        value = to_number(value)
+        return lambda values: value
+
+    def _compile_constant(self, node):
+        """
+        Compiles a literal (python 3.8+)
+
+        :param node: ast node
+        :return: Callable
+        """
+        return self._compile_value(node.value)
+
+    def _compile_num(self, node):
+        """
+        Compiles a number literal
+
+        :param node: ast node
+        :return: Callable
+        """
+        return self._compile_value(node.n)
+
+    def _compile_str(self, node):
+        """
+        Compiles a string literal
+
+        :param node: ast node
+        :return: Callable
+        """
+        return self._compile_value(node.s)
+
+    def _compile_nameconstant(self, node):
+        """
+        Compiles a True, False or None literal
+
+        :param node: ast node
+        :return: Callable
+        """
+        return self._compile_value(node.value)
+
+    def _compile_name(self, node):
+        """
+        Compiles a reference to the value of a field.  Names only refer to functions when called,
+        so fields may share the names of functions
+
+        :param node: ast node
+        :return: Callable
+        """
+        if node.id in RESERVED_NAMES:
+            return self._compile_value(RESERVED_NAMES[node.id])
+        name = node.id
+        self.names.add(name)
+        return lambda values: limit_size(to_number(values.get(name)))
+
+    def _compile_binop(self, node):
+        """
+        Compiles an arithmetic operation
+
+        :param node: ast node
+        :return: Callable
+        """
+        function = BINARY_OPERATORS.get(node.op.__class__)
+        if function is None:
+            raise ExpressionError('{0} is not allowed in expressions'.format(node.op.__class__.__name__))
+        if isinstance(node.op, ast.Pow) and any(
+            isinstance(child, ast.BinOp) and isinstance(child.op, ast.Pow)
+            for operand in (node.left, node.right) for child in ast.walk(operand)
+        ):
+            raise ExpressionError('Powers may not be raised to a power or used as exponents in expressions')
+        left = self._compile(node.left)
+        right = self._compile(node.right)
+        return lambda values: limit_size(function(left(values), right(values)))
+
+    def _compile_unaryop(self, node):
+        """
+        Compiles a unary operation
+
+        :param node: ast node
+        :return: Callable
+        """
+        function = UNARY_OPERATORS.get(node.op.__class__)
+        if function is None:
+            raise ExpressionError('{0} is not allowed in expressions'.format(node.op.__class__.__name__))
+        operand = self._compile(node.operand)
+        return lambda values: limit_size(function(operand(values)))
+
+    def _compile_boolop(self, node):
+        """
+        Compiles an and/or operation, evaluating operands only as far as needed
+
+        :param node: ast node
+        :return: Callable
+        """
+        operands = [self._compile(value) for value in node.values]
+        is_and = isinstance(node.op, ast.And)
+
+        def evaluate(values):
+            result = None
+            for operand in operands:
+                result = operand(values)
+                if bool(result) != is_and:
+                    return result
+            return result
+        return evaluate
+
+    def _compile_compare(self, node):
+        """
+        Compiles a (possibly chained) comparison
+
+        :param node: ast node
+        :return: Callable
+        """
+        functions = []
+        for op in node.ops:
+            function = COMPARISON_OPERATORS.get(op.__class__)
+            if function is None:
+                raise ExpressionError('{0} is not allowed in expressions'.format(op.__class__.__name__))
+            functions.append(function)
+        first = self._compile(node.left)
+        comparators = list(zip(functions, [self._compile(comparator) for comparator in node.comparators]))
+
+        def evaluate(values):
+            left = first(values)
+            for function, comparator in comparators:
+                right = comparator(values)
+                if not function(left, right):
+                    return False
+                left = right
+            return True
+        return evaluate
+
+    def _compile_ifexp(self, node):
+        """
+        Compiles a conditional expression
+
+        :param node: ast node
+        :return: Callable
+        """
+        test = self._compile(node.test)
+        body = self._compile(node.body)
+        orelse = self._compile(node.orelse)
+        return lambda values: body(values) if test(values) else orelse(values)
+
+    def _compile_call(self, node):
+        """
+        Compiles a call to one of the FUNCTIONS
+
+        :param node: ast node
+        :return: Callable
+        """
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError('Only the functions {0} may be called in expressions'.format(
+                ', '.join(sorted(FUNCTIONS))
+            ))
+        if node.keywords or getattr(node, 'starargs', None) or getattr(node, 'kwargs', None):
+            raise ExpressionError('Functions may only be given positional arguments in expressions')
+        function = FUNCTIONS[node.func.id]
+        arguments = [self._compile(argument) for argument in node.args]
+        return lambda values: limit_size(function(*[argument(values) for argument in arguments]))
+
+    def _compile_list(self, node):
+        """
+        Compiles a list or tuple literal
+
+        :param node: ast node
+        :return: Callable
+        """
+        items = [self._compile(item) for item in node.elts]
+        return lambda values: [item(values) for item in items]
+
+    _compile_tuple = _compile_list
+
+
+_expressions = {}
+_expressions_lock = threading.Lock()
+MAX_CACHED_EXPRESSIONS = 1000
+
+
+def compile_expression(source):
+    """
+    Compiles an expression, reusing the compiled expression if the same source has been compiled before
+
+    :param source: The expression source
+    :return: Expression instance
+    :raises: ExpressionError if the expression is not valid or uses syntax that is not allowed
+    """
+    expression = _expressions.get(source)
+    if expression is None:
+        expression = Expression(source)
+        with _expressions_lock:
+            if len(_expressions) >= MAX_CACHED_EXPRESSIONS:
+                _expressions.clear()
+            _expressions[source] = expression
+    return expression
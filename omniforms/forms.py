@@ -6,6 +6,166 @@ from __future__ import unicode_literals
 from django import forms
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils.translation import ugettext_lazy as _
+from omniforms.conditions import ConditionGraph
+from omniforms.storage import content_addressed_storage
+from collections import OrderedDict
+import threading
+
+
+class HandlerLoader(object):
+    """
+    Lazily loads the handlers attached to an omni form.
+    Handlers are resolved the first time they are needed and cached on the loader, meaning every form
+    instance created from a form class holding the loader shares them.  Loading happens in two stages:
+    the base handler rows are loaded (in one query) and their conditions compiled first, and the most
+    specific version of a handler is only loaded once a submission meets its condition
+    """
+    def __init__(self, queryset):
+        """
+        Sets up the loader
+
+        :param queryset: Unevaluated OmniFormHandler queryset for the form
+        """
+        super(HandlerLoader, self).__init__()
+        self.queryset = queryset
+        self._handlers = None
+        self._base_handlers = None
+        self._conditions = None
+        self._specific_handlers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """
+        Whether or not all of the handlers have been loaded
+
+        :return: bool
+        """
+        return self._handlers is not None
+
+    def get_conditions(self):
+        """
+        Gets the compiled condition of every handler (see OmniFormHandler.get_condition), in handler order.
+        Only the base handler rows are loaded to do so, and only once
+
+        :return: List of tuples of handler primary keys and conditions (None for handlers that always run)
+        """
+        if self._conditions is None:
+            with self._lock:
+                if self._conditions is None:
+                    base_handlers = list(self.queryset.all())
+                    self._base_handlers = dict((handler.pk, handler) for handler in base_handlers)
+                    self._conditions = [(handler.pk, handler.get_condition()) for handler in base_handlers]
+        return self._conditions
+
+    def load_specific(self, pks):
+        """
+        Loads the most specific version of the given handlers if they have not been loaded already,
+        using one query per concrete handler type
+
+        :param pks: Primary keys of handlers returned by get_conditions
+        :return: Dict of OmniFormHandler subclass instances keyed by primary key
+        """
+        self.get_conditions()
+        missing = [pk for pk in pks if pk not in self._specific_handlers]
+        if missing:
+            with self._lock:
+                missing = [pk for pk in missing if pk not in self._specific_handlers]
+                if missing:
+                    specific_handlers = self.queryset.specific_instances([self._base_handlers[pk] for pk in missing])
+                    for handler in specific_handlers:
+                        self._specific_handlers[handler.pk] = handler
+        return dict((pk, self._specific_handlers[pk]) for pk in pks)
+
+    def load(self):
+        """
+        Loads the most specific version of every handler if they have not been loaded already
+
+        :return: List of OmniFormHandler subclass instances
+        """
+        if self._handlers is None:
+            pks = [pk for pk, condition in self.get_conditions()]
+            handlers = self.load_specific(pks)
+            self._handlers = [handlers[pk] for pk in pks]
+        return self._handlers
+
+
+class CalculatedField(forms.Field):
+    """
+    Form field holding a value calculated from the cleaned values of other fields of the form.
+    The field is never submitted: its value is set by the form once the form has been cleaned
+    (see OmniFormBaseForm.calculate_fields)
+    """
+    widget = forms.HiddenInput
+
+    def __init__(self, expression, **kwargs):
+        """
+        Sets up the field
+
+        :param expression: omniforms.expressions.Expression instance
+        :param kwargs: Default keyword args
+        """
+        kwargs.update({'required': False, 'disabled': True})
+        super(CalculatedField, self).__init__(**kwargs)
+        self.expression = expression
+
+
+class UploadSizeMixin(object):
+    """
+    Mixin for file form fields limiting the size of the files uploaded using them.  Files are checked using
+    the size reported for them, so files cut off part way through the upload by the upload handler (see
+    omniforms.uploads.BoundedUploadHandler) are rejected without being read.  Fields with deduplicate set
+    have their uploads stored in the content addressed storage when the form is handled (see
+    OmniFormBaseForm.store_uploads)
+    """
+    default_error_messages = {
+        'max_upload_size': _('Ensure this file is no larger than %(max)s.'),
+    }
+
+    def __init__(self, max_upload_size=None, deduplicate=False, **kwargs):
+        """
+        Sets up the field
+
+        :param max_upload_size: The maximum size of uploaded files in bytes, or None for no limit
+        :param deduplicate: Whether or not uploads are stored in the content addressed storage
+        :param kwargs: Default keyword args
+        """
+        super(UploadSizeMixin, self).__init__(**kwargs)
+        self.max_upload_size = max_upload_size
+        self.deduplicate = deduplicate
+
+    def to_python(self, data):
+        """
+        Rejects files larger than the maximum upload size before the file is read by super
+
+        :param data: The uploaded file
+        :return: The uploaded file
+        :raises: ValidationError if the file is too large
+        """
+        size = getattr(data, 'size', None)
+        if self.max_upload_size is not None and size is not None and size > self.max_upload_size:
+            raise forms.ValidationError(
+                self.error_messages['max_upload_size'],
+                code='max_upload_size',
+                params={'max': filesizeformat(self.max_upload_size)}
+            )
+        return super(UploadSizeMixin, self).to_python(data)
+
+
+class BoundedFileField(UploadSizeMixin, forms.FileField):
+    """
+    File field with an optional maximum upload size
+    """
+
+
+class BoundedImageField(UploadSizeMixin, forms.ImageField):
+    """
+    Image field with an optional maximum upload size
+    """
 
 
 class OmniFormBaseForm(forms.Form):
@@ -14,9 +174,57 @@ class OmniFormBaseForm(forms.Form):
     """
     _handlers = None
 
+    def get_handlers(self):
+        """
+        Method for getting the handlers that should be run when the form is handled
+
+        :return: List of OmniFormHandler instances
+        """
+        if isinstance(self._handlers, HandlerLoader):
+            return self._handlers.load()
+        return self._handlers or []
+
+    def _get_handler_conditions(self):
+        """
+        Gets the condition of every handler, in handler order, without loading the handlers from the database
+
+        :return: List of tuples of handler keys and conditions (None for handlers that always run)
+        """
+        if isinstance(self._handlers, HandlerLoader):
+            return self._handlers.get_conditions()
+        return [(index, handler.get_condition()) for index, handler in enumerate(self._handlers or [])]
+
+    def _load_handlers(self, keys):
+        """
+        Gets the handlers for keys returned by _get_handler_conditions
+
+        :param keys: List of handler keys
+        :return: Dict of handlers keyed by handler key
+        """
+        if isinstance(self._handlers, HandlerLoader):
+            return self._handlers.load_specific(keys)
+        return dict((key, self._handlers[key]) for key in keys)
+
+    def get_active_handlers(self):
+        """
+        Method for getting the handlers whose condition is met by the cleaned data of the form.
+        Conditions are checked before handlers are loaded, so handlers that do not run are never loaded.
+        Handlers whose condition cannot be evaluated (see omniforms.expressions.Expression.evaluate) do not run
+
+        :return: List of OmniFormHandler instances
+        """
+        keys = [
+            key for key, condition in self._get_handler_conditions()
+            if condition is None or condition.evaluate(self.cleaned_data)
+        ]
+        handlers = self._load_handlers(keys)
+        return [handlers[key] for key in keys]
+
     def handle(self):
         """
-        Really simple form handle method
+        Really simple form handle method.  Runs each handler whose condition is met by the submission.
+        Handlers run in a single transaction, so the rows they write (for instance saved instances and
+        emails written to the outbox) are committed together
 
         :return:
         """
@@ -26,9 +234,242 @@ class OmniFormBaseForm(forms.Form):
                 'unbound forms'.format(self.__class__.__name__)
             )
 
-        if self._handlers:
-            for handler in self._handlers:
+        with transaction.atomic(savepoint=False):
+            self.store_uploads()
+            for handler in self.get_active_handlers():
                 handler.handle(self)
+            self.release_uploads()
+
+    def store_uploads(self):
+        """
+        Saves the files uploaded using fields with deduplicate set to the content addressed storage (see
+        omniforms.storage), taking a reference to the stored file while the handlers run.  The storage name
+        is set as the storage_name attribute of each uploaded file, which is left ready to be read again by
+        the handlers.  Files already stored are not stored again
+        """
+        for name, field in self.fields.items():
+            value = self.cleaned_data.get(name)
+            if getattr(field, 'deduplicate', False) and isinstance(value, File) and not hasattr(value, 'storage_name'):
+                value.storage_name = content_addressed_storage.save(value.name, value)
+                value.storage_referenced = True
+                value.seek(0)
+
+    def release_uploads(self):
+        """
+        Releases the references taken by store_uploads once the handlers have run.  Handlers keeping a
+        stored file take a reference of their own, for instance by saving it to a model file field using
+        the content addressed storage, so files no handler kept are left without references and are
+        removed by the omniforms_clean_stored_files command
+        """
+        for value in self.cleaned_data.values():
+            if isinstance(value, File) and getattr(value, 'storage_referenced', False):
+                content_addressed_storage.delete(value.storage_name)
+                value.storage_referenced = False
+
+    @classmethod
+    def get_condition_graph(cls):
+        """
+        Gets the conditions of the form fields (see OmniField.get_condition) compiled into a dependency graph.
+        The graph is compiled once and stored on the form class, so is shared for as long as the form class is
+        (see omniforms.cache)
+
+        :return: omniforms.conditions.ConditionGraph instance
+        :raises: ImproperlyConfigured if the conditions depend on each other in a cycle
+        """
+        graph = cls.__dict__.get('_condition_graph')
+        if graph is None:
+            conditions = OrderedDict(
+                (name, field.condition)
+                for name, field in cls.base_fields.items()
+                if getattr(field, 'condition', None) is not None
+            )
+            try:
+                graph = ConditionGraph(conditions)
+            except ValueError as e:
+                raise ImproperlyConfigured(e.args[0])
+            cls._condition_graph = graph
+        return graph
+
+    def _get_condition_value(self, name):
+        """
+        Gets the submitted value of a field for evaluating the conditions that depend on it.
+        Values of fields that are not part of the form (for instance fields of other steps) are read
+        from the data directly
+
+        :param name: The name of the field
+        :return: The submitted value
+        """
+        field = self.fields.get(name)
+        if field is None:
+            key = self.add_prefix(name)
+            values = self.data.getlist(key) if hasattr(self.data, 'getlist') else self.data.get(key)
+            if isinstance(values, (list, tuple)) and len(values) < 2:
+                return values[0] if values else None
+            return values
+        if field.disabled:
+            return self.get_initial_for_field(field, name)
+        return field.widget.value_from_datadict(self.data, self.files, self.add_prefix(name))
+
+    def apply_conditions(self):
+        """
+        Evaluates the conditions of the form fields against the submitted data, in a single pass over the
+        compiled conditions.  Fields required by their condition are made required, and the names of fields
+        hidden by their condition are stored in the conditionally_hidden attribute
+
+        :return: Set of the names of hidden fields
+        """
+        hidden, required = self.get_condition_graph().evaluate(self._get_condition_value)
+        for name in required:
+            if name in self.fields:
+                self.fields[name].required = True
+        self.conditionally_hidden = hidden
+        return hidden
+
+    def _clean_fields(self):
+        """
+        Cleans the fields of the form that are not hidden by their condition.  Hidden fields skip
+        validation entirely, so are not included in the cleaned data
+        """
+        self.conditionally_hidden = set()
+        if not self.get_condition_graph():
+            return super(OmniFormBaseForm, self)._clean_fields()
+
+        hidden = self.apply_conditions()
+        fields = self.fields
+        self.fields = OrderedDict((name, field) for name, field in fields.items() if name not in hidden)
+        try:
+            super(OmniFormBaseForm, self)._clean_fields()
+        finally:
+            self.fields = fields
+
+    def _clean_form(self):
+        """
+        Cleans the form as a whole, then calculates the values of calculated fields
+        """
+        super(OmniFormBaseForm, self)._clean_form()
+        self.calculate_fields()
+
+    def calculate_fields(self):
+        """
+        Sets the values of calculated fields in the cleaned data, in field order.  Calculations may use the
+        values of calculated fields before them.  Values that cannot be calculated (for instance because a
+        field they use is not valid) are set to None
+        """
+        for name, field in self.fields.items():
+            if isinstance(field, CalculatedField) and name in self.cleaned_data:
+                self.cleaned_data[name] = field.expression.evaluate(self.cleaned_data)
+
+    @classmethod
+    def get_upload_limits(cls):
+        """
+        Gets the maximum upload size of each file field of the form, for the upload handler to enforce
+        while files are received (see omniforms.uploads.BoundedUploadHandler)
+
+        :return: Dict of maximum upload sizes in bytes (None for no limit) keyed by field name
+        """
+        return dict(
+            (name, getattr(field, 'max_upload_size', None))
+            for name, field in cls.base_fields.items()
+            if isinstance(field, forms.FileField)
+        )
+
+    @classmethod
+    def get_hashed_uploads(cls):
+        """
+        Gets the names of the file fields whose uploads are hashed while they are received, so that they
+        can be stored in the content addressed storage without being read again
+
+        :return: List of field names
+        """
+        return [name for name, field in cls.base_fields.items() if getattr(field, 'deduplicate', False)]
+
+    @classmethod
+    def get_steps(cls):
+        """
+        Gets the steps of the form as lists of field names, in field order.  Each field flagged
+        as a page break (see OmniField.page_break) starts a new step
+
+        :return: List of lists of field names
+        """
+        steps = [[]]
+        for name, field in cls.base_fields.items():
+            if getattr(field, 'page_break', False) and steps[-1]:
+                steps.append([])
+            steps[-1].append(name)
+        return steps
+
+    @classmethod
+    def _get_step_form_attrs(cls):
+        """
+        Gets extra attributes for the step form classes generated by get_step_form_class
+
+        :return: Dict of class attributes
+        """
+        return {}
+
+    @classmethod
+    def get_step_form_class(cls, index):
+        """
+        Gets a form class holding only the fields of one step of the form, meaning forms for a step
+        only build and validate the fields of that step.  Step form classes are generated once and
+        stored on the form class, so are shared for as long as the form class is (see omniforms.cache)
+
+        :param index: The index of the step
+        :return: Form class
+        :raises: IndexError if the form has no such step
+        """
+        step_form_classes = cls.__dict__.get('_step_form_classes')
+        if step_form_classes is None:
+            step_form_classes = {}
+            cls._step_form_classes = step_form_classes
+
+        step_form_class = step_form_classes.get(index)
+        if step_form_class is None:
+            names = cls.get_steps()[index]
+            step_form_class = type(
+                str('{0}Step{1}'.format(cls.__name__, index + 1)),
+                (cls,),
+                cls._get_step_form_attrs()
+            )
+            step_form_class.base_fields = OrderedDict((name, cls.base_fields[name]) for name in names)
+            step_form_class._step_form_classes = {}
+            step_form_class._condition_graph = cls.get_condition_graph()
+            step_form_classes[index] = step_form_class
+        return step_form_class
+
+    @classmethod
+    def handle_batch(cls, forms):
+        """
+        Handles a number of valid submissions of the same form at once, passing each handler in turn
+        the submissions meeting its condition (see OmniFormHandler.handle_batch) in a single transaction
+
+        :param forms: List of bound form instances of this form class
+        """
+        forms = list(forms)
+        if not forms:
+            return
+
+        for form in forms:
+            if not form.is_bound:
+                raise ImproperlyConfigured(
+                    '\'{0}\' handle_batch method cannot be called for '
+                    'unbound forms'.format(cls.__name__)
+                )
+
+        selected = []
+        for key, condition in forms[0]._get_handler_conditions():
+            handler_forms = [form for form in forms if condition is None or condition.evaluate(form.cleaned_data)]
+            if handler_forms:
+                selected.append((key, handler_forms))
+
+        handlers = forms[0]._load_handlers([key for key, handler_forms in selected])
+        with transaction.atomic(savepoint=False):
+            for form in forms:
+                form.store_uploads()
+            for key, handler_forms in selected:
+                handlers[key].handle_batch(handler_forms)
+            for form in forms:
+                form.release_uploads()
 
 
 class OmniModelFormBaseForm(forms.ModelForm, OmniFormBaseForm):
@@ -38,6 +479,29 @@ class OmniModelFormBaseForm(forms.ModelForm, OmniFormBaseForm):
     def save(self, commit=True):
         self.handle()
 
+    def _get_validation_exclusions(self):
+        """
+        Excludes the fields hidden by their condition from model validation, as they were not validated by the form
+
+        :return: List of field names
+        """
+        exclude = super(OmniModelFormBaseForm, self)._get_validation_exclusions()
+        for name in getattr(self, 'conditionally_hidden', ()):
+            if name not in exclude:
+                exclude.append(name)
+        return exclude
+
+    @classmethod
+    def _get_step_form_attrs(cls):
+        """
+        Gets extra attributes for the step form classes generated by get_step_form_class.
+        The fields of the form are reused rather than generated again for the model
+
+        :return: Dict of class attributes
+        """
+        base_fields = cls.base_fields
+        return {'formfield_callback': lambda model_field, **kwargs: base_fields.get(model_field.name)}
+
 
 class EmailConfirmationHandlerBaseFormClass(forms.ModelForm):
     """
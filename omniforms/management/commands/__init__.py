@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Management commands for the omniforms app
+"""
+from __future__ import unicode_literals
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for removing the stored files of the content addressed storage that are no longer referenced
+"""
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.utils import timezone
+from omniforms.models import OmniFormStoredFile
+from omniforms.storage import content_addressed_storage
+import datetime
+
+
+class Command(BaseCommand):
+    """
+    Removes the files of the content addressed storage (see omniforms.storage) whose references have all been
+    released.  Each file is locked and checked again before it is removed, so files referenced again while the
+    command runs are kept.  Files are only removed once they have gone unreferenced for the minimum age, which
+    leaves time for anything given the storage name of a file (for instance webhooks) to fetch it
+    """
+    help = 'Removes the stored files that are no longer referenced'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24,
+            help='Hours a file must have gone unreferenced before it is removed'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Removes the unreferenced files from the underlying storage along with their records
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        cutoff = timezone.now() - datetime.timedelta(hours=options['min_age'])
+        using = router.db_for_write(OmniFormStoredFile)
+        queryset = OmniFormStoredFile.objects.using(using).filter(references=0, modified__lt=cutoff)
+        storage = content_addressed_storage.storage
+        removed = 0
+        for pk in list(queryset.values_list('pk', flat=True)):
+            with transaction.atomic(using=using):
+                stored_file = queryset.select_for_update().filter(pk=pk).first()
+                if stored_file is None:
+                    continue
+                storage.delete(stored_file.name)
+                stored_file.delete()
+                removed += 1
+        self.stdout.write('{0} stored files removed'.format(removed))
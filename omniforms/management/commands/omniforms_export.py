@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for exporting omniform definitions
+"""
+from __future__ import unicode_literals
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from omniforms.definitions import iter_form_definitions
+from omniforms.models import OmniFormBase
+import io
+import json
+
+
+class Command(BaseCommand):
+    """
+    Streams every form, along with its fields and handlers, as JSON Lines (one form definition per line).
+    Models are referenced by their label rather than content type IDs, so the output can be imported
+    into any database using the omniforms_import command.
+    """
+    help = 'Exports all omni forms as JSON Lines'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='The file to write to, defaults to stdout'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='The number of forms to load from the database at once'
+        )
+
+    def export(self, stream, batch_size):
+        """
+        Method for writing every form definition to the stream
+
+        :param stream: Writable text stream
+        :param batch_size: The number of forms to load from the database at once
+        :return: The number of forms exported
+        """
+        total = 0
+        for model_class in apps.get_models():
+            if not issubclass(model_class, OmniFormBase):
+                continue
+            for definition in iter_form_definitions(model_class.objects.all(), batch_size=batch_size):
+                stream.write('{0}\n'.format(json.dumps(definition.to_dict(), cls=DjangoJSONEncoder, sort_keys=True)))
+                total += 1
+        return total
+
+    def handle(self, *args, **options):
+        """
+        Exports the forms to the output file or stdout
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        if options['output'] is None:
+            self.export(self.stdout, options['batch_size'])
+            return
+
+        with io.open(options['output'], 'w', encoding='utf-8') as output:
+            total = self.export(output, options['batch_size'])
+        self.stdout.write('{0} forms exported'.format(total))
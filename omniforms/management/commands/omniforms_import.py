@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for importing omniform definitions
+"""
+from __future__ import unicode_literals
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from omniforms.definitions import FormDefinition, save_definitions
+import io
+import json
+import sys
+
+
+class Command(BaseCommand):
+    """
+    Imports form definitions from JSON Lines (as written by the omniforms_export command).  Each definition
+    is validated in memory before being saved, and definitions are saved in batches, one transaction per batch,
+    using bulk inserts per concrete field and handler type.  Forms are matched to existing forms by their key,
+    so importing the same export twice (for instance when promoting forms from staging to production) does not
+    duplicate them.  Existing forms are only updated when the --update option is given, otherwise the import
+    stops at the first batch holding one.
+    """
+    help = 'Imports omni forms from JSON Lines'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            'input',
+            help='The file to read from, or - to read from stdin'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='The maximum number of forms to save per transaction'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            default=False,
+            help='Updates existing forms, replacing their fields and handlers, rather than stopping'
+        )
+
+    def import_definitions(self, stream, batch_size, update=False):
+        """
+        Method for importing every definition in the stream
+
+        :param stream: Readable text stream
+        :param batch_size: The maximum number of forms to save per transaction
+        :param update: Whether or not to update existing forms
+        :return: The number of forms imported
+        :raises: CommandError if a line is not a valid definition, or a form exists and update is False
+        """
+        total = 0
+        batch = []
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                raise CommandError('Line {0} is not valid JSON: {1}'.format(line_number, e))
+            try:
+                batch.append(FormDefinition.from_dict(data))
+            except ValidationError as e:
+                raise CommandError('Line {0} is not a valid form definition: {1}'.format(
+                    line_number,
+                    '; '.join(e.messages)
+                ))
+
+            if len(batch) >= batch_size:
+                total += self.save_batch(batch, total, update)
+                batch = []
+
+        if batch:
+            total += self.save_batch(batch, total, update)
+        return total
+
+    @staticmethod
+    def save_batch(batch, total, update):
+        """
+        Method for saving a batch of definitions in a single transaction
+
+        :param batch: List of FormDefinition instances
+        :param total: The number of forms imported before the batch
+        :param update: Whether or not to update existing forms
+        :return: The number of forms saved
+        :raises: CommandError if a form exists and update is False
+        """
+        try:
+            save_definitions(batch, update=update)
+        except ValueError as e:
+            hint = '' if update else ' (use --update to update existing forms)'
+            raise CommandError('{0}{1}; {2} forms imported'.format(e.args[0], hint, total))
+        return len(batch)
+
+    def handle(self, *args, **options):
+        """
+        Imports the forms from the input file or stdin
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        if options['input'] == '-':
+            total = self.import_definitions(sys.stdin, options['batch_size'], options['update'])
+        else:
+            with io.open(options['input'], encoding='utf-8') as stream:
+                total = self.import_definitions(stream, options['batch_size'], options['update'])
+        self.stdout.write('{0} forms imported'.format(total))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for sending the digest emails of email handlers in digest mode
+"""
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+from omniforms.models import OmniFormEmailDigestEntry, OmniFormEmailHandler
+
+
+class Command(BaseCommand):
+    """
+    Sends the digest of every email handler whose digest window has passed, along with the submissions left
+    over by handlers that are no longer in digest mode.  Digests are also sent when submissions are received,
+    but only this command sends the digests of forms that stop receiving submissions, so it should be run
+    at least as often as the shortest digest window
+    """
+    help = 'Sends the digest emails of email handlers whose digest window has passed'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            default=False,
+            help='Sends every digest holding submissions, whether or not its window has passed'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Finds the handlers with accumulated submissions using a single aggregate query and sends their digests
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        stats = OmniFormEmailDigestEntry.objects.order_by().values('handler').annotate(
+            count=Count('pk'),
+            oldest=Min('created')
+        )
+        stats = dict((row['handler'], row) for row in stats)
+        now = timezone.now()
+        digests = submissions = 0
+        for handler in OmniFormEmailHandler.objects.filter(pk__in=list(stats)).order_by('pk'):
+            row = stats[handler.pk]
+            due = not handler.digest_mode or handler.is_digest_due(row['count'], row['oldest'], now)
+            if options['all'] or due:
+                count = handler.send_digest(if_due=handler.digest_mode and not options['all'])
+                if count:
+                    digests += 1
+                    submissions += count
+        self.stdout.write('{0} digests sent holding {1} submissions'.format(digests, submissions))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for sending the emails written to the omniforms outbox
+"""
+from __future__ import unicode_literals
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.utils import timezone
+from omniforms.models import OmniFormOutboxEmail
+import datetime
+import time
+
+
+class Command(BaseCommand):
+    """
+    Sends the emails waiting in the outbox (see OmniFormOutboxEmail) over a single connection to the mail
+    server.  Each email is locked, sent and marked as sent in a transaction of its own (skipping emails locked
+    by other senders on databases supporting SELECT ... FOR UPDATE SKIP LOCKED) so several senders may run at
+    once, and no email stays locked while others are sent or while waiting for the rate limit.  Emails that
+    fail to send are retried with exponential backoff, and are moved to the dead letter state once they have
+    failed too many times
+    """
+    help = 'Sends the emails waiting in the omniforms outbox'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='The maximum number of due emails looked up at a time'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='The maximum number of emails sent per second, unlimited if 0'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='The maximum number of emails sent by this run, unlimited if 0'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='The number of failed attempts after which an email is moved to the dead letter state'
+        )
+        parser.add_argument(
+            '--retry-delay',
+            type=int,
+            default=60,
+            help='Seconds to wait before retrying an email that failed to send, doubling for each failure'
+        )
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            default=False,
+            help='Moves the emails in the dead letter state back into the outbox before sending'
+        )
+
+    @staticmethod
+    def sleep(seconds):
+        """
+        Waits before sending the next email to respect the rate limit
+
+        :param seconds: The number of seconds to wait
+        """
+        time.sleep(seconds)
+
+    @staticmethod
+    def close(connection):
+        """
+        Closes the connection to the mail server, so that the next email is sent over a new connection
+
+        :param connection: Email backend instance
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def fail(self, email, error, max_attempts, retry_delay):
+        """
+        Records a failed attempt to send an email
+
+        :param email: OmniFormOutboxEmail instance
+        :param error: The exception raised
+        :param max_attempts: The number of failed attempts after which the email is moved to the dead letter state
+        :param retry_delay: The number of seconds to wait before the first retry
+        :return: Whether or not the email was moved to the dead letter state
+        """
+        email.attempts += 1
+        email.last_error = '{0!r}'.format(error)
+        if email.attempts >= max_attempts:
+            email.status = OmniFormOutboxEmail.STATUS_DEAD
+        else:
+            email.send_after = timezone.now() + datetime.timedelta(seconds=retry_delay * 2 ** (email.attempts - 1))
+        email.save(update_fields=['attempts', 'last_error', 'status', 'send_after'])
+        return email.status == OmniFormOutboxEmail.STATUS_DEAD
+
+    def send_batch(self, connection, batch_size, interval, options, counts):
+        """
+        Sends a batch of emails whose next attempt is due.  The due emails are looked up without locking them,
+        then each email is locked, sent and marked as sent (or failed) in a transaction of its own.  Emails
+        locked by another sender, or sent by one since the batch was looked up, are skipped
+
+        :param connection: Open email backend instance
+        :param batch_size: The maximum number of emails to send
+        :param interval: The minimum number of seconds between two emails
+        :param options: Parsed command line options
+        :param counts: Dict of the numbers of emails sent, failed and dead, updated in place
+        :return: The number of emails sent or failed
+        """
+        using = router.db_for_write(OmniFormOutboxEmail)
+        queryset = OmniFormOutboxEmail.objects.using(using).due()
+        locking_queryset = queryset.select_for_update(
+            skip_locked=connections[using].features.has_select_for_update_skip_locked
+        )
+        attempted = 0
+        for pk in list(queryset.values_list('pk', flat=True)[:batch_size]):
+            started = time.time()
+            with transaction.atomic(using=using):
+                email = locking_queryset.filter(pk=pk).first()
+                if email is None:
+                    continue
+                attempted += 1
+                try:
+                    # Opening an open connection does nothing, so every email is sent over the same connection
+                    # unless a failure closed it
+                    connection.open()
+                    connection.send_messages([email.to_message(connection)])
+                except Exception as e:
+                    self.close(connection)
+                    if self.fail(email, e, options['max_attempts'], options['retry_delay']):
+                        counts['dead'] += 1
+                    else:
+                        counts['failed'] += 1
+                else:
+                    email.status = OmniFormOutboxEmail.STATUS_SENT
+                    email.sent = timezone.now()
+                    email.save(update_fields=['status', 'sent'])
+                    counts['sent'] += 1
+            if interval:
+                self.sleep(max(0, interval - (time.time() - started)))
+        return attempted
+
+    def handle(self, *args, **options):
+        """
+        Sends batches of emails until no more are due or the limit is reached.  Emails failing in this run
+        are not due again until their retry delay has passed.  Emails are marked as sent as soon as they have
+        been sent, so only an email interrupted while being sent is sent again by the next run
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        if options['requeue_dead']:
+            requeued = OmniFormOutboxEmail.objects.filter(status=OmniFormOutboxEmail.STATUS_DEAD).update(
+                status=OmniFormOutboxEmail.STATUS_PENDING,
+                attempts=0,
+                send_after=timezone.now()
+            )
+            self.stdout.write('{0} dead letter emails requeued'.format(requeued))
+
+        interval = 1.0 / options['rate'] if options['rate'] > 0 else 0
+        counts = {'sent': 0, 'failed': 0, 'dead': 0}
+        connection = get_connection()
+        try:
+            while True:
+                batch_size = options['batch_size']
+                if options['limit']:
+                    batch_size = min(batch_size, options['limit'] - sum(counts.values()))
+                if batch_size <= 0 or not self.send_batch(connection, batch_size, interval, options, counts):
+                    break
+        finally:
+            self.close(connection)
+
+        self.stdout.write(
+            '{sent} emails sent, {failed} failed and will be retried, {dead} moved to dead letters'.format(**counts)
+        )
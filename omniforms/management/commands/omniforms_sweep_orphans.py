@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for removing orphaned omniform fields and handlers
+"""
+from __future__ import unicode_literals
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from omniforms.models import OmniField, OmniFormHandler
+
+
+class Command(BaseCommand):
+    """
+    Finds OmniField and OmniFormHandler rows whose form no longer exists and deletes them in chunks
+    """
+    help = 'Removes OmniField and OmniFormHandler instances that are not attached to an existing form'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='The maximum number of orphaned instances to delete per transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            default=False,
+            help='Report the number of orphaned instances without deleting them'
+        )
+
+    @staticmethod
+    def get_orphans(model_class, content_type):
+        """
+        Method for getting a queryset of the model_class instances attached to the given content
+        type whose form no longer exists.  The form lookup is performed as an anti-join (NOT EXISTS)
+        against the forms table so that no form or related instances are loaded into memory
+
+        :param model_class: OmniField or OmniFormHandler
+        :param content_type: The content type the related instances are attached to
+        :return: QuerySet of orphaned model_class instances
+        """
+        queryset = model_class.objects.filter(content_type=content_type).order_by()
+        form_model = content_type.model_class()
+        if form_model is None:
+            return queryset
+
+        return queryset.annotate(
+            has_form=Exists(form_model._base_manager.filter(pk=OuterRef('object_id')))
+        ).filter(has_form=False)
+
+    def sweep(self, model_class, batch_size, dry_run):
+        """
+        Method for deleting (or counting) all orphaned instances of the given model class
+
+        :param model_class: OmniField or OmniFormHandler
+        :param batch_size: The maximum number of instances to delete per transaction
+        :param dry_run: Whether or not to only count the orphaned instances
+        :return: The number of orphaned instances
+        """
+        content_type_ids = model_class.objects.order_by().values_list('content_type', flat=True).distinct()
+        total = 0
+        for content_type_id in list(content_type_ids):
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            orphans = self.get_orphans(model_class, content_type)
+            if dry_run:
+                total += orphans.count()
+                continue
+
+            while True:
+                pks = list(orphans.values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                model_class.objects.filter(pk__in=pks).bulk_delete()
+                total += len(pks)
+        return total
+
+    def handle(self, *args, **options):
+        """
+        Removes orphaned handlers before orphaned fields as handlers may reference fields
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        message = '{0}: {1} orphaned instances {2}'
+        action = 'found' if options['dry_run'] else 'deleted'
+        for model_class in (OmniFormHandler, OmniField):
+            total = self.sweep(model_class, options['batch_size'], options['dry_run'])
+            self.stdout.write(message.format(model_class.__name__, total, action))
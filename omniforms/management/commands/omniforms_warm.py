@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Management command for compiling omniform form classes ahead of time
+"""
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from omniforms.cache import definition_cache
+
+
+class Command(BaseCommand):
+    """
+    Compiles the form class of every form, storing current definition versions in the cache backend
+    and reporting any forms that fail to compile.  Form classes are only held in memory by the process
+    that compiled them, use omniforms.cache.preload to warm web server processes.
+    """
+    help = 'Compiles the form classes of all omni forms'
+
+    def add_arguments(self, parser):
+        """
+        Adds the command line arguments for the command
+
+        :param parser: Argument parser instance
+        """
+        parser.add_argument(
+            '--recent',
+            type=int,
+            default=None,
+            help='Only compile forms used within this number of seconds'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Compiles the forms and reports the results for each form model
+
+        :param args: Default positional args
+        :param options: Parsed command line options
+        """
+        for model_class, compiled, failures in definition_cache.warm(recent=options['recent']):
+            self.stdout.write('{0}: {1} forms compiled'.format(model_class.__name__, compiled))
+            for pk, error in failures:
+                self.stderr.write('{0} {1} failed to compile: {2!r}'.format(model_class.__name__, pk, error))
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 02:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0025_rename_new_related_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='omnifield',
+            index=models.Index(fields=['content_type', 'object_id', 'order'], name='omnifield_form_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='omnifield',
+            index=models.Index(fields=['content_type', 'object_id', 'real_type'], name='omnifield_form_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='omniformhandler',
+            index=models.Index(fields=['content_type', 'object_id', 'order'], name='omnihandler_form_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='omniformhandler',
+            index=models.Index(fields=['content_type', 'object_id', 'real_type'], name='omnihandler_form_type_idx'),
+        ),
+    ]
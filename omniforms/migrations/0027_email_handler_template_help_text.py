@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 02:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0026_generic_relation_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='omniformemailconfirmationhandler',
+            name='template',
+            field=models.TextField(help_text='Please enter the content of the email here.'),
+        ),
+        migrations.AlterField(
+            model_name='omniformemailhandler',
+            name='template',
+            field=models.TextField(help_text='Please enter the content of the email here.'),
+        ),
+    ]
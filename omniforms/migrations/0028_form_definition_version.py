@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 02:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0027_email_handler_template_help_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omniform',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the form, its fields or its handlers change'),
+        ),
+        migrations.AddField(
+            model_name='omnimodelform',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the form, its fields or its handlers change'),
+        ),
+    ]
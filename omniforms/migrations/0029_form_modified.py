@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 02:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0028_form_definition_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omniform',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='When the form, its fields or its handlers last changed'),
+        ),
+        migrations.AddField(
+            model_name='omnimodelform',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='When the form, its fields or its handlers last changed'),
+        ),
+    ]
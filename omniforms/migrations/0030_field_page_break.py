@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0029_form_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omnifield',
+            name='page_break',
+            field=models.BooleanField(default=False, help_text='If checked, this field starts a new step of the form. Forms with page breaks can be filled in one step at a time'),
+        ),
+    ]
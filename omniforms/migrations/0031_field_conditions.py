@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0030_field_page_break'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omnifield',
+            name='condition_action',
+            field=models.CharField(blank=True, choices=[('show', 'Only show the field when the condition is met'), ('require', 'Only require the field when the condition is met')], default='show', help_text='What happens to this field when the condition is met', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='omnifield',
+            name='condition_field',
+            field=models.CharField(blank=True, default='', help_text='The name of the field this field depends on. Leave blank if this field does not depend on the answer to another field', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='omnifield',
+            name='condition_operator',
+            field=models.CharField(blank=True, choices=[('equals', 'Is equal to'), ('not_equals', 'Is not equal to'), ('in', 'Is one of'), ('is_set', 'Has been answered'), ('is_not_set', 'Has not been answered')], default='', help_text='How the answer to the field this field depends on is compared with the condition value', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='omnifield',
+            name='condition_value',
+            field=models.TextField(blank=True, default='', help_text="The value the answer to the field this field depends on is compared with. Enter one value per line for 'Is one of'"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0031_field_conditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OmniCalculatedField',
+            fields=[
+                ('omnifield_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='omniforms.OmniField')),
+                ('expression', models.TextField(help_text="The calculation, using the names of other fields of the form. Example, 'price * quantity' or 'age(date_of_birth)'")),
+            ],
+            options={
+                'verbose_name': 'Calculated Field',
+            },
+            bases=('omniforms.omnifield',),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0032_calculated_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omniformhandler',
+            name='condition',
+            field=models.TextField(blank=True, default='', help_text='If provided, the handler only runs for submissions meeting this condition. Example, \'topic == "sales"\'. Conditions are written in the same way as calculated fields'),
+        ),
+    ]
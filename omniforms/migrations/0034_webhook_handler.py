@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:31
+from __future__ import unicode_literals
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0033_handler_condition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OmniFormWebhookHandler',
+            fields=[
+                ('omniformhandler_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='omniforms.OmniFormHandler')),
+                ('url', models.URLField(help_text='The URL submissions are posted to', max_length=255)),
+                ('headers', models.TextField(blank=True, help_text="Additional HTTP headers to send, one 'Name: value' pair per line")),
+                ('timeout', models.PositiveIntegerField(default=10, help_text='Seconds to wait for the service to respond')),
+                ('secret', models.CharField(blank=True, help_text="If provided, requests are signed using this secret. The X-Omniforms-Signature header holds 'sha256=' followed by the hex HMAC-SHA256 digest of the request body", max_length=255)),
+                ('batch_size', models.PositiveIntegerField(default=1, help_text='The maximum number of submissions sent together in one request', validators=[django.core.validators.MinValueValidator(1)])),
+                ('batch_window', models.PositiveIntegerField(default=0, help_text='Seconds to hold submissions back for, so that they can be sent together. Submissions are sent straight away if 0')),
+                ('max_retries', models.PositiveIntegerField(default=3, help_text='The number of times a failed request is retried')),
+            ],
+            options={
+                'verbose_name': 'Post to Webhook',
+            },
+            bases=('omniforms.omniformhandler',),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0034_webhook_handler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OmniFormOutboxEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('from_email', models.CharField(max_length=255)),
+                ('recipients', models.TextField(help_text='One email address per line')),
+                ('attachments', models.TextField(blank=True, default='', help_text='JSON encoded list of attachments')),
+                ('status', models.CharField(choices=[('pending', 'Waiting to be sent'), ('sent', 'Sent'), ('dead', 'Failed too many times')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, help_text='When the next attempt is due')),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Email',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='omniformoutboxemail',
+            index_together=set([('status', 'send_after')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0035_outbox_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OmniFormEmailDigestEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('body', models.TextField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+            ],
+            options={
+                'verbose_name': 'Email Digest Entry',
+                'verbose_name_plural': 'Email Digest Entries',
+            },
+        ),
+        migrations.AddField(
+            model_name='omniformemailhandler',
+            name='digest_size',
+            field=models.PositiveIntegerField(blank=True, help_text='If provided, submissions are sent together in a digest email once this many have been received', null=True),
+        ),
+        migrations.AddField(
+            model_name='omniformemailhandler',
+            name='digest_window',
+            field=models.PositiveIntegerField(blank=True, help_text='If provided, submissions are sent together in a digest email once the first of them is this many minutes old (see the omniforms_send_digests management command)', null=True),
+        ),
+        migrations.AddField(
+            model_name='omniformemaildigestentry',
+            name='handler',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='digest_entries', to='omniforms.OmniFormEmailHandler'),
+        ),
+    ]
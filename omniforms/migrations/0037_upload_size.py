@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0036_email_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omnifilefield',
+            name='max_upload_size',
+            field=models.PositiveIntegerField(blank=True, help_text='The maximum size of uploaded files in bytes. Uploads are cut off as soon as they exceed this size', null=True),
+        ),
+        migrations.AddField(
+            model_name='omniimagefield',
+            name='max_upload_size',
+            field=models.PositiveIntegerField(blank=True, help_text='The maximum size of uploaded files in bytes. Uploads are cut off as soon as they exceed this size', null=True),
+        ),
+    ]
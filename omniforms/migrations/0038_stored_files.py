@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 03:56
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0037_upload_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OmniFormStoredFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(help_text='The SHA-256 digest of the content', max_length=64, unique=True)),
+                ('name', models.CharField(db_index=True, help_text='The name the file is stored under', max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now, help_text='When a reference was last taken or released')),
+            ],
+            options={
+                'verbose_name': 'Stored File',
+            },
+        ),
+        migrations.AddField(
+            model_name='omnifilefield',
+            name='deduplicate',
+            field=models.BooleanField(default=False, help_text='If checked uploaded files are stored under a path derived from their content when the form is handled, so files uploaded more than once are only stored once'),
+        ),
+        migrations.AddField(
+            model_name='omniimagefield',
+            name='deduplicate',
+            field=models.BooleanField(default=False, help_text='If checked uploaded files are stored under a path derived from their content when the form is handled, so files uploaded more than once are only stored once'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import uuid
+
+
+def forwards(apps, schema_editor):
+    for model_name in ('OmniForm', 'OmniModelForm'):
+        model_class = apps.get_model('omniforms', model_name)
+        for pk in model_class.objects.using(schema_editor.connection.alias).values_list('pk', flat=True):
+            model_class.objects.using(schema_editor.connection.alias).filter(pk=pk).update(key=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omniforms', '0038_stored_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omniform',
+            name='key',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='omnimodelform',
+            name='key',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='omniform',
+            name='key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Identifies the form in every database it is exported to, so importing it again updates it', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='omnimodelform',
+            name='key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Identifies the form in every database it is exported to, so importing it again updates it', unique=True),
+        ),
+    ]
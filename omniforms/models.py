@@ -8,19 +8,52 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError, ImproperlyConfigured
 from django.core.files import File
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.core.urlresolvers import reverse
-from django.core.validators import RegexValidator
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator, RegexValidator
+from django.db import connections, models, router, transaction
 from django.db.models.fields.related import ForeignObjectRel
 from django.forms import modelform_factory
 from django.template import Template, Context
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.functional import cached_property
 from django.utils.module_loading import import_string
+from django.utils.six import StringIO
 from django.utils.translation import ugettext_lazy as _
-from omniforms.forms import OmniFormBaseForm, OmniModelFormBaseForm, EmailConfirmationHandlerBaseFormClass
+from omniforms.cache import definition_cache
+from omniforms.conditions import (
+    ACTION_CHOICES as CONDITION_ACTION_CHOICES,
+    ACTION_REQUIRE as CONDITION_ACTION_REQUIRE,
+    ACTION_SHOW as CONDITION_ACTION_SHOW,
+    OPERATOR_CHOICES as CONDITION_OPERATOR_CHOICES,
+    Condition,
+    ConditionGraph
+)
+from omniforms.expressions import ExpressionError, compile_expression
+from omniforms.forms import (
+    EmailConfirmationHandlerBaseFormClass,
+    HandlerLoader,
+    OmniFormBaseForm,
+    OmniModelFormBaseForm
+)
+from omniforms.renderers import get_form_renderer
+from omniforms.webhooks import webhook_batcher, webhook_client
+from collections import OrderedDict, defaultdict, deque
+from decimal import Decimal
+import base64
+import copy
+import datetime
+import hashlib
+import hmac
+import json
+import logging
 import re
+import uuid
+
+
+logger = logging.getLogger(__name__)
 
 
 class OmniFormRelatedQuerySet(models.QuerySet):
@@ -49,6 +82,153 @@ class OmniFormRelatedQuerySet(models.QuerySet):
             model_classes.append(model_class)
         return model_classes
 
+    def specific(self):
+        """
+        Method for getting the most specific subclassed version of every instance in the queryset.
+        Instances are grouped by their real type so that one query is made per concrete model
+        class rather than one query per instance
+
+        :return: List of model subclass instances in queryset order
+        """
+        return self.specific_instances(list(self))
+
+    def specific_instances(self, instances):
+        """
+        Method for getting the most specific subclassed version of instances already loaded from
+        the queryset, using one query per concrete model class
+
+        :param instances: List of instances of the querysets model
+        :return: List of model subclass instances in the order given
+        """
+        pks_by_type = defaultdict(list)
+        for instance in instances:
+            pks_by_type[instance.real_type_id].append(instance.pk)
+
+        specific_instances = {}
+        for real_type_id, pks in pks_by_type.items():
+            model_class = ContentType.objects.db_manager(self.db).get_for_id(real_type_id).model_class()
+            if model_class is None or model_class == self.model:
+                continue
+            for specific_instance in model_class._base_manager.using(self.db).filter(pk__in=pks):
+                specific_instances[specific_instance.pk] = specific_instance
+
+        return [specific_instances.get(instance.pk, instance) for instance in instances]
+
+    def _bulk_delete(self, base_model_class, bump_versions=True):
+        """
+        Method for deleting every instance in the queryset using one set based DELETE statement per
+        concrete model table.  Subclass rows are removed before the rows of the tables they inherit from.
+        Unlike QuerySet.delete no model instances are loaded, meaning delete signals are not sent and
+        relations pointing at the deleted rows from other models are not followed
+
+        :param base_model_class: The base model class (OmniField or OmniFormHandler)
+        :param bump_versions: Whether or not to bump the definition version of the affected forms
+        :return: Tuple containing the total number of rows deleted and a dict of deletions per model label
+        """
+        from omniforms.signals import bump_related_definition_version
+
+        deleted_counter = {}
+        affected_forms = []
+        if bump_versions:
+            affected_forms = list(self.order_by().values_list('content_type_id', 'object_id').distinct())
+        model_classes = sorted(
+            self._get_concrete_models(base_model_class),
+            key=lambda model_class: len(model_class._meta.get_parent_list()),
+            reverse=True
+        )
+
+        with transaction.atomic(using=self.db):
+            for model_class in model_classes:
+                queryset = model_class._base_manager.using(self.db).filter(pk__in=self.values('pk'))
+                count = queryset._raw_delete(using=self.db)
+                if count:
+                    deleted_counter[model_class._meta.label] = count
+
+            count = self.order_by()._raw_delete(using=self.db)
+            if count:
+                deleted_counter[base_model_class._meta.label] = count
+
+            for content_type_id, object_id in affected_forms:
+                bump_related_definition_version(content_type_id, object_id, self.db)
+
+        return sum(deleted_counter.values()), deleted_counter
+
+    def _bulk_insert(self, instances, base_model_class, bump_versions=True):
+        """
+        Method for inserting unsaved instances of any number of concrete types using multi row INSERT
+        statements, one per table (in batches).  Rows are inserted into the base model table first.  Backends
+        that cannot return the primary keys of inserted rows read them back for each form in insertion order,
+        so forms must not have instances of the base model class added to them concurrently.  As with
+        QuerySet.bulk_create, save methods are not called and save signals are not sent.
+
+        :param instances: List of unsaved instances attached to saved forms
+        :param base_model_class: The base model class (OmniField or OmniFormHandler)
+        :param bump_versions: Whether or not to bump the definition version of the affected forms
+        :return: List of inserted instances
+        """
+        from omniforms.signals import bump_related_definition_version
+
+        instances = list(instances)
+        if not instances:
+            return instances
+
+        connection = connections[self.db]
+        content_types = ContentType.objects.db_manager(self.db)
+        for instance in instances:
+            instance.real_type = content_types.get_for_model(instance)
+            for field in instance._meta.concrete_fields:
+                related = getattr(instance, field.get_cache_name(), None) if field.is_relation else None
+                if related is not None and getattr(instance, field.attname) is None:
+                    setattr(instance, field.attname, related.pk)
+
+        base_queryset = base_model_class._base_manager.using(self.db)
+        base_fields = [field for field in base_model_class._meta.local_concrete_fields if not field.primary_key]
+        form_keys = set((instance.content_type_id, instance.object_id) for instance in instances)
+        related_filters = {
+            'content_type_id__in': set(key[0] for key in form_keys),
+            'object_id__in': set(key[1] for key in form_keys)
+        }
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            if connection.features.can_return_ids_from_bulk_insert:
+                pks = base_queryset._batched_insert(instances, base_fields, None)
+            else:
+                existing_pks = set(base_queryset.filter(**related_filters).order_by().values_list('pk', flat=True))
+                base_queryset._batched_insert(instances, base_fields, None)
+                inserted_rows = base_queryset.filter(**related_filters).order_by('pk').values_list(
+                    'pk', 'content_type_id', 'object_id'
+                )
+                inserted_pks = defaultdict(deque)
+                for pk, content_type_id, object_id in inserted_rows:
+                    if pk not in existing_pks:
+                        inserted_pks[(content_type_id, object_id)].append(pk)
+                pks = [inserted_pks[(instance.content_type_id, instance.object_id)].popleft() for instance in instances]
+
+            instances_by_model = defaultdict(list)
+            for instance, pk in zip(instances, pks):
+                setattr(instance, base_model_class._meta.pk.attname, pk)
+                instances_by_model[instance.__class__].append(instance)
+
+            for model_class, model_instances in instances_by_model.items():
+                for table_model in list(reversed(model_class._meta.get_parent_list()))[1:] + [model_class]:
+                    for link_field in table_model._meta.parents.values():
+                        for instance in model_instances:
+                            setattr(instance, link_field.attname, getattr(instance, base_model_class._meta.pk.attname))
+                    table_model._base_manager.using(self.db)._batched_insert(
+                        model_instances,
+                        table_model._meta.local_concrete_fields,
+                        None
+                    )
+
+            if bump_versions:
+                for content_type_id, object_id in form_keys:
+                    bump_related_definition_version(content_type_id, object_id, self.db)
+
+        for instance in instances:
+            instance._state.adding = False
+            instance._state.db = self.db
+        return instances
+
 
 class OmniFieldQuerySet(OmniFormRelatedQuerySet):
     """
@@ -63,6 +243,29 @@ class OmniFieldQuerySet(OmniFormRelatedQuerySet):
         """
         return self._get_concrete_models(OmniField)
 
+    def bulk_delete(self, bump_versions=True):
+        """
+        Method for deleting all fields in the queryset along with their subclass rows
+
+        :param bump_versions: Whether or not to bump the definition version of the affected forms
+        :return: Tuple containing the total number of rows deleted and a dict of deletions per model label
+        """
+        return self._bulk_delete(OmniField, bump_versions=bump_versions)
+
+    def bulk_insert(self, instances, bump_versions=True):
+        """
+        Method for inserting unsaved fields of any type using one INSERT statement per table (see _bulk_insert).
+        Save methods are not called, so each field is prepared for saving (see OmniField.prepare_for_save) first
+
+        :param instances: List of unsaved fields attached to saved forms
+        :param bump_versions: Whether or not to bump the definition version of the affected forms
+        :return: List of inserted fields
+        """
+        instances = list(instances)
+        for instance in instances:
+            instance.prepare_for_save()
+        return self._bulk_insert(instances, OmniField, bump_versions=bump_versions)
+
 
 class OmniFormHandlerQuerySet(OmniFormRelatedQuerySet):
     """
@@ -77,6 +280,129 @@ class OmniFormHandlerQuerySet(OmniFormRelatedQuerySet):
         """
         return self._get_concrete_models(OmniFormHandler)
 
+    def bulk_delete(self, bump_versions=True):
+        """
+        Method for deleting all handlers in the queryset along with their subclass rows.  The submissions
+        accumulated for the digests of the handlers are removed with them without being sent
+
+        :param bump_versions: Whether or not to bump the definition version of the affected forms
+        :return: Tuple containing the total number of rows deleted and a dict of deletions per model label
+        """
+        with transaction.atomic(using=self.db):
+            entries = OmniFormEmailDigestEntry.objects.using(self.db).filter(handler_id__in=self.values('pk'))
+            count = entries.order_by()._raw_delete(using=self.db)
+            total, deleted_counter = self._bulk_delete(OmniFormHandler, bump_versions=bump_versions)
+        if count:
+            deleted_counter[OmniFormEmailDigestEntry._meta.label] = count
+        return total + count, deleted_counter
+
+    def bulk_insert(self, instances, bump_versions=True):
+        """
+        Method for inserting unsaved handlers of any type using one INSERT statement per table (see _bulk_insert)
+
+        :param instances: List of unsaved handlers attached to saved forms
+        :param bump_versions: Whether or not to bump the definition version of the affected forms
+        :return: List of inserted handlers
+        """
+        return self._bulk_insert(instances, OmniFormHandler, bump_versions=bump_versions)
+
+
+class OmniFormQuerySet(models.QuerySet):
+    """
+    Custom QuerySet class for the OmniForm and OmniModelForm models
+    """
+    def bulk_insert(self, forms):
+        """
+        Method for inserting unsaved forms.  Forms are inserted using QuerySet.bulk_create on backends
+        that return the primary keys of inserted rows, and one at a time otherwise (the primary keys
+        are needed to attach fields and handlers).  Save methods are not called and save signals are not sent.
+
+        :param forms: List of unsaved forms
+        :return: List of inserted forms
+        """
+        forms = list(forms)
+        if connections[self.db].features.can_return_ids_from_bulk_insert:
+            return self.bulk_create(forms)
+
+        fields = [field for field in self.model._meta.concrete_fields if not field.primary_key]
+        with transaction.atomic(using=self.db, savepoint=False):
+            for form in forms:
+                form.pk = self._insert([form], fields=fields, return_id=True, using=self.db)
+                form._state.adding = False
+                form._state.db = self.db
+        return forms
+
+    def bulk_delete(self):
+        """
+        Deletes every form in the queryset along with all of its fields and handlers.
+        Fields and handlers are removed with set based deletes per concrete type (see
+        OmniFormRelatedQuerySet._bulk_delete) rather than being collected one instance
+        at a time through the forms generic relations.  Handlers are deleted before
+        fields as handlers may hold protected references to fields on the same form.
+
+        :return: Tuple containing the total number of rows deleted and a dict of deletions per model label
+        """
+        content_type = ContentType.objects.db_manager(self.db).get_for_model(self.model)
+        related_filters = {'content_type': content_type, 'object_id__in': self.values('pk')}
+        deleted_counter = {}
+
+        with transaction.atomic(using=self.db):
+            results = [
+                related_model.objects.using(self.db).filter(**related_filters).bulk_delete(bump_versions=False)
+                for related_model in (OmniFormHandler, OmniField)
+            ]
+            results.append(self.delete())
+
+        for result in results:
+            for label, count in result[1].items():
+                if count:
+                    deleted_counter[label] = deleted_counter.get(label, 0) + count
+        return sum(deleted_counter.values()), deleted_counter
+
+
+def to_json_number(value):
+    """
+    Converts a numeric field constraint to a number that can be serialized as JSON
+
+    :param value: int, float or Decimal
+    :return: int or float
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def add_length_constraints(schema, min_length, max_length):
+    """
+    Adds the minLength and maxLength keywords for a fields minimum and maximum length to a JSON Schema fragment
+
+    :param schema: The JSON Schema fragment
+    :param min_length: The minimum length or None
+    :param max_length: The maximum length or None
+    :return: The JSON Schema fragment
+    """
+    if min_length:
+        schema['minLength'] = max(schema.get('minLength', 0), min_length)
+    if max_length:
+        schema['maxLength'] = max_length
+    return schema
+
+
+def add_value_constraints(schema, min_value, max_value):
+    """
+    Adds the minimum and maximum keywords for a fields minimum and maximum value to a JSON Schema fragment
+
+    :param schema: The JSON Schema fragment
+    :param min_value: The minimum value or None
+    :param max_value: The maximum value or None
+    :return: The JSON Schema fragment
+    """
+    if min_value is not None:
+        schema['minimum'] = to_json_number(min_value)
+    if max_value is not None:
+        schema['maximum'] = to_json_number(max_value)
+    return schema
+
 
 @python_2_unicode_compatible
 class OmniField(models.Model):
@@ -129,6 +455,44 @@ class OmniField(models.Model):
             'to the bottom of the form'
         )
     )
+    page_break = models.BooleanField(
+        default=False,
+        help_text=_(
+            'If checked, this field starts a new step of the form. '
+            'Forms with page breaks can be filled in one step at a time'
+        )
+    )
+    condition_field = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text=_(
+            'The name of the field this field depends on. '
+            'Leave blank if this field does not depend on the answer to another field'
+        )
+    )
+    condition_operator = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        choices=CONDITION_OPERATOR_CHOICES,
+        help_text=_('How the answer to the field this field depends on is compared with the condition value')
+    )
+    condition_value = models.TextField(
+        blank=True,
+        default='',
+        help_text=_(
+            'The value the answer to the field this field depends on is compared with. '
+            'Enter one value per line for \'Is one of\''
+        )
+    )
+    condition_action = models.CharField(
+        max_length=20,
+        blank=True,
+        default=CONDITION_ACTION_SHOW,
+        choices=CONDITION_ACTION_CHOICES,
+        help_text=_('What happens to this field when the condition is met')
+    )
     real_type = models.ForeignKey(ContentType, related_name='+')  # The Real OmniField type (set in the save method)
     content_type = models.ForeignKey(ContentType)
     object_id = models.PositiveIntegerField()
@@ -136,6 +500,8 @@ class OmniField(models.Model):
 
     objects = OmniFieldQuerySet.as_manager()
 
+    JSON_SCHEMA = {}
+
     class Meta(object):
         """
         Django properties
@@ -143,6 +509,12 @@ class OmniField(models.Model):
         ordering = ('order',)
         unique_together = ('name', 'content_type', 'object_id')
         verbose_name = 'Field'
+        indexes = [
+            # form.fields lookups filter by form and order by 'order'
+            models.Index(fields=['content_type', 'object_id', 'order'], name='omnifield_form_order_idx'),
+            # Polymorphic fan-out looks up the real types used by a form
+            models.Index(fields=['content_type', 'object_id', 'real_type'], name='omnifield_form_type_idx'),
+        ]
 
     def __str__(self):
         """
@@ -225,7 +597,8 @@ class OmniField(models.Model):
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         """
         Custom save method
-        Sets the actual content type on the instance if it doesn't exist already
+        Sets the actual content type on the instance if it doesn't exist already and prepares the instance
+        for saving (see prepare_for_save)
 
         :param force_insert: Whether or not to force the insert
         :type force_insert: bool
@@ -243,6 +616,7 @@ class OmniField(models.Model):
         """
         if not self.real_type_id:
             self.real_type = ContentType.objects.get_for_model(self)
+        self.prepare_for_save()
         super(OmniField, self).save(
             force_insert=force_insert,
             force_update=force_update,
@@ -250,23 +624,90 @@ class OmniField(models.Model):
             update_fields=update_fields
         )
 
+    def prepare_for_save(self):
+        """
+        Method for setting values that follow from the field type before the field is saved.  Called by save
+        and by OmniFieldQuerySet.bulk_insert, which does not call save.  Does nothing by default
+        """
+        pass
+
     @cached_property
     def specific(self):
         """
-        Method for getting the most specific subclassed version of this instance
+        Method for getting the most specific subclassed version of this instance.
+        Instances without a real type (such as those held by form definitions) are returned as they are
 
         :return: OmniField model subclass instance
         """
+        if self.real_type_id is None:
+            return self
         real_type = self.real_type
         if isinstance(self, real_type.model_class()):
             return self
         else:
             return self.real_type.get_object_for_this_type(pk=self.pk)
 
+    def get_condition(self):
+        """
+        Gets the condition on the answer to another field this field depends on
+
+        :return: omniforms.conditions.Condition instance or None if the field does not depend on another field
+        """
+        if not self.condition_field:
+            return None
+        return Condition(
+            self.condition_field,
+            self.condition_operator,
+            self.condition_value,
+            self.condition_action or CONDITION_ACTION_SHOW
+        )
+
+    def clean(self):
+        """
+        Cleans the model data
+        Ensures that the condition of the field is complete, and does not leave the form with fields
+        that depend on themselves, on fields that do not exist or on each other in a cycle
+
+        :raises: ValidationError
+        """
+        super(OmniField, self).clean()
+        if not self.condition_field:
+            return
+        if not self.condition_operator:
+            raise ValidationError({'condition_operator': _('Please choose how the answer should be compared')})
+
+        form = self.form if self.object_id else None
+        if form is None:
+            if self.condition_field == self.name:
+                raise ValidationError({'condition_field': _('A field cannot depend on itself')})
+            return
+
+        fields = list(form.fields.exclude(pk=self.pk)) if self.pk else list(form.fields.all())
+        conditions = {field.name: field.get_condition() for field in fields if field.condition_field}
+        conditions[self.name] = self.get_condition()
+        try:
+            ConditionGraph(conditions, [field.name for field in fields] + [self.name])
+        except ValueError as e:
+            raise ValidationError({'condition_field': e.args[0]})
+
+    def annotate_form_field(self, form_field):
+        """
+        Attaches the options of the field that are used by the form rather than the form field itself
+        to the form field: the page_break flag (see OmniFormBaseForm.get_steps) and the condition
+        (see OmniFormBaseForm.get_condition_graph)
+
+        :param form_field: The form field generated for the field
+        :return: The form field
+        """
+        form_field.page_break = self.specific.page_break
+        form_field.condition = self.specific.get_condition()
+        return form_field
+
     def as_form_field(self, **kwargs):
         """
         Method for generating a form field instance from the
-        specified data stored against this model instance
+        specified data stored against this model instance.
+        The page_break flag and condition are carried by the form field (see annotate_form_field)
 
         :param kwargs: Extra keyword args to pass to the form field constructor
         :type kwargs: dict
@@ -275,7 +716,7 @@ class OmniField(models.Model):
         """
         field_class = import_string(self.specific.FIELD_CLASS)
         widget_class = import_string(self.specific.widget_class)
-        return field_class(
+        form_field = field_class(
             widget=widget_class(),
             label=self.specific.label,
             help_text=self.specific.help_text,
@@ -283,6 +724,42 @@ class OmniField(models.Model):
             initial=self.specific.initial_data,
             **kwargs
         )
+        return self.annotate_form_field(form_field)
+
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts, for
+        validating submissions before they are posted.  Empty values of optional fields are always
+        accepted by the form, so are not described by the fragment (see get_optional_json_schema)
+
+        :return: JSON Schema fragment dict
+        """
+        schema = OrderedDict([('title', self.label)])
+        if self.help_text:
+            schema['description'] = self.help_text
+        schema.update(copy.deepcopy(self.JSON_SCHEMA))
+        if self.required and schema.get('type') == 'string':
+            schema['minLength'] = 1
+        elif self.required and schema.get('type') == 'array':
+            schema['minItems'] = 1
+        return schema
+
+    def get_optional_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts when the
+        form does not require it, which also accepts the empty values browsers submit for the field
+
+        :return: JSON Schema fragment dict
+        """
+        schema = self.get_json_schema()
+        empty_values = ['', None]
+        if schema.get('type') == 'array':
+            empty_values.append([])
+        elif schema.get('type') == 'boolean':
+            empty_values.append(False)
+        optional_schema = OrderedDict((key, schema.pop(key)) for key in ('title', 'description') if key in schema)
+        optional_schema['anyOf'] = [schema, {'enum': empty_values}]
+        return optional_schema
 
     def get_edit_url(self):
         """
@@ -320,6 +797,7 @@ class OmniCharField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.CharField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = (
         'django.forms.widgets.TextInput',
         'django.forms.widgets.Textarea',
@@ -347,6 +825,18 @@ class OmniCharField(OmniField):
             max_length=self.max_length
         )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts
+
+        :return: JSON Schema fragment dict
+        """
+        return add_length_constraints(
+            super(OmniCharField, self).get_json_schema(),
+            self.min_length,
+            self.max_length
+        )
+
 
 class OmniDurationField(OmniField):
     """
@@ -358,6 +848,7 @@ class OmniDurationField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.DurationField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = (
         'django.forms.widgets.TextInput',
         'django.forms.widgets.Textarea'
@@ -402,6 +893,7 @@ class OmniGenericIPAddressField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.GenericIPAddressField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = ('django.forms.widgets.TextInput',)
 
     class Meta(object):
@@ -432,12 +924,28 @@ class OmniGenericIPAddressField(OmniField):
 
         :raises: ValidationError
         """
+        super(OmniGenericIPAddressField, self).clean()
         if self.unpack_ipv4 and self.protocol != self.PROTOCOL_BOTH:
             raise ValidationError(
                 'You may only select the \'unpack ipv4\' option if '
                 'the protocol you have selected is \'Both\''
             )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts
+
+        :return: JSON Schema fragment dict
+        """
+        schema = super(OmniGenericIPAddressField, self).get_json_schema()
+        if self.protocol == self.PROTOCOL_IPV4:
+            schema['format'] = 'ipv4'
+        elif self.protocol == self.PROTOCOL_IPV6:
+            schema['format'] = 'ipv6'
+        else:
+            schema['anyOf'] = [{'format': 'ipv4'}, {'format': 'ipv6'}]
+        return schema
+
 
 class OmniUUIDField(OmniField):
     """
@@ -449,6 +957,7 @@ class OmniUUIDField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.UUIDField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = ('django.forms.widgets.TextInput',)
 
     class Meta(object):
@@ -468,6 +977,7 @@ class OmniSlugField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.SlugField'
+    JSON_SCHEMA = {'type': 'string', 'pattern': '^[-a-zA-Z0-9_]+$'}
     FORM_WIDGETS = (
         'django.forms.widgets.TextInput',
         'django.forms.widgets.HiddenInput'
@@ -488,6 +998,7 @@ class OmniBooleanField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.BooleanField'
+    JSON_SCHEMA = {'type': 'boolean'}
     FORM_WIDGETS = ('django.forms.widgets.CheckboxInput',)
 
     class Meta(object):
@@ -496,6 +1007,18 @@ class OmniBooleanField(OmniField):
         """
         verbose_name = 'Boolean Field'
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts.
+        Required boolean fields must be checked
+
+        :return: JSON Schema fragment dict
+        """
+        schema = super(OmniBooleanField, self).get_json_schema()
+        if self.required:
+            schema['enum'] = [True]
+        return schema
+
 
 class OmniDateField(OmniField):
     """
@@ -507,6 +1030,7 @@ class OmniDateField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.DateField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = ('django.forms.widgets.DateInput',)
 
     class Meta(object):
@@ -526,6 +1050,7 @@ class OmniDateTimeField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.DateTimeField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = ('django.forms.widgets.DateTimeInput',)
 
     class Meta(object):
@@ -568,6 +1093,7 @@ class OmniDecimalField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.DecimalField'
+    JSON_SCHEMA = {'type': 'number'}
     FORM_WIDGETS = ('django.forms.widgets.NumberInput',)
 
     class Meta(object):
@@ -593,6 +1119,25 @@ class OmniDecimalField(OmniField):
             decimal_places=self.decimal_places
         )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts.
+        The number of digits is described by the range of values they allow, the number of
+        decimal places is only checked when the form is submitted
+
+        :return: JSON Schema fragment dict
+        """
+        schema = add_value_constraints(
+            super(OmniDecimalField, self).get_json_schema(),
+            self.min_value,
+            self.max_value
+        )
+        if self.max_digits is not None and self.decimal_places is not None:
+            limit = 10 ** (self.max_digits - self.decimal_places)
+            schema['exclusiveMinimum'] = -limit
+            schema['exclusiveMaximum'] = limit
+        return schema
+
 
 class OmniEmailField(OmniField):
     """
@@ -615,6 +1160,7 @@ class OmniEmailField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.EmailField'
+    JSON_SCHEMA = {'type': 'string', 'format': 'email'}
     FORM_WIDGETS = ('django.forms.widgets.EmailInput',)
 
     class Meta(object):
@@ -638,8 +1184,58 @@ class OmniEmailField(OmniField):
             max_length=self.max_length
         )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts
+
+        :return: JSON Schema fragment dict
+        """
+        return add_length_constraints(
+            super(OmniEmailField, self).get_json_schema(),
+            self.min_length,
+            self.max_length
+        )
+
 
-class OmniFileField(OmniField):
+class UploadFieldMixin(models.Model):
+    """
+    Provides the maximum upload size and deduplicated storage options of file and image fields
+    """
+    max_upload_size = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text=_(
+            'The maximum size of uploaded files in bytes. '
+            'Uploads are cut off as soon as they exceed this size'
+        )
+    )
+    deduplicate = models.BooleanField(
+        default=False,
+        help_text=_(
+            'If checked uploaded files are stored under a path derived from their content when the form '
+            'is handled, so files uploaded more than once are only stored once'
+        )
+    )
+
+    class Meta(object):
+        """
+        Django model properties
+        """
+        abstract = True
+
+    def as_form_field(self, **kwargs):
+        """
+        Adds the maximum upload size and deduplicate flag to the field constructor kwargs before calling super
+
+        :param kwargs: Default keyword args
+        :return: field instance
+        """
+        kwargs['max_upload_size'] = self.max_upload_size
+        kwargs['deduplicate'] = self.deduplicate
+        return super(UploadFieldMixin, self).as_form_field(**kwargs)
+
+
+class OmniFileField(UploadFieldMixin, OmniField):
     """
     FileField representation
     """
@@ -657,7 +1253,7 @@ class OmniFileField(OmniField):
         )
     )
 
-    FIELD_CLASS = 'django.forms.FileField'
+    FIELD_CLASS = 'omniforms.forms.BoundedFileField'
     FORM_WIDGETS = ('django.forms.widgets.FileInput',)
 
     class Meta(object):
@@ -678,16 +1274,17 @@ class OmniFileField(OmniField):
         """
         return super(OmniFileField, self).as_form_field(
             max_length=self.max_length,
-            allow_empty_file=self.allow_empty_file
+            allow_empty_file=self.allow_empty_file,
+            **kwargs
         )
 
 
-class OmniImageField(OmniField):
+class OmniImageField(UploadFieldMixin, OmniField):
     """
     ImageField representation
     """
     initial_data = None
-    FIELD_CLASS = 'django.forms.ImageField'
+    FIELD_CLASS = 'omniforms.forms.BoundedImageField'
     FORM_WIDGETS = ('django.forms.widgets.FileInput',)
 
     class Meta(object):
@@ -718,6 +1315,7 @@ class OmniFloatField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.FloatField'
+    JSON_SCHEMA = {'type': 'number'}
     FORM_WIDGETS = ('django.forms.widgets.NumberInput',)
 
     class Meta(object):
@@ -741,6 +1339,18 @@ class OmniFloatField(OmniField):
             max_value=self.max_value
         )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts
+
+        :return: JSON Schema fragment dict
+        """
+        return add_value_constraints(
+            super(OmniFloatField, self).get_json_schema(),
+            self.min_value,
+            self.max_value
+        )
+
 
 class OmniIntegerField(OmniField):
     """
@@ -763,6 +1373,7 @@ class OmniIntegerField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.IntegerField'
+    JSON_SCHEMA = {'type': 'integer'}
     FORM_WIDGETS = ('django.forms.widgets.NumberInput',)
 
     class Meta(object):
@@ -786,6 +1397,18 @@ class OmniIntegerField(OmniField):
             max_value=self.max_value
         )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts
+
+        :return: JSON Schema fragment dict
+        """
+        return add_value_constraints(
+            super(OmniIntegerField, self).get_json_schema(),
+            self.min_value,
+            self.max_value
+        )
+
 
 class OmniTimeField(OmniField):
     """
@@ -797,6 +1420,7 @@ class OmniTimeField(OmniField):
         help_text=_('If provided, initial data will appear in this field by default.')
     )
     FIELD_CLASS = 'django.forms.TimeField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = ('django.forms.widgets.TimeInput',)
 
     class Meta(object):
@@ -827,6 +1451,7 @@ class OmniUrlField(OmniField):
     )
 
     FIELD_CLASS = 'django.forms.URLField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = ('django.forms.widgets.URLInput',)
 
     class Meta(object):
@@ -850,6 +1475,18 @@ class OmniUrlField(OmniField):
             max_length=self.max_length
         )
 
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema fragment describing the values the field accepts
+
+        :return: JSON Schema fragment dict
+        """
+        return add_length_constraints(
+            super(OmniUrlField, self).get_json_schema(),
+            self.min_length,
+            self.max_length
+        )
+
 
 class OmniRelatedField(OmniField):
     """
@@ -870,7 +1507,7 @@ class OmniRelatedField(OmniField):
         """
         field_class = import_string(self.specific.FIELD_CLASS)
         widget_class = import_string(self.specific.widget_class)
-        return field_class(
+        form_field = field_class(
             queryset=self.related_type.model_class().objects.all(),
             widget=widget_class(),
             label=self.specific.label,
@@ -878,6 +1515,7 @@ class OmniRelatedField(OmniField):
             required=self.specific.required,
             initial=self.specific.initial_data
         )
+        return self.annotate_form_field(form_field)
 
 
 class OmniManyToManyField(OmniRelatedField):
@@ -885,6 +1523,7 @@ class OmniManyToManyField(OmniRelatedField):
     ManyToManyField representation
     """
     FIELD_CLASS = 'django.forms.ModelMultipleChoiceField'
+    JSON_SCHEMA = {'type': 'array', 'items': {'type': ['integer', 'string']}, 'uniqueItems': True}
     FORM_WIDGETS = ('django.forms.SelectMultiple', 'django.forms.CheckboxSelectMultiple')
 
     class Meta(object):
@@ -899,6 +1538,7 @@ class OmniForeignKeyField(OmniRelatedField):
     ForeignKey field representation
     """
     FIELD_CLASS = 'django.forms.ModelChoiceField'
+    JSON_SCHEMA = {'type': ['integer', 'string']}
     FORM_WIDGETS = ('django.forms.Select', 'django.forms.RadioSelect')
 
     class Meta(object):
@@ -948,12 +1588,27 @@ class ChoiceFieldMixin(models.Model):
         kwargs['choices'] = self._get_field_choices()
         return super(ChoiceFieldMixin, self).as_form_field(**kwargs)
 
+    def get_json_schema(self):
+        """
+        Adds the field choices to the JSON Schema fragment generated by super
+
+        :return: JSON Schema fragment dict
+        """
+        schema = super(ChoiceFieldMixin, self).get_json_schema()
+        choices = [value for value, label in self._get_field_choices()]
+        if schema.get('type') == 'array':
+            schema['items'] = {'type': 'string', 'enum': choices}
+        else:
+            schema['enum'] = choices
+        return schema
+
 
 class OmniChoiceField(ChoiceFieldMixin, OmniField):
     """
     Custom choice field type for the omni form
     """
     FIELD_CLASS = 'django.forms.ChoiceField'
+    JSON_SCHEMA = {'type': 'string'}
     FORM_WIDGETS = (
         'django.forms.widgets.Select',
         'django.forms.widgets.RadioSelect'
@@ -971,6 +1626,7 @@ class OmniMultipleChoiceField(ChoiceFieldMixin, OmniField):
     Custom multiple choice field type for the omni form
     """
     FIELD_CLASS = 'django.forms.MultipleChoiceField'
+    JSON_SCHEMA = {'type': 'array', 'uniqueItems': True}
     FORM_WIDGETS = (
         'django.forms.widgets.SelectMultiple',
         'django.forms.widgets.CheckboxSelectMultiple'
@@ -983,6 +1639,72 @@ class OmniMultipleChoiceField(ChoiceFieldMixin, OmniField):
         verbose_name = 'Multiple Choice Field'
 
 
+class OmniCalculatedField(OmniField):
+    """
+    Field holding a value calculated from the values of other fields of the form (see omniforms.expressions)
+    """
+    expression = models.TextField(
+        help_text=_(
+            'The calculation, using the names of other fields of the form. '
+            'Example, \'price * quantity\' or \'age(date_of_birth)\''
+        )
+    )
+    initial_data = None
+    FIELD_CLASS = 'omniforms.forms.CalculatedField'
+    JSON_SCHEMA = {'readOnly': True}
+    FORM_WIDGETS = ('django.forms.widgets.HiddenInput',)
+
+    class Meta(object):
+        """
+        Django properties
+        """
+        verbose_name = 'Calculated Field'
+
+    def prepare_for_save(self):
+        """
+        Calculated fields are never submitted, so are never required
+        """
+        self.required = False
+
+    def clean(self):
+        """
+        Cleans the model data
+        Ensures that the field is not required (see prepare_for_save), and that the expression is valid
+        and only uses the names of other fields of the form
+
+        :raises: ValidationError
+        """
+        super(OmniCalculatedField, self).clean()
+        self.prepare_for_save()
+        try:
+            expression = compile_expression(self.expression)
+        except ExpressionError as e:
+            raise ValidationError({'expression': e.args[0]})
+
+        form = self.form if self.object_id else None
+        if form is None:
+            return
+        names = set(form.fields.exclude(pk=self.pk).values_list('name', flat=True))
+        unknown = sorted(expression.names - names)
+        if unknown:
+            raise ValidationError({'expression': _('The form has no field named {0}').format(
+                ', '.join('\'{0}\''.format(name) for name in unknown)
+            )})
+
+    def as_form_field(self, **kwargs):
+        """
+        Method for generating a form field instance holding the compiled expression.
+        The expression is compiled once for each form class (see omniforms.cache)
+
+        :param kwargs: Extra keyword args to pass to the form field constructor
+        :return: omniforms.forms.CalculatedField instance
+        """
+        return super(OmniCalculatedField, self).as_form_field(
+            expression=compile_expression(self.specific.expression),
+            **kwargs
+        )
+
+
 @python_2_unicode_compatible
 class OmniFormHandler(models.Model):
     """
@@ -990,6 +1712,14 @@ class OmniFormHandler(models.Model):
     """
     name = models.CharField(max_length=255)
     order = models.IntegerField(default=0)
+    condition = models.TextField(
+        blank=True,
+        default='',
+        help_text=_(
+            'If provided, the handler only runs for submissions meeting this condition. '
+            'Example, \'topic == "sales"\'. Conditions are written in the same way as calculated fields'
+        )
+    )
     real_type = models.ForeignKey(ContentType, related_name='+')  # The Real OmniField type (set in the save method)
     content_type = models.ForeignKey(ContentType)
     object_id = models.PositiveIntegerField()
@@ -1002,6 +1732,12 @@ class OmniFormHandler(models.Model):
         Django properties
         """
         ordering = ('order',)
+        indexes = [
+            # form.handlers lookups filter by form and order by 'order'
+            models.Index(fields=['content_type', 'object_id', 'order'], name='omnihandler_form_order_idx'),
+            # Polymorphic fan-out looks up the real types used by a form
+            models.Index(fields=['content_type', 'object_id', 'real_type'], name='omnihandler_form_type_idx'),
+        ]
 
     def __str__(self):
         """
@@ -1042,16 +1778,57 @@ class OmniFormHandler(models.Model):
     @cached_property
     def specific(self):
         """
-        Method for getting the most specific subclassed version of this instance
+        Method for getting the most specific subclassed version of this instance.
+        Instances without a real type (such as those held by form definitions) are returned as they are
 
         :return: OmniField model subclass instance
         """
+        if self.real_type_id is None:
+            return self
         real_type = self.real_type
         if isinstance(self, real_type.model_class()):
             return self
         else:
             return self.real_type.get_object_for_this_type(pk=self.pk)
 
+    def get_condition(self):
+        """
+        Gets the compiled condition deciding whether or not the handler runs for a submission
+
+        :return: omniforms.expressions.Expression instance or None if the handler always runs
+        """
+        return compile_expression(self.condition) if self.condition else None
+
+    def check_condition(self, field_names=None):
+        """
+        Ensures that the condition is valid and only uses the names of fields of the form
+
+        :param field_names: Names of the fields of the form, if known
+        :raises: ValidationError
+        """
+        try:
+            condition = self.get_condition()
+        except ExpressionError as e:
+            raise ValidationError({'condition': e.args[0]})
+        if condition is None or field_names is None:
+            return
+        unknown = sorted(condition.names - set(field_names))
+        if unknown:
+            raise ValidationError({'condition': _('The form has no field named {0}').format(
+                ', '.join('\'{0}\''.format(name) for name in unknown)
+            )})
+
+    def clean(self):
+        """
+        Cleans the handler
+        Ensures that the condition is valid for the form the handler is attached to
+
+        :raises: ValidationError
+        """
+        super(OmniFormHandler, self).clean()
+        form = self.form if self.object_id else None
+        self.check_condition(form.fields.values_list('name', flat=True) if form is not None else None)
+
     def handle(self, form):
         """
         Handle method stub
@@ -1063,6 +1840,38 @@ class OmniFormHandler(models.Model):
         """
         raise NotImplementedError('"{0}" must define it\'s own handle method'.format(self.__class__.__name__))
 
+    def handle_batch(self, forms):
+        """
+        Method for handling a number of valid submissions at once (see OmniFormBaseForm.handle_batch).
+        Handles each form in turn by default; handlers that can process submissions more efficiently
+        together should override this
+
+        :param forms: List of valid form instances
+        """
+        for form in forms:
+            self.handle(form)
+
+    def validate_definition(self, definition):
+        """
+        Method for validating the handler against the in memory form definition it is part
+        of (see omniforms.definitions.FormDefinition).  Handlers whose clean method depends on
+        the form they are attached to should perform the same checks against the definition here
+
+        :param definition: FormDefinition instance
+        :raises: ValidationError
+        """
+        pass
+
+    def get_help_texts(self):
+        """
+        Method for getting help texts that depend on this handler instance (for example on the form
+        it is attached to). Admin views apply these to the form fields when building the handler form
+        as model field metadata is shared by every instance (and thread) and must not be changed here
+
+        :return: Dict of help texts keyed by field name
+        """
+        return {}
+
     def get_edit_url(self):
         """
         Generates a URL for editing the handler in the django admin
@@ -1096,7 +1905,7 @@ class TemplateHelpTextLazy(object):
 
         :return: Help text content
         """
-        help_text = 'Please enter the content of the email here.'
+        help_text = '{0}'.format(self.instance._meta.get_field('template').help_text)
         if self.instance.form:
             used_fields = self.instance.form.used_field_names
             if len(used_fields) > 0:
@@ -1114,7 +1923,9 @@ class OmniFormEmailHandlerBase(OmniFormHandler):
         max_length=255,
         help_text='The subject of the email that will be sent'
     )
-    template = models.TextField()
+    template = models.TextField(
+        help_text='Please enter the content of the email here.'
+    )
 
     class Meta(object):
         """
@@ -1122,18 +1933,15 @@ class OmniFormEmailHandlerBase(OmniFormHandler):
         """
         abstract = True
 
-    def __init__(self, *args, **kwargs):
+    def get_help_texts(self):
         """
-        Sets the help text for the 'template' field
-
-        :param args: Default positional args
-        :type args: ()
+        Adds help text listing the tokens available to the 'template' field
 
-        :param kwargs: Default keyword args
-        :type kwargs: {}
+        :return: Dict of help texts keyed by field name
         """
-        super(OmniFormEmailHandlerBase, self).__init__(*args, **kwargs)
-        self._meta.get_field('template').help_text = TemplateHelpTextLazy(self)
+        help_texts = super(OmniFormEmailHandlerBase, self).get_help_texts()
+        help_texts['template'] = TemplateHelpTextLazy(self)
+        return help_texts
 
     def _get_recipients(self, form):
         raise NotImplementedError(
@@ -1141,6 +1949,16 @@ class OmniFormEmailHandlerBase(OmniFormHandler):
             "method".format(self.__class__.__name__)
         )
 
+    @cached_property
+    def compiled_template(self):
+        """
+        The compiled email template.  Handler instances are shared by every submission of a form version
+        (see omniforms.forms.HandlerLoader), so the template is only compiled once per version
+
+        :return: Template instance
+        """
+        return Template(self.template)
+
     def _render_template(self, context_data):
         """
         Renders the template data specified against the instance
@@ -1150,7 +1968,7 @@ class OmniFormEmailHandlerBase(OmniFormHandler):
 
         :return: Rendered content
         """
-        return Template(self.template).render(Context(context_data))
+        return self.compiled_template.render(Context(context_data))
 
     @staticmethod
     def get_files(form):
@@ -1167,13 +1985,14 @@ class OmniFormEmailHandlerBase(OmniFormHandler):
             )
         )
 
-    def handle(self, form):
+    def get_message(self, form):
         """
-        Handle method
-        Sends an email to the specified recipients
+        Method for building the email to send for the submission
 
         :param form: Valid form instance
         :type form: django.forms.Form
+
+        :return: EmailMessage instance
         """
         message = EmailMessage(
             self.subject,
@@ -1185,14 +2004,67 @@ class OmniFormEmailHandlerBase(OmniFormHandler):
         for file_object in self.get_files(form):
             message.attach(file_object.name, file_object.read(), file_object.content_type)
 
-        message.send()
+        return message
+
+    @property
+    def use_outbox(self):
+        """
+        Whether or not emails are written to the outbox (see OmniFormOutboxEmail) rather than sent straight away
+
+        :return: bool
+        """
+        return getattr(settings, 'OMNI_FORMS_EMAIL_OUTBOX', False)
+
+    def handle(self, form):
+        """
+        Handle method
+        Sends an email to the specified recipients, or writes it to the outbox
+
+        :param form: Valid form instance
+        :type form: django.forms.Form
+        """
+        message = self.get_message(form)
+        if self.use_outbox:
+            OmniFormOutboxEmail.from_message(message).save()
+        else:
+            message.send()
+
+    def handle_batch(self, forms):
+        """
+        Sends the emails for all of the submissions over a single connection to the mail server,
+        or writes them to the outbox using a single INSERT statement
+
+        :param forms: List of valid form instances
+        """
+        messages = [self.get_message(form) for form in forms]
+        if self.use_outbox:
+            OmniFormOutboxEmail.objects.bulk_create(
+                [OmniFormOutboxEmail.from_message(message) for message in messages],
+                batch_size=100
+            )
+        else:
+            get_connection().send_messages(messages)
 
 
 class OmniFormEmailHandler(OmniFormEmailHandlerBase):
     """
-    Email handler for the form builder
+    Email handler for the form builder.  In digest mode submissions are accumulated and sent together in
+    a single summary email once enough have been received or the digest window has passed
     """
+    DIGEST_SEPARATOR = '\n\n{0}\n\n'.format('-' * 40)
+
     recipients = models.TextField()
+    digest_size = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='If provided, submissions are sent together in a digest email once this many have been received'
+    )
+    digest_window = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='If provided, submissions are sent together in a digest email once the first of them is this '
+                  'many minutes old (see the omniforms_send_digests management command)'
+    )
 
     class Meta(object):
         """
@@ -1209,6 +2081,200 @@ class OmniFormEmailHandler(OmniFormEmailHandlerBase):
         """
         return [recipient.strip() for recipient in self.recipients.split(',')]
 
+    @property
+    def digest_mode(self):
+        """
+        Whether or not submissions are accumulated and sent in digests.  Handlers that have not been saved
+        (for instance those of in memory form definitions) always send emails straight away
+
+        :return: bool
+        """
+        return bool(self.digest_size or self.digest_window) and self.pk is not None
+
+    def handle(self, form):
+        """
+        Handle method
+        Adds the submission to the digest in digest mode, otherwise sends an email straight away.
+        Digests that have become due are sent once the submission has been committed (see send_pending_digest)
+
+        :param form: Valid form instance
+        :type form: django.forms.Form
+        """
+        if not self.digest_mode:
+            return super(OmniFormEmailHandler, self).handle(form)
+        OmniFormEmailDigestEntry.objects.create(handler=self, body=self._render_template(form.cleaned_data))
+        transaction.on_commit(self.send_pending_digest, using=router.db_for_write(OmniFormEmailDigestEntry))
+
+    def handle_batch(self, forms):
+        """
+        Adds the submissions to the digest using a single INSERT statement in digest mode,
+        otherwise sends the emails straight away
+
+        :param forms: List of valid form instances
+        """
+        if not self.digest_mode:
+            return super(OmniFormEmailHandler, self).handle_batch(forms)
+        OmniFormEmailDigestEntry.objects.bulk_create(
+            [OmniFormEmailDigestEntry(handler=self, body=self._render_template(form.cleaned_data)) for form in forms],
+            batch_size=100
+        )
+        transaction.on_commit(self.send_pending_digest, using=router.db_for_write(OmniFormEmailDigestEntry))
+
+    def is_digest_due(self, count, oldest, now=None):
+        """
+        Whether or not the digest should be sent
+
+        :param count: The number of submissions accumulated
+        :param oldest: When the oldest of them was received
+        :param now: The current time, defaults to now
+        :return: bool
+        """
+        if not count:
+            return False
+        if self.digest_size and count >= self.digest_size:
+            return True
+        now = now or timezone.now()
+        return bool(self.digest_window) and oldest <= now - datetime.timedelta(minutes=self.digest_window)
+
+    def get_digest_stats(self, using=None):
+        """
+        Gets the number of accumulated submissions and when the oldest of them was received
+
+        :param using: The database alias, defaults to the database the handler was loaded from
+        :return: Dict holding the count and oldest values
+        """
+        entries = self.digest_entries.using(using) if using else self.digest_entries.all()
+        return entries.aggregate(count=models.Count('pk'), oldest=models.Min('created'))
+
+    def send_digest_if_due(self):
+        """
+        Sends the digest if enough submissions have been accumulated or the digest window has passed.
+        The digest is checked again once the handler has been locked (see send_digest), so a submission
+        waiting for another process to send the digest does not go on to send a second digest
+
+        :return: The number of submissions sent
+        """
+        stats = self.get_digest_stats()
+        if self.is_digest_due(stats['count'], stats['oldest']):
+            return self.send_digest(if_due=True)
+        return 0
+
+    def send_pending_digest(self):
+        """
+        Sends the digest if it is due once a submission has been committed.  The submission has already
+        been saved, so failures are logged rather than raised and the submissions are left for the next digest
+        """
+        try:
+            self.send_digest_if_due()
+        except Exception:
+            logger.exception('Sending the digest of email handler %s failed', self.pk)
+
+    def get_digest_message(self, bodies):
+        """
+        Method for building the digest email.  The rendered submissions are streamed into the body
+        one at a time, so they never all need to be held as model instances
+
+        :param bodies: Iterable of rendered submissions
+        :return: Tuple of the EmailMessage instance (None if there were no submissions) and the submission count
+        """
+        content = StringIO()
+        count = 0
+        for body in bodies:
+            if count:
+                content.write(self.DIGEST_SEPARATOR)
+            content.write(body)
+            count += 1
+        if not count:
+            return None, 0
+        message = EmailMessage(
+            '{0} ({1} submissions)'.format(self.subject, count),
+            content.getvalue(),
+            settings.DEFAULT_FROM_EMAIL,
+            [recipient.strip() for recipient in self.recipients.split(',')]
+        )
+        return message, count
+
+    def send_digest(self, if_due=False):
+        """
+        Sends every accumulated submission in a single email (or writes it to the outbox) and removes
+        them.  The handler and its submissions are locked while the digest is built and the submissions
+        are removed, so digests of the handler are built one at a time and submissions are only sent once
+        even if digests are sent from several processes.  The email is sent once the lock has been released,
+        and the submissions are restored if it cannot be sent
+
+        :param if_due: Whether or not to only send the digest if it is still due once the handler is locked
+        :return: The number of submissions sent
+        """
+        using = router.db_for_write(OmniFormEmailDigestEntry)
+        with transaction.atomic(using=using):
+            list(OmniFormEmailHandler.objects.using(using).select_for_update().filter(pk=self.pk).values_list('pk'))
+            if if_due:
+                stats = self.get_digest_stats(using)
+                if not self.is_digest_due(stats['count'], stats['oldest']):
+                    return 0
+            entries = OmniFormEmailDigestEntry.objects.using(using).filter(handler=self).order_by('pk')
+            sent = []
+
+            def get_bodies():
+                for pk, body, created in entries.select_for_update().values_list('pk', 'body', 'created').iterator():
+                    sent.append((pk, body, created))
+                    yield body
+
+            message, count = self.get_digest_message(get_bodies())
+            if message is None:
+                return 0
+            if self.use_outbox:
+                OmniFormOutboxEmail.from_message(message).save(using=using)
+            # Submissions received while the digest was built are left for the next digest.  Nothing
+            # relates to entries, so they are removed using a single DELETE without being loaded
+            entries.filter(pk__lte=sent[-1][0]).order_by()._raw_delete(using=using)
+
+        if not self.use_outbox:
+            try:
+                message.send()
+            except Exception:
+                self._restore_digest_entries(sent, using)
+                raise
+        return count
+
+    def _restore_digest_entries(self, entries, using):
+        """
+        Method for restoring the submissions of a digest that could not be sent, unless the handler has been removed
+
+        :param entries: List of (pk, body, created) tuples of the removed submissions
+        :param using: The database alias
+        """
+        if OmniFormEmailHandler.objects.using(using).filter(pk=self.pk).exists():
+            OmniFormEmailDigestEntry.objects.using(using).bulk_create(
+                [
+                    OmniFormEmailDigestEntry(handler_id=self.pk, body=body, created=created)
+                    for _, body, created in entries
+                ],
+                batch_size=100
+            )
+
+
+class OmniFormEmailDigestEntry(models.Model):
+    """
+    Rendered submission waiting to be sent in the digest of an OmniFormEmailHandler
+    """
+    # No database constraint, as handlers may be removed using set based deletes (see OmniFormRelatedQuerySet)
+    handler = models.ForeignKey(
+        OmniFormEmailHandler,
+        on_delete=models.CASCADE,
+        related_name='digest_entries',
+        db_constraint=False
+    )
+    body = models.TextField()
+    created = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta(object):
+        """
+        Django properties
+        """
+        verbose_name = 'Email Digest Entry'
+        verbose_name_plural = 'Email Digest Entries'
+
 
 class OmniFormEmailConfirmationHandler(OmniFormEmailHandlerBase):
     """
@@ -1241,6 +2307,137 @@ class OmniFormEmailConfirmationHandler(OmniFormEmailHandlerBase):
         return [form.cleaned_data.get(self.recipient_field.name)]
 
 
+class OmniFormOutboxEmailQuerySet(models.QuerySet):
+    """
+    Custom queryset for the OmniFormOutboxEmail model
+    """
+    def due(self):
+        """
+        Method for getting the emails waiting to be sent whose next attempt is due
+
+        :return: QuerySet of OmniFormOutboxEmail instances, oldest first
+        """
+        return self.filter(
+            status=OmniFormOutboxEmail.STATUS_PENDING,
+            send_after__lte=timezone.now()
+        ).order_by('pk')
+
+
+@python_2_unicode_compatible
+class OmniFormOutboxEmail(models.Model):
+    """
+    Rendered email waiting to be sent by the omniforms_send_outbox management command.  Email handlers
+    write to the outbox instead of sending emails straight away when the OMNI_FORMS_EMAIL_OUTBOX setting
+    is enabled, so that a slow or unavailable mail server neither holds up nor loses submissions
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Waiting to be sent'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Failed too many times'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.TextField(help_text=_('One email address per line'))
+    attachments = models.TextField(blank=True, default='', help_text=_('JSON encoded list of attachments'))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    send_after = models.DateTimeField(default=timezone.now, help_text=_('When the next attempt is due'))
+    sent = models.DateTimeField(blank=True, null=True)
+
+    objects = OmniFormOutboxEmailQuerySet.as_manager()
+
+    class Meta(object):
+        """
+        Django properties
+        """
+        index_together = (('status', 'send_after'),)
+        verbose_name = 'Outbox Email'
+
+    def __str__(self):
+        """
+        Method for generating a string representation of the instance
+
+        :return: String representation of the instance
+        """
+        return self.subject
+
+    @classmethod
+    def from_message(cls, message):
+        """
+        Creates an (unsaved) outbox email from an email message.  Only the subject, body, sender,
+        recipients and attachments of the message are kept
+
+        :param message: EmailMessage instance
+        :return: OmniFormOutboxEmail instance
+        """
+        attachments = []
+        for filename, content, mimetype in message.attachments:
+            if not isinstance(content, bytes):
+                content = content.encode('utf-8')
+            attachments.append([filename, base64.b64encode(content).decode('ascii'), mimetype])
+        return cls(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email,
+            recipients='\n'.join(message.to),
+            attachments=json.dumps(attachments) if attachments else ''
+        )
+
+    def to_message(self, connection=None):
+        """
+        Builds the email message to send
+
+        :param connection: The email backend instance the message will be sent with
+        :return: EmailMessage instance
+        """
+        message = EmailMessage(
+            self.subject,
+            self.body,
+            self.from_email,
+            [recipient for recipient in self.recipients.splitlines() if recipient],
+            connection=connection
+        )
+        for filename, content, mimetype in json.loads(self.attachments or '[]'):
+            message.attach(filename, base64.b64decode(content), mimetype)
+        return message
+
+
+@python_2_unicode_compatible
+class OmniFormStoredFile(models.Model):
+    """
+    File stored by omniforms.storage.ContentAddressedStorage.  The file is referenced once for every time
+    it was saved, and each deletion releases a reference.  Files without references are removed by the
+    omniforms_clean_stored_files management command
+    """
+    sha256 = models.CharField(max_length=64, unique=True, help_text=_('The SHA-256 digest of the content'))
+    name = models.CharField(max_length=255, db_index=True, help_text=_('The name the file is stored under'))
+    size = models.BigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    modified = models.DateTimeField(default=timezone.now, help_text=_('When a reference was last taken or released'))
+
+    class Meta(object):
+        """
+        Django properties
+        """
+        verbose_name = 'Stored File'
+
+    def __str__(self):
+        """
+        Method for generating a string representation of the instance
+
+        :return: String representation of the instance
+        """
+        return self.name
+
+
 class OmniFormSaveInstanceHandler(OmniFormHandler):
     """
     Handler for saving the form instance
@@ -1251,14 +2448,28 @@ class OmniFormSaveInstanceHandler(OmniFormHandler):
         """
         verbose_name = 'Save Data'
 
-    def assert_has_all_required_fields(self):
+    @staticmethod
+    def assert_is_model_form(form):
+        """
+        Ensures that the given form is a model form
+
+        :param form: Form instance
+        :raises: ValidationError
+        """
+        if not isinstance(form, OmniModelFormBase):
+            raise ValidationError('This handler can only be attached to model forms')
+
+    def assert_has_all_required_fields(self, form=None, defined_fields=None):
         """
         Property that determines whether or not the associated form defines all of the required fields
 
+        :param form: The form to check, defaults to the associated form
+        :param defined_fields: The names of the fields defined by the form, defaults to those of the associated form
         :raises: ValidationError
         """
-        defined_fields = self.form.used_field_names
-        required_fields = self.form.get_required_field_names()
+        form = self.form if form is None else form
+        defined_fields = form.used_field_names if defined_fields is None else defined_fields
+        required_fields = form.get_required_field_names()
         missing_fields = []
         for field in required_fields:
             if field not in defined_fields:
@@ -1279,10 +2490,19 @@ class OmniFormSaveInstanceHandler(OmniFormHandler):
         :raises: ValidationError
         """
         super(OmniFormSaveInstanceHandler, self).clean()
-        if not isinstance(self.form, OmniModelFormBase):
-            raise ValidationError('This handler can only be attached to model forms')
+        self.assert_is_model_form(self.form)
         self.assert_has_all_required_fields()
 
+    def validate_definition(self, definition):
+        """
+        Ensures that the definition is for a model form defining all required fields
+
+        :param definition: FormDefinition instance
+        :raises: ValidationError
+        """
+        self.assert_is_model_form(definition.form)
+        self.assert_has_all_required_fields(definition.form, definition.field_names)
+
     def handle(self, form):
         """
         Handle method
@@ -1309,6 +2529,157 @@ class OmniFormSaveInstanceHandler(OmniFormHandler):
             form.instance.save()
             form._save_m2m()
 
+    def handle_batch(self, forms):
+        """
+        Saves the instances of all of the submissions.  New instances of models without many to many
+        fields are inserted using QuerySet.bulk_create (meaning their save methods are not called and save
+        signals are not sent), other instances are saved one at a time
+
+        :param forms: List of valid form instances
+        """
+        instances = [form.instance for form in forms]
+        if not instances or any(instance.pk is not None for instance in instances):
+            return super(OmniFormSaveInstanceHandler, self).handle_batch(forms)
+
+        model_class = instances[0].__class__
+        if model_class._meta.many_to_many:
+            return super(OmniFormSaveInstanceHandler, self).handle_batch(forms)
+
+        model_class._default_manager.bulk_create(instances, batch_size=100)
+
+
+class OmniFormWebhookHandler(OmniFormHandler):
+    """
+    Handler for posting submissions as JSON to another service.  Submissions are posted in the background
+    once they have been committed, over the process wide pool of keep-alive connections (see omniforms.webhooks),
+    and retried with backoff if they fail
+    """
+    url = models.URLField(max_length=255, help_text='The URL submissions are posted to')
+    headers = models.TextField(
+        blank=True,
+        help_text='Additional HTTP headers to send, one \'Name: value\' pair per line'
+    )
+    timeout = models.PositiveIntegerField(default=10, help_text='Seconds to wait for the service to respond')
+    secret = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='If provided, requests are signed using this secret. The X-Omniforms-Signature header holds '
+                  '\'sha256=\' followed by the hex HMAC-SHA256 digest of the request body'
+    )
+    batch_size = models.PositiveIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text='The maximum number of submissions sent together in one request'
+    )
+    batch_window = models.PositiveIntegerField(
+        default=0,
+        help_text='Seconds to hold submissions back for, so that they can be sent together. '
+                  'Submissions are sent straight away if 0'
+    )
+    max_retries = models.PositiveIntegerField(default=3, help_text='The number of times a failed request is retried')
+
+    class Meta(object):
+        """
+        Django properties
+        """
+        verbose_name = 'Post to Webhook'
+
+    def get_headers(self):
+        """
+        Parses the additional headers
+
+        :return: Dict of header values keyed by header name
+        :raises: ValueError if a line is not a 'Name: value' pair
+        """
+        headers = OrderedDict()
+        for line in self.headers.splitlines():
+            if not line.strip():
+                continue
+            name, separator, value = line.partition(':')
+            if not separator or not name.strip():
+                raise ValueError('\'{0}\' is not a \'Name: value\' pair'.format(line.strip()))
+            headers[name.strip()] = value.strip()
+        return headers
+
+    def clean(self):
+        """
+        Cleans the handler
+        Ensures that the additional headers can be parsed
+
+        :raises: ValidationError
+        """
+        super(OmniFormWebhookHandler, self).clean()
+        try:
+            self.get_headers()
+        except ValueError as e:
+            raise ValidationError({'headers': e.args[0]})
+
+    @classmethod
+    def serialize_value(cls, value):
+        """
+        Converts a cleaned value to a value that can be serialized as JSON using DjangoJSONEncoder.
+        Uploaded files are given by name (or by storage name once stored, see OmniFormBaseForm.store_uploads)
+        and model instances by primary key
+
+        :param value: The cleaned value
+        :return: The converted value
+        """
+        if isinstance(value, File):
+            return getattr(value, 'storage_name', None) or value.name
+        if isinstance(value, models.Model):
+            return value.pk
+        if isinstance(value, (models.QuerySet, list, tuple)):
+            return [cls.serialize_value(item) for item in value]
+        return value
+
+    def get_payload(self, form):
+        """
+        Gets the data posted for a submission
+
+        :param form: Valid form instance
+        :return: Dict of serializable values keyed by field name
+        """
+        return OrderedDict((name, self.serialize_value(value)) for name, value in form.cleaned_data.items())
+
+    def send(self, payloads):
+        """
+        Posts a number of submissions in a single request.  The request body is a JSON object holding
+        the list of submissions under 'submissions'
+
+        :param payloads: List of submission payloads (see get_payload)
+        :raises: omniforms.webhooks.WebhookError if the request fails
+        """
+        body = json.dumps({'submissions': payloads}, cls=DjangoJSONEncoder).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        headers.update(self.get_headers())
+        if self.secret:
+            headers['X-Omniforms-Signature'] = 'sha256={0}'.format(
+                hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            )
+        webhook_client.post(self.url, body, headers, timeout=self.timeout, max_retries=self.max_retries)
+
+    def handle(self, form):
+        """
+        Handle method
+        Posts the submission once it has been committed, or holds it back to be sent with others if the
+        handler has a batch window.  Submissions that are rolled back are not sent
+
+        :param form: Valid form instance
+        :type form: django.forms.Form
+        """
+        payload = self.get_payload(form)
+        transaction.on_commit(lambda: webhook_batcher.add(self, payload))
+
+    def handle_batch(self, forms):
+        """
+        Posts the submissions once they have been committed, in requests holding up to batch_size submissions each
+
+        :param forms: List of valid form instances
+        """
+        payloads = [self.get_payload(form) for form in forms]
+        batches = [payloads[start:start + self.batch_size] for start in range(0, len(payloads), self.batch_size)]
+        transaction.on_commit(lambda: webhook_batcher.send_in_background(self, batches))
+
 
 class FormGeneratorMixin(object):
     """
@@ -1381,6 +2752,47 @@ class FormGeneratorMixin(object):
         """
         return {field.name: field.help_text for field in self.fields.all()}
 
+    def get_condition_graph(self):
+        """
+        Method for compiling the conditions of the fields on the form (see OmniField.get_condition)
+
+        :return: omniforms.conditions.ConditionGraph instance
+        :raises: ImproperlyConfigured if the conditions depend on each other in a cycle
+        """
+        conditions = {field.name: field.get_condition() for field in self.fields.all() if field.condition_field}
+        try:
+            return ConditionGraph(conditions)
+        except ValueError as e:
+            raise ImproperlyConfigured(e.args[0])
+
+    def get_json_schema(self):
+        """
+        Method for generating a JSON Schema describing the submissions the form accepts, made up of
+        the JSON Schema fragment of each field (see OmniField.get_json_schema).  Fields that are only
+        shown when a condition is met are not listed as required, as hidden fields are not validated.
+        Fields that are not required also accept empty values (see OmniField.get_optional_json_schema)
+
+        :return: JSON Schema dict
+        """
+        properties = OrderedDict()
+        required = []
+        for field in self.fields.all().specific():
+            if field.required and not (field.condition_field and field.condition_action != CONDITION_ACTION_REQUIRE):
+                properties[field.name] = field.get_json_schema()
+                required.append(field.name)
+            else:
+                properties[field.name] = field.get_optional_json_schema()
+
+        schema = OrderedDict([
+            ('$schema', 'http://json-schema.org/draft-07/schema#'),
+            ('title', self.title),
+            ('type', 'object'),
+            ('properties', properties)
+        ])
+        if required:
+            schema['required'] = required
+        return schema
+
 
 @python_2_unicode_compatible
 class OmniFormBase(FormGeneratorMixin, models.Model):
@@ -1388,6 +2800,24 @@ class OmniFormBase(FormGeneratorMixin, models.Model):
     Base class for the OmniForm model
     """
     title = models.CharField(max_length=255)
+    key = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text=_('Identifies the form in every database it is exported to, so importing it again updates it')
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text=_('Incremented whenever the form, its fields or its handlers change')
+    )
+    modified = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        help_text=_('When the form, its fields or its handlers last changed')
+    )
+
+    objects = OmniFormQuerySet.as_manager()
 
     class Meta(object):
         """
@@ -1403,6 +2833,25 @@ class OmniFormBase(FormGeneratorMixin, models.Model):
         """
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the form, incrementing the definition version (and updating the modification time) of
+        existing forms.  The version is incremented within the UPDATE statement so that saving a stale
+        instance never overwrites a version bumped elsewhere (for instance by a change to one of the forms fields)
+
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        """
+        bump_version = not self._state.adding and self.pk is not None
+        if bump_version:
+            self.version = models.F('version') + 1
+            self.modified = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version', 'modified'}
+        super(OmniFormBase, self).save(*args, **kwargs)
+        if bump_version:
+            self.refresh_from_db(fields=['version'])
+
     @property
     def used_field_names(self):
         """
@@ -1412,6 +2861,16 @@ class OmniFormBase(FormGeneratorMixin, models.Model):
         """
         return self.fields.values_list('name', flat=True)
 
+    def get_cached_form_class(self):
+        """
+        Method for getting the form class from the per process form class cache.
+        The form class is only generated if the cache does not hold one for the
+        current definition version of the form (see omniforms.cache)
+
+        :return: Form class
+        """
+        return definition_cache.get_form_class(self.__class__, self.pk)
+
 
 class OmniModelFormBase(OmniFormBase):
     """
@@ -1425,16 +2884,22 @@ class OmniModelFormBase(OmniFormBase):
         """
         abstract = True
 
-    def _get_base_form_class(self):
+    def _get_base_form_class(self, handlers=None):
         """
         Helper method for getting the base ModelForm class for use with the model form factory
+        The form class holds a HandlerLoader so handlers are only loaded once a bound form is handled,
+        and renders its widgets using the renderer configured by settings.OMNI_FORMS_FORM_RENDERER
 
+        :param handlers: List of handler instances to use instead of the handlers attached to the form
         :return: ModelForm instance
         """
         return type(
             self._get_form_class_name(),
             (OmniModelFormBaseForm,),
-            {'_handlers': [handler.specific for handler in self.handlers.all()]}
+            {
+                '_handlers': HandlerLoader(self.handlers.all()) if handlers is None else handlers,
+                'default_renderer': get_form_renderer()
+            }
         )
 
     def formfield_callback(self, model_field, **kwargs):
@@ -1522,16 +2987,22 @@ class OmniForm(OmniFormBase):
     fields = GenericRelation(OmniField)
     handlers = GenericRelation(OmniFormHandler)
 
-    def _get_base_form_class(self):
+    def _get_base_form_class(self, handlers=None):
         """
         Helper method for getting the base ModelForm class for use with the model form factory
+        The form class holds a HandlerLoader so handlers are only loaded once a bound form is handled,
+        and renders its widgets using the renderer configured by settings.OMNI_FORMS_FORM_RENDERER
 
+        :param handlers: List of handler instances to use instead of the handlers attached to the form
         :return: ModelForm instance
         """
         return type(
             self._get_form_class_name(),
             (OmniFormBaseForm,),
-            {'_handlers': [handler.specific for handler in self.handlers.all()]}
+            {
+                '_handlers': HandlerLoader(self.handlers.all()) if handlers is None else handlers,
+                'default_renderer': get_form_renderer()
+            }
         )
 
     def get_form_class(self):
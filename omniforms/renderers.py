@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Form renderers for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.forms.renderers import BaseRenderer, get_default_renderer
+from django.utils.encoding import force_text
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import SafeData, mark_safe
+from django.utils.timezone import template_localtime
+
+
+def get_form_renderer():
+    """
+    Gets the renderer used by generated omni forms, as configured by settings.OMNI_FORMS_FORM_RENDERER
+
+    :return: Renderer instance, or None to use the django default renderer
+    """
+    renderer_path = getattr(settings, 'OMNI_FORMS_FORM_RENDERER', None)
+    if renderer_path is None:
+        return None
+    return import_string(renderer_path)()
+
+
+def render_value(value):
+    """
+    Renders a value in the same way as {{ value }} within a django template
+
+    :param value: The value to render
+    :return: Escaped text
+    """
+    return conditional_escape(force_text(localize(template_localtime(value))))
+
+
+def render_string_value(value):
+    """
+    Renders a value in the same way as {{ value|stringformat:'s' }} within a django template
+
+    :param value: The value to render
+    :return: Escaped text
+    """
+    try:
+        text = '%s' % value
+    except (ValueError, TypeError):
+        return ''
+    if isinstance(value, SafeData):
+        text = mark_safe(text)
+    return conditional_escape(text)
+
+
+class FastWidgetRenderer(BaseRenderer):
+    """
+    Renderer producing the same HTML as django's stock widget templates using string formatting rather
+    than the template engine.  Every widget listed in the FORM_WIDGETS of the omniforms field models is
+    supported.  Any other template is rendered by the default renderer (settings.FORM_RENDERER).
+
+    The output is identical to django's own templates, so this renderer should not be used if those
+    templates are overridden within your project.
+    """
+    INPUT = '<input type="{type}" name="{name}"{value}{attrs} />\n'
+    TEXTAREA = '<textarea name="{name}"{attrs}>\n{value}</textarea>\n'
+    SELECT = '<select name="{name}"{attrs}>{options}\n</select>\n'
+    SELECT_GROUP_START = '\n  <optgroup label="{label}">'
+    SELECT_GROUP_OPTION = '\n  {option}'
+    SELECT_GROUP_END = '\n  </optgroup>'
+    SELECT_OPTION = '<option value="{value}"{attrs}>{label}</option>\n'
+    MULTIPLE_INPUT = '<ul{id}{class_name}>{options}\n</ul>\n'
+    MULTIPLE_INPUT_GROUP_START = '\n  <li>{label}<ul{id}>'
+    MULTIPLE_INPUT_GROUP_OPTION = '\n    <li>{option}</li>'
+    MULTIPLE_INPUT_GROUP_END = '\n  </ul></li>'
+    INPUT_OPTION = '{label_start}{input}{label_end}\n'
+
+    def __init__(self):
+        """
+        Sets up the renderer
+        """
+        super(FastWidgetRenderer, self).__init__()
+        input_templates = ('checkbox', 'date', 'datetime', 'email', 'file', 'hidden', 'number', 'password',
+                           'text', 'time', 'url')
+        self.fragments = {
+            'django/forms/widgets/{0}.html'.format(name): self.render_input_template for name in input_templates
+        }
+        self.fragments.update({
+            'django/forms/widgets/input.html': self.render_input,
+            'django/forms/widgets/textarea.html': self.render_textarea,
+            'django/forms/widgets/select.html': self.render_select,
+            'django/forms/widgets/select_option.html': self.render_select_option,
+            'django/forms/widgets/radio.html': self.render_multiple_input_template,
+            'django/forms/widgets/checkbox_select.html': self.render_multiple_input_template,
+            'django/forms/widgets/multiple_input.html': self.render_multiple_input,
+            'django/forms/widgets/radio_option.html': self.render_input_option_template,
+            'django/forms/widgets/checkbox_option.html': self.render_input_option_template,
+            'django/forms/widgets/input_option.html': self.render_input_option,
+        })
+
+    @property
+    def fallback(self):
+        """
+        Property for getting the renderer used for unsupported templates
+
+        :return: Renderer instance
+        """
+        return get_default_renderer()
+
+    def get_template(self, template_name):
+        """
+        Method for getting a template from the fallback renderer
+
+        :param template_name: The template name
+        :return: Template instance
+        """
+        return self.fallback.get_template(template_name)
+
+    def render(self, template_name, context, request=None):
+        """
+        Renders the template using its HTML fragment if supported, or the fallback renderer if not
+
+        :param template_name: The template name
+        :param context: The template context
+        :param request: The current request
+        :return: Rendered HTML
+        """
+        fragment = self.fragments.get(template_name)
+        if fragment is None:
+            return self.fallback.render(template_name, context, request=request)
+        return fragment(context).strip()
+
+    def include(self, template_name, context):
+        """
+        Renders the template in the same way as {% include %}, which does not strip the output
+
+        :param template_name: The template name
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        fragment = self.fragments.get(template_name)
+        if fragment is None:
+            return self.get_template(template_name).render(context)
+        return fragment(context)
+
+    @staticmethod
+    def render_attrs(attrs):
+        """
+        Renders django/forms/widgets/attrs.html
+
+        :param attrs: Dict of attributes
+        :return: Rendered HTML
+        """
+        return ''.join([
+            ' {0}{1}'.format(
+                render_value(name),
+                '' if value is True else '="{0}"'.format(render_string_value(value))
+            )
+            for name, value in attrs.items() if value is not False
+        ])
+
+    def render_input(self, context):
+        """
+        Renders django/forms/widgets/input.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        widget = context['widget']
+        value = widget['value']
+        return self.INPUT.format(
+            type=render_value(widget['type']),
+            name=render_value(widget['name']),
+            value='' if value is None else ' value="{0}"'.format(render_string_value(value)),
+            attrs=self.render_attrs(widget['attrs'])
+        )
+
+    def render_input_template(self, context):
+        """
+        Renders the templates that include django/forms/widgets/input.html, such as text.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        return '{0}\n'.format(self.render_input(context))
+
+    def render_textarea(self, context):
+        """
+        Renders django/forms/widgets/textarea.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        widget = context['widget']
+        return self.TEXTAREA.format(
+            name=render_value(widget['name']),
+            attrs=self.render_attrs(widget['attrs']),
+            value=render_value(widget['value']) if widget['value'] else ''
+        )
+
+    def render_select(self, context):
+        """
+        Renders django/forms/widgets/select.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        widget = context['widget']
+        options = []
+        for group_name, group_choices, group_index in widget['optgroups']:
+            if group_name:
+                options.append(self.SELECT_GROUP_START.format(label=render_value(group_name)))
+            for option in group_choices:
+                options.append(self.SELECT_GROUP_OPTION.format(
+                    option=self.include(option['template_name'], dict(context, widget=option))
+                ))
+            if group_name:
+                options.append(self.SELECT_GROUP_END)
+        return self.SELECT.format(
+            name=render_value(widget['name']),
+            attrs=self.render_attrs(widget['attrs']),
+            options=''.join(options)
+        )
+
+    def render_select_option(self, context):
+        """
+        Renders django/forms/widgets/select_option.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        widget = context['widget']
+        return self.SELECT_OPTION.format(
+            value=render_string_value(widget['value']),
+            attrs=self.render_attrs(widget['attrs']),
+            label=render_value(widget['label'])
+        )
+
+    def render_multiple_input(self, context):
+        """
+        Renders django/forms/widgets/multiple_input.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        widget = context['widget']
+        id_ = widget['attrs'].get('id')
+        class_name = widget['attrs'].get('class')
+        options = []
+        for group, group_options, index in widget['optgroups']:
+            if group:
+                options.append(self.MULTIPLE_INPUT_GROUP_START.format(
+                    label=render_value(group),
+                    id=' id="{0}_{1}"'.format(render_value(id_), render_value(index)) if id_ else ''
+                ))
+            for option in group_options:
+                options.append(self.MULTIPLE_INPUT_GROUP_OPTION.format(
+                    option=self.include(option['template_name'], dict(context, widget=option))
+                ))
+            if group:
+                options.append(self.MULTIPLE_INPUT_GROUP_END)
+        return self.MULTIPLE_INPUT.format(
+            id=' id="{0}"'.format(render_value(id_)) if id_ else '',
+            class_name=' class="{0}"'.format(render_value(class_name)) if class_name else '',
+            options=''.join(options)
+        )
+
+    def render_multiple_input_template(self, context):
+        """
+        Renders the templates that include django/forms/widgets/multiple_input.html, such as radio.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        return '{0}\n'.format(self.render_multiple_input(context))
+
+    def render_input_option(self, context):
+        """
+        Renders django/forms/widgets/input_option.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        widget = context['widget']
+        label_start = label_end = ''
+        if context.get('wrap_label'):
+            id_ = widget['attrs'].get('id')
+            label_start = '<label{0}>'.format(' for="{0}"'.format(render_value(id_)) if id_ else '')
+            label_end = ' {0}</label>'.format(render_value(widget['label']))
+        return self.INPUT_OPTION.format(label_start=label_start, input=self.render_input(context), label_end=label_end)
+
+    def render_input_option_template(self, context):
+        """
+        Renders the templates that include django/forms/widgets/input_option.html, such as radio_option.html
+
+        :param context: The template context
+        :return: Rendered HTML
+        """
+        return '{0}\n'.format(self.render_input_option(context))
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Cached rendering of unbound omni forms
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.forms.boundfield import BoundField
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils import translation
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from omniforms.cache import definition_cache
+import re
+
+
+@python_2_unicode_compatible
+class PlaceholderBoundField(BoundField):
+    """
+    Bound field rendering a placeholder in place of its widget
+    """
+    def __str__(self):
+        """
+        Renders the placeholder for the field
+
+        :return: Placeholder text
+        """
+        return mark_safe('\x00field:{0}\x00'.format(self.name))
+
+
+class FormHTMLCache(object):
+    """
+    Cache of the HTML rendered for unbound omni forms.  The HTML of an unbound form only depends on
+    its definition version and the active language, so it is rendered once and stored in the django
+    cache backend (settings.OMNI_FORMS_CACHE) keyed by form, version and language.  The parts that
+    vary per request are left as placeholders and spliced in when the HTML is served:
+
+     - the CSRF token rendered by {% csrf_token %}
+     - the widgets of fields given per request initial values, which are rendered using the compiled
+       form class (see omniforms.cache)
+    """
+    cache_key_prefix = 'omniforms:html:'
+    default_template_name = 'omniforms/form.html'
+    csrf_placeholder = '\x00csrf:\x00'
+    placeholder_re = re.compile('\x00(field|csrf):([^\x00]*)\x00')
+
+    @property
+    def cache(self):
+        """
+        Property for getting the django cache backend used to store rendered forms
+
+        :return: Cache backend
+        """
+        return definition_cache.cache
+
+    @property
+    def cache_timeout(self):
+        """
+        Property for getting the number of seconds rendered forms are stored for
+
+        :return: Number of seconds
+        """
+        return getattr(settings, 'OMNI_FORMS_HTML_CACHE_TIMEOUT', 3600)
+
+    def get_key(self, model_class, pk, version, template_name):
+        """
+        Method for getting the cache key for a rendered form
+
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :param version: The definition version
+        :param template_name: The name of the template the form is rendered with
+        :return: Cache key
+        """
+        return '{0}{1}:{2}:{3}:{4}'.format(
+            self.cache_key_prefix,
+            definition_cache.get_key(model_class, pk),
+            version,
+            translation.get_language(),
+            template_name
+        )
+
+    @staticmethod
+    def get_placeholder_form(form_class):
+        """
+        Method for creating an unbound form rendering placeholders in place of its widgets
+
+        :param form_class: The compiled form class
+        :return: Form instance
+        """
+        class PlaceholderForm(form_class):
+            """
+            Form rendering placeholders in place of its widgets
+            """
+            def __getitem__(self, name):
+                """
+                Gets a placeholder bound field for the field with the given name
+
+                :param name: The field name
+                :return: PlaceholderBoundField instance
+                """
+                field = super(PlaceholderForm, self).__getitem__(name).field
+                return PlaceholderBoundField(self, field, name)
+
+        return PlaceholderForm()
+
+    def build(self, form_class, template_name):
+        """
+        Method for rendering an unbound form into the parts stored in the cache.  Static HTML is stored as
+        text, the value of the CSRF token as None and field widgets as tuples of the field name and
+        unbound widget HTML
+
+        :param form_class: The compiled form class
+        :param template_name: The name of the template the form is rendered with
+        :return: List of parts
+        """
+        html = get_template(template_name).render({
+            'form': self.get_placeholder_form(form_class),
+            'csrf_token': self.csrf_placeholder
+        })
+        form = form_class()
+        parts = []
+        position = 0
+        for match in self.placeholder_re.finditer(html):
+            parts.append(html[position:match.start()])
+            if match.group(1) == 'csrf':
+                parts.append(None)
+            else:
+                parts.append((match.group(2), '{0}'.format(form[match.group(2)])))
+            position = match.end()
+        parts.append(html[position:])
+        return [part for part in parts if part != '']
+
+    def render(self, request, model_class, pk, initial=None, template_name=None):
+        """
+        Method for rendering an unbound form, using the cached HTML if available
+
+        :param request: The current request, used for the CSRF token (which is left blank if None)
+        :param model_class: The form model class
+        :param pk: The primary key of the form
+        :param initial: Dict of per request initial values keyed by field name
+        :param template_name: The name of the template the form is rendered with
+        :return: Rendered HTML
+        :raises: model_class.DoesNotExist if the form does not exist
+        """
+        template_name = template_name or self.default_template_name
+        key = self.get_key(model_class, pk, definition_cache.get_version(model_class, pk), template_name)
+        parts = self.cache.get(key)
+        if parts is None:
+            parts = self.build(definition_cache.get_form_class(model_class, pk), template_name)
+            self.cache.set(key, parts, self.cache_timeout)
+
+        form = None
+        if initial:
+            form = definition_cache.get_form_class(model_class, pk)(initial=initial)
+
+        html = []
+        for part in parts:
+            if part is None:
+                html.append(conditional_escape(get_token(request)) if request is not None else '')
+            elif isinstance(part, tuple):
+                name, widget_html = part
+                html.append('{0}'.format(form[name]) if form is not None and name in initial else widget_html)
+            else:
+                html.append(part)
+        return mark_safe(''.join(html))
+
+
+form_html_cache = FormHTMLCache()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Signals for the omniforms app
+"""
+from __future__ import unicode_literals
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+from omniforms.models import OmniField, OmniFormBase, OmniFormHandler
+
+
+definition_changed = Signal(providing_args=['pk', 'version'])
+
+
+def send_definition_changed(model_class, pk, using):
+    """
+    Sends the definition_changed signal with the current (committed) version of the form
+
+    :param model_class: The form model class
+    :param pk: The primary key of the form
+    :param using: The database alias
+    """
+    version = model_class._base_manager.using(using).filter(pk=pk).values_list('version', flat=True).first()
+    definition_changed.send(sender=model_class, pk=pk, version=version)
+
+
+def bump_definition_version(model_class, pk, using):
+    """
+    Increments the definition version, and updates the modification time, of a form.
+    The definition_changed signal is sent once the surrounding transaction (if any) has been committed
+
+    :param model_class: The form model class
+    :param pk: The primary key of the form
+    :param using: The database alias
+    """
+    model_class._base_manager.using(using).filter(pk=pk).update(version=F('version') + 1, modified=timezone.now())
+    transaction.on_commit(lambda: send_definition_changed(model_class, pk, using), using=using)
+
+
+def bump_related_definition_version(content_type_id, object_id, using):
+    """
+    Increments the definition version of the form a field or handler belongs to
+
+    :param content_type_id: The ID of the forms content type
+    :param object_id: The primary key of the form
+    :param using: The database alias
+    """
+    model_class = ContentType.objects.db_manager(using).get_for_id(content_type_id).model_class()
+    if model_class is not None and issubclass(model_class, OmniFormBase):
+        bump_definition_version(model_class, object_id, using)
+
+
+def form_saved(sender, instance, created, using, raw=False, **kwargs):
+    """
+    post_save receiver announcing changes to existing forms.  The version
+    itself is incremented when the form is saved (see OmniFormBase.save)
+
+    :param sender: The model class
+    :param instance: The saved instance
+    :param created: Whether or not the instance was created
+    :param using: The database alias
+    :param raw: Whether or not the instance is being loaded from a fixture
+    :param kwargs: Default keyword args
+    """
+    if raw or created or not isinstance(instance, OmniFormBase):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: send_definition_changed(sender, pk, using), using=using)
+
+
+def form_deleted(sender, instance, using, **kwargs):
+    """
+    post_delete receiver announcing that a form no longer exists
+
+    :param sender: The model class
+    :param instance: The deleted instance
+    :param using: The database alias
+    :param kwargs: Default keyword args
+    """
+    if not isinstance(instance, OmniFormBase):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: definition_changed.send(sender=sender, pk=pk, version=None), using=using)
+
+
+def related_changed(sender, instance, using, raw=False, **kwargs):
+    """
+    post_save and post_delete receiver bumping the definition version
+    of the form a changed field or handler belongs to
+
+    :param sender: The model class
+    :param instance: The saved or deleted instance
+    :param using: The database alias
+    :param raw: Whether or not the instance is being loaded from a fixture
+    :param kwargs: Default keyword args
+    """
+    if raw or not isinstance(instance, (OmniField, OmniFormHandler)):
+        return
+    bump_related_definition_version(instance.content_type_id, instance.object_id, using)
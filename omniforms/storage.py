@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Content addressed storage of uploaded files for the omniforms app.  Files are stored under a path
+derived from the SHA-256 digest of their content, so a file uploaded again is referenced rather than
+written again.  References are counted (see OmniFormStoredFile) and files are only removed from the
+underlying storage once every reference has been released (see the omniforms_clean_stored_files command)
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage, get_storage_class
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+import hashlib
+import mmap
+import os
+
+
+def hash_file(file_object):
+    """
+    Gets the SHA-256 digest of a files content.  Digests calculated while the file was uploaded (see
+    omniforms.uploads.BoundedUploadHandler) are used as they are.  Files spooled to a temporary file on
+    disk are hashed through a memory map of the file rather than being read into buffers a chunk at a
+    time; other files are hashed a chunk at a time
+
+    :param file_object: django.core.files.File instance
+    :return: Hex digest
+    """
+    digest = getattr(file_object, 'sha256', None)
+    if digest:
+        return digest
+
+    sha256 = hashlib.sha256()
+    if hasattr(file_object, 'temporary_file_path'):
+        with open(file_object.temporary_file_path(), 'rb') as temporary_file:
+            if os.fstat(temporary_file.fileno()).st_size:
+                mapped = mmap.mmap(temporary_file.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    sha256.update(mapped)
+                finally:
+                    mapped.close()
+    else:
+        for chunk in file_object.chunks():
+            sha256.update(chunk)
+        file_object.seek(0)
+    return sha256.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """
+    Storage saving files under a path derived from their SHA-256 digest, using the storage named by the
+    OMNI_FORMS_FILE_STORAGE setting (the default file storage if not set) to hold the files.
+
+    Every save takes a reference to the stored file, and content already stored is not written again.
+    Deleting a file releases a reference without removing the file.  Files without references are removed
+    by the omniforms_clean_stored_files management command.  The storage can also be used for the file
+    fields of your own models, for instance models saved by OmniFormSaveInstanceHandler
+    """
+    def __init__(self, location='omniforms/files', storage=None):
+        """
+        Sets up the storage
+
+        :param location: The directory files are stored under, relative to the underlying storage
+        :param storage: The underlying storage instance, the storage named by the setting if not given
+        """
+        super(ContentAddressedStorage, self).__init__()
+        self.location = location
+        self._storage = storage
+
+    @property
+    def storage(self):
+        """
+        The underlying storage holding the files
+
+        :return: Storage instance
+        """
+        if self._storage is not None:
+            return self._storage
+        return get_storage_class(getattr(settings, 'OMNI_FORMS_FILE_STORAGE', None))()
+
+    def get_content_name(self, digest, name):
+        """
+        Gets the name a file is stored under.  The digest is split into two levels of directories so that no
+        directory holds too many files, and the extension of the uploaded file is kept
+
+        :param digest: The hex digest of the files content
+        :param name: The name of the uploaded file
+        :return: Storage name
+        """
+        extension = os.path.splitext(name)[1].lower()[:10]
+        return '{0}/{1}/{2}/{3}{4}'.format(self.location, digest[:2], digest[2:4], digest, extension)
+
+    def get_available_name(self, name, max_length=None):
+        """
+        Names are derived from the content when files are saved, so any name is available
+
+        :param name: The name of the uploaded file
+        :param max_length: The maximum length of the name
+        :return: The name
+        """
+        return name
+
+    def _save(self, name, content):
+        """
+        Stores the content unless it is already stored, and takes a reference to the stored file
+
+        :param name: The name of the uploaded file
+        :param content: File instance
+        :return: The storage name of the stored file
+        """
+        from omniforms.models import OmniFormStoredFile
+
+        digest = hash_file(content)
+        storage = self.storage
+        using = router.db_for_write(OmniFormStoredFile)
+        with transaction.atomic(using=using):
+            stored_file, created = OmniFormStoredFile.objects.using(using).select_for_update().get_or_create(
+                sha256=digest,
+                defaults={'name': self.get_content_name(digest, name), 'size': content.size}
+            )
+            if not storage.exists(stored_file.name):
+                # Wrapping the content stops file system storage moving temporary files into place, as the
+                # uploaded file is still used by the caller once it has been stored
+                stored_file.name = storage.save(stored_file.name, File(content, content.name))
+            OmniFormStoredFile.objects.using(using).filter(pk=stored_file.pk).update(
+                name=stored_file.name,
+                references=F('references') + 1,
+                modified=timezone.now()
+            )
+        return stored_file.name
+
+    def _open(self, name, mode='rb'):
+        """
+        Opens a stored file
+
+        :param name: Storage name
+        :param mode: File mode
+        :return: File instance
+        """
+        return self.storage.open(name, mode)
+
+    def delete(self, name):
+        """
+        Releases a reference to a stored file.  The file is removed by the cleanup command once no references remain
+
+        :param name: Storage name
+        """
+        from omniforms.models import OmniFormStoredFile
+
+        OmniFormStoredFile.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1,
+            modified=timezone.now()
+        )
+
+    def exists(self, name):
+        """
+        Checks whether or not a file is stored
+
+        :param name: Storage name
+        :return: bool
+        """
+        return self.storage.exists(name)
+
+    def size(self, name):
+        """
+        Gets the size of a stored file
+
+        :param name: Storage name
+        :return: Size in bytes
+        """
+        return self.storage.size(name)
+
+    def url(self, name):
+        """
+        Gets the URL of a stored file
+
+        :param name: Storage name
+        :return: URL
+        """
+        return self.storage.url(name)
+
+    def path(self, name):
+        """
+        Gets the local filesystem path of a stored file, for underlying storages on the local filesystem
+
+        :param name: Storage name
+        :return: Path
+        """
+        return self.storage.path(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
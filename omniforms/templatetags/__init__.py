@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Template tags for the omniforms app
+"""
+from __future__ import unicode_literals
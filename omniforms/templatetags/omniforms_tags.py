@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Template tags for the omniforms app
+"""
+from __future__ import unicode_literals
+from django import template
+from omniforms.rendering import form_html_cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def render_omniform(context, form, initial=None, template_name=None):
+    """
+    Renders an unbound omni form using the cached HTML for its current definition version
+    (see omniforms.rendering.FormHTMLCache)
+
+    Usage: {% render_omniform form initial=initial template_name='my_app/form.html' %}
+
+    :param context: The template context
+    :param form: OmniForm or OmniModelForm instance
+    :param initial: Dict of per request initial values keyed by field name
+    :param template_name: The name of the template the form is rendered with
+    :return: Rendered HTML
+    """
+    return form_html_cache.render(
+        context.get('request'),
+        form.__class__,
+        form.pk,
+        initial=initial,
+        template_name=template_name
+    )
@@ -11,9 +11,11 @@ from omniforms.models import (
     OmniModelForm,
     OmniFormEmailHandler,
     OmniFormEmailConfirmationHandler,
+    OmniFormWebhookHandler,
     OmniCharField,
     OmniBooleanField,
-    OmniEmailField
+    OmniEmailField,
+    OmniCalculatedField
 )
 from omniforms.tests.models import DummyModel
 import factory
@@ -98,6 +100,22 @@ class OmniFormEmailConfirmationHandlerFactory(factory.DjangoModelFactory):
         model = OmniFormEmailConfirmationHandler
 
 
+class OmniFormWebhookHandlerFactory(factory.DjangoModelFactory):
+    """
+    Factory for creating OmniFormWebhookHandler instances
+    """
+    name = factory.Sequence('Webhook handler {0}'.format)
+    order = 0
+    url = 'http://example.com/hook/'
+    form = factory.SubFactory(OmniFormFactory)
+
+    class Meta(object):
+        """
+        Factory meta
+        """
+        model = OmniFormWebhookHandler
+
+
 class OmniCharFieldFactory(factory.DjangoModelFactory):
     """
     Factory for creating OmniCharField instances
@@ -141,6 +159,20 @@ class OmniEmailFieldFactory(factory.DjangoModelFactory):
         model = OmniEmailField
 
 
+class OmniCalculatedFieldFactory(factory.DjangoModelFactory):
+    """
+    Model factory for generating OmniCalculatedField instances
+    """
+    name = factory.Sequence('calculated_field_{0}'.format)
+    label = factory.Sequence('Calculated field {0}'.format)
+    widget_class = 'django.forms.widgets.HiddenInput'
+    order = factory.Sequence(lambda n: n)
+    form = factory.SubFactory(OmniFormFactory)
+
+    class Meta(object):
+        model = OmniCalculatedField
+
+
 class DummyModelFactory(factory.DjangoModelFactory):
     """
     Factory for creating dummy model instances
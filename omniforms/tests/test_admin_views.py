@@ -38,7 +38,8 @@ from omniforms.models import (
     OmniUrlField,
     OmniFormHandler,
     OmniFormEmailHandler,
-    OmniFormSaveInstanceHandler
+    OmniFormSaveInstanceHandler,
+    TemplateHelpTextLazy
 )
 from omniforms.tests.utils import OmniModelFormAdminTestCaseStub, OmniBasicFormAdminTestCaseStub
 from omniforms.tests.factories import OmniCharFieldFactory, OmniFormEmailHandlerFactory
@@ -1260,6 +1261,15 @@ class OmniFormCreateHandlerViewTestCase(OmniBasicFormAdminTestCaseStub):
         self.assertIsNotNone(form.instance)
         self.assertEqual(form.instance.form, self.omni_form)
 
+    def test_template_help_text(self):
+        """
+        The template field help text should be generated for the handler instance
+        """
+        response = self.client.get(self.url)
+        help_text = response.context['form'].fields['template'].help_text
+        self.assertIsInstance(help_text, TemplateHelpTextLazy)
+        self.assertEqual(help_text.instance, response.context['form'].instance)
+
     def test_raises_404_if_content_type_invalid(self):
         """
         The view should raise an HTTP 404 response if the specified content type is not a subclass of OmniFormHandler
@@ -1362,6 +1372,16 @@ class OmniFormUpdateHandlerViewTestCase(OmniBasicFormAdminTestCaseStub):
         self.assertIsInstance(response.context['view'], OmniFormUpdateHandlerView)
         self.assertIsInstance(response.context['form'], forms.ModelForm)
 
+    def test_template_help_text(self):
+        """
+        The template field help text should list the tokens available for the handlers form
+        """
+        OmniCharField.objects.create(name='title', label='Title', form=self.omni_form)
+        response = self.client.get(self.url)
+        help_text = response.context['form'].fields['template'].help_text
+        self.assertEqual(help_text.instance, self.instance)
+        self.assertIn('Available tokens are {{ title }}', '{0}'.format(help_text))
+
     def test_raises_404_if_handler_not_exists(self):
         """
         The view should raise an HTTP 404 response if the specified handler does not exist
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms builder module
+"""
+from __future__ import unicode_literals
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.test import TestCase, TransactionTestCase
+from mock import patch
+from omniforms.builder import FormBuilder, build_forms
+from omniforms.cache import definition_cache
+from omniforms.forms import OmniFormBaseForm, OmniModelFormBaseForm
+from omniforms.models import (
+    OmniCharField,
+    OmniEmailField,
+    OmniForm,
+    OmniFormEmailConfirmationHandler,
+    OmniModelForm
+)
+from omniforms.tests.models import DummyModel
+
+
+class FormBuilderTestCase(TestCase):
+    """
+    Tests the FormBuilder class
+    """
+    def setUp(self):
+        super(FormBuilderTestCase, self).setUp()
+        self.builder = FormBuilder('Contact us')
+        self.builder.add_field(OmniCharField, name='name', label='Name', required=True)
+        self.builder.add_field('omniforms.omniemailfield', name='email', label='Email', required=True)
+        self.builder.add_handler(
+            OmniFormEmailConfirmationHandler,
+            name='Confirm',
+            recipient_field='email',
+            subject='Thanks',
+            template='Thanks {{ name }}'
+        )
+
+    def test_add_returns_builder(self):
+        """
+        The add_field and add_handler methods should return the builder
+        """
+        builder = FormBuilder('Contact us')
+        self.assertIs(builder.add_field(OmniCharField, name='name', label='Name'), builder)
+        self.assertIs(builder.add_handler('omniforms.omniformemailhandler', name='Notify'), builder)
+
+    def test_to_dict(self):
+        """
+        The to_dict method should return the definition dict, with model classes given as labels
+        """
+        data = self.builder.to_dict()
+        self.assertEqual(data['model'], 'omniforms.omniform')
+        self.assertEqual(data['title'], 'Contact us')
+        self.assertEqual([field['type'] for field in data['fields']], [
+            'omniforms.omnicharfield',
+            'omniforms.omniemailfield'
+        ])
+        self.assertEqual(data['handlers'][0]['type'], 'omniforms.omniformemailconfirmationhandler')
+        self.assertNotIn('content_type', data)
+
+    def test_get_definition(self):
+        """
+        The get_definition method should validate the form without database queries
+        """
+        with self.assertNumQueries(0):
+            definition = self.builder.get_definition()
+        self.assertEqual(definition.field_names, ['name', 'email'])
+        self.assertIsNone(definition.form.pk)
+
+    def test_build(self):
+        """
+        The build method should save the form and return its form class
+        """
+        form_class = self.builder.build()
+        self.assertTrue(issubclass(form_class, OmniFormBaseForm))
+        self.assertEqual(list(form_class.base_fields.keys()), ['name', 'email'])
+        self.assertIsInstance(self.builder.form, OmniForm)
+        self.assertIsNotNone(self.builder.form.pk)
+
+        form = OmniForm.objects.get(pk=self.builder.form.pk)
+        fields = list(form.fields.all().specific())
+        self.assertIsInstance(fields[1], OmniEmailField)
+        self.assertEqual(form.handlers.get().specific.recipient_field_id, fields[1].pk)
+        self.assertEqual(list(form.get_form_class().base_fields.keys()), ['name', 'email'])
+
+    def test_build_invalid(self):
+        """
+        Nothing should be saved if the form is not valid
+        """
+        self.builder.add_field(OmniCharField, name='name', label='Name again')
+        self.assertRaises(ValidationError, self.builder.build)
+        self.assertFalse(OmniForm.objects.exists())
+        self.assertIsNone(self.builder.form)
+
+    def test_build_model_form(self):
+        """
+        Model forms should be built for the content type given
+        """
+        builder = FormBuilder('Dummy', model=OmniModelForm, content_type=DummyModel)
+        builder.add_field(OmniCharField, name='title', label='Title')
+        form_class = builder.build()
+        self.assertTrue(issubclass(form_class, OmniModelFormBaseForm))
+        self.assertEqual(form_class._meta.model, DummyModel)
+        self.assertEqual(builder.form.content_type, ContentType.objects.get_for_model(DummyModel))
+
+    def test_build_forms(self):
+        """
+        The build_forms function should save every form and return their form classes
+        """
+        builders = [self.builder]
+        for index in range(3):
+            builder = FormBuilder('Form {0}'.format(index))
+            builder.add_field(OmniCharField, name='name', label='Name')
+            builders.append(builder)
+
+        form_classes = build_forms(builders)
+        self.assertEqual(len(form_classes), 4)
+        self.assertEqual(OmniForm.objects.count(), 4)
+        for builder, form_class in zip(builders, form_classes):
+            self.assertEqual(form_class.__name__, builder.form._get_form_class_name())
+
+    def test_build_forms_invalid(self):
+        """
+        Nothing should be saved if any of the forms are not valid
+        """
+        self.assertRaises(ValidationError, build_forms, [self.builder, FormBuilder('')])
+        self.assertFalse(OmniForm.objects.exists())
+
+
+class BuildFormsCacheTestCase(TransactionTestCase):
+    """
+    Tests the form class cache is primed by build_forms
+    """
+    def setUp(self):
+        super(BuildFormsCacheTestCase, self).setUp()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.builder = FormBuilder('Contact us')
+        self.builder.add_field(OmniCharField, name='name', label='Name')
+
+    def test_cache_primed(self):
+        """
+        The generated form class should be returned by the form class cache without compiling the form again
+        """
+        form_class = self.builder.build()
+        with patch.object(definition_cache, 'compile') as compile_form:
+            self.assertIs(self.builder.form.get_cached_form_class(), form_class)
+        self.assertFalse(compile_form.called)
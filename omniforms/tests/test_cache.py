@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms cache module and the definition version signals
+"""
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from mock import Mock, patch
+from omniforms.cache import (
+    BaseInvalidationTransport,
+    FormDefinitionCache,
+    LocalInvalidationTransport,
+    definition_cache,
+    preload
+)
+from omniforms.definition_files import definition_files
+from omniforms.models import OmniForm, OmniField, OmniModelForm
+from omniforms.signals import definition_changed
+from omniforms.tests.factories import (
+    OmniCharFieldFactory,
+    OmniFormEmailHandlerFactory,
+    OmniFormFactory,
+    OmniModelFormFactory
+)
+import threading
+import time
+
+
+class BaseInvalidationTransportTestCase(TestCase):
+    """
+    Tests the BaseInvalidationTransport class
+    """
+    def test_publish_not_implemented(self):
+        """
+        The publish method should raise a NotImplementedError
+        """
+        self.assertRaises(NotImplementedError, BaseInvalidationTransport().publish, 'omniforms.omniform:1', 2)
+
+    def test_subscribe_not_implemented(self):
+        """
+        The subscribe method should raise a NotImplementedError
+        """
+        self.assertRaises(NotImplementedError, BaseInvalidationTransport().subscribe, Mock())
+
+
+class LocalInvalidationTransportTestCase(TestCase):
+    """
+    Tests the LocalInvalidationTransport class
+    """
+    def test_publish(self):
+        """
+        The publish method should call every subscriber with the key and version
+        """
+        transport = LocalInvalidationTransport()
+        subscribers = [Mock(), Mock()]
+        for subscriber in subscribers:
+            transport.subscribe(subscriber)
+        transport.publish('omniforms.omniform:1', 2)
+        for subscriber in subscribers:
+            subscriber.assert_called_once_with('omniforms.omniform:1', 2)
+
+
+class FormDefinitionCacheTestCase(TestCase):
+    """
+    Tests the FormDefinitionCache class
+    """
+    def setUp(self):
+        super(FormDefinitionCacheTestCase, self).setUp()
+        cache.clear()
+        self.definition_cache = FormDefinitionCache()
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='title')
+        self.form.refresh_from_db()
+        self.key = self.definition_cache.get_key(OmniForm, self.form.pk)
+
+    def test_get_key(self):
+        """
+        The get_key method should combine the model label and primary key
+        """
+        self.assertEqual(self.key, 'omniforms.omniform:{0}'.format(self.form.pk))
+
+    def test_get_version_database(self):
+        """
+        The get_version method should read the version from the database and store it in the cache backend
+        """
+        OmniForm.objects.filter(pk=self.form.pk).update(version=4)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 4)
+        self.assertEqual(cache.get('omniforms:version:{0}'.format(self.key)), 4)
+
+    def test_get_version_cache_backend(self):
+        """
+        The get_version method should prefer the version stored in the cache backend over the database
+        """
+        cache.set('omniforms:version:{0}'.format(self.key), 7)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 7)
+
+    def test_get_version_local(self):
+        """
+        The get_version method should not check the cache backend while the local version is fresh
+        """
+        self.definition_cache.get_version(OmniForm, self.form.pk)
+        cache.set('omniforms:version:{0}'.format(self.key), 9)
+        self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), self.form.version)
+
+    def test_get_modified(self):
+        """
+        The get_modified method should read the modification time from the database once per version
+        """
+        with self.assertNumQueries(1):
+            for index in range(2):
+                modified = self.definition_cache.get_modified(OmniForm, self.form.pk, self.form.version)
+                self.assertEqual(modified, self.form.modified)
+
+    def test_get_manifest(self):
+        """
+        The get_manifest method should generate the manifest once per version and store it in the cache backend
+        """
+        manifest = self.definition_cache.get_manifest(OmniForm, self.form.pk)
+        self.assertEqual(manifest, {
+            'version': self.form.version,
+            'schema': self.form.get_json_schema(),
+            'conditions': []
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(self.definition_cache.get_manifest(OmniForm, self.form.pk), manifest)
+        self.assertEqual(
+            cache.get('omniforms:manifest:{0}:{1}'.format(self.key, self.form.version)),
+            manifest
+        )
+
+    def test_get_manifest_version_change(self):
+        """
+        The get_manifest method should generate the manifest again once the definition changes
+        """
+        self.definition_cache.get_manifest(OmniForm, self.form.pk)
+        OmniCharFieldFactory.create(form=self.form, name='email')
+        self.form.refresh_from_db()
+        self.definition_cache.set_local_version(self.key, self.form.version)
+        manifest = self.definition_cache.get_manifest(OmniForm, self.form.pk)
+        self.assertEqual(manifest['version'], self.form.version)
+        self.assertIn('email', manifest['schema']['properties'])
+
+    def test_get_manifest_does_not_exist(self):
+        """
+        The get_manifest method should raise DoesNotExist for forms that do not exist
+        """
+        self.assertRaises(OmniForm.DoesNotExist, self.definition_cache.get_manifest, OmniForm, 0)
+
+    def test_get_modified_newer_version(self):
+        """
+        The get_modified method should not store the modification time of a newer version against an older version
+        """
+        with self.assertNumQueries(2):
+            self.definition_cache.get_modified(OmniForm, self.form.pk, self.form.version - 1)
+            self.definition_cache.get_modified(OmniForm, self.form.pk, self.form.version - 1)
+
+    @override_settings(OMNI_FORMS_VERSION_TTL=0)
+    def test_get_version_local_expired(self):
+        """
+        The get_version method should check the cache backend once the local version has expired
+        """
+        self.definition_cache.get_version(OmniForm, self.form.pk)
+        cache.set('omniforms:version:{0}'.format(self.key), 9)
+        self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 9)
+
+    def test_get_version_does_not_exist(self):
+        """
+        The get_version method should raise DoesNotExist for forms that do not exist
+        """
+        self.assertRaises(OmniForm.DoesNotExist, self.definition_cache.get_version, OmniForm, 0)
+
+    def test_get_form_class(self):
+        """
+        The get_form_class method should compile the form class once per definition version
+        """
+        form_class = self.definition_cache.get_form_class(OmniForm, self.form.pk)
+        self.assertIn('title', form_class.base_fields)
+        with self.assertNumQueries(0):
+            self.assertIs(self.definition_cache.get_form_class(OmniForm, self.form.pk), form_class)
+
+    def test_get_form_class_new_version(self):
+        """
+        The get_form_class method should compile a new form class when the version changes
+        """
+        form_class = self.definition_cache.get_form_class(OmniForm, self.form.pk)
+        self.definition_cache.set_local_version(self.key, 5)
+        OmniForm.objects.filter(pk=self.form.pk).update(version=5)
+        self.assertIsNot(self.definition_cache.get_form_class(OmniForm, self.form.pk), form_class)
+
+    def test_compile_newer_version(self):
+        """
+        The compile method should store the form class and version read with the form
+        """
+        OmniForm.objects.filter(pk=self.form.pk).update(version=3)
+        form_class = self.definition_cache.compile(OmniForm, self.form.pk, 2)
+        self.assertEqual(self.definition_cache._form_classes[self.key], (3, form_class))
+        self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 3)
+
+    def test_compile_older_version(self):
+        """
+        The compile method should not store a form class read before a change was committed against the new version
+        """
+        OmniForm.objects.filter(pk=self.form.pk).update(version=1)
+        self.definition_cache.set_local_version(self.key, 2)
+        self.definition_cache.get_form_class(OmniForm, self.form.pk)
+        self.assertEqual(self.definition_cache._form_classes[self.key][0], 1)
+        self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 2)
+
+    def test_get_form_class_model_form(self):
+        """
+        The get_form_class method should work for omni model forms
+        """
+        model_form = OmniModelFormFactory.create()
+        OmniCharFieldFactory.create(form=model_form, name='title')
+        form_class = self.definition_cache.get_form_class(OmniModelForm, model_form.pk)
+        self.assertIn('title', form_class.base_fields)
+
+    def test_definition_changed(self):
+        """
+        The definition_changed method should remove the version from the cache backend and store the new version
+        locally
+        """
+        cache.set('omniforms:version:{0}'.format(self.key), 4)
+        self.definition_cache.definition_changed(sender=OmniForm, pk=self.form.pk, version=5)
+        self.assertIsNone(cache.get('omniforms:version:{0}'.format(self.key)))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 5)
+
+    def test_definition_changed_out_of_order(self):
+        """
+        Changes received out of order should not replace a newer version with an older one
+        """
+        OmniForm.objects.filter(pk=self.form.pk).update(version=5)
+        self.definition_cache.definition_changed(sender=OmniForm, pk=self.form.pk, version=5)
+        self.definition_cache.definition_changed(sender=OmniForm, pk=self.form.pk, version=4)
+        self.assertIsNone(cache.get('omniforms:version:{0}'.format(self.key)))
+        self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 5)
+
+        self.definition_cache.clear()
+        self.assertEqual(self.definition_cache.get_version(OmniForm, self.form.pk), 5)
+        self.assertEqual(cache.get('omniforms:version:{0}'.format(self.key)), 5)
+
+    def test_definition_changed_deleted(self):
+        """
+        The definition_changed method should discard everything stored for deleted forms
+        """
+        self.definition_cache.get_form_class(OmniForm, self.form.pk)
+        self.definition_cache.definition_changed(sender=OmniForm, pk=self.form.pk, version=None)
+        self.assertIsNone(cache.get('omniforms:version:{0}'.format(self.key)))
+        self.assertNotIn(self.key, self.definition_cache._versions)
+        self.assertNotIn(self.key, self.definition_cache._form_classes)
+
+    def test_get_transport_not_configured(self):
+        """
+        The get_transport method should return None if no transport is configured
+        """
+        self.assertIsNone(self.definition_cache.get_transport())
+
+    @override_settings(OMNI_FORMS_INVALIDATION_TRANSPORT='omniforms.cache.LocalInvalidationTransport')
+    def test_get_transport(self):
+        """
+        The get_transport method should create and subscribe to the transport once
+        """
+        transport = self.definition_cache.get_transport()
+        self.assertIsInstance(transport, LocalInvalidationTransport)
+        self.assertEqual(transport.subscribers, [self.definition_cache.set_local_version])
+        self.assertIs(self.definition_cache.get_transport(), transport)
+
+    @override_settings(OMNI_FORMS_INVALIDATION_TRANSPORT='omniforms.cache.LocalInvalidationTransport')
+    def test_definition_changed_pushed_to_other_processes(self):
+        """
+        Changes should be pushed through the transport to caches in other processes
+        """
+        other_process = FormDefinitionCache()
+        transport = self.definition_cache.get_transport()
+        transport.subscribe(other_process.set_local_version)
+        other_process.get_form_class(OmniForm, self.form.pk)
+
+        OmniForm.objects.filter(pk=self.form.pk).update(version=2)
+        self.definition_cache.definition_changed(sender=OmniForm, pk=self.form.pk, version=2)
+        with self.assertNumQueries(0):
+            self.assertEqual(other_process.get_version(OmniForm, self.form.pk), 2)
+
+    def test_get_form_class_single_flight(self):
+        """
+        Concurrent cache misses for the same form version should only compile the form class once
+        """
+        self.definition_cache.set_local_version(self.key, self.form.version)
+        form_class = Mock()
+        results = []
+
+        def compile_form(model_class, pk, version):
+            time.sleep(0.1)
+            self.definition_cache._form_classes[self.key] = (version, form_class)
+            return form_class
+
+        def get_form_class():
+            results.append(self.definition_cache.get_form_class(OmniForm, self.form.pk))
+
+        with patch.object(self.definition_cache, 'compile', side_effect=compile_form) as compile_mock:
+            threads = [threading.Thread(target=get_form_class) for index in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        compile_mock.assert_called_once_with(OmniForm, self.form.pk, self.form.version)
+        self.assertEqual(results, [form_class] * 5)
+        self.assertEqual(self.definition_cache._compile_locks, {})
+
+    def test_cache_lock_disabled(self):
+        """
+        The cache_lock context manager should not touch the cache backend unless compile concurrency is limited
+        """
+        with patch.object(cache, 'add') as add:
+            with self.definition_cache.cache_lock(self.key, 1):
+                pass
+        self.assertFalse(add.called)
+
+    @override_settings(OMNI_FORMS_COMPILE_CONCURRENCY=2)
+    def test_cache_lock(self):
+        """
+        The cache_lock context manager should claim a free slot and release it afterwards
+        """
+        cache.set('omniforms:compile:{0}:1:0'.format(self.key), 1)
+        with self.definition_cache.cache_lock(self.key, 1):
+            self.assertEqual(cache.get('omniforms:compile:{0}:1:1'.format(self.key)), 1)
+        self.assertIsNone(cache.get('omniforms:compile:{0}:1:1'.format(self.key)))
+        self.assertEqual(cache.get('omniforms:compile:{0}:1:0'.format(self.key)), 1)
+
+    @override_settings(OMNI_FORMS_COMPILE_CONCURRENCY=1, OMNI_FORMS_COMPILE_LOCK_TIMEOUT=0.2)
+    def test_cache_lock_waits(self):
+        """
+        The cache_lock context manager should wait for a slot to be released by another process
+        """
+        slot_key = 'omniforms:compile:{0}:1:0'.format(self.key)
+        cache.set(slot_key, 1)
+        threading.Timer(0.05, cache.delete, args=[slot_key]).start()
+        with self.definition_cache.cache_lock(self.key, 1):
+            self.assertEqual(cache.get(slot_key), 1)
+        self.assertIsNone(cache.get(slot_key))
+
+    @override_settings(OMNI_FORMS_COMPILE_CONCURRENCY=1, OMNI_FORMS_COMPILE_LOCK_TIMEOUT=0.1)
+    def test_cache_lock_timeout(self):
+        """
+        The cache_lock context manager should give up waiting after the lock timeout without releasing the lock
+        """
+        slot_key = 'omniforms:compile:{0}:1:0'.format(self.key)
+        cache.set(slot_key, 'other')
+        start = time.time()
+        with self.definition_cache.cache_lock(self.key, 1):
+            self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertEqual(cache.get(slot_key), 'other')
+
+    @override_settings(OMNI_FORMS_COMPILE_CONCURRENCY=1)
+    def test_get_form_class_cache_lock(self):
+        """
+        The get_form_class method should compile within the cache lock
+        """
+        with patch.object(self.definition_cache, 'cache_lock', wraps=self.definition_cache.cache_lock) as cache_lock:
+            self.definition_cache.get_form_class(OmniForm, self.form.pk)
+        cache_lock.assert_called_once_with(self.key, self.form.version)
+
+    def test_get_version_marks_form_used(self):
+        """
+        The get_version method should mark the form as used when it checks the cache backend
+        """
+        self.definition_cache.get_version(OmniForm, self.form.pk)
+        self.assertIsNotNone(cache.get('omniforms:used:{0}'.format(self.key)))
+
+    def test_filter_recently_used(self):
+        """
+        The filter_recently_used method should only return forms used within the given number of seconds
+        """
+        other_form = OmniFormFactory.create()
+        unused_form = OmniFormFactory.create()
+        cache.set('omniforms:used:{0}'.format(self.key), time.time())
+        cache.set('omniforms:used:omniforms.omniform:{0}'.format(other_form.pk), time.time() - 120)
+        pks = [self.form.pk, other_form.pk, unused_form.pk]
+        self.assertEqual(self.definition_cache.filter_recently_used(OmniForm, pks, 60), [self.form.pk])
+        self.assertEqual(
+            sorted(self.definition_cache.filter_recently_used(OmniForm, pks, 180)),
+            sorted([self.form.pk, other_form.pk])
+        )
+
+    def test_warm(self):
+        """
+        The warm method should compile and store the form classes of every form
+        """
+        model_form = OmniModelFormFactory.create()
+        results = {result[0]: result[1:] for result in self.definition_cache.warm()}
+        self.assertEqual(results[OmniForm], (1, []))
+        self.assertEqual(results[OmniModelForm], (1, []))
+        self.assertIn(self.key, self.definition_cache._form_classes)
+        self.assertEqual(cache.get('omniforms:version:{0}'.format(self.key)), self.form.version)
+        with self.assertNumQueries(0):
+            self.definition_cache.get_form_class(OmniForm, self.form.pk)
+            self.definition_cache.get_form_class(OmniModelForm, model_form.pk)
+
+    def test_warm_recent(self):
+        """
+        The warm method should only compile recently used forms if asked to
+        """
+        other_form = OmniFormFactory.create()
+        cache.set('omniforms:used:omniforms.omniform:{0}'.format(other_form.pk), time.time())
+        results = {model_class: compiled for model_class, compiled, failures in self.definition_cache.warm(recent=60)}
+        self.assertEqual(results[OmniForm], 1)
+        self.assertNotIn(self.key, self.definition_cache._form_classes)
+        self.assertIn('omniforms.omniform:{0}'.format(other_form.pk), self.definition_cache._form_classes)
+
+    def test_warm_failures(self):
+        """
+        The warm method should report forms that fail to compile without stopping
+        """
+        error = ValueError('Broken')
+        with patch.object(OmniForm, 'get_form_class', side_effect=error):
+            results = {result[0]: result[1:] for result in self.definition_cache.warm()}
+        self.assertEqual(results[OmniForm], (0, [(self.form.pk, error)]))
+        self.assertNotIn(self.key, self.definition_cache._form_classes)
+
+    def test_preload(self):
+        """
+        The preload function should warm the definition cache, load definition files and close database connections
+        """
+        with patch.object(definition_cache, 'warm') as warm, patch('django.db.connections.close_all') as close_all:
+            with patch.object(definition_files, 'load') as load:
+                self.assertEqual(preload(recent=60), warm.return_value)
+        warm.assert_called_once_with(recent=60)
+        load.assert_called_once_with()
+        close_all.assert_called_once_with()
+
+    def test_clear(self):
+        """
+        The clear method should discard everything stored locally
+        """
+        self.definition_cache.get_form_class(OmniForm, self.form.pk)
+        self.definition_cache.clear()
+        self.assertEqual(self.definition_cache._versions, {})
+        self.assertEqual(self.definition_cache._form_classes, {})
+
+    def test_get_cached_form_class(self):
+        """
+        The get_cached_form_class method should get the form class from the definition cache
+        """
+        with patch.object(definition_cache, 'get_form_class') as get_form_class:
+            self.assertEqual(self.form.get_cached_form_class(), get_form_class.return_value)
+        get_form_class.assert_called_once_with(OmniForm, self.form.pk)
+
+
+class DefinitionVersionSignalsTestCase(TransactionTestCase):
+    """
+    Tests that definition versions are bumped and announced when forms, fields and handlers change
+    """
+    def setUp(self):
+        super(DefinitionVersionSignalsTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.form = OmniFormFactory.create()
+        self.field = OmniCharFieldFactory.create(form=self.form, name='title')
+        self.receiver = Mock()
+        definition_changed.connect(self.receiver)
+        self.addCleanup(definition_changed.disconnect, self.receiver)
+
+    def get_version(self):
+        """
+        Helper method for reading the current version of the form from the database
+
+        :return: Definition version
+        """
+        return OmniForm.objects.values_list('version', flat=True).get(pk=self.form.pk)
+
+    def test_form_saved(self):
+        """
+        Saving a form should bump its version and send the definition_changed signal
+        """
+        version = self.get_version()
+        modified = self.form.modified
+        self.form.title = 'Changed'
+        self.form.save()
+        self.assertEqual(self.get_version(), version + 1)
+        self.assertEqual(self.form.version, version + 1)
+        self.assertGreater(self.form.modified, modified)
+        self.receiver.assert_called_once_with(
+            signal=definition_changed,
+            sender=OmniForm,
+            pk=self.form.pk,
+            version=version + 1
+        )
+
+    def test_field_saved(self):
+        """
+        Saving a field should bump the version of its form
+        """
+        version = self.get_version()
+        self.field.label = 'Changed'
+        self.field.save()
+        self.assertEqual(self.get_version(), version + 1)
+        self.assertGreater(OmniForm.objects.get(pk=self.form.pk).modified, self.form.modified)
+
+    def test_field_deleted(self):
+        """
+        Deleting a field should bump the version of its form
+        """
+        version = self.get_version()
+        self.field.delete()
+        self.assertGreater(self.get_version(), version)
+
+    def test_handler_saved(self):
+        """
+        Creating a handler should bump the version of its form
+        """
+        version = self.get_version()
+        OmniFormEmailHandlerFactory.create(form=self.form)
+        self.assertEqual(self.get_version(), version + 1)
+
+    def test_bulk_delete(self):
+        """
+        Bulk deleting fields should bump the version of the affected forms
+        """
+        version = self.get_version()
+        OmniField.objects.filter(pk=self.field.pk).bulk_delete()
+        self.assertEqual(self.get_version(), version + 1)
+
+    def test_form_deleted(self):
+        """
+        Deleting a form should send the definition_changed signal without a version
+        """
+        pk = self.form.pk
+        self.form.delete()
+        self.receiver.assert_called_with(signal=definition_changed, sender=OmniForm, pk=pk, version=None)
+
+    def test_signal_sent_after_commit(self):
+        """
+        The definition_changed signal should not be sent until the transaction is committed
+        """
+        with transaction.atomic():
+            self.field.save()
+            self.assertFalse(self.receiver.called)
+        self.assertTrue(self.receiver.called)
+
+    def test_cached_form_class_updated(self):
+        """
+        The cached form class should be regenerated once a change has been committed
+        """
+        form_class = self.form.get_cached_form_class()
+        OmniCharFieldFactory.create(form=self.form, name='agree')
+        new_form_class = self.form.get_cached_form_class()
+        self.assertIsNot(new_form_class, form_class)
+        self.assertIn('agree', new_form_class.base_fields)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms conditions module
+"""
+from __future__ import unicode_literals
+from django.test import SimpleTestCase
+from omniforms.conditions import (
+    ACTION_REQUIRE,
+    ACTION_SHOW,
+    OPERATOR_EQUALS,
+    OPERATOR_IN,
+    OPERATOR_IS_NOT_SET,
+    OPERATOR_IS_SET,
+    OPERATOR_NOT_EQUALS,
+    Condition,
+    ConditionGraph,
+    normalize_value
+)
+
+
+class NormalizeValueTestCase(SimpleTestCase):
+    """
+    Tests the normalize_value function
+    """
+    def test_normalize_value(self):
+        """
+        Submitted values should be normalized to text
+        """
+        self.assertEqual(normalize_value(None), '')
+        self.assertEqual(normalize_value(True), 'true')
+        self.assertEqual(normalize_value(False), 'false')
+        self.assertEqual(normalize_value(' yes '), 'yes')
+        self.assertEqual(normalize_value(3), '3')
+        self.assertEqual(normalize_value(['a', 1, None]), ['a', '1', ''])
+
+
+class ConditionTestCase(SimpleTestCase):
+    """
+    Tests the Condition class
+    """
+    def test_unknown_operator(self):
+        """
+        Unknown operators and actions should be rejected
+        """
+        self.assertRaises(ValueError, Condition, 'name', 'contains', 'x')
+        self.assertRaises(ValueError, Condition, 'name', OPERATOR_EQUALS, 'x', action='hide')
+
+    def test_equals(self):
+        """
+        The condition should be met if the answer is equal to the value
+        """
+        condition = Condition('colour', OPERATOR_EQUALS, 'red')
+        self.assertTrue(condition.evaluate('red'))
+        self.assertTrue(condition.evaluate(['blue', 'red']))
+        self.assertFalse(condition.evaluate('blue'))
+        self.assertFalse(condition.evaluate(None))
+        self.assertTrue(Condition('agree', OPERATOR_EQUALS, 'true').evaluate(True))
+
+    def test_not_equals(self):
+        """
+        The condition should be met if the answer is not equal to the value
+        """
+        condition = Condition('colour', OPERATOR_NOT_EQUALS, 'red')
+        self.assertFalse(condition.evaluate('red'))
+        self.assertTrue(condition.evaluate('blue'))
+        self.assertTrue(condition.evaluate(None))
+
+    def test_in(self):
+        """
+        The condition should be met if the answer is one of the values given on each line
+        """
+        condition = Condition('colour', OPERATOR_IN, 'red\r\n blue \n\n')
+        self.assertEqual(condition.values, ['red', 'blue'])
+        self.assertTrue(condition.evaluate('blue'))
+        self.assertTrue(condition.evaluate(['green', 'red']))
+        self.assertFalse(condition.evaluate('green'))
+        self.assertFalse(condition.evaluate([]))
+
+    def test_is_set(self):
+        """
+        The condition should be met if the field has been answered
+        """
+        condition = Condition('name', OPERATOR_IS_SET)
+        self.assertTrue(condition.evaluate('Joe'))
+        self.assertTrue(condition.evaluate(['a']))
+        self.assertTrue(condition.evaluate(True))
+        self.assertFalse(condition.evaluate(''))
+        self.assertFalse(condition.evaluate(None))
+        self.assertFalse(condition.evaluate(False))
+        self.assertFalse(condition.evaluate([]))
+        self.assertTrue(Condition('name', OPERATOR_IS_NOT_SET).evaluate(None))
+        self.assertFalse(Condition('name', OPERATOR_IS_NOT_SET).evaluate('Joe'))
+
+    def test_to_dict(self):
+        """
+        The to_dict method should describe the condition
+        """
+        self.assertEqual(Condition('colour', OPERATOR_IN, 'red\nblue', ACTION_REQUIRE).to_dict(), {
+            'depends_on': 'colour',
+            'operator': 'in',
+            'value': ['red', 'blue'],
+            'action': 'require'
+        })
+        self.assertEqual(Condition('colour', OPERATOR_EQUALS, ' red ').to_dict()['value'], 'red')
+
+
+class ConditionGraphTestCase(SimpleTestCase):
+    """
+    Tests the ConditionGraph class
+    """
+    def setUp(self):
+        super(ConditionGraphTestCase, self).setUp()
+        self.conditions = {
+            'details': Condition('reason', OPERATOR_EQUALS, 'other'),
+            'reason': Condition('contact', OPERATOR_IS_SET),
+            'phone': Condition('contact', OPERATOR_EQUALS, 'phone', ACTION_REQUIRE)
+        }
+        self.graph = ConditionGraph(self.conditions)
+
+    def test_order(self):
+        """
+        Fields should be ordered after the fields they depend on
+        """
+        self.assertEqual(self.graph.order, ['phone', 'reason', 'details'])
+
+    def test_cycle(self):
+        """
+        Conditions depending on each other in a cycle should be rejected
+        """
+        self.conditions['contact'] = Condition('details', OPERATOR_IS_SET)
+        with self.assertRaisesMessage(ValueError, '\'contact\', \'details\', \'reason\' depend on each other'):
+            ConditionGraph(self.conditions)
+
+    def test_self_dependency(self):
+        """
+        Fields depending on themselves should be rejected
+        """
+        self.assertRaises(ValueError, ConditionGraph, {'name': Condition('name', OPERATOR_IS_SET)})
+
+    def test_unknown_field(self):
+        """
+        Conditions depending on unknown fields should only be rejected if the names of the fields are given
+        """
+        field_names = ['details', 'reason', 'phone']
+        with self.assertRaisesMessage(ValueError, '\'contact\' which is not a field of the form'):
+            ConditionGraph(self.conditions, field_names)
+        ConditionGraph(self.conditions, field_names + ['contact'])
+
+    def test_bool(self):
+        """
+        Graphs should be falsy if they hold no conditions
+        """
+        self.assertTrue(self.graph)
+        self.assertFalse(ConditionGraph({}))
+
+    def test_evaluate(self):
+        """
+        The evaluate method should give the hidden fields and the fields required by their conditions
+        """
+        self.assertEqual(self.graph.evaluate({'contact': 'phone', 'reason': 'other'}.get), (set(), {'phone'}))
+        self.assertEqual(self.graph.evaluate({'contact': 'email', 'reason': 'price'}.get), ({'details'}, set()))
+
+    def test_evaluate_hidden_dependency(self):
+        """
+        Fields depending on hidden fields should see them as unanswered
+        """
+        self.assertEqual(self.graph.evaluate({'reason': 'other'}.get), ({'reason', 'details'}, set()))
+
+    def test_evaluate_single_pass(self):
+        """
+        Each condition should be evaluated once, reading only the value it depends on
+        """
+        values = []
+
+        def get_value(name):
+            values.append(name)
+            return {'contact': 'phone', 'reason': 'other'}.get(name)
+
+        self.graph.evaluate(get_value)
+        self.assertEqual(values, ['contact', 'contact', 'reason'])
+
+    def test_to_list(self):
+        """
+        The to_list method should give the rules in evaluation order
+        """
+        rules = self.graph.to_list()
+        self.assertEqual([rule['field'] for rule in rules], ['phone', 'reason', 'details'])
+        self.assertEqual(rules[2], {
+            'field': 'details',
+            'depends_on': 'reason',
+            'operator': 'equals',
+            'value': 'other',
+            'action': ACTION_SHOW
+        })
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms definition_files module
+"""
+from __future__ import unicode_literals
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from mock import patch
+from omniforms import definition_files as definition_files_module
+from omniforms.definition_files import DefinitionFileRegistry
+from omniforms.definitions import FormDefinition
+from omniforms.forms import OmniFormBaseForm
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+class DefinitionFileRegistryTestCase(SimpleTestCase):
+    """
+    Tests the DefinitionFileRegistry class
+    """
+    def setUp(self):
+        super(DefinitionFileRegistryTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(OMNI_FORMS_DEFINITION_DIRS=[self.directory])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.registry = DefinitionFileRegistry()
+        self.definition = {
+            'title': 'Contact us',
+            'fields': [{'type': 'omniforms.omnicharfield', 'name': 'name', 'label': 'Name'}]
+        }
+
+    def write(self, file_name, content, mtime=None):
+        """
+        Helper method for writing a definition file
+
+        :param file_name: The name of the file
+        :param content: The file content
+        :param mtime: Optional modification time for the file
+        :return: Path to the file
+        """
+        path = os.path.join(self.directory, file_name)
+        with io.open(path, 'w', encoding='utf-8') as definition_file:
+            definition_file.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_json(self):
+        """
+        JSON definition files should be loaded and compiled
+        """
+        self.write('contact.json', json.dumps(self.definition))
+        self.assertEqual(self.registry.get_names(), ['contact'])
+        self.assertIsInstance(self.registry.get_definition('contact'), FormDefinition)
+        form_class = self.registry.get_form_class('contact')
+        self.assertTrue(issubclass(form_class, OmniFormBaseForm))
+        self.assertEqual(list(form_class.base_fields.keys()), ['name'])
+
+    def test_python(self):
+        """
+        Python definition files should be loaded from their FORM variable
+        """
+        self.write('contact.py', 'from omniforms.models import OmniCharField\nFORM = {0!r}\n'.format(self.definition))
+        self.assertEqual(list(self.registry.get_form_class('contact').base_fields.keys()), ['name'])
+
+    def test_python_without_form(self):
+        """
+        Python definition files must define a FORM variable
+        """
+        self.write('contact.py', 'DEFINITION = {}\n')
+        self.assertRaises(ImproperlyConfigured, self.registry.get_names)
+
+    def test_yaml(self):
+        """
+        YAML definition files should be loaded using PyYAML
+        """
+        self.write('contact.yaml', 'title: Contact us\n')
+        with patch.object(definition_files_module, 'yaml') as yaml:
+            yaml.safe_load.return_value = self.definition
+            self.assertEqual(list(self.registry.get_form_class('contact').base_fields.keys()), ['name'])
+        self.assertEqual(yaml.safe_load.call_count, 1)
+
+    def test_yaml_not_installed(self):
+        """
+        An ImproperlyConfigured exception should be raised if PyYAML is needed but not installed
+        """
+        self.write('contact.yml', 'title: Contact us\n')
+        with patch.object(definition_files_module, 'yaml', None):
+            self.assertRaises(ImproperlyConfigured, self.registry.get_names)
+
+    def test_invalid_json(self):
+        """
+        An ImproperlyConfigured exception should be raised for files that cannot be parsed
+        """
+        self.write('contact.json', '{')
+        self.assertRaises(ImproperlyConfigured, self.registry.get_names)
+
+    def test_invalid_yaml(self):
+        """
+        An ImproperlyConfigured exception should be raised for YAML files that cannot be parsed
+        """
+        class YAMLError(Exception):
+            pass
+
+        self.write('contact.yaml', 'title: [')
+        with patch.object(definition_files_module, 'yaml') as yaml:
+            yaml.YAMLError = YAMLError
+            yaml.safe_load.side_effect = YAMLError('unexpected end of stream')
+            self.assertRaises(ImproperlyConfigured, self.registry.get_names)
+
+    def test_not_a_dict(self):
+        """
+        An ImproperlyConfigured exception should be raised for files that do not hold a single definition
+        """
+        for file_name, content in (
+            ('contact.json', json.dumps([self.definition])),
+            ('contact.py', 'FORM = None\n'),
+        ):
+            path = self.write(file_name, content)
+            with self.assertRaises(ImproperlyConfigured) as context:
+                self.registry.get_names()
+            self.assertIn(path, str(context.exception))
+            os.remove(path)
+
+    def test_missing_directory(self):
+        """
+        An ImproperlyConfigured exception should be raised for definition directories that do not exist
+        """
+        missing = os.path.join(self.directory, 'missing')
+        with self.settings(OMNI_FORMS_DEFINITION_DIRS=[missing]):
+            with self.assertRaises(ImproperlyConfigured) as context:
+                self.registry.get_names()
+        self.assertIn(missing, str(context.exception))
+
+    def test_invalid_definition(self):
+        """
+        An ImproperlyConfigured exception should be raised for invalid definitions
+        """
+        del self.definition['title']
+        path = self.write('contact.json', json.dumps(self.definition))
+        with self.assertRaises(ImproperlyConfigured) as context:
+            self.registry.get_names()
+        self.assertIn(path, '{0}'.format(context.exception))
+        self.assertIn('form: This field cannot be blank.', '{0}'.format(context.exception))
+
+    def test_duplicate_names(self):
+        """
+        An ImproperlyConfigured exception should be raised if two files define the same name
+        """
+        self.write('contact.json', json.dumps(self.definition))
+        self.write('contact.py', 'FORM = {0!r}\n'.format(self.definition))
+        self.assertRaises(ImproperlyConfigured, self.registry.get_names)
+
+    def test_ignored_files(self):
+        """
+        Files with other extensions, or names starting with an underscore or dot should be ignored
+        """
+        self.write('__init__.py', '')
+        self.write('.contact.json', '{')
+        self.write('README.txt', 'Definitions')
+        self.assertEqual(self.registry.get_names(), [])
+
+    def test_unknown_name(self):
+        """
+        A KeyError should be raised for unknown definitions
+        """
+        self.assertRaises(KeyError, self.registry.get_form_class, 'contact')
+
+    def test_compiled_once(self):
+        """
+        Definitions should be compiled once and reused
+        """
+        self.write('contact.json', json.dumps(self.definition))
+        form_class = self.registry.get_form_class('contact')
+        with patch.object(self.registry, 'load') as load:
+            self.assertIs(self.registry.get_form_class('contact'), form_class)
+        self.assertFalse(load.called)
+
+    def test_not_reloaded_by_default(self):
+        """
+        Changed files should not be reloaded unless reloading is enabled
+        """
+        self.write('contact.json', json.dumps(self.definition), mtime=time.time() - 10)
+        form_class = self.registry.get_form_class('contact')
+        self.definition['title'] = 'Get in touch'
+        self.write('contact.json', json.dumps(self.definition))
+        self.registry._last_poll = 0
+        self.assertIs(self.registry.get_form_class('contact'), form_class)
+
+    @override_settings(OMNI_FORMS_DEFINITION_RELOAD=True, OMNI_FORMS_DEFINITION_POLL_INTERVAL=0)
+    def test_reload(self):
+        """
+        Changed files should be reloaded, and unchanged files reused, if reloading is enabled
+        """
+        self.write('contact.json', json.dumps(self.definition), mtime=time.time() - 10)
+        self.write('other.json', json.dumps(self.definition), mtime=time.time() - 10)
+        form_class = self.registry.get_form_class('contact')
+        other_form_class = self.registry.get_form_class('other')
+
+        self.definition['fields'].append({'type': 'omniforms.omniemailfield', 'name': 'email', 'label': 'Email'})
+        self.write('contact.json', json.dumps(self.definition))
+        new_form_class = self.registry.get_form_class('contact')
+        self.assertIsNot(new_form_class, form_class)
+        self.assertEqual(list(new_form_class.base_fields.keys()), ['name', 'email'])
+        self.assertIs(self.registry.get_form_class('other'), other_form_class)
+
+    @override_settings(OMNI_FORMS_DEFINITION_RELOAD=True, OMNI_FORMS_DEFINITION_POLL_INTERVAL=60)
+    def test_reload_poll_interval(self):
+        """
+        Files should not be checked more than once per poll interval
+        """
+        self.write('contact.json', json.dumps(self.definition))
+        self.registry.get_names()
+        with patch.object(self.registry, 'find_files') as find_files:
+            self.registry.get_names()
+        self.assertFalse(find_files.called)
+
+    @override_settings(OMNI_FORMS_DEFINITION_RELOAD=True, OMNI_FORMS_DEFINITION_POLL_INTERVAL=0)
+    def test_reload_removed(self):
+        """
+        Definitions should be removed when their file is deleted
+        """
+        path = self.write('contact.json', json.dumps(self.definition))
+        self.registry.get_names()
+        os.remove(path)
+        self.assertEqual(self.registry.get_names(), [])
+
+    def test_clear(self):
+        """
+        The clear method should discard all loaded definitions
+        """
+        self.write('contact.json', json.dumps(self.definition))
+        form_class = self.registry.get_form_class('contact')
+        self.registry.clear()
+        self.assertIsNot(self.registry.get_form_class('contact'), form_class)
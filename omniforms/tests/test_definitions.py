@@ -0,0 +1,580 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms definitions module
+"""
+from __future__ import unicode_literals
+from django import forms
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from mock import Mock
+from omniforms.definitions import FormDefinition, get_model_class, iter_form_definitions, save_definitions
+from omniforms.forms import OmniFormBaseForm, OmniModelFormBaseForm
+from omniforms.models import (
+    OmniBooleanField,
+    OmniCharField,
+    OmniEmailField,
+    OmniField,
+    OmniForm,
+    OmniFormEmailConfirmationHandler,
+    OmniFormEmailDigestEntry,
+    OmniFormEmailHandler,
+    OmniFormSaveInstanceHandler,
+    OmniModelForm
+)
+from omniforms.tests.factories import (
+    OmniBooleanFieldFactory,
+    OmniCharFieldFactory,
+    OmniEmailFieldFactory,
+    OmniFormFactory,
+    OmniModelFormFactory
+)
+from omniforms.tests.models import DummyModel
+
+
+class GetModelClassTestCase(TestCase):
+    """
+    Tests the get_model_class function
+    """
+    def test_valid(self):
+        """
+        The function should return the model class for the label
+        """
+        self.assertEqual(get_model_class('omniforms.omnicharfield', OmniField), OmniCharField)
+
+    def test_unknown(self):
+        """
+        The function should raise a ValidationError for unknown models
+        """
+        self.assertRaises(ValidationError, get_model_class, 'omniforms.omnifoofield', OmniField)
+        self.assertRaises(ValidationError, get_model_class, 'omnicharfield', OmniField)
+
+    def test_not_subclass(self):
+        """
+        The function should raise a ValidationError for models that are not concrete subclasses of the base class
+        """
+        self.assertRaises(ValidationError, get_model_class, 'omniforms.omniform', OmniField)
+        self.assertRaises(ValidationError, get_model_class, 'omniforms.omnifield', OmniField)
+
+
+class FormDefinitionTestCase(TestCase):
+    """
+    Tests the FormDefinition class
+    """
+    def setUp(self):
+        super(FormDefinitionTestCase, self).setUp()
+        self.data = {
+            'title': 'Contact us',
+            'fields': [
+                {
+                    'type': 'omniforms.omnicharfield',
+                    'name': 'name',
+                    'label': 'Name',
+                    'required': True,
+                    'max_length': 50
+                },
+                {
+                    'type': 'omniforms.omniemailfield',
+                    'name': 'email',
+                    'label': 'Email',
+                    'help_text': 'Your email address',
+                    'widget_class': 'django.forms.widgets.EmailInput'
+                },
+                {'type': 'omniforms.omnibooleanfield', 'name': 'agree', 'label': 'Agree'},
+            ],
+            'handlers': [
+                {
+                    'type': 'omniforms.omniformemailhandler',
+                    'name': 'Notify',
+                    'recipients': 'a@example.com',
+                    'subject': 'New enquiry',
+                    'template': 'Hello'
+                },
+                {
+                    'type': 'omniforms.omniformemailconfirmationhandler',
+                    'name': 'Confirm',
+                    'recipient_field': 'email',
+                    'subject': 'Thanks',
+                    'template': 'Thanks {{ name }}'
+                },
+            ]
+        }
+
+    def test_from_dict(self):
+        """
+        The from_dict method should build unsaved form, field and handler instances without database queries
+        """
+        with self.assertNumQueries(0):
+            definition = FormDefinition.from_dict(self.data)
+        self.assertIsInstance(definition.form, OmniForm)
+        self.assertIsNone(definition.form.pk)
+        self.assertEqual(definition.form.title, 'Contact us')
+        self.assertEqual(definition.field_names, ['name', 'email', 'agree'])
+        self.assertEqual([field.order for field in definition.fields], [0, 1, 2])
+        self.assertEqual(definition.fields[2].widget_class, 'django.forms.widgets.CheckboxInput')
+        self.assertIsInstance(definition.handlers[0], OmniFormEmailHandler)
+        self.assertIsInstance(definition.handlers[1], OmniFormEmailConfirmationHandler)
+        self.assertIs(definition.handlers[1].recipient_field, definition.fields[1])
+
+    def test_from_dict_instances(self):
+        """
+        The from_dict method should accept unsaved field instances
+        """
+        self.data['fields'][0] = OmniCharField(name='name', label='Name', widget_class='django.forms.widgets.TextInput')
+        definition = FormDefinition.from_dict(self.data)
+        self.assertIs(definition.fields[0], self.data['fields'][0])
+
+    def test_from_dict_order(self):
+        """
+        Fields should be ordered by their order value
+        """
+        self.data['fields'][0]['order'] = 10
+        definition = FormDefinition.from_dict(self.data)
+        self.assertEqual(definition.field_names, ['email', 'agree', 'name'])
+
+    def assertInvalid(self, data, message):
+        """
+        Asserts that the definition is invalid with the given message
+
+        :param data: Definition dict
+        :param message: Expected error message
+        """
+        with self.assertRaises(ValidationError) as context:
+            FormDefinition.from_dict(data)
+        self.assertIn(message, context.exception.messages)
+
+    def test_invalid_title(self):
+        """
+        The form title is required
+        """
+        del self.data['title']
+        self.assertInvalid(self.data, 'form: This field cannot be blank.')
+
+    def test_invalid_form_model(self):
+        """
+        The form model must be an omni form model
+        """
+        self.data['model'] = 'omniforms.omnicharfield'
+        self.assertInvalid(self.data, 'form: \'omniforms.omnicharfield\' is not a concrete OmniFormBase model')
+
+    def test_invalid_field_type(self):
+        """
+        Field types must be omni field models
+        """
+        self.data['fields'][1]['type'] = 'omniforms.omniform'
+        self.assertInvalid(self.data, 'fields[1]: \'omniforms.omniform\' is not a concrete OmniField model')
+
+    def test_invalid_field_attribute(self):
+        """
+        Field specs may only contain model field names
+        """
+        self.data['fields'][0]['colour'] = 'red'
+        with self.assertRaises(ValidationError) as context:
+            FormDefinition.from_dict(self.data)
+        self.assertIn('colour', context.exception.messages[0])
+
+    def test_invalid_field_name(self):
+        """
+        Field names are validated using the model field validators
+        """
+        self.data['fields'][0]['name'] = 'Full name'
+        self.assertInvalid(
+            self.data,
+            'fields[0]: The name may only contain alphanumeric characters and underscores.'
+        )
+
+    def test_invalid_widget(self):
+        """
+        Field widgets must be permitted by the field type
+        """
+        self.data['fields'][0]['widget_class'] = 'django.forms.widgets.CheckboxInput'
+        self.assertInvalid(self.data, 'fields[0]: django.forms.widgets.CheckboxInput is not a permitted widget')
+
+    def test_invalid_duplicate_field(self):
+        """
+        Field names must be unique
+        """
+        self.data['fields'][1]['name'] = 'name'
+        self.data['handlers'].pop()
+        self.assertInvalid(self.data, 'fields: \'name\' is defined more than once')
+
+    def test_invalid_condition_field(self):
+        """
+        Field conditions must depend on fields of the definition
+        """
+        self.data['fields'][1].update({'condition_field': 'colour', 'condition_operator': 'is_set'})
+        self.assertInvalid(self.data, 'fields: \'email\' depends on \'colour\' which is not a field of the form')
+
+    def test_invalid_condition_cycle(self):
+        """
+        Field conditions must not depend on each other in a cycle
+        """
+        self.data['fields'][1].update({'condition_field': 'agree', 'condition_operator': 'is_set'})
+        self.data['fields'][2].update({'condition_field': 'email', 'condition_operator': 'is_set'})
+        self.assertInvalid(self.data, 'fields: The conditions of \'agree\', \'email\' depend on each other')
+
+    def test_condition(self):
+        """
+        Field conditions should be compiled into the form class generated for the definition
+        """
+        self.data['fields'][1].update({'condition_field': 'agree', 'condition_operator': 'is_set'})
+        form_class = FormDefinition.from_dict(self.data).get_form_class()
+        self.assertEqual(form_class.get_condition_graph().order, ['email'])
+        form = form_class({'name': 'Joe', 'email': 'invalid'})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_calculated_field(self):
+        """
+        Calculated fields should be validated against the fields of the definition
+        """
+        self.data['fields'].append({
+            'type': 'omniforms.omnicalculatedfield',
+            'name': 'greeting',
+            'label': 'Greeting',
+            'expression': '"Hello " + name + colour'
+        })
+        self.assertInvalid(self.data, 'fields: \'greeting\' uses \'colour\' which is not a field of the form')
+        self.data['fields'][-1]['expression'] = '"Hello " + name'
+        self.data['fields'][-1]['required'] = True
+        definition = FormDefinition.from_dict(self.data)
+        self.assertFalse(definition.fields[-1].required)
+        definition.save()
+        self.assertFalse(OmniField.objects.get(name='greeting').required)
+        form_class = definition.get_form_class()
+        form = form_class({'name': 'Joe', 'email': 'joe@example.com'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['greeting'], 'Hello Joe')
+
+    def test_invalid_expression(self):
+        """
+        Calculated field expressions are validated when the definition is built
+        """
+        self.data['fields'].append({
+            'type': 'omniforms.omnicalculatedfield',
+            'name': 'greeting',
+            'label': 'Greeting',
+            'expression': 'name.upper'
+        })
+        self.assertInvalid(self.data, 'fields[3]: Attribute is not allowed in expressions')
+
+    def test_invalid_recipient_field(self):
+        """
+        Handler foreign keys to fields must name a field of the right type in the definition
+        """
+        self.data['handlers'][1]['recipient_field'] = 'name'
+        self.assertInvalid(self.data, 'handlers[1]: \'name\' is not a OmniEmailField in this definition')
+
+    def test_invalid_handler(self):
+        """
+        Handler specs are validated using the model field validators
+        """
+        del self.data['handlers'][0]['subject']
+        self.assertInvalid(self.data, 'handlers[0]: This field cannot be blank.')
+
+    def test_handler_condition(self):
+        """
+        Handler conditions should be validated against the fields of the definition
+        """
+        self.data['handlers'][0]['condition'] = 'topic == "sales"'
+        self.assertInvalid(self.data, 'handlers: The form has no field named \'topic\'')
+        self.data['handlers'][0]['condition'] = 'name =='
+        self.assertInvalid(self.data, 'handlers: \'name ==\' is not a valid expression')
+        self.data['handlers'][0]['condition'] = 'name == "Bob"'
+        definition = FormDefinition.from_dict(self.data)
+        for handler in definition.handlers:
+            handler.handle = Mock()
+        form = definition.get_form_class()(data={'name': 'Joe', 'email': 'joe@example.com'})
+        self.assertTrue(form.is_valid())
+        form.handle()
+        self.assertFalse(definition.handlers[0].handle.called)
+        definition.handlers[1].handle.assert_called_once_with(form)
+
+    def test_validate_definition_called(self):
+        """
+        The validate method should call validate_definition on each handler
+        """
+        definition = FormDefinition.from_dict(self.data)
+        definition.handlers[0].validate_definition = Mock(side_effect=ValidationError('Nope'))
+        with self.assertRaises(ValidationError) as context:
+            definition.validate()
+        self.assertEqual(context.exception.messages, ['handlers: Nope'])
+        definition.handlers[0].validate_definition.assert_called_once_with(definition)
+
+    def test_save_instance_handler_requires_model_form(self):
+        """
+        The save instance handler may only be used in model form definitions
+        """
+        self.data['handlers'] = [{'type': 'omniforms.omniformsaveinstancehandler', 'name': 'Save'}]
+        self.assertInvalid(self.data, 'handlers: This handler can only be attached to model forms')
+
+    def assertFormClassesEqual(self, form_class, expected_form_class):
+        """
+        Asserts that two generated form classes define the same fields
+
+        :param form_class: Form class generated from a definition
+        :param expected_form_class: Form class generated from the database
+        """
+        self.assertEqual(form_class.__name__, expected_form_class.__name__)
+        self.assertEqual(list(form_class.base_fields.keys()), list(expected_form_class.base_fields.keys()))
+        for name, field in expected_form_class.base_fields.items():
+            definition_field = form_class.base_fields[name]
+            self.assertEqual(definition_field.__class__, field.__class__)
+            self.assertEqual(definition_field.widget.__class__, field.widget.__class__)
+            for attribute in ('label', 'help_text', 'required', 'initial', 'max_length'):
+                self.assertEqual(getattr(definition_field, attribute, None), getattr(field, attribute, None))
+
+    def test_get_form_class(self):
+        """
+        The get_form_class method should generate the same form class as the equivalent database form
+        """
+        form = OmniFormFactory.create(title='Contact us')
+        OmniCharFieldFactory.create(form=form, name='name', label='Name', required=True, max_length=50, order=0)
+        OmniEmailFieldFactory.create(form=form, name='email', label='Email', help_text='Your email address', order=1)
+        OmniBooleanFieldFactory.create(form=form, name='agree', label='Agree', order=2)
+
+        definition = FormDefinition.from_dict(self.data)
+        with self.assertNumQueries(0):
+            form_class = definition.get_form_class()
+        self.assertTrue(issubclass(form_class, OmniFormBaseForm))
+        self.assertFormClassesEqual(form_class, form.get_form_class())
+        self.assertEqual(form_class._handlers, definition.handlers)
+
+    def test_get_form_class_handles(self):
+        """
+        Forms generated from definitions should run the definitions handlers
+        """
+        definition = FormDefinition.from_dict(self.data)
+        for handler in definition.handlers:
+            handler.handle = Mock()
+        form = definition.get_form_class()(data={'name': 'Bob', 'email': 'bob@example.com'})
+        self.assertTrue(form.is_valid())
+        form.handle()
+        for handler in definition.handlers:
+            handler.handle.assert_called_once_with(form)
+
+    def test_get_form_class_model_form(self):
+        """
+        Model form definitions should generate the same form class as the equivalent database form
+        """
+        model_form = OmniModelFormFactory.create(title='Dummy')
+        OmniCharFieldFactory.create(form=model_form, name='title', label='Title', order=0)
+        OmniBooleanFieldFactory.create(form=model_form, name='agree', label='Agree', order=1)
+        data = {
+            'model': 'omniforms.omnimodelform',
+            'content_type': 'tests.dummymodel',
+            'title': 'Dummy',
+            'fields': [
+                {'type': 'omniforms.omnicharfield', 'name': 'title', 'label': 'Title'},
+                {'type': 'omniforms.omnibooleanfield', 'name': 'agree', 'label': 'Agree'},
+            ]
+        }
+        with self.assertNumQueries(0):
+            definition = FormDefinition.from_dict(data)
+            form_class = definition.get_form_class()
+        self.assertIsInstance(definition.form, OmniModelForm)
+        self.assertEqual(definition.form.content_type.model_class(), DummyModel)
+        self.assertTrue(issubclass(form_class, OmniModelFormBaseForm))
+        self.assertTrue(issubclass(form_class, forms.ModelForm))
+        self.assertEqual(form_class._meta.model, DummyModel)
+        self.assertFormClassesEqual(form_class, model_form.get_form_class())
+
+    def test_model_form_invalid_field(self):
+        """
+        Model form definitions may only define fields of the model
+        """
+        data = {
+            'model': 'omniforms.omnimodelform',
+            'content_type': 'tests.dummymodel',
+            'title': 'Dummy',
+            'fields': [{'type': 'omniforms.omnicharfield', 'name': 'colour', 'label': 'Colour'}]
+        }
+        self.assertInvalid(data, 'fields: \'colour\' is not a field of the forms model')
+
+    def test_model_form_save_instance_handler(self):
+        """
+        Model form definitions must define all required fields to use the save instance handler
+        """
+        data = {
+            'model': 'omniforms.omnimodelform',
+            'content_type': 'tests.dummymodel',
+            'title': 'Dummy',
+            'fields': [{'type': 'omniforms.omnicharfield', 'name': 'title', 'label': 'Title'}],
+            'handlers': [{'type': 'omniforms.omniformsaveinstancehandler', 'name': 'Save'}]
+        }
+        with self.assertRaises(ValidationError) as context:
+            FormDefinition.from_dict(data)
+        self.assertIn('The save instance handler can only be attached to forms', context.exception.messages[0])
+
+        required_field_names = OmniModelForm(
+            content_type=ContentType(app_label='tests', model='dummymodel')
+        ).get_required_field_names()
+        data['fields'] = [
+            {'type': 'omniforms.omnicharfield', 'name': name, 'label': name}
+            for name in required_field_names
+        ]
+        definition = FormDefinition.from_dict(data)
+        self.assertIsInstance(definition.handlers[0], OmniFormSaveInstanceHandler)
+
+    def test_save(self):
+        """
+        The save method should save the form, fields and handlers
+        """
+        definition = FormDefinition.from_dict(self.data)
+        form = definition.save()
+        self.assertIsNotNone(form.pk)
+        self.assertEqual(list(form.fields.values_list('name', flat=True)), ['name', 'email', 'agree'])
+        fields = list(form.fields.all().specific())
+        self.assertIsInstance(fields[0], OmniCharField)
+        self.assertEqual(fields[0].max_length, 50)
+        self.assertIsInstance(fields[1], OmniEmailField)
+        self.assertIsInstance(fields[2], OmniBooleanField)
+        handlers = list(form.handlers.all().specific())
+        self.assertEqual(handlers[0].subject, 'New enquiry')
+        self.assertEqual(handlers[1].recipient_field_id, fields[1].pk)
+        self.assertFormClassesEqual(form.get_form_class(), definition.get_form_class())
+
+    def test_save_model_form(self):
+        """
+        The save method should replace the unsaved content type of model forms
+        """
+        data = {
+            'model': 'omniforms.omnimodelform',
+            'content_type': 'tests.dummymodel',
+            'title': 'Dummy',
+            'fields': [{'type': 'omniforms.omnicharfield', 'name': 'title', 'label': 'Title'}]
+        }
+        form = FormDefinition.from_dict(data).save()
+        form = OmniModelForm.objects.get(pk=form.pk)
+        self.assertEqual(form.content_type, ContentType.objects.get_for_model(DummyModel))
+        self.assertEqual(list(form.fields.values_list('name', flat=True)), ['title'])
+
+    def test_save_saved_form(self):
+        """
+        Definitions for saved forms cannot be saved again
+        """
+        definition = FormDefinition.from_instance(OmniFormFactory.create())
+        self.assertRaises(ValueError, definition.save)
+
+    def test_save_existing_key(self):
+        """
+        Definitions with the same key as a saved form should only be saved by updating the form
+        """
+        form = FormDefinition.from_dict(self.data).save()
+        data = dict(self.data, key='{0}'.format(form.key))
+        self.assertRaises(ValueError, save_definitions, [FormDefinition.from_dict(data)])
+        definitions = [FormDefinition.from_dict(data), FormDefinition.from_dict(data)]
+        self.assertRaises(ValueError, save_definitions, definitions, update=True)
+        self.assertEqual(OmniForm.objects.count(), 1)
+
+    def test_save_update(self):
+        """
+        Saved forms with the same key should be updated, sending the digests of replaced email handlers first
+        """
+        form = FormDefinition.from_dict(self.data).save()
+        version = form.version
+        handler = form.handlers.all().specific()[0]
+        handler.digest_size = 10
+        handler.save()
+        handler.handle(Mock(cleaned_data={}))
+        data = dict(self.data, key='{0}'.format(form.key), title='Get in touch', fields=self.data['fields'][:2])
+        definition = FormDefinition.from_dict(data)
+        save_definitions([definition], update=True)
+        form = OmniForm.objects.get()
+        self.assertEqual(definition.form.pk, form.pk)
+        self.assertGreater(form.version, version)
+        self.assertEqual(definition.form.version, form.version)
+        self.assertEqual(form.title, 'Get in touch')
+        self.assertEqual(list(form.fields.values_list('name', flat=True)), ['name', 'email'])
+        self.assertEqual(form.handlers.count(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(OmniFormEmailDigestEntry.objects.exists())
+
+    def test_save_definitions(self):
+        """
+        The save_definitions function should insert each table in a fixed number of queries
+        """
+        definitions = [FormDefinition.from_dict(dict(self.data, title='Form {0}'.format(index))) for index in range(5)]
+        save_definitions(definitions[:1])
+        if connection.features.can_return_ids_from_bulk_insert:
+            # One INSERT per table, the query for saved forms with the same keys, plus the savepoint queries
+            expected_queries = 11
+        else:
+            # One INSERT per form, and a query before and after each base field and handler INSERT
+            expected_queries = 18
+        with self.assertNumQueries(expected_queries):
+            save_definitions(definitions[1:])
+        for definition in definitions:
+            self.assertEqual(definition.form.fields.count(), 3)
+            self.assertEqual(definition.form.handlers.count(), 2)
+
+    def test_to_dict(self):
+        """
+        The to_dict method should return a dict that can be loaded by from_dict
+        """
+        form = OmniFormFactory.create(title='Contact us')
+        email_field = OmniEmailFieldFactory.create(form=form, name='email', order=0)
+        OmniFormEmailConfirmationHandler.objects.create(
+            form=form,
+            name='Confirm',
+            recipient_field=email_field,
+            subject='Thanks',
+            template='Thanks'
+        )
+        data = FormDefinition.from_instance(form).to_dict()
+        self.assertEqual(data['model'], 'omniforms.omniform')
+        self.assertEqual(data['title'], 'Contact us')
+        self.assertEqual(data['fields'][0]['type'], 'omniforms.omniemailfield')
+        self.assertEqual(data['fields'][0]['name'], 'email')
+        self.assertNotIn('id', data['fields'][0])
+        self.assertNotIn('object_id', data['fields'][0])
+        self.assertEqual(data['handlers'][0]['recipient_field'], 'email')
+
+        definition = FormDefinition.from_dict(data)
+        self.assertEqual(definition.to_dict(), data)
+        self.assertFormClassesEqual(definition.get_form_class(), form.get_form_class())
+
+    def test_to_dict_model_form(self):
+        """
+        The to_dict method should include the content type of model forms
+        """
+        form = OmniModelFormFactory.create()
+        data = FormDefinition.from_instance(form).to_dict()
+        self.assertEqual(data['model'], 'omniforms.omnimodelform')
+        self.assertEqual(data['content_type'], 'tests.dummymodel')
+
+
+class IterFormDefinitionsTestCase(TestCase):
+    """
+    Tests the iter_form_definitions function
+    """
+    def setUp(self):
+        super(IterFormDefinitionsTestCase, self).setUp()
+        self.forms = OmniFormFactory.create_batch(5)
+        for form in self.forms:
+            OmniCharFieldFactory.create(form=form)
+            OmniEmailFieldFactory.create(form=form)
+
+    def test_definitions(self):
+        """
+        A definition should be yielded for every form, with its fields
+        """
+        definitions = list(iter_form_definitions(OmniForm.objects.all()))
+        self.assertEqual([definition.form for definition in definitions], self.forms)
+        for definition in definitions:
+            self.assertEqual(
+                [field.pk for field in definition.fields],
+                list(definition.form.fields.values_list('pk', flat=True))
+            )
+            self.assertIsInstance(definition.fields[1], OmniEmailField)
+
+    def test_batches(self):
+        """
+        Forms, fields and handlers should be loaded in batches
+        """
+        ContentType.objects.get_for_model(OmniForm)
+        # Per batch: the forms, the base fields, the char and email fields and the base handlers,
+        # plus a final query finding no more forms
+        with self.assertNumQueries(16):
+            self.assertEqual(len(list(iter_form_definitions(OmniForm.objects.all(), batch_size=2))), 5)
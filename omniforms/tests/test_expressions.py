@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms expressions module
+"""
+from __future__ import unicode_literals
+from django.test import SimpleTestCase, override_settings
+from mock import patch
+from omniforms.expressions import Expression, ExpressionError, compile_expression
+from decimal import Decimal
+import copy
+import datetime
+import timeit
+
+
+class ExpressionTestCase(SimpleTestCase):
+    """
+    Tests the Expression class
+    """
+    def evaluate(self, source, **values):
+        """
+        Helper method for compiling and evaluating an expression
+
+        :param source: The expression source
+        :param values: Values of the fields used by the expression
+        :return: The result
+        """
+        return Expression(source).evaluate(values)
+
+    def test_arithmetic(self):
+        """
+        Arithmetic should be calculated using decimals rather than floats
+        """
+        self.assertEqual(self.evaluate('price * quantity + 1.5', price=Decimal('2.25'), quantity=2), Decimal('6.00'))
+        self.assertEqual(self.evaluate('total / 4', total=10), Decimal('2.5'))
+        self.assertEqual(self.evaluate('weight + 0.1', weight=0.2), Decimal('0.3'))
+        self.assertEqual(self.evaluate('7 // 2 + 7 % 2 - -1'), 5)
+        self.assertEqual(self.evaluate('2 ** 10'), 1024)
+        self.assertEqual(self.evaluate('2 ** -1'), Decimal('0.5'))
+
+    def test_strings(self):
+        """
+        Strings can be joined, but not repeated
+        """
+        self.assertEqual(self.evaluate('first + " " + last', first='Joe', last='Bloggs'), 'Joe Bloggs')
+        self.assertIsNone(self.evaluate('name * 1000', name='x'))
+
+    def test_logic(self):
+        """
+        Comparisons, boolean operators and conditional expressions should be supported
+        """
+        self.assertEqual(self.evaluate('"adult" if age >= 18 else "child"', age=20), 'adult')
+        self.assertTrue(self.evaluate('1 < score <= 10', score=10))
+        self.assertFalse(self.evaluate('1 < score <= 10', score=11))
+        self.assertEqual(self.evaluate('(discount or 0) + 1', discount=None), 1)
+        self.assertTrue(self.evaluate('colour in ["red", "blue"] and not agree', colour='red', agree=False))
+        self.assertTrue(self.evaluate('colour not in ("red",)', colour='blue'))
+        self.assertIsNone(self.evaluate('None'))
+
+    def test_functions(self):
+        """
+        The whitelisted functions should be callable
+        """
+        self.assertEqual(self.evaluate('round(total, 2)', total=Decimal('1.005')), Decimal('1.01'))
+        self.assertEqual(self.evaluate('round(total)', total=2.5), 3)
+        self.assertEqual(self.evaluate('max(a, b) - min(a, b)', a=3, b=5), 2)
+        self.assertEqual(self.evaluate('sum(sizes) + len(sizes)', sizes=[1, 2]), 5)
+        self.assertEqual(self.evaluate('str(abs(int("-3")))'), '3')
+        self.assertEqual(
+            self.evaluate('days_between(start, end)', start=datetime.date(2020, 1, 1), end=datetime.date(2020, 3, 1)),
+            60
+        )
+
+    def test_age(self):
+        """
+        The age function should give the age in full years
+        """
+        date_of_birth = datetime.date(2000, 6, 15)
+        self.assertEqual(self.evaluate('age(dob, on)', dob=date_of_birth, on=datetime.date(2020, 6, 14)), 19)
+        self.assertEqual(self.evaluate('age(dob, on)', dob=date_of_birth, on=datetime.date(2020, 6, 15)), 20)
+        with patch('omniforms.expressions.today', return_value=datetime.date(2021, 1, 1)):
+            self.assertEqual(self.evaluate('age(dob)', dob=date_of_birth), 20)
+
+    @override_settings(USE_TZ=False)
+    def test_today(self):
+        """
+        The today function should give the current date
+        """
+        self.assertEqual(self.evaluate('today()'), datetime.date.today())
+
+    def test_evaluation_errors(self):
+        """
+        Expressions that cannot be evaluated for the values should give None
+        """
+        self.assertIsNone(self.evaluate('price * quantity', price=Decimal('1')))
+        self.assertIsNone(self.evaluate('total / count', total=1, count=0))
+        self.assertIsNone(self.evaluate('2 ** 1000'))
+        self.assertIsNone(self.evaluate('x ** 100', x=9 ** 100))
+        self.assertIsNone(self.evaluate('age(dob)', dob='yesterday'))
+
+    def test_size_limits(self):
+        """
+        Intermediate results too large to calculate quickly should be rejected, so the expression gives None
+        """
+        source = 'len(str(int({0})))'.format(' * '.join(['1e300 ** 100'] * 30))
+        self.assertEqual(len(source), 462)
+        start = timeit.default_timer()
+        self.assertIsNone(self.evaluate(source))
+        self.assertLess(timeit.default_timer() - start, 1)
+        self.assertIsNone(self.evaluate('x * x', x=2 ** 4000))
+        self.assertIsNone(self.evaluate('int(x)', x='9' * 2000))
+        self.assertIsNone(self.evaluate('str(x)', x=2 ** 5000))
+        self.assertIsNone(self.evaluate('x + 1', x=Decimal('1e1000')))
+        self.assertEqual(self.evaluate('len(str(int(1e300 * 1e300)))'), 601)
+
+    def test_not_allowed(self):
+        """
+        Syntax other than the restricted subset should be rejected when the expression is compiled
+        """
+        for source in (
+            '__import__("os")',
+            'name.upper()',
+            'values[0]',
+            'open("/etc/passwd")',
+            '(lambda: 1)()',
+            '[x for x in sizes]',
+            'round(total, places=2)',
+            'a if',
+            'x = 1',
+            '1 & 2',
+            '1 is 1',
+            'b"bytes"',
+            'x' * 1001,
+            ' + '.join(['x'] * 101),
+            '(((9 ** 100) ** 100) ** 100) ** 100 > 1',
+            'x ** 100 ** 100',
+            '2 ** -(2 ** 2)',
+        ):
+            self.assertRaises(ExpressionError, Expression, source)
+
+    def test_names(self):
+        """
+        The names of the fields used by the expression should be collected
+        """
+        expression = Expression('round(price * quantity, 2) if agree else None')
+        self.assertEqual(expression.names, {'price', 'quantity', 'agree'})
+
+    def test_deepcopy(self):
+        """
+        Compiled expressions should be shared by copies of form fields
+        """
+        expression = Expression('1 + 1')
+        self.assertIs(copy.deepcopy(expression), expression)
+
+    def test_compile_expression(self):
+        """
+        The compile_expression function should reuse compiled expressions
+        """
+        expression = compile_expression('price * 2')
+        self.assertIs(compile_expression('price * 2'), expression)
+        self.assertEqual(expression.evaluate({'price': 2}), 4)
+
+
+class ExpressionBenchmarkTestCase(SimpleTestCase):
+    """
+    Micro benchmark for evaluating compiled expressions, as calculated fields are evaluated for every submission
+    """
+    budget = 0.0001  # Seconds (100 microseconds) per evaluation
+    number = 1000
+
+    def assertEvaluationWithinBudget(self, source, values):
+        """
+        Asserts the best average time taken to evaluate the expression is within budget
+
+        :param source: The expression source
+        :param values: Dict of values
+        """
+        expression = compile_expression(source)
+        best = min(timeit.repeat(lambda: expression.evaluate(values), number=self.number, repeat=5)) / self.number
+        self.assertLess(best, self.budget, '{0} took {1:.1f} microseconds'.format(source, best * 1000000))
+
+    def test_total(self):
+        """
+        Evaluating a total should take microseconds
+        """
+        self.assertEvaluationWithinBudget(
+            'round(price * quantity * (1 + tax_rate) - (discount or 0), 2)',
+            {'price': Decimal('9.99'), 'quantity': 3, 'tax_rate': 0.2, 'discount': None}
+        )
+
+    def test_age(self):
+        """
+        Evaluating an age should take microseconds
+        """
+        self.assertEvaluationWithinBudget(
+            '"adult" if age(date_of_birth, on) >= 18 else "child"',
+            {'date_of_birth': datetime.date(2000, 6, 15), 'on': datetime.date(2020, 1, 1)}
+        )
@@ -5,13 +5,46 @@ Tests the omniforms admin forms
 from __future__ import unicode_literals
 from django import forms
 from django.core.exceptions import ImproperlyConfigured
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from django.utils.six import StringIO
 from mock import Mock, patch
-from omniforms.forms import OmniFormBaseForm, OmniModelFormBaseForm, EmailConfirmationHandlerBaseFormClass
-from omniforms.models import OmniFormEmailConfirmationHandler
-from omniforms.tests.factories import OmniFormFactory, OmniEmailFieldFactory
+from omniforms.conditions import Condition
+from omniforms.expressions import compile_expression
+from omniforms.forms import (
+    BoundedFileField,
+    BoundedImageField,
+    EmailConfirmationHandlerBaseFormClass,
+    HandlerLoader,
+    OmniFormBaseForm,
+    OmniModelFormBaseForm
+)
+from omniforms.models import (
+    OmniDecimalField,
+    OmniFormEmailConfirmationHandler,
+    OmniFileField,
+    OmniFormEmailHandler,
+    OmniFormStoredFile,
+    OmniImageField,
+    OmniIntegerField
+)
+from omniforms.storage import content_addressed_storage
+from omniforms.tests.factories import (
+    OmniBooleanFieldFactory,
+    OmniCalculatedFieldFactory,
+    OmniCharFieldFactory,
+    OmniEmailFieldFactory,
+    OmniFormEmailHandlerFactory,
+    OmniFormFactory,
+    OmniModelFormFactory
+)
 from omniforms.tests.models import DummyModel
+from omniforms.uploads import RejectedUpload
+from decimal import Decimal
+import shutil
+import tempfile
 
 
 class OmniFormBaseFormTestCase(TestCase):
@@ -20,8 +53,8 @@ class OmniFormBaseFormTestCase(TestCase):
     """
     def setUp(self):
         super(OmniFormBaseFormTestCase, self).setUp()
-        self.mock_1 = Mock(methods=['handle'])
-        self.mock_2 = Mock(methods=['handle'])
+        self.mock_1 = Mock(methods=['handle'], **{'get_condition.return_value': None})
+        self.mock_2 = Mock(methods=['handle'], **{'get_condition.return_value': None})
         self.form = OmniFormBaseForm({})
         self.form._handlers = [self.mock_1, self.mock_2]
 
@@ -49,6 +82,157 @@ class OmniFormBaseFormTestCase(TestCase):
         form.full_clean()
         form.handle()
 
+    def test_handle_batch_calls_handlers(self):
+        """
+        The forms handle_batch method should pass all of the forms to each handlers handle_batch method
+        """
+        other_form = OmniFormBaseForm({})
+        self.form.full_clean()
+        other_form.full_clean()
+        OmniFormBaseForm.handle_batch([self.form, other_form])
+        self.mock_1.handle_batch.assert_called_once_with([self.form, other_form])
+        self.mock_2.handle_batch.assert_called_once_with([self.form, other_form])
+
+    def test_form_handle_skips_handlers(self):
+        """
+        The forms handle method should only call handlers whose condition is met by the cleaned data
+        """
+        self.mock_2.get_condition.return_value = compile_expression('topic == "sales"')
+        self.form.full_clean()
+        self.form.cleaned_data['topic'] = 'support'
+        self.assertEqual(self.form.get_active_handlers(), [self.mock_1])
+        self.form.handle()
+        self.mock_1.handle.assert_called_once()
+        self.assertFalse(self.mock_2.handle.called)
+        self.form.cleaned_data['topic'] = 'sales'
+        self.assertEqual(self.form.get_active_handlers(), [self.mock_1, self.mock_2])
+
+    def test_handle_batch_passes_matching_forms(self):
+        """
+        The forms handle_batch method should pass each handler only the forms meeting its condition,
+        skipping handlers no form meets the condition of
+        """
+        self.mock_1.get_condition.return_value = compile_expression('topic == "sales"')
+        self.mock_2.get_condition.return_value = compile_expression('topic == "billing"')
+        other_form = OmniFormBaseForm({})
+        self.form.full_clean()
+        other_form.full_clean()
+        self.form.cleaned_data['topic'] = 'sales'
+        other_form.cleaned_data['topic'] = 'support'
+        OmniFormBaseForm.handle_batch([self.form, other_form])
+        self.mock_1.handle_batch.assert_called_once_with([self.form])
+        self.assertFalse(self.mock_2.handle_batch.called)
+
+    def test_handle_batch_raises_exception(self):
+        """
+        The forms handle_batch method should raise an improperly configured exception if any form is not bound
+        """
+        self.assertRaises(ImproperlyConfigured, OmniFormBaseForm.handle_batch, [self.form, OmniFormBaseForm()])
+        self.assertFalse(self.mock_1.handle_batch.called)
+
+    def test_handle_batch_no_forms(self):
+        """
+        The forms handle_batch method should do nothing if there are no forms
+        """
+        OmniFormBaseForm.handle_batch([])
+
+
+class HandlerLoaderTestCase(TestCase):
+    """
+    Tests the HandlerLoader
+    """
+    def setUp(self):
+        super(HandlerLoaderTestCase, self).setUp()
+        self.omni_form = OmniFormFactory.create()
+        self.handler_1 = OmniFormEmailHandlerFactory.create(form=self.omni_form, order=1)
+        self.handler_2 = OmniFormEmailHandlerFactory.create(form=self.omni_form, order=0)
+
+    def test_does_not_query_on_construction(self):
+        """
+        Constructing the loader should not query the database
+        """
+        with self.assertNumQueries(0):
+            loader = HandlerLoader(self.omni_form.handlers.all())
+        self.assertFalse(loader.loaded)
+
+    def test_load(self):
+        """
+        The load method should return the most specific version of each handler in order
+        """
+        loader = HandlerLoader(self.omni_form.handlers.all())
+        handlers = loader.load()
+        self.assertTrue(loader.loaded)
+        self.assertEqual(handlers, [self.handler_2, self.handler_1])
+        for handler in handlers:
+            self.assertIsInstance(handler, OmniFormEmailHandler)
+
+    def test_load_cached(self):
+        """
+        The handlers should only be loaded once
+        """
+        loader = HandlerLoader(self.omni_form.handlers.all())
+        handlers = loader.load()
+        with self.assertNumQueries(0):
+            self.assertIs(loader.load(), handlers)
+
+    def test_get_conditions(self):
+        """
+        The get_conditions method should compile the condition of each handler in order, loading only the base
+        handler rows, once
+        """
+        self.handler_1.condition = 'topic == "sales"'
+        self.handler_1.save()
+        loader = HandlerLoader(self.omni_form.handlers.all())
+        with self.assertNumQueries(1):
+            conditions = loader.get_conditions()
+        self.assertEqual(conditions, [
+            (self.handler_2.pk, None),
+            (self.handler_1.pk, compile_expression('topic == "sales"'))
+        ])
+        with self.assertNumQueries(0):
+            self.assertIs(loader.get_conditions(), conditions)
+        self.assertFalse(loader.loaded)
+
+    def test_load_specific(self):
+        """
+        The load_specific method should only load the given handlers, once
+        """
+        loader = HandlerLoader(self.omni_form.handlers.all())
+        loader.get_conditions()
+        with self.assertNumQueries(1):
+            handlers = loader.load_specific([self.handler_1.pk])
+        self.assertEqual(handlers, {self.handler_1.pk: self.handler_1})
+        self.assertIsInstance(handlers[self.handler_1.pk], OmniFormEmailHandler)
+        with self.assertNumQueries(0):
+            self.assertEqual(loader.load_specific([]), {})
+            self.assertIs(loader.load_specific([self.handler_1.pk])[self.handler_1.pk], handlers[self.handler_1.pk])
+
+    def test_skipped_handlers_not_loaded(self):
+        """
+        Handlers whose condition is not met should not be loaded by the form
+        """
+        self.handler_1.condition = 'topic == "sales"'
+        self.handler_1.save()
+        self.handler_2.condition = 'topic == "support"'
+        self.handler_2.save()
+        form = OmniFormBaseForm({})
+        form._handlers = HandlerLoader(self.omni_form.handlers.all())
+        form.full_clean()
+        form.cleaned_data['topic'] = 'billing'
+        with self.assertNumQueries(1):
+            self.assertEqual(form.get_active_handlers(), [])
+        form.cleaned_data['topic'] = 'sales'
+        with self.assertNumQueries(1):
+            self.assertEqual(form.get_active_handlers(), [self.handler_1])
+
+    def test_form_get_handlers_uses_loader(self):
+        """
+        The forms get_handlers method should load handlers through the loader
+        """
+        form = OmniFormBaseForm({})
+        form._handlers = HandlerLoader(self.omni_form.handlers.all())
+        self.assertEqual(form.get_handlers(), [self.handler_2, self.handler_1])
+
 
 class OmniModelFormBaseFormTestCase(TestCase):
     """
@@ -88,6 +272,448 @@ class OmniModelFormBaseFormTestCase(TestCase):
         patched_method.assert_called_once()
 
 
+class FormStepsTestCase(TestCase):
+    """
+    Tests the step methods of the OmniFormBaseForm and OmniModelFormBaseForm
+    """
+    def setUp(self):
+        super(FormStepsTestCase, self).setUp()
+        self.omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.omni_form, name='name', label='Name', order=0)
+        OmniEmailFieldFactory.create(form=self.omni_form, name='email', label='Email', order=1, required=True)
+        OmniCharFieldFactory.create(form=self.omni_form, name='address', label='Address', order=2, page_break=True)
+        OmniBooleanFieldFactory.create(form=self.omni_form, name='agree', label='Agree', order=3, page_break=True)
+        self.form_class = self.omni_form.get_form_class()
+
+    def test_get_steps(self):
+        """
+        The get_steps method should split the fields at each page break
+        """
+        self.assertEqual(self.form_class.get_steps(), [['name', 'email'], ['address'], ['agree']])
+
+    def test_get_steps_no_page_breaks(self):
+        """
+        Forms without page breaks should have a single step
+        """
+        omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='name', label='Name', page_break=True)
+        self.assertEqual(omni_form.get_form_class().get_steps(), [['name']])
+
+    def test_get_step_form_class(self):
+        """
+        The get_step_form_class method should return a form class holding only the fields of the step
+        """
+        step_form_class = self.form_class.get_step_form_class(0)
+        self.assertTrue(issubclass(step_form_class, self.form_class))
+        self.assertEqual(list(step_form_class.base_fields.keys()), ['name', 'email'])
+        self.assertEqual(list(step_form_class().fields.keys()), ['name', 'email'])
+        self.assertEqual(list(self.form_class.get_step_form_class(2)().fields.keys()), ['agree'])
+        self.assertEqual(len(self.form_class.base_fields), 4)
+        self.assertRaises(IndexError, self.form_class.get_step_form_class, 3)
+
+    def test_get_step_form_class_validates_step(self):
+        """
+        Step forms should only validate the fields of the step
+        """
+        step_form = self.form_class.get_step_form_class(1)({'address': 'Somewhere'})
+        self.assertTrue(step_form.is_valid())
+        self.assertEqual(step_form.cleaned_data, {'address': 'Somewhere'})
+        self.assertFalse(self.form_class.get_step_form_class(0)({'name': 'Joe'}).is_valid())
+
+    def test_get_step_form_class_cached(self):
+        """
+        Step form classes should be generated once per form class
+        """
+        step_form_class = self.form_class.get_step_form_class(1)
+        self.assertIs(self.form_class.get_step_form_class(1), step_form_class)
+        self.assertIsNot(self.omni_form.get_form_class().get_step_form_class(1), step_form_class)
+
+    def test_model_form(self):
+        """
+        Step form classes for model forms should reuse the fields of the form without querying the database
+        """
+        omni_form = OmniModelFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='title', label='Title', order=0)
+        OmniCharFieldFactory.create(form=omni_form, name='slug', label='Slug', order=1, page_break=True)
+        form_class = omni_form.get_form_class()
+        with self.assertNumQueries(0):
+            step_form_class = form_class.get_step_form_class(1)
+        self.assertIs(step_form_class.base_fields['slug'], form_class.base_fields['slug'])
+        self.assertEqual(list(step_form_class.base_fields.keys()), ['slug'])
+        step_form = step_form_class({'slug': 'dummy'})
+        self.assertTrue(step_form.is_valid(), step_form.errors)
+
+
+class FormConditionsTestCase(TestCase):
+    """
+    Tests the condition methods of the OmniFormBaseForm and OmniModelFormBaseForm
+    """
+    def setUp(self):
+        super(FormConditionsTestCase, self).setUp()
+        self.omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.omni_form, name='contact', label='Contact', order=0, required=True)
+        OmniCharFieldFactory.create(
+            form=self.omni_form,
+            name='phone',
+            label='Phone',
+            order=1,
+            condition_field='contact',
+            condition_operator='equals',
+            condition_value='phone',
+            condition_action='require'
+        )
+        OmniBooleanFieldFactory.create(
+            form=self.omni_form,
+            name='newsletter',
+            label='Newsletter',
+            order=2,
+            page_break=True
+        )
+        OmniEmailFieldFactory.create(
+            form=self.omni_form,
+            name='email',
+            label='Email',
+            order=3,
+            required=True,
+            condition_field='newsletter',
+            condition_operator='is_set'
+        )
+        self.form_class = self.omni_form.get_form_class()
+
+    def test_get_condition_graph(self):
+        """
+        The conditions should be compiled once per form class
+        """
+        graph = self.form_class.get_condition_graph()
+        self.assertEqual(graph.order, ['email', 'phone'])
+        self.assertIs(self.form_class.get_condition_graph(), graph)
+        self.assertIs(self.form_class.get_step_form_class(1).get_condition_graph(), graph)
+
+    def test_get_condition_graph_cycle(self):
+        """
+        Conditions depending on each other in a cycle should raise ImproperlyConfigured
+        """
+        self.form_class.base_fields['newsletter'].condition = Condition('email', 'is_set')
+        self.form_class._condition_graph = None
+        self.assertRaises(ImproperlyConfigured, self.form_class.get_condition_graph)
+
+    def test_hidden_fields_skip_validation(self):
+        """
+        Fields hidden by their condition should not be validated or cleaned
+        """
+        form = self.form_class({'contact': 'post', 'email': 'not an email'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.conditionally_hidden, {'email'})
+        self.assertNotIn('email', form.cleaned_data)
+        self.assertEqual(list(form.fields.keys()), ['contact', 'phone', 'newsletter', 'email'])
+
+    def test_shown_fields_validated(self):
+        """
+        Fields shown by their condition should be validated as usual
+        """
+        form = self.form_class({'contact': 'post', 'newsletter': 'on'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors.keys()), ['email'])
+        self.assertEqual(form.conditionally_hidden, set())
+
+    def test_required_by_condition(self):
+        """
+        Fields required by their condition should only be required when the condition is met
+        """
+        form = self.form_class({'contact': 'phone'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors.keys()), ['phone'])
+        self.assertFalse(self.form_class.base_fields['phone'].required)
+        self.assertTrue(self.form_class({'contact': 'email'}).is_valid())
+
+    def test_step_form(self):
+        """
+        Step forms should evaluate conditions depending on fields of other steps using the submitted data
+        """
+        step_form_class = self.form_class.get_step_form_class(1)
+        self.assertTrue(step_form_class({'newsletter': ''}).is_valid())
+        self.assertFalse(step_form_class({'newsletter': 'on'}).is_valid())
+
+    def test_no_conditions(self):
+        """
+        Forms without conditions should be cleaned as usual
+        """
+        omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='name', label='Name', required=True)
+        form = omni_form.get_form_class()({'name': 'Joe'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.conditionally_hidden, set())
+
+    def test_model_form(self):
+        """
+        Hidden fields of model forms should be excluded from model validation
+        """
+        omni_form = OmniModelFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='title', label='Title', order=0, required=True)
+        OmniCharFieldFactory.create(
+            form=omni_form,
+            name='slug',
+            label='Slug',
+            order=1,
+            required=True,
+            condition_field='title',
+            condition_operator='not_equals',
+            condition_value='draft'
+        )
+        form_class = omni_form.get_form_class()
+        form = form_class({'title': 'draft'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIn('slug', form._get_validation_exclusions())
+        self.assertFalse(form_class({'title': 'final'}).is_valid())
+
+
+class CalculatedFieldsTestCase(TestCase):
+    """
+    Tests the calculation of calculated fields by the OmniFormBaseForm
+    """
+    def setUp(self):
+        super(CalculatedFieldsTestCase, self).setUp()
+        self.omni_form = OmniFormFactory.create()
+        OmniDecimalField.objects.create(
+            form=self.omni_form,
+            name='price',
+            label='Price',
+            widget_class='django.forms.widgets.NumberInput',
+            required=True,
+            max_digits=6,
+            decimal_places=2,
+            order=0
+        )
+        OmniIntegerField.objects.create(
+            form=self.omni_form,
+            name='quantity',
+            label='Quantity',
+            widget_class='django.forms.widgets.NumberInput',
+            order=1
+        )
+        OmniCalculatedFieldFactory.create(form=self.omni_form, name='total', expression='price * quantity', order=2)
+        OmniCalculatedFieldFactory.create(
+            form=self.omni_form,
+            name='summary',
+            expression='str(total) + " GBP"',
+            order=3
+        )
+        self.form_class = self.omni_form.get_form_class()
+
+    def test_calculated_after_clean(self):
+        """
+        Calculated values should be set in the cleaned data once the form has been cleaned
+        """
+        form = self.form_class({'price': '2.50', 'quantity': '3', 'total': '1000'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['total'], Decimal('7.50'))
+        self.assertEqual(form.cleaned_data['summary'], '7.50 GBP')
+
+    def test_clean_method(self):
+        """
+        Calculations should use the values given by the form clean method
+        """
+        def clean(form):
+            form.cleaned_data['quantity'] = 10
+            return form.cleaned_data
+
+        with patch.object(self.form_class, 'clean', clean):
+            form = self.form_class({'price': '1', 'quantity': '3'})
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['total'], 10)
+
+    def test_missing_values(self):
+        """
+        Calculations using missing or invalid values should give None
+        """
+        form = self.form_class({'price': '1'})
+        self.assertTrue(form.is_valid())
+        self.assertIsNone(form.cleaned_data['total'])
+        self.assertEqual(form.cleaned_data['summary'], 'None GBP')
+        form = self.form_class({'price': 'invalid', 'quantity': '2'})
+        self.assertFalse(form.is_valid())
+        self.assertIsNone(form.cleaned_data['total'])
+
+    def test_handlers(self):
+        """
+        Handlers should receive the calculated values
+        """
+        handler = Mock()
+        form = self.form_class({'price': '2', 'quantity': '2'})
+        form._handlers = [handler]
+        self.assertTrue(form.is_valid())
+        form.handle()
+        self.assertEqual(handler.handle.call_args[0][0].cleaned_data['total'], 4)
+
+    def test_model_form(self):
+        """
+        Calculated values of model forms should be set on the instance
+        """
+        omni_form = OmniModelFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='title', label='Title', order=0, required=True)
+        OmniCalculatedFieldFactory.create(form=omni_form, name='slug', expression='title + "-slug"', order=1)
+        form = omni_form.get_form_class()({'title': 'dummy'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.instance.slug, 'dummy-slug')
+
+
+class UploadSizeTestCase(TestCase):
+    """
+    Tests the maximum upload size of file and image fields
+    """
+    def test_file_too_large(self):
+        """
+        Files larger than the maximum upload size should be rejected
+        """
+        field = BoundedFileField(max_upload_size=4)
+        self.assertEqual(field.clean(SimpleUploadedFile('a.txt', b'1234')).name, 'a.txt')
+        with self.assertRaises(forms.ValidationError) as context:
+            field.clean(SimpleUploadedFile('a.txt', b'12345'))
+        self.assertEqual(context.exception.messages, ['Ensure this file is no larger than 4\xa0bytes.'])
+
+    def test_no_limit(self):
+        """
+        Files of any size should be accepted if there is no maximum upload size
+        """
+        self.assertEqual(BoundedFileField().clean(SimpleUploadedFile('a.txt', b'1' * 1024)).size, 1024)
+
+    def test_rejected_upload(self):
+        """
+        Images cut off part way through the upload should be rejected without being read
+        """
+        field = BoundedImageField(max_upload_size=1024)
+        with patch.object(forms.ImageField, 'to_python') as to_python:
+            with self.assertRaises(forms.ValidationError) as context:
+                field.clean(RejectedUpload('photo.gif', 'image/gif', 2048))
+        self.assertEqual(context.exception.code, 'max_upload_size')
+        self.assertFalse(to_python.called)
+
+    def test_get_upload_limits(self):
+        """
+        The get_upload_limits method should give the maximum upload size of each file field
+        """
+        omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='name', label='Name', order=0)
+        OmniFileField.objects.create(
+            form=omni_form,
+            name='cv',
+            label='CV',
+            widget_class='django.forms.widgets.FileInput',
+            max_upload_size=1024,
+            order=1
+        )
+        OmniImageField.objects.create(
+            form=omni_form,
+            name='photo',
+            label='Photo',
+            widget_class='django.forms.widgets.FileInput',
+            order=2
+        )
+        self.assertEqual(omni_form.get_form_class().get_upload_limits(), {'cv': 1024, 'photo': None})
+
+
+class StoreUploadsTestCase(TestCase):
+    """
+    Tests the storing of uploads in the content addressed storage by the OmniFormBaseForm
+    """
+    def setUp(self):
+        super(StoreUploadsTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            OMNI_FORMS_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+            MEDIA_ROOT=self.directory
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.omni_form = OmniFormFactory.create()
+        for order, (name, deduplicate) in enumerate([('cv', True), ('photo', False)]):
+            OmniFileField.objects.create(
+                form=self.omni_form,
+                name=name,
+                label=name,
+                widget_class='django.forms.widgets.FileInput',
+                required=False,
+                deduplicate=deduplicate,
+                order=order
+            )
+        self.form_class = self.omni_form.get_form_class()
+
+    def get_form(self, **files):
+        """
+        Helper method for getting a valid form instance
+
+        :param files: Uploaded files keyed by field name
+        :return: Valid form instance
+        """
+        form = self.form_class({}, files)
+        self.assertTrue(form.is_valid(), form.errors)
+        form._handlers = [Mock()]
+        return form
+
+    def test_get_hashed_uploads(self):
+        """
+        Uploads for fields with deduplicate set should be hashed
+        """
+        self.assertEqual(self.form_class.get_hashed_uploads(), ['cv'])
+
+    def test_handle(self):
+        """
+        Uploads for fields with deduplicate set should be stored before the handlers run, ready to be read again
+        """
+        form = self.get_form(cv=SimpleUploadedFile('cv.pdf', b'cv'), photo=SimpleUploadedFile('photo.gif', b'gif'))
+        handler = form._handlers[0]
+        handler.handle.side_effect = lambda form: self.assertEqual(form.cleaned_data['cv'].read(), b'cv')
+        form.handle()
+        handler.handle.assert_called_once_with(form)
+        storage_name = form.cleaned_data['cv'].storage_name
+        self.assertTrue(content_addressed_storage.exists(storage_name))
+        self.assertFalse(hasattr(form.cleaned_data['photo'], 'storage_name'))
+        handler.handle.side_effect = None
+        form.handle()
+        self.assertEqual(OmniFormStoredFile.objects.get().references, 0)
+
+    def test_handle_references(self):
+        """
+        Submissions should only hold a reference while the handlers run, so handlers keeping the file take their own
+        """
+        form = self.get_form(cv=SimpleUploadedFile('cv.pdf', b'cv'))
+        handler = form._handlers[0]
+
+        def keep_file(form):
+            self.assertEqual(OmniFormStoredFile.objects.get().references, 1)
+            content_addressed_storage.save('kept.pdf', form.cleaned_data['cv'])
+
+        handler.handle.side_effect = keep_file
+        form.handle()
+        self.assertEqual(OmniFormStoredFile.objects.get().references, 1)
+
+    def test_handle_collectable(self):
+        """
+        Uploads no handler kept should be removed by the cleanup command
+        """
+        form = self.get_form(cv=SimpleUploadedFile('cv.pdf', b'cv'))
+        form.handle()
+        storage_name = form.cleaned_data['cv'].storage_name
+        call_command('omniforms_clean_stored_files', '--min-age', '0', stdout=StringIO())
+        self.assertFalse(content_addressed_storage.exists(storage_name))
+        self.assertFalse(OmniFormStoredFile.objects.exists())
+
+    def test_handle_batch(self):
+        """
+        Duplicate uploads in a batch should be stored once, and released once the handlers have run
+        """
+        forms = [self.get_form(cv=SimpleUploadedFile('cv{0}.pdf'.format(i), b'cv')) for i in range(3)]
+        handler = forms[0]._handlers[0]
+        handler.handle_batch.side_effect = lambda forms: self.assertEqual(
+            OmniFormStoredFile.objects.get().references, 3
+        )
+        self.form_class.handle_batch(forms)
+        handler.handle_batch.assert_called_once_with(forms)
+        self.assertEqual(len(set(form.cleaned_data['cv'].storage_name for form in forms)), 1)
+        self.assertEqual(OmniFormStoredFile.objects.get().references, 0)
+
+
 class EmailConfirmationHandlerBaseFormClassTestCase(TestCase):
     """
     Tests the EmailConfirmationHandlerBaseFormClass
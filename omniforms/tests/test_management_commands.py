@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms management commands
+"""
+from __future__ import unicode_literals
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+from mock import patch
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from omniforms.cache import definition_cache
+from omniforms.models import (
+    OmniForm,
+    OmniModelForm,
+    OmniField,
+    OmniCharField,
+    OmniFormEmailHandler,
+    OmniFormEmailDigestEntry,
+    OmniFormHandler,
+    OmniForeignKeyField,
+    OmniFormOutboxEmail,
+    OmniFormStoredFile
+)
+from omniforms.storage import content_addressed_storage
+from omniforms.tests.factories import (
+    OmniCharFieldFactory,
+    OmniEmailFieldFactory,
+    OmniFormFactory,
+    OmniFormEmailConfirmationHandlerFactory,
+    OmniFormEmailHandlerFactory,
+    OmniModelFormFactory
+)
+
+
+class SweepOrphansCommandTestCase(TestCase):
+    """
+    Tests the omniforms_sweep_orphans management command
+    """
+    def setUp(self):
+        super(SweepOrphansCommandTestCase, self).setUp()
+        self.form = OmniFormFactory.create()
+        self.model_form = OmniModelFormFactory.create()
+        self.field = OmniCharFieldFactory.create(form=self.form)
+        self.model_field = OmniCharFieldFactory.create(form=self.model_form)
+        self.handler = OmniFormEmailHandlerFactory.create(form=self.form)
+
+        form_ctype = ContentType.objects.get_for_model(OmniForm)
+        model_form_ctype = ContentType.objects.get_for_model(OmniModelForm)
+        for index in range(3):
+            OmniCharFieldFactory.create(content_type=form_ctype, object_id=0)
+        OmniCharFieldFactory.create(content_type=model_form_ctype, object_id=0)
+        orphaned_form = OmniFormFactory.create()
+        email_field = OmniEmailFieldFactory.create(form=orphaned_form)
+        OmniFormEmailConfirmationHandlerFactory.create(form=orphaned_form, recipient_field=email_field)
+        OmniForm.objects.filter(pk=orphaned_form.pk)._raw_delete(using='default')
+
+    def test_deletes_orphans(self):
+        """
+        The command should delete fields and handlers whose form does not exist
+        """
+        out = StringIO()
+        call_command('omniforms_sweep_orphans', batch_size=2, stdout=out)
+        self.assertEqual(
+            set(OmniField.objects.values_list('pk', flat=True)),
+            {self.field.pk, self.model_field.pk}
+        )
+        self.assertEqual(list(OmniFormHandler.objects.values_list('pk', flat=True)), [self.handler.pk])
+        self.assertEqual(OmniCharField.objects.count(), 2)
+        self.assertIn('OmniFormHandler: 1 orphaned instances deleted', out.getvalue())
+        self.assertIn('OmniField: 5 orphaned instances deleted', out.getvalue())
+
+    def test_dry_run(self):
+        """
+        The command should not delete anything when the dry run option is given
+        """
+        out = StringIO()
+        call_command('omniforms_sweep_orphans', dry_run=True, stdout=out)
+        self.assertEqual(OmniField.objects.count(), 7)
+        self.assertEqual(OmniFormHandler.objects.count(), 2)
+        self.assertIn('OmniField: 5 orphaned instances found', out.getvalue())
+
+
+class SendOutboxCommandTestCase(TestCase):
+    """
+    Tests the omniforms_send_outbox management command
+    """
+    def setUp(self):
+        super(SendOutboxCommandTestCase, self).setUp()
+        self.emails = [
+            self.create_email('Email {0}'.format(index), 'user{0}@example.com'.format(index))
+            for index in range(3)
+        ]
+        self.send_messages = EmailBackend.send_messages
+
+    def create_email(self, subject, recipient, **kwargs):
+        """
+        Helper method for writing an email to the outbox
+
+        :param subject: The email subject
+        :param recipient: The email recipient
+        :param kwargs: OmniFormOutboxEmail field values
+        :return: OmniFormOutboxEmail instance
+        """
+        message = EmailMessage(subject, 'Body', 'from@example.com', [recipient])
+        message.attach('data.txt', b'Attached', 'text/plain')
+        email = OmniFormOutboxEmail.from_message(message)
+        for name, value in kwargs.items():
+            setattr(email, name, value)
+        email.save()
+        return email
+
+    def call_command(self, *args):
+        """
+        Helper method for calling the command and capturing its output
+
+        :param args: Command line arguments
+        :return: stdout output
+        """
+        stdout = StringIO()
+        call_command('omniforms_send_outbox', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def fail_for(self, recipient):
+        """
+        Helper method for patching the locmem email backend to fail sending emails to a recipient
+
+        :param recipient: The recipient
+        :return: patch instance
+        """
+        send_messages = self.send_messages
+
+        def side_effect(backend, messages):
+            if recipient in messages[0].to:
+                raise IOError('Connection refused')
+            return send_messages(backend, messages)
+        return patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=side_effect)
+
+    def test_send(self):
+        """
+        The command should send every email that is due and mark it as sent
+        """
+        self.create_email('Later', 'later@example.com', send_after=timezone.now() + datetime.timedelta(hours=1))
+        stdout = self.call_command('--batch-size=2')
+        self.assertEqual([message.subject for message in mail.outbox], ['Email 0', 'Email 1', 'Email 2'])
+        self.assertEqual(mail.outbox[0].to, ['user0@example.com'])
+        self.assertEqual(mail.outbox[0].attachments, [('data.txt', 'Attached', 'text/plain')])
+        self.assertEqual(OmniFormOutboxEmail.objects.filter(status=OmniFormOutboxEmail.STATUS_SENT).count(), 3)
+        self.assertIsNotNone(OmniFormOutboxEmail.objects.get(pk=self.emails[0].pk).sent)
+        self.assertIn('3 emails sent, 0 failed and will be retried, 0 moved to dead letters', stdout)
+        self.call_command()
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_single_connection(self):
+        """
+        The emails should be sent over a single connection
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.filebased.EmailBackend',
+            EMAIL_FILE_PATH=directory
+        ):
+            self.call_command('--batch-size=2')
+        files = os.listdir(directory)
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(directory, files[0])) as stream:
+            content = stream.read()
+        for index in range(3):
+            self.assertIn('Subject: Email {0}'.format(index), content)
+
+    def test_retry(self):
+        """
+        Emails that fail to send should be retried later with exponential backoff
+        """
+        with self.fail_for('user1@example.com'):
+            stdout = self.call_command('--retry-delay=30')
+        self.assertIn('2 emails sent, 1 failed and will be retried', stdout)
+        email = OmniFormOutboxEmail.objects.get(pk=self.emails[1].pk)
+        self.assertEqual(email.status, OmniFormOutboxEmail.STATUS_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('Connection refused', email.last_error)
+        self.assertGreater(email.send_after, timezone.now() + datetime.timedelta(seconds=25))
+
+        OmniFormOutboxEmail.objects.filter(pk=email.pk).update(send_after=timezone.now(), attempts=2)
+        with self.fail_for('user1@example.com'):
+            self.call_command('--retry-delay=30')
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 3)
+        self.assertGreater(email.send_after, timezone.now() + datetime.timedelta(seconds=115))
+
+    def test_dead_letter(self):
+        """
+        Emails should be moved to the dead letter state once they have failed too many times, and may be requeued
+        """
+        OmniFormOutboxEmail.objects.filter(pk=self.emails[1].pk).update(attempts=4)
+        with self.fail_for('user1@example.com'):
+            stdout = self.call_command('--max-attempts=5')
+        self.assertIn('1 moved to dead letters', stdout)
+        self.assertEqual(OmniFormOutboxEmail.objects.get(pk=self.emails[1].pk).status, OmniFormOutboxEmail.STATUS_DEAD)
+
+        stdout = self.call_command('--requeue-dead')
+        self.assertIn('1 dead letter emails requeued', stdout)
+        self.assertIn('1 emails sent', stdout)
+        self.assertEqual(mail.outbox[-1].to, ['user1@example.com'])
+
+    def test_sent_per_email(self):
+        """
+        Emails should be marked as sent as soon as they have been sent, rather than when their batch is done
+        """
+        send_messages = self.send_messages
+
+        def side_effect(backend, messages):
+            if 'user1@example.com' in messages[0].to:
+                raise KeyboardInterrupt
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=side_effect):
+            self.assertRaises(KeyboardInterrupt, self.call_command)
+        self.assertEqual(OmniFormOutboxEmail.objects.get(pk=self.emails[0].pk).status, OmniFormOutboxEmail.STATUS_SENT)
+        self.assertEqual(list(OmniFormOutboxEmail.objects.due()), self.emails[1:])
+
+    def test_sent_elsewhere(self):
+        """
+        Emails sent by another sender since the batch was looked up should be skipped
+        """
+        send_messages = self.send_messages
+
+        def side_effect(backend, messages):
+            OmniFormOutboxEmail.objects.filter(pk=self.emails[1].pk).update(status=OmniFormOutboxEmail.STATUS_SENT)
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=side_effect):
+            stdout = self.call_command()
+        self.assertEqual([message.subject for message in mail.outbox], ['Email 0', 'Email 2'])
+        self.assertIn('2 emails sent', stdout)
+
+    def test_limit(self):
+        """
+        The command should send no more than the given number of emails
+        """
+        self.call_command('--limit=2', '--batch-size=1')
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(OmniFormOutboxEmail.objects.due().count(), 1)
+
+    @patch('omniforms.management.commands.omniforms_send_outbox.Command.sleep')
+    def test_rate(self, sleep):
+        """
+        The command should wait between emails to respect the rate limit
+        """
+        self.call_command('--rate=10')
+        self.assertEqual(sleep.call_count, 3)
+        for call in sleep.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= 0.1)
+
+
+class CleanStoredFilesCommandTestCase(TestCase):
+    """
+    Tests the omniforms_clean_stored_files management command
+    """
+    def setUp(self):
+        super(CleanStoredFilesCommandTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            OMNI_FORMS_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+            MEDIA_ROOT=self.directory
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.released = content_addressed_storage.save('a.pdf', ContentFile(b'released'))
+        self.referenced = content_addressed_storage.save('b.pdf', ContentFile(b'referenced'))
+        content_addressed_storage.delete(self.released)
+        OmniFormStoredFile.objects.update(modified=timezone.now() - datetime.timedelta(hours=25))
+
+    def call_command(self, *args):
+        """
+        Helper method for calling the command and capturing its output
+
+        :param args: Command line arguments
+        :return: stdout output
+        """
+        stdout = StringIO()
+        call_command('omniforms_clean_stored_files', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_clean(self):
+        """
+        Files without references should be removed along with their records
+        """
+        self.assertIn('1 stored files removed', self.call_command())
+        self.assertFalse(content_addressed_storage.exists(self.released))
+        self.assertTrue(content_addressed_storage.exists(self.referenced))
+        self.assertEqual(list(OmniFormStoredFile.objects.values_list('name', flat=True)), [self.referenced])
+
+    def test_min_age(self):
+        """
+        Files released more recently than the minimum age should be kept
+        """
+        self.assertIn('0 stored files removed', self.call_command('--min-age', '48'))
+        self.assertTrue(content_addressed_storage.exists(self.released))
+
+    def test_referenced_again(self):
+        """
+        Files referenced again should be kept, and files stored again once removed should be written again
+        """
+        content_addressed_storage.save('c.pdf', ContentFile(b'released'))
+        self.assertIn('0 stored files removed', self.call_command())
+        content_addressed_storage.delete(self.released)
+        self.assertIn('0 stored files removed', self.call_command())
+        self.assertIn('1 stored files removed', self.call_command('--min-age', '0'))
+        self.assertEqual(content_addressed_storage.save('d.pdf', ContentFile(b'released')), self.released)
+        self.assertTrue(content_addressed_storage.exists(self.released))
+
+
+class SendDigestsCommandTestCase(TestCase):
+    """
+    Tests the omniforms_send_digests management command
+    """
+    def setUp(self):
+        super(SendDigestsCommandTestCase, self).setUp()
+        self.hourly = OmniFormEmailHandlerFactory.create(subject='Hourly', digest_window=60)
+        self.daily = OmniFormEmailHandlerFactory.create(subject='Daily', digest_window=1440)
+        for handler in (self.hourly, self.daily):
+            for index in range(2):
+                OmniFormEmailDigestEntry.objects.create(
+                    handler=handler,
+                    body='Entry {0}'.format(index),
+                    created=timezone.now() - datetime.timedelta(minutes=90)
+                )
+
+    def call_command(self, *args):
+        """
+        Helper method for calling the command and capturing its output
+
+        :param args: Command line arguments
+        :return: stdout output
+        """
+        stdout = StringIO()
+        call_command('omniforms_send_digests', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_send_due(self):
+        """
+        The command should only send the digests whose window has passed
+        """
+        stdout = self.call_command()
+        self.assertIn('1 digests sent holding 2 submissions', stdout)
+        self.assertEqual([message.subject for message in mail.outbox], ['Hourly (2 submissions)'])
+        self.assertEqual(OmniFormEmailDigestEntry.objects.filter(handler=self.daily).count(), 2)
+
+    def test_send_all(self):
+        """
+        The command should send every digest when the all option is given
+        """
+        stdout = self.call_command('--all')
+        self.assertIn('2 digests sent holding 4 submissions', stdout)
+        self.assertEqual(OmniFormEmailDigestEntry.objects.count(), 0)
+
+    def test_digest_mode_disabled(self):
+        """
+        Submissions left over by handlers no longer in digest mode should be sent
+        """
+        OmniFormEmailHandler.objects.filter(pk=self.daily.pk).update(digest_window=None)
+        self.call_command()
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class WarmCommandTestCase(TestCase):
+    """
+    Tests the omniforms_warm management command
+    """
+    def setUp(self):
+        super(WarmCommandTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form)
+        self.form.refresh_from_db()
+
+    def call_command(self, *args):
+        """
+        Helper method for calling the command and capturing its output
+
+        :param args: Command line arguments
+        :return: Tuple of stdout and stderr output
+        """
+        stdout, stderr = StringIO(), StringIO()
+        call_command('omniforms_warm', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_warm(self):
+        """
+        The command should compile every form and store the current versions in the cache backend
+        """
+        stdout, stderr = self.call_command()
+        self.assertIn('OmniForm: 1 forms compiled', stdout)
+        self.assertIn('OmniModelForm: 0 forms compiled', stdout)
+        self.assertEqual(stderr, '')
+        key = 'omniforms:version:omniforms.omniform:{0}'.format(self.form.pk)
+        self.assertEqual(cache.get(key), self.form.version)
+
+    def test_warm_recent(self):
+        """
+        The command should pass the recent option through to the definition cache
+        """
+        with patch.object(definition_cache, 'warm', return_value=[]) as warm:
+            self.call_command('--recent=300')
+        warm.assert_called_once_with(recent=300)
+
+    def test_warm_failures(self):
+        """
+        The command should report forms that fail to compile
+        """
+        with patch.object(OmniForm, 'get_form_class', side_effect=ValueError('Broken')):
+            stdout, stderr = self.call_command()
+        self.assertIn('OmniForm: 0 forms compiled', stdout)
+        self.assertIn('OmniForm {0} failed to compile'.format(self.form.pk), stderr)
+
+
+class ExportImportCommandTestCase(TestCase):
+    """
+    Tests the omniforms_export and omniforms_import management commands
+    """
+    def setUp(self):
+        super(ExportImportCommandTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'forms.jsonl')
+        self.form = OmniFormFactory.create(title='Contact us')
+        self.email_field = OmniEmailFieldFactory.create(form=self.form, name='email', order=0)
+        OmniCharFieldFactory.create(form=self.form, name='name', order=1)
+        OmniFormEmailConfirmationHandlerFactory.create(form=self.form, recipient_field=self.email_field)
+        self.model_form = OmniModelFormFactory.create(title='Dummy')
+        OmniCharFieldFactory.create(form=self.model_form, name='title')
+
+    def export(self, *args):
+        """
+        Helper method for calling the export command and capturing its output
+
+        :param args: Command line arguments
+        :return: List of exported definition dicts
+        """
+        stdout = StringIO()
+        call_command('omniforms_export', *args, stdout=stdout)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def write(self, lines):
+        """
+        Helper method for writing lines to the import file
+
+        :param lines: List of lines
+        """
+        with open(self.path, 'w') as import_file:
+            import_file.write('\n'.join(lines))
+
+    def test_export(self):
+        """
+        The export command should write one definition per form to stdout
+        """
+        data = self.export()
+        self.assertEqual([definition['title'] for definition in data], ['Contact us', 'Dummy'])
+        self.assertEqual([field['name'] for field in data[0]['fields']], ['email', 'name'])
+        self.assertEqual(data[0]['handlers'][0]['recipient_field'], 'email')
+        self.assertEqual(data[1]['content_type'], 'tests.dummymodel')
+
+    def test_export_file(self):
+        """
+        The export command should write to the output file if given
+        """
+        stdout = StringIO()
+        call_command('omniforms_export', '--output={0}'.format(self.path), stdout=stdout)
+        self.assertIn('2 forms exported', stdout.getvalue())
+        with open(self.path) as export_file:
+            self.assertEqual(len(export_file.readlines()), 2)
+
+    def test_round_trip(self):
+        """
+        Imported forms should match the exported forms
+        """
+        OmniForeignKeyField.objects.create(
+            form=self.form,
+            name='permission',
+            label='Permission',
+            related_type=ContentType.objects.get_for_model(Permission),
+            widget_class=OmniForeignKeyField.FORM_WIDGETS[0],
+            order=2
+        )
+        call_command('omniforms_export', '--output={0}'.format(self.path), stdout=StringIO())
+        exported = self.export()
+        OmniForm.objects.all().bulk_delete()
+        OmniModelForm.objects.all().bulk_delete()
+
+        stdout = StringIO()
+        call_command('omniforms_import', self.path, '--batch-size=1', stdout=stdout)
+        self.assertIn('2 forms imported', stdout.getvalue())
+        self.assertEqual(OmniForm.objects.count(), 1)
+        self.assertEqual(OmniModelForm.objects.count(), 1)
+        self.assertEqual(self.export(), exported)
+        self.assertEqual(exported[0]['fields'][2]['related_type'], 'auth.permission')
+        form = OmniForm.objects.get()
+        self.assertEqual(list(form.get_form_class().base_fields.keys()), ['email', 'name', 'permission'])
+        self.assertEqual(form.get_form_class().base_fields['permission'].queryset.model, Permission)
+
+    def test_import_existing(self):
+        """
+        The import command should not import forms that already exist unless asked to update them
+        """
+        call_command('omniforms_export', '--output={0}'.format(self.path), stdout=StringIO())
+        with self.assertRaisesRegexp(CommandError, 'The forms \'Contact us\' already exist \(use --update'):
+            call_command('omniforms_import', self.path, stdout=StringIO())
+        self.assertEqual(OmniForm.objects.count(), 1)
+        self.assertEqual(OmniModelForm.objects.count(), 1)
+
+    def test_import_update(self):
+        """
+        The import command should update existing forms in place when asked to, replacing their fields and handlers
+        """
+        exported = self.export()
+        exported[0]['title'] = 'Get in touch'
+        exported[0]['fields'] = exported[0]['fields'][:1]
+        self.write([json.dumps(definition) for definition in exported])
+        version = self.form.version
+
+        stdout = StringIO()
+        call_command('omniforms_import', self.path, '--update', stdout=stdout)
+        self.assertIn('2 forms imported', stdout.getvalue())
+        self.assertEqual(OmniForm.objects.count(), 1)
+        self.assertEqual(OmniModelForm.objects.count(), 1)
+        form = OmniForm.objects.get()
+        self.assertEqual((form.pk, form.title), (self.form.pk, 'Get in touch'))
+        self.assertGreater(form.version, version)
+        self.assertEqual(list(form.fields.values_list('name', flat=True)), ['email'])
+        self.assertEqual(form.handlers.count(), 1)
+        self.assertEqual(self.export(), exported)
+
+    def test_import_invalid_json(self):
+        """
+        The import command should raise a CommandError naming the line that is not valid JSON
+        """
+        self.write([json.dumps({'title': 'Valid'}), '{'])
+        with self.assertRaisesRegexp(CommandError, 'Line 2 is not valid JSON'):
+            call_command('omniforms_import', self.path, stdout=StringIO())
+
+    def test_import_invalid_definition(self):
+        """
+        The import command should raise a CommandError naming the line that is not a valid definition,
+        before saving anything
+        """
+        self.write([json.dumps({'title': 'Valid'}), '', json.dumps({'title': ''})])
+        with self.assertRaisesRegexp(CommandError, 'Line 3 is not a valid form definition: form: '):
+            call_command('omniforms_import', self.path, stdout=StringIO())
+        self.assertFalse(OmniForm.objects.filter(title='Valid').exists())
+
+    def test_import_invalid_related_type(self):
+        """
+        The import command should report related types that are not model labels as invalid definitions
+        """
+        field = {
+            'type': 'omniforms.omniforeignkeyfield',
+            'name': 'permission',
+            'label': 'Permission',
+            'related_type': ContentType.objects.get_for_model(Permission).pk
+        }
+        self.write([json.dumps({'title': 'Invalid', 'fields': [field]})])
+        with self.assertRaisesRegexp(CommandError, 'Line 1 is not a valid form definition: fields\[0\]: '):
+            call_command('omniforms_import', self.path, stdout=StringIO())
+        self.assertFalse(OmniForm.objects.filter(title='Invalid').exists())
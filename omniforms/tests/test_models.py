@@ -8,20 +8,32 @@ from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.core.files import File
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.urlresolvers import reverse
-from django.db import models, IntegrityError
+from django.db import connection, models, transaction, IntegrityError
 from django.db.models.deletion import ProtectedError
-from django.test import TestCase, override_settings
+from django.template import Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.module_loading import import_string
 from mock import Mock, patch, PropertyMock
-from omniforms.forms import OmniFormBaseForm, OmniModelFormBaseForm, EmailConfirmationHandlerBaseFormClass
+from omniforms.conditions import ACTION_CHOICES, OPERATOR_CHOICES, Condition
+from omniforms.expressions import compile_expression
+from omniforms.forms import (
+    CalculatedField,
+    EmailConfirmationHandlerBaseFormClass,
+    OmniFormBaseForm,
+    OmniModelFormBaseForm
+)
 from omniforms.models import (
     OmniFormBase,
     OmniModelFormBase,
     OmniForm,
+    OmniModelForm,
     OmniField,
     OmniCharField,
     OmniBooleanField,
@@ -43,27 +55,43 @@ from omniforms.models import (
     OmniForeignKeyField,
     OmniMultipleChoiceField,
     OmniChoiceField,
+    OmniCalculatedField,
     OmniFormHandler,
     OmniFormEmailHandler,
     OmniFormEmailConfirmationHandler,
     OmniFormSaveInstanceHandler,
+    OmniFormWebhookHandler,
+    OmniFormOutboxEmail,
+    OmniFormEmailDigestEntry,
     TemplateHelpTextLazy
 )
 from omniforms.tests.factories import (
     DummyModelFactory,
+    OmniBooleanFieldFactory,
+    OmniCalculatedFieldFactory,
+    OmniCharFieldFactory,
     OmniFormFactory,
     OmniModelFormFactory,
     OmniEmailFieldFactory,
     OmniFormEmailConfirmationHandlerFactory,
-    OmniFormEmailHandlerFactory
+    OmniFormEmailHandlerFactory,
+    OmniFormWebhookHandlerFactory
 )
-from omniforms.tests.models import TaggableManagerField, DummyModel2
-from omniforms.tests.utils import OmniModelFormTestCaseStub
+from omniforms.tests.models import TaggableManagerField, DummyModel, DummyModel2
+from omniforms.tests.utils import OmniModelFormTestCaseStub, StandInServer
+from omniforms.webhooks import webhook_batcher, webhook_client
 from taggit_autosuggest.managers import TaggableManager
 from unittest import skipUnless
+from collections import OrderedDict
+from decimal import Decimal
 
+import datetime
 import django
+import hashlib
+import hmac
+import json
 import os
+import threading
 
 
 TEST_FILE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -208,6 +236,80 @@ class OmniFormTestCase(OmniModelFormTestCaseStub):
         self.assertTrue(fields['agree'].initial)
         self.assertTrue(fields['agree'].required)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the submissions the form accepts using the fragment of each field
+        """
+        form = OmniFormFactory.create(title='Contact')
+        name = OmniCharFieldFactory.create(form=form, name='name', label='Name', required=True, order=0)
+        email = OmniEmailFieldFactory.create(form=form, name='email', label='Email', required=False, order=1)
+        schema = form.get_json_schema()
+        self.assertEqual(schema['$schema'], 'http://json-schema.org/draft-07/schema#')
+        self.assertEqual(schema['title'], 'Contact')
+        self.assertEqual(schema['type'], 'object')
+        self.assertEqual(list(schema['properties'].keys()), ['name', 'email'])
+        self.assertEqual(schema['properties']['name'], name.get_json_schema())
+        self.assertEqual(schema['properties']['email'], email.get_optional_json_schema())
+        self.assertEqual(schema['required'], ['name'])
+
+    def test_get_json_schema_empty_values(self):
+        """
+        Fields the form does not require should accept empty values in the schema
+        """
+        form = OmniFormFactory.create()
+        OmniEmailFieldFactory.create(form=form, name='email', required=False, order=0)
+        OmniCharFieldFactory.create(form=form, name='phone', required=True, order=1, condition_field='email')
+        schema = form.get_json_schema()
+        self.assertNotIn('required', schema)
+        self.assertEqual(schema['properties']['email']['anyOf'][0]['format'], 'email')
+        self.assertEqual(schema['properties']['email']['anyOf'][1], {'enum': ['', None]})
+        self.assertEqual(schema['properties']['phone']['anyOf'][0]['minLength'], 1)
+        self.assertEqual(schema['properties']['phone']['anyOf'][1], {'enum': ['', None]})
+
+    def test_get_json_schema_conditions(self):
+        """
+        Fields only shown when their condition is met should not be listed as required
+        """
+        form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=form, name='contact', required=True, order=0)
+        OmniCharFieldFactory.create(
+            form=form,
+            name='phone',
+            required=True,
+            order=1,
+            condition_field='contact',
+            condition_operator='is_set'
+        )
+        OmniCharFieldFactory.create(
+            form=form,
+            name='email',
+            required=True,
+            order=2,
+            condition_field='contact',
+            condition_operator='is_set',
+            condition_action='require'
+        )
+        self.assertEqual(form.get_json_schema()['required'], ['contact', 'email'])
+
+    def test_get_condition_graph(self):
+        """
+        The get_condition_graph method should compile the conditions of the fields on the form
+        """
+        form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=form, name='contact', order=0)
+        OmniCharFieldFactory.create(
+            form=form,
+            name='phone',
+            order=1,
+            condition_field='contact',
+            condition_operator='is_set'
+        )
+        graph = form.get_condition_graph()
+        self.assertEqual(graph.order, ['phone'])
+        self.assertEqual(graph.to_list(), form.get_form_class().get_condition_graph().to_list())
+        OmniField.objects.filter(name='contact').update(condition_field='phone', condition_operator='is_set')
+        self.assertRaises(ImproperlyConfigured, form.get_condition_graph)
+
 
 class OmniModelFormTestCase(TestCase):
     """
@@ -354,6 +456,30 @@ class OmniModelFormTestCase(TestCase):
         self.assertEqual(patched_method.call_count, 2)
         patched_method.assert_any_call(form)
 
+    def test_get_form_class_does_not_load_handlers(self):
+        """
+        Generating and rendering an unbound form should not query the handlers
+        """
+        with CaptureQueriesContext(connection) as context:
+            form_class = self.omniform.get_form_class()
+            form_class().as_p()
+        self.assertFalse([query for query in context.captured_queries if 'omniformhandler' in query['sql']])
+
+    @patch('omniforms.models.OmniFormEmailHandler.handle')
+    def test_form_handlers_loaded_once_per_form_class(self, patched_method):
+        """
+        Handlers should be loaded when the form is first handled and shared by later form instances
+        """
+        form_class = self.omniform.get_form_class()
+        form = form_class({})
+        form.full_clean()
+        form.handle()
+        form = form_class({})
+        form.full_clean()
+        with self.assertNumQueries(0):
+            form.handle()
+        self.assertEqual(patched_method.call_count, 4)
+
     @patch('omniforms.models.OmniFormEmailHandler.handle')
     def test_form_save_calls_handlers(self, patched_method):
         """
@@ -793,6 +919,118 @@ class OmniFieldTestCase(TestCase):
             self.assertNotEqual(model_class, OmniField)
             self.assertFalse(model_class._meta.abstract)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the field using its label and help text
+        """
+        field = OmniCharField(label='Name', help_text='Your full name', required=False, min_length=0, max_length=None)
+        self.assertEqual(field.get_json_schema(), {'title': 'Name', 'description': 'Your full name', 'type': 'string'})
+
+    def test_get_json_schema_required(self):
+        """
+        The get_json_schema method should not accept empty values for required fields
+        """
+        field = OmniDateField(label='Date', required=True)
+        self.assertEqual(field.get_json_schema(), {'title': 'Date', 'type': 'string', 'minLength': 1})
+        field = OmniMultipleChoiceField(label='Sizes', required=True, choices='Small')
+        self.assertEqual(field.get_json_schema()['minItems'], 1)
+
+    def test_get_optional_json_schema(self):
+        """
+        The get_optional_json_schema method should accept the empty values submitted for the field as well
+        """
+        field = OmniCharField(label='Name', help_text='Your full name', required=False, min_length=3, max_length=None)
+        self.assertEqual(field.get_optional_json_schema(), {
+            'title': 'Name',
+            'description': 'Your full name',
+            'anyOf': [{'type': 'string', 'minLength': 3}, {'enum': ['', None]}]
+        })
+        field = OmniIntegerField(label='Age', required=False)
+        self.assertEqual(field.get_optional_json_schema()['anyOf'], [{'type': 'integer'}, {'enum': ['', None]}])
+        field = OmniDecimalField(label='Price', required=False, max_digits=None, decimal_places=None)
+        self.assertEqual(field.get_optional_json_schema()['anyOf'][1], {'enum': ['', None]})
+        field = OmniBooleanField(label='Agree', required=True)
+        self.assertEqual(field.get_optional_json_schema()['anyOf'][1], {'enum': ['', None, False]})
+        field = OmniMultipleChoiceField(label='Sizes', required=True, choices='Small')
+        self.assertEqual(field.get_optional_json_schema()['anyOf'][1], {'enum': ['', None, []]})
+
+    def test_condition_fields(self):
+        """
+        The model should have fields describing the condition of the field
+        """
+        field = OmniField._meta.get_field('condition_field')
+        self.assertIsInstance(field, models.CharField)
+        self.assertTrue(field.blank)
+        field = OmniField._meta.get_field('condition_operator')
+        self.assertEqual(list(field.choices), list(OPERATOR_CHOICES))
+        self.assertIsInstance(OmniField._meta.get_field('condition_value'), models.TextField)
+        field = OmniField._meta.get_field('condition_action')
+        self.assertEqual(list(field.choices), list(ACTION_CHOICES))
+        self.assertEqual(field.default, 'show')
+
+    def test_get_condition(self):
+        """
+        The get_condition method should return the condition of the field, if it has one
+        """
+        self.assertIsNone(OmniCharField(name='phone').get_condition())
+        condition = OmniCharField(
+            name='phone',
+            condition_field='contact',
+            condition_operator='equals',
+            condition_value='phone',
+            condition_action=''
+        ).get_condition()
+        self.assertIsInstance(condition, Condition)
+        self.assertEqual(condition.to_dict(), {
+            'depends_on': 'contact',
+            'operator': 'equals',
+            'value': 'phone',
+            'action': 'show'
+        })
+
+    def test_as_form_field_condition(self):
+        """
+        The condition of the field should be carried by the form field
+        """
+        field = OmniCharFieldFactory.create(
+            form=OmniFormFactory.create(),
+            condition_field='contact',
+            condition_operator='is_set'
+        )
+        self.assertEqual(field.as_form_field().condition.field_name, 'contact')
+        self.assertIsNone(OmniCharFieldFactory.create(form=field.form, name='other').as_form_field().condition)
+
+    def test_clean_condition(self):
+        """
+        The clean method should reject incomplete conditions and conditions depending on the field itself
+        """
+        field = OmniCharField(name='phone', condition_field='contact')
+        self.assertRaises(ValidationError, field.clean)
+        field.condition_field = 'phone'
+        field.condition_operator = 'is_set'
+        self.assertRaises(ValidationError, field.clean)
+        field.condition_field = 'contact'
+        field.clean()
+
+    def test_clean_condition_form(self):
+        """
+        The clean method should reject conditions depending on fields that are not part of the form,
+        or leaving the fields of the form depending on each other in a cycle
+        """
+        form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=form, name='contact', condition_field='phone', condition_operator='is_set')
+        field = OmniCharFieldFactory.create(form=form, name='phone')
+        field.condition_operator = 'is_set'
+        field.condition_field = 'other'
+        with self.assertRaisesMessage(ValidationError, 'which is not a field of the form'):
+            field.clean()
+        field.condition_field = 'contact'
+        with self.assertRaisesMessage(ValidationError, 'depend on each other'):
+            field.clean()
+        OmniCharFieldFactory.create(form=form, name='other')
+        field.condition_field = 'other'
+        field.clean()
+
 
 class OmniFieldInstanceTestCase(OmniModelFormTestCaseStub):
     """
@@ -931,6 +1169,18 @@ class OmniCharFieldTestCase(TestCase):
         self.assertEqual(field_instance.min_length, 10)
         self.assertEqual(field_instance.max_length, 150)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the min_length and max_length of the field
+        """
+        field = OmniCharField(label='Title', required=True, min_length=10, max_length=150)
+        self.assertEqual(
+            field.get_json_schema(),
+            {'title': 'Title', 'type': 'string', 'minLength': 10, 'maxLength': 150}
+        )
+        field = OmniCharField(label='Title', required=True, min_length=0, max_length=150)
+        self.assertEqual(field.get_json_schema()['minLength'], 1)
+
 
 class OmniUUIDFieldTestCase(TestCase):
     """
@@ -995,6 +1245,13 @@ class OmniBooleanFieldTestCase(TestCase):
         """
         self.assertIn('django.forms.widgets.CheckboxInput', OmniBooleanField.FORM_WIDGETS)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should require required fields to be checked
+        """
+        self.assertEqual(OmniBooleanField(label='Agree').get_json_schema(), {'title': 'Agree', 'type': 'boolean'})
+        self.assertEqual(OmniBooleanField(label='Agree', required=True).get_json_schema()['enum'], [True])
+
 
 class OmniEmailFieldTestCase(TestCase):
     """
@@ -1068,6 +1325,16 @@ class OmniEmailFieldTestCase(TestCase):
         self.assertEqual(field_instance.min_length, 10)
         self.assertEqual(field_instance.max_length, 150)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the format and length of the field
+        """
+        field = OmniEmailField(label='Email', min_length=5, max_length=100)
+        self.assertEqual(
+            field.get_json_schema(),
+            {'title': 'Email', 'type': 'string', 'format': 'email', 'minLength': 5, 'maxLength': 100}
+        )
+
 
 class OmniDateFieldTestCase(TestCase):
     """
@@ -1260,6 +1527,27 @@ class OmniDecimalFieldTestCase(TestCase):
         self.assertEqual(field_instance.max_digits, 999)
         self.assertEqual(field_instance.decimal_places, 3)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the range of values the field accepts
+        """
+        field = OmniDecimalField(
+            label='Price',
+            min_value=Decimal('0.5'),
+            max_value=Decimal('100'),
+            max_digits=5,
+            decimal_places=2
+        )
+        self.assertEqual(field.get_json_schema(), {
+            'title': 'Price',
+            'type': 'number',
+            'minimum': 0.5,
+            'maximum': 100,
+            'exclusiveMinimum': -1000,
+            'exclusiveMaximum': 1000
+        })
+        self.assertIsInstance(field.get_json_schema()['maximum'], int)
+
 
 class OmniFloatFieldTestCase(TestCase):
     """
@@ -1331,6 +1619,13 @@ class OmniFloatFieldTestCase(TestCase):
         self.assertEqual(field_instance.min_value, 10)
         self.assertEqual(field_instance.max_value, 999)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the min_value and max_value of the field
+        """
+        field = OmniFloatField(label='Weight', min_value=0.0, max_value=None)
+        self.assertEqual(field.get_json_schema(), {'title': 'Weight', 'type': 'number', 'minimum': 0.0})
+
 
 class OmniIntegerFieldTestCase(TestCase):
     """
@@ -1402,6 +1697,16 @@ class OmniIntegerFieldTestCase(TestCase):
         self.assertEqual(field_instance.min_value, 5)
         self.assertEqual(field_instance.max_value, 999)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the min_value and max_value of the field
+        """
+        field = OmniIntegerField(label='Age', min_value=18, max_value=120)
+        self.assertEqual(
+            field.get_json_schema(),
+            {'title': 'Age', 'type': 'integer', 'minimum': 18, 'maximum': 120}
+        )
+
 
 class OmniGenericIPAddressFieldTestCase(TestCase):
     """
@@ -1532,6 +1837,17 @@ class OmniGenericIPAddressFieldTestCase(TestCase):
         field.save()
         field.full_clean()
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the protocol of the field
+        """
+        field = OmniGenericIPAddressField(label='IP', protocol=OmniGenericIPAddressField.PROTOCOL_IPV4)
+        self.assertEqual(field.get_json_schema()['format'], 'ipv4')
+        field.protocol = OmniGenericIPAddressField.PROTOCOL_IPV6
+        self.assertEqual(field.get_json_schema()['format'], 'ipv6')
+        field.protocol = OmniGenericIPAddressField.PROTOCOL_BOTH
+        self.assertEqual(field.get_json_schema()['anyOf'], [{'format': 'ipv4'}, {'format': 'ipv6'}])
+
 
 class OmniTimeFieldTestCase(TestCase):
     """
@@ -1670,6 +1986,12 @@ class OmniSlugFieldTestCase(TestCase):
         self.assertIn('django.forms.widgets.TextInput', OmniSlugField.FORM_WIDGETS)
         self.assertIn('django.forms.widgets.HiddenInput', OmniSlugField.FORM_WIDGETS)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the characters the field accepts
+        """
+        self.assertEqual(OmniSlugField(label='Slug').get_json_schema()['pattern'], '^[-a-zA-Z0-9_]+$')
+
 
 class OmniFileFieldTestCase(TestCase):
     """
@@ -1708,7 +2030,7 @@ class OmniFileFieldTestCase(TestCase):
         """
         The model should define the correct field class
         """
-        self.assertEqual(OmniFileField.FIELD_CLASS, 'django.forms.FileField')
+        self.assertEqual(OmniFileField.FIELD_CLASS, 'omniforms.forms.BoundedFileField')
 
     def test_form_widgets(self):
         """
@@ -1735,6 +2057,44 @@ class OmniFileFieldTestCase(TestCase):
         field_instance = field.as_form_field()
         self.assertEqual(field_instance.max_length, 150)
         self.assertTrue(field_instance.allow_empty_file)
+        self.assertIsNone(field_instance.max_upload_size)
+
+    def test_max_upload_size(self):
+        """
+        The model should define an optional max_upload_size field passed to the form field
+        """
+        field = OmniFileField._meta.get_field('max_upload_size')
+        self.assertIsInstance(field, models.PositiveIntegerField)
+        self.assertTrue(field.blank)
+        self.assertTrue(field.null)
+        field = OmniFileField(
+            name='my_file',
+            label='Please upload a file',
+            widget_class='django.forms.widgets.FileInput',
+            max_upload_size=1024
+        )
+        self.assertEqual(field.as_form_field().max_upload_size, 1024)
+
+    def test_deduplicate(self):
+        """
+        The model should define a deduplicate field passed to the form field
+        """
+        field = OmniFileField._meta.get_field('deduplicate')
+        self.assertIsInstance(field, models.BooleanField)
+        self.assertFalse(field.default)
+        field = OmniFileField(
+            name='my_file',
+            label='Please upload a file',
+            widget_class='django.forms.widgets.FileInput',
+            deduplicate=True
+        )
+        self.assertTrue(field.as_form_field().deduplicate)
+
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should not describe the type of uploaded files
+        """
+        self.assertEqual(OmniFileField(label='Upload', required=True).get_json_schema(), {'title': 'Upload'})
 
 
 class OmniImageFieldTestCase(TestCase):
@@ -1757,7 +2117,7 @@ class OmniImageFieldTestCase(TestCase):
         """
         The model should define the correct field class
         """
-        self.assertEqual(OmniImageField.FIELD_CLASS, 'django.forms.ImageField')
+        self.assertEqual(OmniImageField.FIELD_CLASS, 'omniforms.forms.BoundedImageField')
 
     def test_form_widgets(self):
         """
@@ -1765,6 +2125,21 @@ class OmniImageFieldTestCase(TestCase):
         """
         self.assertIn('django.forms.widgets.FileInput', OmniImageField.FORM_WIDGETS)
 
+    def test_upload_options(self):
+        """
+        The max_upload_size and deduplicate options should be passed to the form field
+        """
+        field = OmniImageField(
+            name='photo',
+            label='Photo',
+            widget_class='django.forms.widgets.FileInput',
+            max_upload_size=2048,
+            deduplicate=True
+        )
+        form_field = field.as_form_field()
+        self.assertEqual(form_field.max_upload_size, 2048)
+        self.assertTrue(form_field.deduplicate)
+
 
 class OmniManyToManyFieldTestCase(OmniModelFormTestCaseStub):
     """
@@ -1832,6 +2207,19 @@ class OmniManyToManyFieldTestCase(OmniModelFormTestCaseStub):
         self.assertIsInstance(instance.widget, widget_class)
         self.assertEquals(list(instance.queryset), list(Permission.objects.all()))
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe a list of primary keys
+        """
+        self.assertEqual(self.field.get_json_schema(), {
+            'title': 'Test Field Label',
+            'description': 'Test help text',
+            'type': 'array',
+            'items': {'type': ['integer', 'string']},
+            'uniqueItems': True,
+            'minItems': 1
+        })
+
 
 class OmniForeignKeyFieldTestCase(OmniModelFormTestCaseStub):
     """
@@ -1957,6 +2345,13 @@ class OmniChoiceFieldTestCase(TestCase):
         self.assertIn(['bar', 'bar'], field.choices)
         self.assertIn(['baz', 'baz'], field.choices)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe the choices of the field
+        """
+        field = OmniChoiceField(label='Colour', choices='Red\n\n Green \n')
+        self.assertEqual(field.get_json_schema(), {'title': 'Colour', 'type': 'string', 'enum': ['Red', 'Green']})
+
 
 class OmniMultipleChoiceFieldTestCase(TestCase):
     """
@@ -2015,6 +2410,113 @@ class OmniMultipleChoiceFieldTestCase(TestCase):
         self.assertIn(['bar', 'bar'], field.choices)
         self.assertIn(['baz', 'baz'], field.choices)
 
+    def test_get_json_schema(self):
+        """
+        The get_json_schema method should describe a list of the choices of the field
+        """
+        field = OmniMultipleChoiceField(label='Sizes', choices='Small\nLarge')
+        self.assertEqual(field.get_json_schema(), {
+            'title': 'Sizes',
+            'type': 'array',
+            'uniqueItems': True,
+            'items': {'type': 'string', 'enum': ['Small', 'Large']}
+        })
+
+
+class OmniCalculatedFieldTestCase(TestCase):
+    """
+    Tests the OmniCalculatedField
+    """
+    def setUp(self):
+        super(OmniCalculatedFieldTestCase, self).setUp()
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='price', order=0)
+        self.field = OmniCalculatedFieldFactory.create(
+            form=self.form,
+            name='total',
+            label='Total',
+            expression='price * 2',
+            order=1
+        )
+
+    def test_subclasses_omni_field(self):
+        """
+        The model should subclass OmniField
+        """
+        self.assertTrue(issubclass(OmniCalculatedField, OmniField))
+
+    def test_expression(self):
+        """
+        The model should have an expression field
+        """
+        field = OmniCalculatedField._meta.get_field('expression')
+        self.assertIsInstance(field, models.TextField)
+        self.assertFalse(field.blank)
+
+    def test_field_class(self):
+        """
+        The model should define the correct field class
+        """
+        self.assertEqual(OmniCalculatedField.FIELD_CLASS, 'omniforms.forms.CalculatedField')
+
+    def test_form_widgets(self):
+        """
+        The model should define the correct form widgets
+        """
+        self.assertEqual(OmniCalculatedField.FORM_WIDGETS, ('django.forms.widgets.HiddenInput',))
+
+    def test_never_required(self):
+        """
+        Calculated fields should never be required
+        """
+        self.field.required = True
+        self.field.save()
+        self.assertFalse(self.field.required)
+        self.assertFalse(self.field.as_form_field().required)
+
+    def test_never_required_bulk_insert(self):
+        """
+        Calculated fields inserted without being saved should not be required either
+        """
+        field = OmniCalculatedField(
+            form=self.form,
+            name='other',
+            label='Other',
+            expression='1',
+            widget_class=OmniCalculatedField.FORM_WIDGETS[0],
+            required=True
+        )
+        OmniField.objects.bulk_insert([field])
+        self.assertFalse(OmniCalculatedField.objects.get(pk=field.pk).required)
+
+    def test_as_form_field(self):
+        """
+        The form field should hold the compiled expression
+        """
+        form_field = self.field.as_form_field()
+        self.assertIsInstance(form_field, CalculatedField)
+        self.assertIs(form_field.expression, compile_expression('price * 2'))
+        self.assertTrue(form_field.disabled)
+
+    def test_clean(self):
+        """
+        The clean method should reject invalid expressions and expressions using unknown fields
+        """
+        self.field.clean()
+        self.field.expression = 'price.real'
+        with self.assertRaisesMessage(ValidationError, 'Attribute is not allowed in expressions'):
+            self.field.clean()
+        self.field.expression = 'price * quantity + total'
+        with self.assertRaisesMessage(ValidationError, 'The form has no field named \'quantity\', \'total\''):
+            self.field.clean()
+
+    def test_get_json_schema(self):
+        """
+        Calculated fields should be described as read only, and never listed as required
+        """
+        self.assertEqual(self.field.get_json_schema(), {'title': 'Total', 'readOnly': True})
+        self.assertNotIn('required', self.form.get_json_schema())
+
 
 class OmniFormHandlerTestCase(TestCase):
     """
@@ -2073,6 +2575,57 @@ class OmniFormHandlerTestCase(TestCase):
         instance = OmniFormHandler(name='Test handler')
         self.assertEqual(instance.name, '{0}'.format(instance))
 
+    def test_get_help_texts(self):
+        """
+        The get_help_texts method should return an empty dict by default
+        """
+        self.assertEqual(OmniFormHandler().get_help_texts(), {})
+
+    def test_condition_field(self):
+        """
+        The model should have a condition field
+        """
+        field = OmniFormHandler._meta.get_field('condition')
+        self.assertIsInstance(field, models.TextField)
+        self.assertEqual(field.default, '')
+        self.assertTrue(field.blank)
+        self.assertFalse(field.null)
+
+    def test_get_condition(self):
+        """
+        The get_condition method should return the compiled condition, or None if the handler always runs
+        """
+        self.assertIsNone(OmniFormHandler().get_condition())
+        condition = OmniFormHandler(condition='topic == "sales"').get_condition()
+        self.assertIs(condition, compile_expression('topic == "sales"'))
+
+    def test_check_condition(self):
+        """
+        The check_condition method should reject invalid conditions and conditions using unknown fields
+        """
+        handler = OmniFormHandler(condition='topic ==')
+        self.assertRaises(ValidationError, handler.check_condition)
+        handler.condition = 'topic == "sales" and agree'
+        handler.check_condition()
+        handler.check_condition(['topic', 'agree'])
+        with self.assertRaises(ValidationError) as context:
+            handler.check_condition(['name'])
+        self.assertEqual(
+            context.exception.message_dict,
+            {'condition': ['The form has no field named \'agree\', \'topic\'']}
+        )
+
+    def test_clean_checks_condition(self):
+        """
+        The clean method should check the condition against the fields of the form
+        """
+        omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=omni_form, name='topic')
+        handler = OmniFormHandler(name='Handler', form=omni_form, condition='topic == "sales"')
+        handler.clean()
+        handler.condition = 'subject == "sales"'
+        self.assertRaises(ValidationError, handler.clean)
+
     def test_handle_raises_not_implemented_error(self):
         """
         The handle method should raise a NotImplementedError
@@ -2194,6 +2747,19 @@ class OmniFormHandlerInstanceTestCase(OmniModelFormTestCaseStub):
         """
         self.assertEqual(self.handler, self.handler.specific)
 
+    def test_queryset_specific(self):
+        """
+        The queryset specific method should return specific instances using one query per concrete type
+        """
+        other_handler = OmniFormSaveInstanceHandler.objects.create(name='Save', order=1, form=self.omni_form)
+        third_handler = OmniFormEmailHandlerFactory.create(form=self.omni_form, order=2)
+        with self.assertNumQueries(3):
+            handlers = self.omni_form.handlers.all().specific()
+        self.assertEqual(handlers, [self.handler, other_handler, third_handler])
+        self.assertIsInstance(handlers[0], OmniFormEmailHandler)
+        self.assertIsInstance(handlers[1], OmniFormSaveInstanceHandler)
+        self.assertIsInstance(handlers[2], OmniFormEmailHandler)
+
     def test_specific_cached(self):
         """
         The specific property should cache the result
@@ -2223,14 +2789,24 @@ class OmniFormEmailHandlerTestCase(TestCase):
 
     def test_template_help_text(self):
         """
-        The 'template' fields help text should be an instance of TemplateHelpTextLazy
+        The 'template' help text returned by get_help_texts should be an instance of TemplateHelpTextLazy
         """
         instance = OmniFormEmailHandler(
             template='Hello {{ user }}',
             recipients='a@example.com,b@example.com',
             subject='This is a test'
         )
-        self.assertIsInstance(instance._meta.get_field('template').help_text, TemplateHelpTextLazy)
+        help_text = instance.get_help_texts()['template']
+        self.assertIsInstance(help_text, TemplateHelpTextLazy)
+        self.assertEqual(help_text.instance, instance)
+
+    def test_instantiation_does_not_change_model_field(self):
+        """
+        Instantiating a handler should not change the help text of the shared model field
+        """
+        OmniFormEmailHandler(template='Hello {{ user }}')
+        field = OmniFormEmailHandler._meta.get_field('template')
+        self.assertEqual(field.help_text, 'Please enter the content of the email here.')
 
     def test_recipients_field(self):
         """
@@ -2310,6 +2886,293 @@ class OmniFormEmailHandlerTestCase(TestCase):
         patched_method.assert_any_call('test.pdf', 'Content', 'application/pdf')
         patched_method.assert_any_call('test.gif', 'Content', 'image/gif')
 
+    def test_handle_batch(self):
+        """
+        The handle_batch method should send an email for each form over a single connection
+        """
+        first_form = Mock(cleaned_data={'user': 'Bob'})
+        second_form = Mock(cleaned_data={'user': 'Jane'})
+        instance = OmniFormEmailHandler(
+            template='Hello {{ user }}',
+            recipients='a@example.com',
+            subject='This is a test'
+        )
+        with patch('omniforms.models.get_connection', wraps=get_connection) as patched_method:
+            instance.handle_batch([first_form, second_form])
+        patched_method.assert_called_once_with()
+        self.assertEqual([message.body for message in mail.outbox], ['Hello Bob', 'Hello Jane'])
+
+    @override_settings(OMNI_FORMS_EMAIL_OUTBOX=True, DEFAULT_FROM_EMAIL='administrator@example.com')
+    def test_handle_outbox(self):
+        """
+        The handle method should write the email to the outbox rather than send it if the outbox is enabled
+        """
+        instance = OmniFormEmailHandler(
+            template='Hello {{ user }}',
+            recipients='a@example.com,b@example.com',
+            subject='This is a test'
+        )
+        with self.assertNumQueries(1):
+            instance.handle(Mock(cleaned_data={'user': 'Bob'}))
+        self.assertEqual(mail.outbox, [])
+        email = OmniFormOutboxEmail.objects.get()
+        self.assertEqual(email.subject, 'This is a test')
+        self.assertEqual(email.body, 'Hello Bob')
+        self.assertEqual(email.from_email, 'administrator@example.com')
+        self.assertEqual(email.recipients, 'a@example.com\nb@example.com')
+        self.assertEqual(email.status, OmniFormOutboxEmail.STATUS_PENDING)
+
+    @override_settings(OMNI_FORMS_EMAIL_OUTBOX=True)
+    def test_handle_batch_outbox(self):
+        """
+        The handle_batch method should write the emails to the outbox in a single query if the outbox is enabled
+        """
+        instance = OmniFormEmailHandler(template='Hello {{ user }}', recipients='a@example.com', subject='Test')
+        with self.assertNumQueries(1):
+            instance.handle_batch([Mock(cleaned_data={'user': 'Bob'}), Mock(cleaned_data={'user': 'Jane'})])
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(list(OmniFormOutboxEmail.objects.values_list('body', flat=True)), ['Hello Bob', 'Hello Jane'])
+
+
+class OmniFormEmailHandlerDigestTestCase(TransactionTestCase):
+    """
+    Tests the digest mode of the OmniFormEmailHandler.  Digests are sent once submissions are committed,
+    so the tests run outside of a transaction
+    """
+    def setUp(self):
+        super(OmniFormEmailHandlerDigestTestCase, self).setUp()
+        self.handler = OmniFormEmailHandlerFactory.create(
+            subject='Enquiry',
+            template='Hello {{ user }}',
+            recipients='a@example.com, b@example.com',
+            digest_size=3
+        )
+
+    def handle(self, *users):
+        """
+        Helper method for handling a submission for each user
+
+        :param users: The submitted user names
+        """
+        for user in users:
+            self.handler.handle(Mock(cleaned_data={'user': user}))
+
+    def test_digest_mode(self):
+        """
+        Handlers should be in digest mode if they have a digest size or window and have been saved
+        """
+        self.assertTrue(self.handler.digest_mode)
+        self.assertFalse(OmniFormEmailHandler(digest_size=3).digest_mode)
+        self.assertFalse(OmniFormEmailHandler(pk=1).digest_mode)
+        self.assertTrue(OmniFormEmailHandler(pk=1, digest_window=60).digest_mode)
+
+    def test_digest_size(self):
+        """
+        Submissions should be accumulated until the digest size is reached, then sent in one email
+        """
+        self.handle('Bob', 'Jane')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(self.handler.digest_entries.count(), 2)
+        self.handle('Joe')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Enquiry (3 submissions)')
+        self.assertEqual(mail.outbox[0].to, ['a@example.com', 'b@example.com'])
+        self.assertEqual(
+            mail.outbox[0].body,
+            OmniFormEmailHandler.DIGEST_SEPARATOR.join(['Hello Bob', 'Hello Jane', 'Hello Joe'])
+        )
+        self.assertEqual(self.handler.digest_entries.count(), 0)
+
+    def test_digest_window(self):
+        """
+        Submissions should be sent once the oldest is older than the digest window
+        """
+        self.handler.digest_size = None
+        self.handler.digest_window = 60
+        self.handle('Bob')
+        self.assertEqual(mail.outbox, [])
+        self.handler.digest_entries.update(created=timezone.now() - datetime.timedelta(minutes=61))
+        self.handle('Jane')
+        self.assertEqual(mail.outbox[0].subject, 'Enquiry (2 submissions)')
+
+    def test_is_digest_due(self):
+        """
+        The is_digest_due method should check the count against the size and the oldest submission against the window
+        """
+        now = timezone.now()
+        handler = OmniFormEmailHandler(digest_size=10, digest_window=5)
+        self.assertFalse(handler.is_digest_due(0, None, now))
+        self.assertFalse(handler.is_digest_due(9, now - datetime.timedelta(minutes=4), now))
+        self.assertTrue(handler.is_digest_due(10, now, now))
+        self.assertTrue(handler.is_digest_due(1, now - datetime.timedelta(minutes=5), now))
+
+    def test_handle_batch(self):
+        """
+        The handle_batch method should add the submissions to the digest in a single query, leaving the digest
+        to be checked once the submissions are committed
+        """
+        self.handler.digest_size = 10
+        with transaction.atomic():
+            with self.assertNumQueries(1):
+                self.handler.handle_batch([Mock(cleaned_data={'user': 'Bob'}), Mock(cleaned_data={'user': 'Jane'})])
+        self.assertEqual(self.handler.digest_entries.count(), 2)
+        self.assertEqual(mail.outbox, [])
+
+    def test_digest_sent_on_commit(self):
+        """
+        Digests should only be sent once the submission that made them due has been committed
+        """
+        with transaction.atomic():
+            self.handle('Bob', 'Jane', 'Joe')
+            self.assertEqual(mail.outbox, [])
+        self.assertEqual(len(mail.outbox), 1)
+
+        try:
+            with transaction.atomic():
+                self.handle('Bob', 'Jane', 'Joe')
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.handler.digest_entries.count(), 0)
+
+    def test_pending_digest_failure(self):
+        """
+        Digests that cannot be sent once a submission has been committed should be logged and their submissions kept
+        """
+        self.handle('Bob', 'Jane')
+        with patch('omniforms.models.EmailMessage.send', side_effect=IOError('Connection refused')):
+            with patch('omniforms.models.logger') as patched_logger:
+                self.handle('Joe')
+        self.assertTrue(patched_logger.exception.called)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(self.handler.digest_entries.count(), 3)
+        self.assertEqual(self.handler.send_digest(), 3)
+
+    def test_bulk_delete(self):
+        """
+        Accumulated submissions should be removed when their handler is removed using a set based delete
+        """
+        self.handle('Bob', 'Jane')
+        other_handler = OmniFormEmailHandlerFactory.create(recipients='a@example.com', digest_size=3)
+        other_handler.handle(Mock(cleaned_data={'user': 'Joe'}))
+        deleted, deleted_counter = OmniFormHandler.objects.filter(pk=self.handler.pk).bulk_delete()
+        self.assertEqual(deleted_counter['omniforms.OmniFormEmailDigestEntry'], 2)
+        self.assertEqual(list(OmniFormEmailDigestEntry.objects.values_list('handler', flat=True)), [other_handler.pk])
+
+        OmniModelForm.objects.filter(pk=other_handler.object_id).bulk_delete()
+        self.assertFalse(OmniFormEmailDigestEntry.objects.exists())
+
+    def test_send_digest_failure(self):
+        """
+        Submissions should be kept if the digest cannot be sent
+        """
+        self.handle('Bob', 'Jane')
+        with patch('omniforms.models.EmailMessage.send', side_effect=IOError('Connection refused')):
+            self.assertRaises(IOError, self.handler.send_digest)
+        self.assertEqual(self.handler.digest_entries.count(), 2)
+        self.assertEqual(self.handler.send_digest(), 2)
+        self.assertEqual(self.handler.send_digest(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_digest_rechecked(self):
+        """
+        Digests found to be due before the handler was locked should only be sent if they are still due once it is
+        """
+        self.handle('Bob', 'Jane', 'Joe')
+        self.handle('Bob')
+        get_digest_stats = OmniFormEmailHandler.get_digest_stats
+        calls = []
+
+        def get_stale_digest_stats(handler, using=None):
+            # The first check sees the submissions already sent by another process
+            calls.append(using)
+            return {'count': 3, 'oldest': None} if len(calls) == 1 else get_digest_stats(handler, using)
+
+        with patch.object(OmniFormEmailHandler, 'get_digest_stats', get_stale_digest_stats):
+            self.assertEqual(self.handler.send_digest_if_due(), 0)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.handler.send_digest(if_due=True), 0)
+        self.assertEqual(self.handler.send_digest(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(OMNI_FORMS_EMAIL_OUTBOX=True)
+    def test_send_digest_outbox(self):
+        """
+        Digests should be written to the outbox if it is enabled
+        """
+        self.handle('Bob', 'Jane', 'Joe')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OmniFormOutboxEmail.objects.get().subject, 'Enquiry (3 submissions)')
+
+    def test_template_compiled_once(self):
+        """
+        The template should only be compiled once per handler instance
+        """
+        with patch('omniforms.models.Template', wraps=Template) as patched_class:
+            self.handle('Bob', 'Jane')
+        patched_class.assert_called_once_with('Hello {{ user }}')
+
+    def test_digest_not_loaded(self):
+        """
+        Digests should be built by streaming the rendered submissions rather than loading model instances
+        """
+        self.handle('Bob', 'Jane')
+        with patch.object(OmniFormEmailDigestEntry, '__init__', side_effect=AssertionError) as patched_method:
+            self.handler.send_digest()
+        self.assertFalse(patched_method.called)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class OmniFormOutboxEmailTestCase(TestCase):
+    """
+    Tests the OmniFormOutboxEmail model
+    """
+    def test_round_trip(self):
+        """
+        Messages should be rebuilt from the outbox with their recipients and attachments
+        """
+        message = EmailMessage('Subject', 'Body', 'from@example.com', ['a@example.com', 'b@example.com'])
+        message.attach('test.gif', b'GIF89a\x00\xff', 'image/gif')
+        message.attach('notes.txt', 'Notes', 'text/plain')
+        email = OmniFormOutboxEmail.from_message(message)
+        email.save()
+        connection = get_connection()
+        rebuilt = OmniFormOutboxEmail.objects.get(pk=email.pk).to_message(connection)
+        self.assertEqual(rebuilt.subject, 'Subject')
+        self.assertEqual(rebuilt.body, 'Body')
+        self.assertEqual(rebuilt.from_email, 'from@example.com')
+        self.assertEqual(rebuilt.to, ['a@example.com', 'b@example.com'])
+        self.assertEqual(rebuilt.attachments, [
+            ('test.gif', b'GIF89a\x00\xff', 'image/gif'),
+            ('notes.txt', 'Notes', 'text/plain')
+        ])
+        self.assertIs(rebuilt.connection, connection)
+        self.assertEqual('{0}'.format(email), 'Subject')
+
+    def test_due(self):
+        """
+        The due queryset method should return the pending emails whose next attempt is due, oldest first
+        """
+        first = OmniFormOutboxEmail.objects.create(subject='First', body='', from_email='', recipients='')
+        second = OmniFormOutboxEmail.objects.create(subject='Second', body='', from_email='', recipients='')
+        OmniFormOutboxEmail.objects.create(
+            subject='Later',
+            body='',
+            from_email='',
+            recipients='',
+            send_after=timezone.now() + datetime.timedelta(minutes=1)
+        )
+        OmniFormOutboxEmail.objects.create(
+            subject='Sent',
+            body='',
+            from_email='',
+            recipients='',
+            status=OmniFormOutboxEmail.STATUS_SENT
+        )
+        self.assertEqual(list(OmniFormOutboxEmail.objects.due()), [first, second])
+
 
 class EmailConfirmationHandlerTestCase(TestCase):
     """
@@ -2455,6 +3318,34 @@ class OmniFormSaveInstanceHandlerTestCase(OmniModelFormTestCaseStub):
             instance.handle(form)
             patched_method.assert_called_once()
 
+    def test_handle_batch(self):
+        """
+        The handle_batch method should insert new instances of models without many to many fields in bulk
+        """
+        omni_form = OmniModelFormFactory.create(content_type=ContentType.objects.get_for_model(DummyModel2))
+        OmniCharFieldFactory.create(form=omni_form, name='title', label='Title')
+        form_class = omni_form.get_form_class()
+        forms = [form_class({'title': 'First'}), form_class({'title': 'Second'})]
+        for form in forms:
+            form.full_clean()
+        with self.assertNumQueries(1):
+            OmniFormSaveInstanceHandler().handle_batch(forms)
+        self.assertEqual(list(DummyModel2.objects.order_by('pk').values_list('title', flat=True)), ['First', 'Second'])
+
+    def test_handle_batch_saves_individually(self):
+        """
+        The handle_batch method should save existing instances, and instances of models with many
+        to many fields, one at a time
+        """
+        form_class = self.omni_form.get_form_class()
+        forms = [form_class(instance=DummyModelFactory.create(), data={}), form_class(data={})]
+        with patch.object(OmniFormSaveInstanceHandler, 'handle') as handle:
+            with patch.object(DummyModel._default_manager, 'bulk_create') as bulk_create:
+                OmniFormSaveInstanceHandler().handle_batch(forms)
+                OmniFormSaveInstanceHandler().handle_batch(forms[1:])
+        self.assertEqual(handle.call_count, 3)
+        self.assertFalse(bulk_create.called)
+
     def test_cannot_be_attached_to_non_model_form(self):
         """
         It must not be possible to attach the Save Instance handler to non model forms
@@ -2504,3 +3395,354 @@ class OmniFormSaveInstanceHandlerTestCase(OmniModelFormTestCaseStub):
         get_required_field_names.return_value = ['foo', 'bar', 'baz']
         handler = OmniFormSaveInstanceHandler(name='Save instance', order=0, form=self.omni_form)
         handler.assert_has_all_required_fields()
+
+
+class OmniFormWebhookHandlerTestCase(TransactionTestCase):
+    """
+    Tests the OmniFormWebhookHandler class.  Submissions are posted once they are committed, so the tests
+    run outside of a transaction
+    """
+    def setUp(self):
+        super(OmniFormWebhookHandlerTestCase, self).setUp()
+        self.server = StandInServer()
+        self.omni_form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.omni_form, name='name')
+        self.handler = OmniFormWebhookHandlerFactory.create(
+            form=self.omni_form,
+            url='{0}/hook/'.format(self.server.url),
+            headers='Authorization: Token abc\n\nX-Source: omniforms',
+            secret='s3cret'
+        )
+        self.form_class = self.omni_form.get_form_class()
+
+    def tearDown(self):
+        super(OmniFormWebhookHandlerTestCase, self).tearDown()
+        webhook_client.pool.clear()
+        self.server.stop()
+
+    def get_form(self, name):
+        """
+        Helper method for getting a valid form instance
+
+        :param name: The submitted name
+        :return: Valid form instance
+        """
+        form = self.form_class({'name': name})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def test_fields(self):
+        """
+        The model should have fields for the URL, headers, timeout, secret, batching and retries
+        """
+        self.assertIsInstance(OmniFormWebhookHandler._meta.get_field('url'), models.URLField)
+        self.assertTrue(OmniFormWebhookHandler._meta.get_field('headers').blank)
+        self.assertEqual(OmniFormWebhookHandler._meta.get_field('timeout').default, 10)
+        self.assertTrue(OmniFormWebhookHandler._meta.get_field('secret').blank)
+        self.assertEqual(OmniFormWebhookHandler._meta.get_field('batch_size').default, 1)
+        self.assertEqual(OmniFormWebhookHandler._meta.get_field('batch_window').default, 0)
+        self.assertEqual(OmniFormWebhookHandler._meta.get_field('max_retries').default, 3)
+
+    def test_get_headers(self):
+        """
+        The get_headers method should parse one header per line
+        """
+        self.assertEqual(
+            self.handler.get_headers(),
+            OrderedDict([('Authorization', 'Token abc'), ('X-Source', 'omniforms')])
+        )
+        self.handler.headers = 'Authorization'
+        self.assertRaises(ValueError, self.handler.get_headers)
+
+    def test_clean(self):
+        """
+        The clean method should reject headers that cannot be parsed
+        """
+        self.handler.clean()
+        self.handler.headers = ': value'
+        with self.assertRaises(ValidationError) as context:
+            self.handler.clean()
+        self.assertIn('headers', context.exception.message_dict)
+
+    def test_get_payload(self):
+        """
+        The get_payload method should convert files and model instances to values that can be serialized
+        """
+        form = Mock(cleaned_data=OrderedDict([
+            ('name', 'Joe'),
+            ('cv', File(Mock(), name='cv.pdf')),
+            ('owner', DummyModel(pk=3)),
+            ('others', [DummyModel(pk=4), DummyModel(pk=5)])
+        ]))
+        self.assertEqual(self.handler.get_payload(form), {'name': 'Joe', 'cv': 'cv.pdf', 'owner': 3, 'others': [4, 5]})
+
+    def test_get_payload_stored_file(self):
+        """
+        Files stored in the content addressed storage should be given by storage name
+        """
+        cv = File(Mock(), name='cv.pdf')
+        cv.storage_name = 'omniforms/files/ab/cd/abcd.pdf'
+        form = Mock(cleaned_data=OrderedDict([('cv', cv)]))
+        self.assertEqual(self.handler.get_payload(form), {'cv': 'omniforms/files/ab/cd/abcd.pdf'})
+
+    def test_handle(self):
+        """
+        The handle method should post the submission as signed JSON
+        """
+        self.get_form('Joe').handle()
+        webhook_batcher.wait()
+        request = self.server.requests[0]
+        self.assertEqual(request['path'], '/hook/')
+        self.assertEqual(json.loads(request['body'].decode('utf-8')), {'submissions': [{'name': 'Joe'}]})
+        self.assertEqual(request['headers']['Content-Type'], 'application/json')
+        self.assertEqual(request['headers']['Authorization'], 'Token abc')
+        self.assertEqual(
+            request['headers']['X-Omniforms-Signature'],
+            'sha256={0}'.format(hmac.new(b's3cret', request['body'], hashlib.sha256).hexdigest())
+        )
+
+    def test_handle_unsigned(self):
+        """
+        Requests should not be signed if the handler has no secret
+        """
+        self.handler.secret = ''
+        self.handler.handle(self.get_form('Joe'))
+        webhook_batcher.wait()
+        self.assertNotIn('X-Omniforms-Signature', self.server.requests[0]['headers'])
+
+    @patch('omniforms.webhooks.WebhookClient.sleep')
+    def test_handle_retries(self, sleep):
+        """
+        Failed requests should be retried in the background, without holding up the submission
+        """
+        retrying = threading.Event()
+        retry = threading.Event()
+        sleep.side_effect = lambda seconds: retrying.set() or retry.wait(5)
+        self.server.statuses = [503]
+        self.handler.handle(self.get_form('Joe'))
+        self.assertTrue(retrying.wait(5))
+        self.assertEqual(len(self.server.requests), 1)
+        retry.set()
+        webhook_batcher.wait()
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_handle_on_commit(self):
+        """
+        Submissions should only be posted once they have been committed
+        """
+        with transaction.atomic():
+            self.handler.handle(self.get_form('Joe'))
+            webhook_batcher.wait()
+            self.assertEqual(self.server.requests, [])
+        webhook_batcher.wait()
+        self.assertEqual(len(self.server.requests), 1)
+
+        try:
+            with transaction.atomic():
+                self.handler.handle(self.get_form('Jane'))
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        webhook_batcher.wait()
+        self.assertEqual(len(self.server.requests), 1)
+
+    @patch('omniforms.models.webhook_batcher')
+    def test_handle_batch_window(self, batcher):
+        """
+        Submissions should be held back if the handler has a batch window
+        """
+        self.handler.batch_size = 10
+        self.handler.batch_window = 5
+        form = self.get_form('Joe')
+        self.handler.handle(form)
+        batcher.add.assert_called_once_with(self.handler, {'name': 'Joe'})
+        self.assertEqual(self.server.requests, [])
+
+    def test_handle_batch(self):
+        """
+        The handle_batch method should post up to batch_size submissions per request over one connection
+        """
+        self.handler.batch_size = 2
+        self.handler.handle_batch([self.get_form(name) for name in ('A', 'B', 'C')])
+        webhook_batcher.wait()
+        bodies = [json.loads(request['body'].decode('utf-8')) for request in self.server.requests]
+        self.assertEqual(bodies, [
+            {'submissions': [{'name': 'A'}, {'name': 'B'}]},
+            {'submissions': [{'name': 'C'}]}
+        ])
+        self.assertEqual(self.server.connections, 1)
+
+
+class OmniFormBulkDeleteTestCase(TestCase):
+    """
+    Tests the bulk_delete queryset methods
+    """
+    def setUp(self):
+        super(OmniFormBulkDeleteTestCase, self).setUp()
+        self.form = OmniFormFactory.create()
+        self.other_form = OmniFormFactory.create()
+        self.model_form = OmniModelFormFactory.create()
+        for form in (self.form, self.other_form):
+            OmniCharFieldFactory.create(form=form)
+            OmniBooleanFieldFactory.create(form=form)
+            email_field = OmniEmailFieldFactory.create(form=form)
+            OmniFormEmailConfirmationHandlerFactory.create(form=form, recipient_field=email_field)
+            OmniFormEmailHandlerFactory.create(form=form)
+        OmniCharFieldFactory.create(form=self.model_form)
+        OmniFormEmailHandlerFactory.create(form=self.model_form)
+
+    def test_form_bulk_delete(self):
+        """
+        The bulk_delete method should delete the forms along with all related fields and handlers
+        """
+        count, counter = OmniForm.objects.filter(pk=self.form.pk).bulk_delete()
+        self.assertFalse(OmniForm.objects.filter(pk=self.form.pk).exists())
+        self.assertEqual(self.form.fields.count(), 0)
+        self.assertEqual(self.form.handlers.count(), 0)
+        self.assertEqual(counter['omniforms.OmniForm'], 1)
+        self.assertEqual(counter['omniforms.OmniField'], 3)
+        self.assertEqual(counter['omniforms.OmniCharField'], 1)
+        self.assertEqual(counter['omniforms.OmniFormHandler'], 2)
+        self.assertEqual(counter['omniforms.OmniFormEmailConfirmationHandler'], 1)
+        self.assertEqual(count, 11)
+
+    def test_form_bulk_delete_leaves_other_forms(self):
+        """
+        The bulk_delete method should not affect fields and handlers of other forms
+        """
+        OmniForm.objects.filter(pk=self.form.pk).bulk_delete()
+        self.assertEqual(self.other_form.fields.count(), 3)
+        self.assertEqual(self.other_form.handlers.count(), 2)
+        self.assertEqual(OmniCharField.objects.filter(object_id=self.other_form.pk).count(), 1)
+        self.assertEqual(self.model_form.fields.count(), 1)
+        self.assertEqual(self.model_form.handlers.count(), 1)
+
+    def test_model_form_bulk_delete(self):
+        """
+        The bulk_delete method should only delete fields attached to the model form content type
+        """
+        OmniModelForm.objects.filter(pk=self.model_form.pk).bulk_delete()
+        self.assertEqual(self.model_form.fields.count(), 0)
+        self.assertEqual(OmniField.objects.count(), 6)
+        self.assertEqual(OmniFormHandler.objects.count(), 4)
+
+    def test_related_bulk_delete_removes_subclass_rows(self):
+        """
+        The related bulk_delete method should remove subclass rows as well as the base rows
+        """
+        filters = {'object_id': self.form.pk, 'content_type__model': 'omniform'}
+        OmniFormHandler.objects.filter(**filters).bulk_delete()
+        OmniField.objects.filter(**filters).bulk_delete()
+        self.assertFalse(OmniCharField.objects.filter(**filters).exists())
+        self.assertFalse(OmniEmailField.objects.filter(**filters).exists())
+        self.assertFalse(OmniFormEmailHandler.objects.filter(**filters).exists())
+        self.assertEqual(self.form.fields.count(), 0)
+        self.assertEqual(self.form.handlers.count(), 0)
+
+
+class OmniFormBulkInsertTestCase(TestCase):
+    """
+    Tests the bulk_insert queryset methods
+    """
+    def setUp(self):
+        super(OmniFormBulkInsertTestCase, self).setUp()
+        self.form = OmniFormFactory.create()
+        self.other_form = OmniFormFactory.create()
+        self.existing_field = OmniCharFieldFactory.create(form=self.form, order=0)
+        self.content_type = ContentType.objects.get_for_model(OmniForm)
+
+    def build(self, model_class, form, **kwargs):
+        """
+        Helper method for building an unsaved field or handler attached to a form
+
+        :param model_class: Field or handler model class
+        :param form: The form to attach the instance to
+        :param kwargs: Model field values
+        :return: Unsaved instance
+        """
+        return model_class(content_type=self.content_type, object_id=form.pk, **kwargs)
+
+    def test_fields_bulk_insert(self):
+        """
+        The bulk_insert method should insert fields of every type with one INSERT per table
+        """
+        fields = [
+            self.build(OmniCharField, self.form, name='name', label='Name', widget_class='a', order=1),
+            self.build(OmniEmailField, self.other_form, name='email', label='Email', widget_class='b', order=0),
+            self.build(OmniCharField, self.other_form, name='title', label='Title', widget_class='c', order=1),
+            self.build(
+                OmniChoiceField, self.form, name='colour', label='Colour', widget_class='d', choices='Red', order=2
+            ),
+        ]
+        ContentType.objects.get_for_models(OmniCharField, OmniEmailField, OmniChoiceField)
+        with self.assertNumQueries(6):
+            OmniField.objects.bulk_insert(fields, bump_versions=False)
+
+        for field in fields:
+            self.assertIsNotNone(field.pk)
+            self.assertFalse(field._state.adding)
+            saved = OmniField.objects.get(pk=field.pk)
+            self.assertEqual(saved.specific.__class__, field.__class__)
+            self.assertEqual(saved.specific.name, field.name)
+            self.assertEqual(saved.object_id, field.object_id)
+        self.assertEqual(
+            list(self.form.fields.values_list('name', flat=True)),
+            [self.existing_field.name, 'name', 'colour']
+        )
+        self.assertEqual(OmniChoiceField.objects.get(pk=fields[3].pk).choices, 'Red')
+
+    def test_handlers_bulk_insert(self):
+        """
+        The bulk_insert method should insert handlers, resolving foreign keys to saved fields
+        """
+        email_field = OmniEmailFieldFactory.create(form=self.form)
+        handlers = [
+            self.build(OmniFormEmailHandler, self.form, name='Notify', subject='S', template='T', recipients='a@b.com'),
+            self.build(
+                OmniFormEmailConfirmationHandler,
+                self.form,
+                name='Confirm',
+                subject='S',
+                template='T',
+                recipient_field=email_field
+            ),
+        ]
+        OmniFormHandler.objects.bulk_insert(handlers)
+        confirmation_handler = OmniFormEmailConfirmationHandler.objects.get(pk=handlers[1].pk)
+        self.assertEqual(confirmation_handler.recipient_field, email_field)
+        self.assertEqual(
+            [handler.specific.__class__ for handler in self.form.handlers.all()],
+            [OmniFormEmailHandler, OmniFormEmailConfirmationHandler]
+        )
+
+    def test_bulk_insert_bumps_versions(self):
+        """
+        The bulk_insert method should bump the definition version of the affected forms unless asked not to
+        """
+        version = OmniForm.objects.get(pk=self.form.pk).version
+        OmniField.objects.bulk_insert([self.build(OmniCharField, self.form, name='a', label='A', widget_class='a')])
+        self.assertEqual(OmniForm.objects.get(pk=self.form.pk).version, version + 1)
+        OmniField.objects.bulk_insert(
+            [self.build(OmniCharField, self.form, name='b', label='B', widget_class='b')],
+            bump_versions=False
+        )
+        self.assertEqual(OmniForm.objects.get(pk=self.form.pk).version, version + 1)
+
+    def test_bulk_insert_empty(self):
+        """
+        The bulk_insert method should not query the database if there is nothing to insert
+        """
+        with self.assertNumQueries(0):
+            self.assertEqual(OmniField.objects.bulk_insert([]), [])
+
+    def test_forms_bulk_insert(self):
+        """
+        The bulk_insert method should insert forms and set their primary keys
+        """
+        forms = [OmniForm(title='One'), OmniForm(title='Two')]
+        OmniForm.objects.bulk_insert(forms)
+        for form in forms:
+            self.assertIsNotNone(form.pk)
+            self.assertFalse(form._state.adding)
+            self.assertEqual(OmniForm.objects.get(pk=form.pk).title, form.title)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the query plans used when looking up fields and handlers for a form
+"""
+from __future__ import unicode_literals
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from omniforms.models import OmniCharField, OmniFormEmailHandler
+from omniforms.tests.factories import (
+    OmniCharFieldFactory,
+    OmniFormEmailHandlerFactory,
+    OmniFormFactory,
+    OmniModelFormFactory
+)
+from unittest import skipUnless
+
+
+class QueryPlanTestCaseMixin(object):
+    """
+    Provides helpers for inspecting the query plan of a queryset
+    """
+    def setUp(self):
+        super(QueryPlanTestCaseMixin, self).setUp()
+        self.form = OmniFormFactory.create()
+        self.model_form = OmniModelFormFactory.create()
+        for form in (self.form, self.model_form):
+            for index in range(5):
+                OmniCharFieldFactory.create(form=form, order=index)
+                OmniFormEmailHandlerFactory.create(form=form)
+
+    def get_query_plan(self, queryset):
+        """
+        Runs EXPLAIN for the given queryset and returns the plan as a single string
+
+        :param queryset: QuerySet to explain
+        :return: Query plan text
+        """
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute('{0} {1}'.format(self.explain_prefix, sql), params)
+            return '\n'.join(' '.join('{0}'.format(column) for column in row) for row in cursor.fetchall())
+
+    def get_querysets(self):
+        """
+        Returns the querysets for the hot generic relation lookups
+
+        :return: Dict of querysets keyed by a descriptive name
+        """
+        return {
+            'form fields': self.form.fields.all(),
+            'form handlers': self.form.handlers.all(),
+            'model form fields': self.model_form.fields.all(),
+            'model form handlers': self.model_form.handlers.all(),
+            'form field types': self.form.fields.order_by('real_type').values_list('real_type').distinct(),
+            'form handler types': self.form.handlers.order_by('real_type').values_list('real_type').distinct(),
+            'form fields of type': self.form.fields.order_by().filter(
+                real_type=ContentType.objects.get_for_model(OmniCharField)
+            ),
+            'form handlers of type': self.form.handlers.order_by().filter(
+                real_type=ContentType.objects.get_for_model(OmniFormEmailHandler)
+            ),
+        }
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite specific query plan checks')
+class SQLiteQueryPlanTestCase(QueryPlanTestCaseMixin, TestCase):
+    """
+    Ensures that generic relation lookups use the composite indexes on SQLite
+    """
+    explain_prefix = 'EXPLAIN QUERY PLAN'
+
+    def test_lookups_use_index(self):
+        """
+        Field and handler lookups for a form should search a composite index without a separate sort
+        """
+        for name, queryset in self.get_querysets().items():
+            plan = self.get_query_plan(queryset)
+            self.assertRegexpMatches(plan, r'SEARCH (TABLE )?omniforms_omni\w+ USING (COVERING )?INDEX', name)
+            self.assertRegexpMatches(plan, r'_form_(order|type)_idx', name)
+            self.assertNotIn('TEMP B-TREE', plan, name)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL specific query plan checks')
+class PostgreSQLQueryPlanTestCase(QueryPlanTestCaseMixin, TestCase):
+    """
+    Ensures that generic relation lookups use the composite indexes on PostgreSQL
+    """
+    explain_prefix = 'EXPLAIN'
+
+    def setUp(self):
+        super(PostgreSQLQueryPlanTestCase, self).setUp()
+        # Tables in the test database are tiny so the planner would always choose a
+        # sequential scan. Disabling them reveals whether a usable index exists at all
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_lookups_use_index(self):
+        """
+        Field and handler lookups for a form should not fall back to sequential scans
+        """
+        for name, queryset in self.get_querysets().items():
+            plan = self.get_query_plan(queryset)
+            self.assertNotIn('Seq Scan', plan, name)
+            self.assertRegexpMatches(plan, r'_form_(order|type)_idx', name)
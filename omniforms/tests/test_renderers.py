@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms renderers module
+"""
+from __future__ import unicode_literals
+from django import forms
+from django.apps import apps
+from django.forms.renderers import get_default_renderer
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from mock import patch
+from omniforms.models import OmniChoiceField, OmniField, OmniMultipleChoiceField
+from omniforms.renderers import FastWidgetRenderer, get_form_renderer, render_string_value, render_value
+from omniforms.tests.factories import (
+    OmniBooleanFieldFactory,
+    OmniCharFieldFactory,
+    OmniEmailFieldFactory,
+    OmniFormFactory
+)
+import datetime
+import decimal
+
+
+class GetFormRendererTestCase(SimpleTestCase):
+    """
+    Tests the get_form_renderer function
+    """
+    def test_not_configured(self):
+        """
+        The function should return None if no renderer is configured
+        """
+        self.assertIsNone(get_form_renderer())
+
+    @override_settings(OMNI_FORMS_FORM_RENDERER='omniforms.renderers.FastWidgetRenderer')
+    def test_configured(self):
+        """
+        The function should return an instance of the configured renderer
+        """
+        self.assertIsInstance(get_form_renderer(), FastWidgetRenderer)
+
+
+class RenderValueTestCase(SimpleTestCase):
+    """
+    Tests the render_value and render_string_value functions
+    """
+    def test_render_value(self):
+        """
+        Values should be converted to text and escaped unless they are safe
+        """
+        self.assertEqual(render_value('<b>'), '&lt;b&gt;')
+        self.assertEqual(render_value(mark_safe('<b>')), '<b>')
+        self.assertEqual(render_value(5), '5')
+
+    def test_render_string_value(self):
+        """
+        Values should be formatted and escaped unless they are safe
+        """
+        self.assertEqual(render_string_value('<b>'), '&lt;b&gt;')
+        self.assertEqual(render_string_value(mark_safe('<b>')), '<b>')
+        self.assertEqual(render_string_value(decimal.Decimal('1.5')), '1.5')
+        self.assertEqual(render_string_value((1, 2)), '')
+
+
+class FastWidgetRendererTestCase(SimpleTestCase):
+    """
+    Tests the FastWidgetRenderer class
+    """
+    def setUp(self):
+        super(FastWidgetRendererTestCase, self).setUp()
+        self.renderer = FastWidgetRenderer()
+        self.choices = [('a', 'A'), ('Group <1>', [('b', 'B<'), (3, 'C')]), ('', '---')]
+
+    def assertRendersIdentically(self, widget, value, name='field<'):
+        """
+        Asserts the widget renders the same HTML with the fast renderer as with the default renderer
+
+        :param widget: The widget instance
+        :param value: The value to render
+        :param name: The field name
+        """
+        self.assertEqual(
+            widget.render(name, value, renderer=self.renderer),
+            widget.render(name, value, renderer=get_default_renderer())
+        )
+
+    def test_inputs(self):
+        """
+        Input widgets should be rendered identically to the default renderer
+        """
+        attrs = {'id': 'id_field', 'required': True, 'disabled': False, 'data-value': '"quoted"'}
+        self.assertRendersIdentically(forms.TextInput(attrs=attrs), 'a<b')
+        self.assertRendersIdentically(forms.TextInput(), None)
+        self.assertRendersIdentically(forms.TextInput(), mark_safe('<b>'))
+        self.assertRendersIdentically(forms.NumberInput(attrs={'step': 'any'}), decimal.Decimal('1.5'))
+        self.assertRendersIdentically(forms.EmailInput(), '')
+        self.assertRendersIdentically(forms.URLInput(), 'http://example.com/?a=1&b=2')
+        self.assertRendersIdentically(forms.PasswordInput(), 'secret')
+        self.assertRendersIdentically(forms.HiddenInput(), 5)
+        self.assertRendersIdentically(forms.DateInput(), datetime.date(2017, 1, 2))
+        self.assertRendersIdentically(forms.DateTimeInput(), datetime.datetime(2017, 1, 2, 3, 4))
+        self.assertRendersIdentically(forms.TimeInput(), datetime.time(1, 2))
+        self.assertRendersIdentically(forms.CheckboxInput(), True)
+        self.assertRendersIdentically(forms.CheckboxInput(), False)
+        self.assertRendersIdentically(forms.FileInput(), 'file.txt')
+
+    def test_textarea(self):
+        """
+        Textarea widgets should be rendered identically to the default renderer
+        """
+        self.assertRendersIdentically(forms.Textarea(), 'Line 1\n<b>Line 2</b>')
+        self.assertRendersIdentically(forms.Textarea(attrs={'rows': 3}), '')
+        self.assertRendersIdentically(forms.Textarea(), None)
+
+    def test_select(self):
+        """
+        Select widgets should be rendered identically to the default renderer
+        """
+        self.assertRendersIdentically(forms.Select(choices=self.choices), 'b')
+        self.assertRendersIdentically(forms.Select(choices=self.choices, attrs={'id': 'id_field'}), None)
+        self.assertRendersIdentically(forms.SelectMultiple(choices=self.choices), ['a', 3])
+        self.assertRendersIdentically(forms.SelectMultiple(choices=[]), [])
+
+    def test_multiple_inputs(self):
+        """
+        Radio and checkbox select widgets should be rendered identically to the default renderer
+        """
+        attrs = {'id': 'id_field', 'class': 'choices'}
+        self.assertRendersIdentically(forms.RadioSelect(choices=self.choices, attrs=attrs), 'a')
+        self.assertRendersIdentically(forms.RadioSelect(choices=self.choices), None)
+        self.assertRendersIdentically(forms.CheckboxSelectMultiple(choices=self.choices, attrs=attrs), ['a', 'b'])
+        self.assertRendersIdentically(forms.CheckboxSelectMultiple(choices=self.choices), [])
+
+    def test_field_widgets_supported(self):
+        """
+        Every widget permitted by the omniforms field models should be rendered without the template engine
+        """
+        for model_class in apps.get_models():
+            if not issubclass(model_class, OmniField):
+                continue
+            for widget_path in getattr(model_class, 'FORM_WIDGETS', ()):
+                widget = import_string(widget_path)()
+                self.assertIn(widget.template_name, self.renderer.fragments, widget_path)
+                option_template_name = getattr(widget, 'option_template_name', None)
+                if option_template_name is not None:
+                    self.assertIn(option_template_name, self.renderer.fragments, widget_path)
+
+    def test_unsupported_template(self):
+        """
+        Unsupported templates should be rendered by the default renderer
+        """
+        self.assertRendersIdentically(forms.ClearableFileInput(), None)
+        with patch.object(get_default_renderer(), 'render', return_value='<input />') as render:
+            self.assertEqual(self.renderer.render('django/forms/widgets/clearable_file_input.html', {}), '<input />')
+        render.assert_called_once_with('django/forms/widgets/clearable_file_input.html', {}, request=None)
+
+    def test_unsupported_option_template(self):
+        """
+        Unsupported option templates should be rendered by the default renderer
+        """
+        class CustomSelect(forms.Select):
+            option_template_name = 'django/forms/widgets/input_option.html'
+
+        widget = CustomSelect(choices=self.choices)
+        self.renderer.fragments.pop('django/forms/widgets/input_option.html')
+        self.assertRendersIdentically(widget, 'a')
+
+
+class GeneratedFormRendererTestCase(TestCase):
+    """
+    Tests the renderer used by generated forms
+    """
+    def setUp(self):
+        super(GeneratedFormRendererTestCase, self).setUp()
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', order=0)
+        OmniEmailFieldFactory.create(form=self.form, name='email', order=1)
+        OmniBooleanFieldFactory.create(form=self.form, name='agree', order=2)
+        OmniChoiceField.objects.create(
+            form=self.form,
+            name='colour',
+            label='Colour',
+            order=3,
+            widget_class='django.forms.widgets.RadioSelect',
+            choices='Red\nGreen'
+        )
+        OmniMultipleChoiceField.objects.create(
+            form=self.form,
+            name='sizes',
+            label='Sizes',
+            order=4,
+            widget_class='django.forms.widgets.SelectMultiple',
+            choices='Small\nLarge'
+        )
+
+    def test_default(self):
+        """
+        Generated forms should use the default renderer unless configured otherwise
+        """
+        self.assertIsNone(self.form.get_form_class().default_renderer)
+
+    @override_settings(OMNI_FORMS_FORM_RENDERER='omniforms.renderers.FastWidgetRenderer')
+    def test_configured(self):
+        """
+        Generated forms should use the configured renderer, and render the same HTML
+        """
+        form_class = self.form.get_form_class()
+        self.assertIsInstance(form_class().renderer, FastWidgetRenderer)
+        data = {'name': '<Name>', 'email': 'invalid', 'agree': 'on', 'colour': 'Green', 'sizes': ['Large']}
+        self.assertEqual(form_class().as_p(), form_class(renderer=get_default_renderer()).as_p())
+        self.assertEqual(
+            form_class(data).as_p(),
+            form_class(data, renderer=get_default_renderer()).as_p()
+        )
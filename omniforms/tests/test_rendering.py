@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms rendering module and template tags
+"""
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.middleware.csrf import _compare_salted_tokens, get_token
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import translation
+from mock import patch
+from omniforms.cache import definition_cache
+from omniforms.models import OmniForm
+from omniforms.rendering import form_html_cache
+from omniforms.tests.factories import OmniBooleanFieldFactory, OmniCharFieldFactory, OmniFormFactory
+import re
+
+CSRF_TOKEN_RE = re.compile(r"name='csrfmiddlewaretoken' value='([^']*)'")
+
+
+def get_csrf_token(html):
+    """
+    Gets the value of the CSRF token rendered in the HTML
+
+    :param html: The rendered HTML
+    :return: CSRF token
+    """
+    return CSRF_TOKEN_RE.search(html).group(1)
+
+
+def strip_csrf_token(html):
+    """
+    Removes the value of the CSRF token from the HTML, as tokens are masked differently each time they are rendered
+
+    :param html: The rendered HTML
+    :return: HTML without the CSRF token
+    """
+    return CSRF_TOKEN_RE.sub("name='csrfmiddlewaretoken' value=''", html)
+
+
+class FormHTMLCacheTestCase(TestCase):
+    """
+    Tests the FormHTMLCache class
+    """
+    def setUp(self):
+        super(FormHTMLCacheTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name', order=0)
+        OmniBooleanFieldFactory.create(form=self.form, name='agree', label='Agree', order=1)
+        self.request = RequestFactory().get('/')
+
+    def render(self, **kwargs):
+        """
+        Helper method for rendering the form
+
+        :param kwargs: Keyword arguments for the render method
+        :return: Rendered HTML
+        """
+        return form_html_cache.render(self.request, OmniForm, self.form.pk, **kwargs)
+
+    def render_uncached(self, initial=None):
+        """
+        Helper method for rendering the form using the template engine alone
+
+        :param initial: Initial values for the form
+        :return: Rendered HTML
+        """
+        form = self.form.get_form_class()(initial=initial)
+        return get_template('omniforms/form.html').render({'form': form}, self.request)
+
+    def assertRenderedEqual(self, html, expected_html):
+        """
+        Asserts the rendered HTML is the same as the expected HTML, and holds a valid CSRF token for the request
+
+        :param html: The rendered HTML
+        :param expected_html: The expected HTML
+        """
+        self.assertEqual(strip_csrf_token(html), strip_csrf_token(expected_html))
+        self.assertTrue(_compare_salted_tokens(get_csrf_token(html), self.request.META['CSRF_COOKIE']))
+
+    def test_render(self):
+        """
+        The rendered HTML should be the same as the template rendered directly
+        """
+        html = self.render()
+        self.assertRenderedEqual(html, self.render_uncached())
+        self.assertIn('<input type="text" name="name"', html)
+
+    def test_cached(self):
+        """
+        The form should not be compiled, nor the database queried, once the HTML is cached
+        """
+        self.render()
+        self.request = RequestFactory().get('/')
+        with patch.object(definition_cache, 'get_form_class') as get_form_class:
+            with self.assertNumQueries(0):
+                html = self.render()
+        self.assertFalse(get_form_class.called)
+        self.assertRenderedEqual(html, self.render_uncached())
+
+    def test_csrf_token_per_request(self):
+        """
+        Each request should receive its own CSRF token
+        """
+        first_request = self.request
+        first_token = get_csrf_token(self.render())
+        self.request = RequestFactory().get('/')
+        second_token = get_csrf_token(self.render())
+        self.assertTrue(_compare_salted_tokens(first_token, first_request.META['CSRF_COOKIE']))
+        self.assertTrue(_compare_salted_tokens(second_token, self.request.META['CSRF_COOKIE']))
+        self.assertFalse(_compare_salted_tokens(second_token, first_request.META['CSRF_COOKIE']))
+
+    def test_no_request(self):
+        """
+        The CSRF token should be left blank if there is no request
+        """
+        html = form_html_cache.render(None, OmniForm, self.form.pk)
+        self.assertIn('name=\'csrfmiddlewaretoken\' value=\'\'', html)
+
+    def test_initial(self):
+        """
+        Per request initial values should be rendered into the cached HTML
+        """
+        self.render()
+        initial = {'name': 'Joe <Bloggs>', 'agree': True, 'unknown': 'Ignored'}
+        html = self.render(initial=initial)
+        self.assertRenderedEqual(html, self.render_uncached(initial=initial))
+        self.assertIn('value="Joe &lt;Bloggs&gt;"', html)
+        self.assertNotIn('Joe', self.render())
+
+    def test_version_change(self):
+        """
+        The form should be rendered again once its definition changes
+        """
+        self.render()
+        OmniCharFieldFactory.create(form=self.form, name='email', label='Email', order=2)
+        self.form.refresh_from_db()
+        definition_cache.set_local_version(
+            definition_cache.get_key(OmniForm, self.form.pk),
+            self.form.version
+        )
+        self.assertIn('name="email"', self.render())
+
+    def test_language(self):
+        """
+        The HTML should be stored separately for each language
+        """
+        with translation.override('en'):
+            english_key = form_html_cache.get_key(OmniForm, self.form.pk, 1, 'omniforms/form.html')
+        with translation.override('de'):
+            german_key = form_html_cache.get_key(OmniForm, self.form.pk, 1, 'omniforms/form.html')
+        self.assertNotEqual(english_key, german_key)
+
+    @override_settings(TEMPLATES=[{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.locmem.Loader', {'custom.html': '<ul>{{ form.as_ul }}</ul>{% csrf_token %}'}),
+                'django.template.loaders.app_directories.Loader'
+            ]
+        }
+    }])
+    def test_template_name(self):
+        """
+        The form should be rendered with the given template, which is cached separately
+        """
+        self.render()
+        html = self.render(template_name='custom.html')
+        self.assertTrue(html.startswith('<ul><li><label for="id_name">'))
+        self.assertRenderedEqual(self.render(template_name='custom.html'), html)
+
+
+class RenderOmniformTagTestCase(TestCase):
+    """
+    Tests the render_omniform template tag
+    """
+    def setUp(self):
+        super(RenderOmniformTagTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name')
+        self.request = RequestFactory().get('/')
+
+    def test_tag(self):
+        """
+        The tag should render the form using the form HTML cache
+        """
+        template = Template('{% load omniforms_tags %}{% render_omniform form initial=initial %}')
+        html = template.render(Context({'form': self.form, 'request': self.request, 'initial': {'name': 'Joe'}}))
+        self.assertTrue(_compare_salted_tokens(get_csrf_token(html), get_token(self.request)))
+        self.assertIn('value="Joe"', html)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms storage module
+"""
+from __future__ import unicode_literals
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase, override_settings
+from mock import patch
+from omniforms.models import OmniFormStoredFile
+from omniforms.storage import ContentAddressedStorage, content_addressed_storage, hash_file
+import hashlib
+import mmap
+import shutil
+import tempfile
+
+
+class HashFileTestCase(TestCase):
+    """
+    Tests the hash_file function
+    """
+    digest = hashlib.sha256(b'content').hexdigest()
+
+    def test_hashed_while_uploaded(self):
+        """
+        Digests calculated while the file was uploaded should be used without reading the file
+        """
+        uploaded_file = SimpleUploadedFile('a.txt', b'content')
+        uploaded_file.sha256 = 'abc'
+        self.assertEqual(hash_file(uploaded_file), 'abc')
+
+    def test_temporary_file(self):
+        """
+        Files spooled to disk should be hashed through a memory map
+        """
+        uploaded_file = TemporaryUploadedFile('a.txt', 'text/plain', 7, None)
+        uploaded_file.write(b'content')
+        uploaded_file.flush()
+        with patch('omniforms.storage.mmap.mmap', wraps=mmap.mmap) as mapped:
+            self.assertEqual(hash_file(uploaded_file), self.digest)
+        self.assertEqual(mapped.call_count, 1)
+        uploaded_file.close()
+
+    def test_empty_temporary_file(self):
+        """
+        Empty files cannot be memory mapped, so should be hashed without a memory map
+        """
+        uploaded_file = TemporaryUploadedFile('a.txt', 'text/plain', 0, None)
+        self.assertEqual(hash_file(uploaded_file), hashlib.sha256(b'').hexdigest())
+        uploaded_file.close()
+
+    def test_in_memory_file(self):
+        """
+        Other files should be hashed a chunk at a time and left ready to be read again
+        """
+        uploaded_file = SimpleUploadedFile('a.txt', b'content')
+        self.assertEqual(hash_file(uploaded_file), self.digest)
+        self.assertEqual(uploaded_file.read(), b'content')
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    """
+    Tests the ContentAddressedStorage class
+    """
+    def setUp(self):
+        super(ContentAddressedStorageTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.backend = FileSystemStorage(location=self.directory)
+        self.storage = ContentAddressedStorage(storage=self.backend)
+        self.digest = hashlib.sha256(b'content').hexdigest()
+
+    def test_save(self):
+        """
+        Files should be stored under a path derived from their content, keeping the extension
+        """
+        name = self.storage.save('uploads/Report.PDF', ContentFile(b'content'))
+        self.assertEqual(name, 'omniforms/files/{0}/{1}/{2}.pdf'.format(self.digest[:2], self.digest[2:4], self.digest))
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'content')
+        stored_file = OmniFormStoredFile.objects.get()
+        self.assertEqual((stored_file.sha256, stored_file.name), (self.digest, name))
+        self.assertEqual((stored_file.size, stored_file.references), (7, 1))
+
+    def test_duplicate(self):
+        """
+        Content already stored should be referenced rather than written again
+        """
+        name = self.storage.save('a.pdf', ContentFile(b'content'))
+        with patch.object(self.backend, 'save') as save:
+            self.assertEqual(self.storage.save('b.pdf', SimpleUploadedFile('b.pdf', b'content')), name)
+        self.assertFalse(save.called)
+        self.assertEqual(OmniFormStoredFile.objects.get().references, 2)
+
+    def test_missing_file(self):
+        """
+        Files missing from the underlying storage should be written again
+        """
+        name = self.storage.save('a.pdf', ContentFile(b'content'))
+        self.backend.delete(name)
+        self.assertEqual(self.storage.save('a.pdf', ContentFile(b'content')), name)
+        self.assertTrue(self.backend.exists(name))
+        self.assertEqual(OmniFormStoredFile.objects.get().references, 2)
+
+    def test_temporary_file_kept(self):
+        """
+        Temporary files should be copied rather than moved, so they can still be read once stored
+        """
+        uploaded_file = TemporaryUploadedFile('a.txt', 'text/plain', 7, None)
+        uploaded_file.write(b'content')
+        uploaded_file.seek(0)
+        self.storage.save(uploaded_file.name, uploaded_file)
+        uploaded_file.seek(0)
+        self.assertEqual(uploaded_file.read(), b'content')
+        with open(uploaded_file.temporary_file_path(), 'rb') as temporary_file:
+            self.assertEqual(temporary_file.read(), b'content')
+        uploaded_file.close()
+
+    def test_delete(self):
+        """
+        Deleting a file should release a reference without removing the file
+        """
+        name = self.storage.save('a.pdf', ContentFile(b'content'))
+        self.storage.save('b.pdf', ContentFile(b'content'))
+        for i in range(3):
+            self.storage.delete(name)
+        self.assertEqual(OmniFormStoredFile.objects.get().references, 0)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_url(self):
+        """
+        URLs and sizes should be given by the underlying storage
+        """
+        name = self.storage.save('a.pdf', ContentFile(b'content'))
+        self.assertEqual(self.storage.url(name), self.backend.url(name))
+        self.assertEqual(self.storage.size(name), 7)
+
+    @override_settings(OMNI_FORMS_FILE_STORAGE='django.core.files.storage.FileSystemStorage')
+    def test_storage_setting(self):
+        """
+        The underlying storage should be the storage named by the setting
+        """
+        with self.settings(MEDIA_ROOT=self.directory):
+            self.assertIsInstance(content_addressed_storage.storage, FileSystemStorage)
+            self.assertEqual(content_addressed_storage.storage.location, self.directory)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms uploads module
+"""
+from __future__ import unicode_literals
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from omniforms.uploads import BoundedUploadHandler, RejectedUpload
+import hashlib
+import os
+
+
+class BoundedUploadHandlerTestCase(SimpleTestCase):
+    """
+    Tests the BoundedUploadHandler class
+    """
+    def setUp(self):
+        super(BoundedUploadHandlerTestCase, self).setUp()
+        self.factory = RequestFactory()
+
+    def upload(self, data, limits, hashed=()):
+        """
+        Helper method for parsing a multipart request using the handler
+
+        :param data: Dict of POST data
+        :param limits: Dict of maximum upload sizes keyed by field name
+        :param hashed: The names of the fields whose files are hashed
+        :return: Tuple of the request and the handler
+        """
+        request = self.factory.post('/upload/', data)
+        handler = BoundedUploadHandler(request, limits, hashed)
+        request.upload_handlers = [handler]
+        request.FILES
+        return request, handler
+
+    def test_accepted(self):
+        """
+        Files within the limit should be written to a temporary file on disk
+        """
+        request, handler = self.upload({'cv': SimpleUploadedFile('cv.txt', b'x' * 100)}, {'cv': 100})
+        uploaded_file = request.FILES['cv']
+        self.assertIsInstance(uploaded_file, TemporaryUploadedFile)
+        self.assertTrue(os.path.exists(uploaded_file.temporary_file_path()))
+        self.assertEqual(uploaded_file.size, 100)
+        self.assertEqual(uploaded_file.read(), b'x' * 100)
+        self.assertFalse(handler.rejected)
+        uploaded_file.close()
+
+    def test_no_limit(self):
+        """
+        Files for fields without a limit should be accepted whatever their size
+        """
+        request, handler = self.upload({'cv': SimpleUploadedFile('cv.txt', b'x' * 100000)}, {'cv': None})
+        self.assertEqual(request.FILES['cv'].size, 100000)
+        request.FILES['cv'].close()
+
+    def test_cut_off(self):
+        """
+        Uploads should be cut off as soon as the limit is exceeded, leaving the rest of the request unread
+        """
+        request, handler = self.upload({
+            'name': 'Joe',
+            'cv': SimpleUploadedFile('cv.txt', b'x' * 300000),
+            'after': 'x',
+        }, {'cv': 100000})
+        self.assertNotIn('cv', request.FILES)
+        self.assertEqual(request.POST.get('name'), 'Joe')
+        self.assertNotIn('after', request.POST)
+        rejected = handler.rejected['cv']
+        self.assertIsInstance(rejected, RejectedUpload)
+        self.assertEqual(rejected.name, 'cv.txt')
+        self.assertGreater(rejected.size, 100000)
+        self.assertLessEqual(rejected.size, 100000 + handler.chunk_size)
+        self.assertFalse(os.path.exists(handler.file.temporary_file_path()))
+
+    def test_limit_per_field(self):
+        """
+        The limit should apply to the total size of the files uploaded for a field
+        """
+        request, handler = self.upload({
+            'cv': [SimpleUploadedFile('a.txt', b'x' * 60), SimpleUploadedFile('b.txt', b'x' * 60)],
+        }, {'cv': 100})
+        self.assertEqual([uploaded_file.name for uploaded_file in request.FILES.getlist('cv')], ['a.txt'])
+        self.assertEqual(handler.rejected['cv'].size, 120)
+
+    def test_content_length(self):
+        """
+        Files whose content length already exceeds the limit should be cut off before any of the file is read
+        """
+        request = self.factory.get('/upload/')
+        handler = BoundedUploadHandler(request, {'cv': 100})
+        with self.assertRaises(StopUpload) as context:
+            handler.new_file('cv', 'cv.txt', 'text/plain', 101)
+        self.assertTrue(context.exception.connection_reset)
+        self.assertEqual(handler.rejected['cv'].size, 101)
+
+    def test_hashed(self):
+        """
+        Files for hashed fields should be hashed while they are received
+        """
+        content = b'x' * 200000
+        request, handler = self.upload({
+            'cv': SimpleUploadedFile('cv.txt', content),
+            'photo': SimpleUploadedFile('photo.gif', b'gif'),
+        }, {'cv': None, 'photo': None}, hashed=['cv'])
+        self.assertEqual(request.FILES['cv'].sha256, hashlib.sha256(content).hexdigest())
+        self.assertFalse(hasattr(request.FILES['photo'], 'sha256'))
+        request.FILES['cv'].close()
+        request.FILES['photo'].close()
+
+    def test_unknown_field(self):
+        """
+        Files for fields the form does not have should be rejected
+        """
+        request, handler = self.upload({'other': SimpleUploadedFile('a.txt', b'x')}, {'cv': 100})
+        self.assertNotIn('other', request.FILES)
+        self.assertIn('other', handler.rejected)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_max_content_length(self):
+        """
+        The largest valid request size should only be known if every file field has a limit
+        """
+        handler = BoundedUploadHandler(None, {'cv': 100, 'photo': 200})
+        self.assertEqual(handler.max_content_length, 1300 + handler.request_overhead)
+        self.assertIsNone(BoundedUploadHandler(None, {'cv': 100, 'photo': None}).max_content_length)
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=None):
+            self.assertIsNone(handler.max_content_length)
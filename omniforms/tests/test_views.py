@@ -0,0 +1,828 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms public views
+"""
+from __future__ import unicode_literals
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
+from django.middleware.csrf import CsrfViewMiddleware, get_token
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.http import http_date
+from mock import patch
+from omniforms.cache import definition_cache
+from omniforms.models import (
+    OmniField,
+    OmniFileField,
+    OmniForm,
+    OmniFormSaveInstanceHandler,
+    OmniFormStoredFile,
+    OmniModelForm
+)
+from omniforms.rendering import form_html_cache
+from omniforms.tests.factories import (
+    OmniBooleanFieldFactory,
+    OmniCharFieldFactory,
+    OmniEmailFieldFactory,
+    OmniFormEmailHandlerFactory,
+    OmniFormFactory,
+    OmniModelFormFactory
+)
+from omniforms.tests.models import DummyModel, DummyModel2
+from omniforms.views import (
+    OmniFormBulkSubmissionView,
+    OmniFormFieldValidationView,
+    OmniFormManifestView,
+    OmniFormSubmissionView,
+    OmniFormView,
+    OmniFormWizardView
+)
+from calendar import timegm
+import hashlib
+import json
+import shutil
+import tempfile
+
+
+class CustomCsrfViewMiddleware(CsrfViewMiddleware):
+    """
+    Subclass of the CSRF middleware for testing purposes
+    """
+
+
+class OmniFormViewTestCase(TestCase):
+    """
+    Tests the OmniFormView class
+    """
+    def setUp(self):
+        super(OmniFormViewTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name', required=True)
+        OmniFormEmailHandlerFactory.create(form=self.form)
+        self.form.refresh_from_db()
+        self.factory = RequestFactory()
+        self.view = OmniFormView.as_view()
+
+    def get(self, **headers):
+        """
+        Helper method for making a GET request to the view
+
+        :param headers: Request headers
+        :return: Response
+        """
+        request = self.factory.get('/contact/', **headers)
+        request.META['CSRF_COOKIE'] = 'token'
+        response = self.view(request, pk=self.form.pk)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def post(self, path, data, **extra):
+        """
+        Helper method for building a POST request to the view.  The view makes the CSRF check itself
+        (see UploadLimitMixin), so the request skips the check as requests made by the test client do
+
+        :param path: The request path
+        :param data: POST data
+        :param extra: Extra request arguments
+        :return: Request
+        """
+        request = self.factory.post(path, data, **extra)
+        request._dont_enforce_csrf_checks = True
+        return request
+
+    def test_get(self):
+        """
+        The view should render the unbound form along with ETag and Last-Modified headers
+        """
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<input type="text" name="name"')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertIsNone(response.context_data['form'])
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(response['Last-Modified'], http_date(timegm(self.form.modified.utctimetuple())))
+
+    def test_not_found(self):
+        """
+        A 404 should be raised for forms that do not exist
+        """
+        request = self.factory.get('/contact/')
+        self.assertRaises(Http404, self.view, request, pk=0)
+        request = self.post('/contact/', {'name': 'Joe'})
+        self.assertRaises(Http404, self.view, request, pk=0)
+
+    def test_if_none_match(self):
+        """
+        A 304 response should be returned without building the form if the ETag matches
+        """
+        etag = self.get()['ETag']
+        with patch.object(definition_cache, 'get_form_class') as get_form_class:
+            with patch.object(form_html_cache, 'render') as render:
+                with self.assertNumQueries(0):
+                    response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(get_form_class.called)
+        self.assertFalse(render.called)
+
+    def test_if_modified_since(self):
+        """
+        A 304 response should be returned if the form has not been modified since the given time
+        """
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_version_change(self):
+        """
+        The ETag should change once the definition changes
+        """
+        etag = self.get()['ETag']
+        OmniCharFieldFactory.create(form=self.form, name='email', label='Email')
+        cache.clear()
+        definition_cache.clear()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'name="email"')
+
+    def test_etag_csrf_token(self):
+        """
+        The ETag should change if the users CSRF token changes
+        """
+        request = self.factory.get('/contact/')
+        request.META['CSRF_COOKIE'] = 'other'
+        response = self.view(request, pk=self.form.pk)
+        self.assertNotEqual(response['ETag'], self.get()['ETag'])
+
+    def test_initial(self):
+        """
+        Responses with per request initial values should not be conditional
+        """
+        view = OmniFormView.as_view(initial={'name': 'Joe'})
+        request = self.factory.get('/contact/')
+        response = view(request, pk=self.form.pk)
+        response.render()
+        self.assertContains(response, 'value="Joe"')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_post_valid(self):
+        """
+        Valid submissions should be handled by the forms handlers and redirected
+        """
+        request = self.post('/contact/?sent=1', {'name': 'Joe'})
+        response = self.view(request, pk=self.form.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/contact/?sent=1')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_post_success_url(self):
+        """
+        Valid submissions should be redirected to the success URL if set
+        """
+        view = OmniFormView.as_view(success_url='/thanks/')
+        response = view(self.post('/contact/', {'name': 'Joe'}), pk=self.form.pk)
+        self.assertEqual(response['Location'], '/thanks/')
+
+    def test_post_invalid(self):
+        """
+        Invalid submissions should render the bound form without running the handlers
+        """
+        request = self.post('/contact/', {'name': ''})
+        get_token(request)
+        response = self.view(request, pk=self.form.pk)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context_data['form'].is_valid())
+        self.assertContains(response, 'This field is required.')
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_model_form(self):
+        """
+        The view should handle model forms
+        """
+        model_form = OmniModelFormFactory.create()
+        OmniCharFieldFactory.create(form=model_form, name='title', label='Title')
+        view = OmniFormView.as_view(model=OmniModelForm)
+        response = view(self.factory.get('/dummy/'), pk=model_form.pk)
+        response.render()
+        self.assertContains(response, 'name="title"')
+        response = view(self.post('/dummy/', {'title': 'Test'}), pk=model_form.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(DummyModel.objects.exists())
+
+    def add_file_field(self):
+        """
+        Helper method for adding a file field with a maximum upload size to the form
+        """
+        OmniFileField.objects.create(
+            form=self.form,
+            name='cv',
+            label='CV',
+            widget_class='django.forms.widgets.FileInput',
+            max_upload_size=1024,
+            order=1
+        )
+        definition_cache.clear()
+
+    def test_upload(self):
+        """
+        Files within the maximum upload size should be handled
+        """
+        self.add_file_field()
+        request = self.post('/contact/', {'name': 'Joe', 'cv': SimpleUploadedFile('cv.txt', b'x' * 1024)})
+        response = self.view(request, pk=self.form.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_upload_deduplicated(self):
+        """
+        Files for fields with deduplicate set should be hashed while received and stored when handled
+        """
+        self.add_file_field()
+        OmniFileField.objects.filter(name='cv').update(deduplicate=True)
+        definition_cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        request = self.post('/contact/', {'name': 'Joe', 'cv': SimpleUploadedFile('cv.txt', b'x' * 1024)})
+        with override_settings(OMNI_FORMS_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+                               MEDIA_ROOT=directory):
+            with patch('omniforms.storage.mmap') as mmap:
+                response = self.view(request, pk=self.form.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(mmap.mmap.called)
+        self.assertEqual(OmniFormStoredFile.objects.get().sha256, hashlib.sha256(b'x' * 1024).hexdigest())
+
+    def test_upload_too_large(self):
+        """
+        Files larger than the maximum upload size should be cut off and rejected by the form
+        """
+        self.add_file_field()
+        request = self.post('/contact/', {'name': 'Joe', 'cv': SimpleUploadedFile('cv.txt', b'x' * 100000)})
+        get_token(request)
+        response = self.view(request, pk=self.form.pk)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['form'].errors['cv'], ['Ensure this file is no larger than 1.0\xa0KB.'])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_request_too_large(self):
+        """
+        Requests larger than any valid submission should be rejected without the body being read
+        """
+        self.add_file_field()
+        request = self.post('/contact/', {'name': 'Joe'})
+        request.META['CONTENT_LENGTH'] = '1000000000'
+        with patch.object(request, 'read') as read:
+            response = self.view(request, pk=self.form.pk)
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(read.called)
+
+    def test_csrf(self):
+        """
+        The view should make the CSRF check the middleware is exempted from
+        """
+        response = self.view(self.factory.post('/contact/', {'name': 'Joe'}), pk=self.form.pk)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(self.view.csrf_exempt)
+
+    @override_settings(MIDDLEWARE=['omniforms.tests.test_views.CustomCsrfViewMiddleware'])
+    def test_csrf_middleware_subclass(self):
+        """
+        The view should make the CSRF check when a subclass of the middleware is installed
+        """
+        response = self.view(self.factory.post('/contact/', {'name': 'Joe'}), pk=self.form.pk)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_invalid_content_length(self):
+        """
+        Invalid content lengths should be treated as 0 rather than failing the request
+        """
+        self.add_file_field()
+        request = self.post('/contact/', {'name': 'Joe'})
+        request.META['CONTENT_LENGTH'] = 'invalid'
+        with patch.object(request, 'read', return_value=b''):
+            response = self.view(request, pk=self.form.pk)
+        self.assertEqual(response.status_code, 200)
+
+
+class OmniFormSubmissionViewTestCase(TestCase):
+    """
+    Tests the OmniFormSubmissionView class
+    """
+    def setUp(self):
+        super(OmniFormSubmissionViewTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name', required=True)
+        OmniFormEmailHandlerFactory.create(form=self.form)
+        self.factory = RequestFactory()
+        self.view = OmniFormSubmissionView.as_view()
+
+    def post(self, data, pk=None):
+        """
+        Helper method for posting JSON to the view
+
+        :param data: The request body, encoded as JSON unless it is a string
+        :param pk: The primary key of the form, defaults to that of the test form
+        :return: Tuple of the response and its decoded content
+        """
+        body = data if isinstance(data, str) else json.dumps(data)
+        request = self.factory.post('/api/contact/', body, content_type='application/json')
+        response = self.view(request, pk=self.form.pk if pk is None else pk)
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def test_valid(self):
+        """
+        Valid submissions should be handled by the forms handlers
+        """
+        response, content = self.post({'name': 'Joe'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, {'valid': True})
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_invalid(self):
+        """
+        Invalid submissions should receive the errors for each field without being handled
+        """
+        response, content = self.post({'name': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content, {
+            'valid': False,
+            'errors': {'name': [{'message': 'This field is required.', 'code': 'required'}]}
+        })
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_invalid_body(self):
+        """
+        Request bodies that are not JSON objects should receive an error
+        """
+        response, content = self.post('{')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content, {'valid': False, 'error': 'The request body must be valid JSON'})
+        response, content = self.post([{'name': 'Joe'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content, {'valid': False, 'error': 'The request body must be a JSON object'})
+
+    def test_get(self):
+        """
+        Only POST requests should be permitted
+        """
+        self.assertEqual(self.view(self.factory.get('/api/contact/'), pk=self.form.pk).status_code, 405)
+
+    def test_not_found(self):
+        """
+        A 404 should be raised for forms that do not exist
+        """
+        self.assertRaises(Http404, self.post, {'name': 'Joe'}, pk=0)
+
+
+class OmniFormBulkSubmissionViewTestCase(TestCase):
+    """
+    Tests the OmniFormBulkSubmissionView class
+    """
+    def setUp(self):
+        super(OmniFormBulkSubmissionViewTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniModelFormFactory.create(content_type=ContentType.objects.get_for_model(DummyModel2))
+        OmniCharFieldFactory.create(form=self.form, name='title', label='Title', required=True)
+        OmniFormSaveInstanceHandler.objects.create(form=self.form, name='Save', order=0)
+        OmniFormEmailHandlerFactory.create(form=self.form, order=1)
+        self.factory = RequestFactory()
+        self.view = OmniFormBulkSubmissionView.as_view(model=OmniModelForm)
+
+    def post(self, data):
+        """
+        Helper method for posting JSON to the view
+
+        :param data: The request body, encoded as JSON
+        :return: Tuple of the response and its decoded content
+        """
+        request = self.factory.post('/api/dummy/bulk/', json.dumps(data), content_type='application/json')
+        response = self.view(request, pk=self.form.pk)
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def test_valid(self):
+        """
+        Valid submissions should be handled together in batch mode
+        """
+        data = [{'title': 'Submission {0}'.format(index)} for index in range(50)]
+        with patch('omniforms.models.get_connection', wraps=get_connection) as patched_method:
+            response, content = self.post(data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, {'valid': True, 'count': 50})
+        self.assertEqual(DummyModel2.objects.count(), 50)
+        self.assertEqual(len(mail.outbox), 50)
+        patched_method.assert_called_once_with()
+
+    def test_queries(self):
+        """
+        The number of queries should not depend on the number of submissions
+        """
+        self.post([{'title': 'Warm up'}])
+        # The savepoint, its release and an INSERT statement for each batch of 100 instances
+        with self.assertNumQueries(4):
+            self.post([{'title': 'Submission {0}'.format(index)} for index in range(200)])
+        self.assertEqual(DummyModel2.objects.count(), 201)
+
+    def test_invalid(self):
+        """
+        No submissions should be handled if any are invalid, and the errors of each invalid submission returned
+        """
+        response, content = self.post([{'title': 'Valid'}, {'title': ''}, {}])
+        self.assertEqual(response.status_code, 400)
+        error = {'title': [{'message': 'This field is required.', 'code': 'required'}]}
+        self.assertEqual(content, {
+            'valid': False,
+            'errors': [{'index': 1, 'errors': error}, {'index': 2, 'errors': error}]
+        })
+        self.assertFalse(DummyModel2.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_rolled_back(self):
+        """
+        Submissions should be handled in a single transaction
+        """
+        with patch('omniforms.models.OmniFormEmailHandler.handle_batch', side_effect=IOError):
+            self.assertRaises(IOError, self.post, [{'title': 'First'}, {'title': 'Second'}])
+        self.assertFalse(DummyModel2.objects.exists())
+
+    def test_invalid_body(self):
+        """
+        Request bodies that are not JSON arrays of objects should receive an error
+        """
+        response, content = self.post({'title': 'Test'})
+        self.assertEqual(content, {'valid': False, 'error': 'The request body must be a JSON array'})
+        response, content = self.post(['Test'])
+        self.assertEqual(content, {'valid': False, 'error': 'Each submission must be a JSON object'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_max_submissions(self):
+        """
+        Requests holding more than the maximum number of submissions should receive an error
+        """
+        self.view = OmniFormBulkSubmissionView.as_view(model=OmniModelForm, max_submissions=2)
+        response, content = self.post([{'title': 'Test'}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content, {'valid': False, 'error': 'No more than 2 submissions may be sent at once'})
+        self.assertFalse(DummyModel2.objects.exists())
+
+
+class OmniFormFieldValidationViewTestCase(TestCase):
+    """
+    Tests the OmniFormFieldValidationView class
+    """
+    def setUp(self):
+        super(OmniFormFieldValidationViewTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name', required=True, max_length=5)
+        OmniEmailFieldFactory.create(form=self.form, name='email', label='Email', required=False)
+        OmniBooleanFieldFactory.create(form=self.form, name='agree', label='Agree', required=True)
+        OmniFileField.objects.create(
+            form=self.form,
+            name='upload',
+            label='Upload',
+            order=3,
+            widget_class='django.forms.widgets.ClearableFileInput'
+        )
+        OmniFormEmailHandlerFactory.create(form=self.form)
+        self.factory = RequestFactory()
+        self.view = OmniFormFieldValidationView.as_view()
+
+    def post(self, data):
+        """
+        Helper method for posting JSON to the view
+
+        :param data: The request body, encoded as JSON
+        :return: Tuple of the response and its decoded content
+        """
+        request = self.factory.post('/api/contact/validate/', json.dumps(data), content_type='application/json')
+        response = self.view(request, pk=self.form.pk)
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def test_valid(self):
+        """
+        Valid values should be reported as valid
+        """
+        response, content = self.post({'field': 'email', 'value': 'joe@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, {'valid': True})
+        self.assertEqual(self.post({'field': 'email', 'value': ''})[1], {'valid': True})
+        self.assertEqual(self.post({'field': 'agree', 'value': True})[1], {'valid': True})
+
+    def test_invalid(self):
+        """
+        Invalid values should be reported along with their errors
+        """
+        response, content = self.post({'field': 'email', 'value': 'invalid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, {
+            'valid': False,
+            'errors': [{'message': 'Enter a valid email address.', 'code': 'invalid'}]
+        })
+        self.assertEqual(
+            self.post({'field': 'name', 'value': 'Joe Bloggs'})[1]['errors'][0]['code'],
+            'max_length'
+        )
+        self.assertEqual(self.post({'field': 'name'})[1]['errors'][0]['code'], 'required')
+
+    def test_widget_value(self):
+        """
+        Values should be read through the field widget in the same way as a form submission
+        """
+        self.assertEqual(self.post({'field': 'agree', 'value': 'false'})[1]['errors'][0]['code'], 'required')
+
+    def test_no_queries(self):
+        """
+        No database queries should be made, nor the form built or handled, once the form class is cached
+        """
+        self.post({'field': 'name', 'value': 'Joe'})
+        with patch('omniforms.forms.OmniFormBaseForm.__init__') as init:
+            with self.assertNumQueries(0):
+                response, content = self.post({'field': 'name', 'value': 'Joe'})
+        self.assertEqual(content, {'valid': True})
+        self.assertFalse(init.called)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_unknown_field(self):
+        """
+        Requests for fields the form does not have should receive an error
+        """
+        response, content = self.post({'field': 'unknown', 'value': 'Joe'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content, {'valid': False, 'error': 'The form has no field named "unknown"'})
+        self.assertEqual(self.post({'field': ['name'], 'value': 'Joe'})[0].status_code, 400)
+
+    def test_file_field(self):
+        """
+        Requests for file fields should receive an error
+        """
+        response, content = self.post({'field': 'upload', 'value': 'file.txt'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content, {'valid': False, 'error': 'File fields cannot be validated on their own'})
+
+
+class OmniFormManifestViewTestCase(TestCase):
+    """
+    Tests the OmniFormManifestView class
+    """
+    def setUp(self):
+        super(OmniFormManifestViewTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name', required=True, max_length=10)
+        self.form.refresh_from_db()
+        self.factory = RequestFactory()
+        self.view = OmniFormManifestView.as_view()
+
+    def get(self, **headers):
+        """
+        Helper method for making a GET request to the view
+
+        :param headers: Request headers
+        :return: Response
+        """
+        return self.view(self.factory.get('/api/contact/manifest/', **headers), pk=self.form.pk)
+
+    def test_get(self):
+        """
+        The view should serve the manifest with ETag, Last-Modified and Cache-Control headers
+        """
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {
+            'version': self.form.version,
+            'schema': {
+                '$schema': 'http://json-schema.org/draft-07/schema#',
+                'title': self.form.title,
+                'type': 'object',
+                'properties': {'name': {'title': 'Name', 'type': 'string', 'minLength': 1, 'maxLength': 10}},
+                'required': ['name']
+            },
+            'conditions': []
+        })
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(response['Last-Modified'], http_date(timegm(self.form.modified.utctimetuple())))
+        self.assertEqual(set(response['Cache-Control'].split(', ')), {'public', 'max-age=300'})
+
+    def test_cached(self):
+        """
+        No database queries should be made once the manifest is cached
+        """
+        self.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_if_none_match(self):
+        """
+        A 304 response should be returned without loading the manifest if the ETag matches
+        """
+        etag = self.get()['ETag']
+        with patch.object(definition_cache, 'get_manifest') as get_manifest:
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(get_manifest.called)
+
+    def test_version_change(self):
+        """
+        The ETag and manifest should change once the definition changes
+        """
+        etag = self.get()['ETag']
+        OmniCharFieldFactory.create(form=self.form, name='email', label='Email')
+        cache.clear()
+        definition_cache.clear()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('email', json.loads(response.content.decode('utf-8'))['schema']['properties'])
+
+    def test_not_found(self):
+        """
+        A 404 should be raised for forms that do not exist
+        """
+        self.assertRaises(Http404, self.view, self.factory.get('/api/contact/manifest/'), pk=0)
+
+
+class OmniFormWizardViewTestCase(TestCase):
+    """
+    Tests the OmniFormWizardView class
+    """
+    def setUp(self):
+        super(OmniFormWizardViewTestCase, self).setUp()
+        cache.clear()
+        definition_cache.clear()
+        self.addCleanup(definition_cache.clear)
+        self.form = OmniFormFactory.create()
+        OmniCharFieldFactory.create(form=self.form, name='name', label='Name', required=True, order=0)
+        OmniEmailFieldFactory.create(form=self.form, name='email', label='Email', required=True, order=1)
+        OmniCharFieldFactory.create(form=self.form, name='address', label='Address', order=2, page_break=True)
+        OmniBooleanFieldFactory.create(form=self.form, name='agree', label='Agree', required=True, order=3,
+                                       page_break=True)
+        OmniFormEmailHandlerFactory.create(form=self.form)
+        self.factory = RequestFactory()
+        self.session = SessionStore()
+        self.view = OmniFormWizardView.as_view(success_url='/thanks/')
+
+    def request(self, method, query='', data=None):
+        """
+        Helper method for making a request to the view using the test session
+
+        :param method: The HTTP method
+        :param query: Query string
+        :param data: POST data
+        :return: Response
+        """
+        request = getattr(self.factory, method)('/apply/{0}'.format(query), data or {})
+        request._dont_enforce_csrf_checks = True
+        request.session = self.session
+        response = self.view(request, pk=self.form.pk)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def get_draft(self):
+        """
+        Helper method for getting the draft stored in the session
+
+        :return: Draft dict
+        """
+        return self.session.get('omniforms:draft:{0}'.format(definition_cache.get_key(OmniForm, self.form.pk)))
+
+    def test_get(self):
+        """
+        The first step should only hold the fields of the step
+        """
+        response = self.request('get')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context_data['form'].fields.keys()), ['name', 'email'])
+        self.assertEqual(response.context_data['step'], 0)
+        self.assertEqual(response.context_data['step_count'], 3)
+        self.assertContains(response, 'Step 1 of 3')
+        self.assertContains(response, 'Next')
+
+    def test_steps(self):
+        """
+        Valid steps should be stored in the session, and the submission handled once after the final step
+        """
+        response = self.request('post', data={'name': 'Joe', 'email': 'joe@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/apply/?step=1')
+        self.assertEqual(self.get_draft()['completed'], 1)
+        self.assertEqual(self.get_draft()['data'], {'name': 'Joe', 'email': 'joe@example.com'})
+
+        response = self.request('get', '?step=1')
+        self.assertEqual(list(response.context_data['form'].fields.keys()), ['address'])
+        response = self.request('post', '?step=1', {'address': 'Somewhere'})
+        self.assertEqual(response['Location'], '/apply/?step=2')
+        self.assertEqual(len(mail.outbox), 0)
+
+        response = self.request('get', '?step=2')
+        self.assertContains(response, 'Submit')
+        response = self.request('post', '?step=2', {'agree': 'on'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/thanks/')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNone(self.get_draft())
+
+    def test_step_invalid(self):
+        """
+        Invalid steps should be displayed again with their errors
+        """
+        response = self.request('post', data={'name': 'Joe', 'email': 'invalid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context_data['form'].errors.keys()), ['email'])
+        self.assertIsNone(self.get_draft())
+
+    def test_previous_step(self):
+        """
+        Completed steps should be displayed with the values entered for them
+        """
+        self.request('post', data={'name': 'Joe', 'email': 'joe@example.com'})
+        response = self.request('get', '?step=0')
+        self.assertEqual(response.context_data['step'], 0)
+        self.assertContains(response, 'value="Joe"')
+        self.assertContains(response, 'Back', count=0)
+        self.assertContains(self.request('get', '?step=1'), 'Back')
+
+    def test_step_not_reached(self):
+        """
+        Steps after the first step not yet completed should not be displayed
+        """
+        self.assertEqual(self.request('get', '?step=2').context_data['step'], 0)
+        self.assertEqual(self.request('get', '?step=invalid').context_data['step'], 0)
+        response = self.request('post', '?step=2', {'agree': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['step'], 0)
+
+    def test_version_change(self):
+        """
+        The draft should be discarded once the definition changes
+        """
+        self.request('post', data={'name': 'Joe', 'email': 'joe@example.com'})
+        OmniCharFieldFactory.create(form=self.form, name='phone', label='Phone', order=4)
+        cache.clear()
+        definition_cache.clear()
+        self.assertEqual(self.request('get', '?step=1').context_data['step'], 0)
+
+    def test_conditions(self):
+        """
+        Conditions should be evaluated against the values entered for earlier steps
+        """
+        address = OmniField.objects.get(name='address').specific
+        address.required = True
+        address.condition_field = 'name'
+        address.condition_operator = 'equals'
+        address.condition_value = 'Joe'
+        address.save()
+        cache.clear()
+        definition_cache.clear()
+
+        self.request('post', data={'name': 'Ann', 'email': 'ann@example.com'})
+        self.assertEqual(self.request('post', '?step=1').status_code, 302)
+        self.request('post', '?step=0', {'name': 'Joe', 'email': 'joe@example.com'})
+        response = self.request('post', '?step=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context_data['form'].errors.keys()), ['address'])
+
+    def test_submission_invalid(self):
+        """
+        The first step holding an error should be displayed if the whole submission is not valid
+        """
+        self.request('post', data={'name': 'Joe', 'email': 'joe@example.com'})
+        self.request('post', '?step=1', {'address': 'Somewhere'})
+        draft = self.get_draft()
+        draft['data']['email'] = 'invalid'
+        self.session['omniforms:draft:{0}'.format(definition_cache.get_key(OmniForm, self.form.pk))] = draft
+        response = self.request('post', '?step=2', {'agree': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['step'], 0)
+        self.assertIn('email', response.context_data['form'].errors)
+        self.assertEqual(self.get_draft()['completed'], 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_queries(self):
+        """
+        Steps should be displayed and validated without querying the database once the form class is cached
+        """
+        self.request('get')
+        with self.assertNumQueries(0):
+            self.request('get')
+            self.request('post', data={'name': 'Joe', 'email': 'joe@example.com'})
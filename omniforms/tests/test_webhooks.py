@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the omniforms webhooks module
+"""
+from __future__ import unicode_literals
+from django.test import SimpleTestCase, override_settings
+from django.utils.six.moves import http_client
+from mock import Mock, patch
+from omniforms.tests.utils import StandInServer
+from omniforms.webhooks import ConnectionPool, WebhookBatcher, WebhookClient, WebhookError
+import select
+import socket
+import threading
+
+
+class StandInServerTestCase(SimpleTestCase):
+    """
+    Test case running a local stand in server for webhooks to post to
+    """
+    def setUp(self):
+        super(StandInServerTestCase, self).setUp()
+        self.server = StandInServer()
+        self.pool = ConnectionPool()
+
+    def tearDown(self):
+        super(StandInServerTestCase, self).tearDown()
+        self.pool.clear()
+        self.server.stop()
+
+
+class ConnectionPoolTestCase(StandInServerTestCase):
+    """
+    Tests the ConnectionPool class
+    """
+    def test_request(self):
+        """
+        The request method should send the request and return the response status and body
+        """
+        status, content = self.pool.request(
+            'POST',
+            '{0}/hook/?key=1'.format(self.server.url),
+            body=b'{}',
+            headers={'Content-Type': 'application/json'}
+        )
+        self.assertEqual((status, content), (200, b'ok'))
+        self.assertEqual(self.server.requests[0]['path'], '/hook/?key=1')
+        self.assertEqual(self.server.requests[0]['body'], b'{}')
+
+    def test_keep_alive(self):
+        """
+        Connections should be reused for later requests to the same host
+        """
+        for i in range(3):
+            self.pool.request('POST', self.server.url, body=b'{}')
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_connection_close(self):
+        """
+        Connections the server closes should not be reused
+        """
+        self.server.close_connections = 'announce'
+        for i in range(2):
+            self.pool.request('POST', self.server.url, body=b'{}')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_dropped_connection(self):
+        """
+        Idle connections the server dropped should be discarded rather than reused
+        """
+        self.server.close_connections = True
+        self.assertEqual(self.pool.request('POST', self.server.url, body=b'{}')[0], 200)
+        connection = self.pool._connections[('http', '127.0.0.1', self.server.server_address[1])][0]
+        # Waits for the server to close its end of the connection
+        select.select([connection.sock], [], [], 5)
+        self.assertEqual(self.pool.request('POST', self.server.url, body=b'{}')[0], 200)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def get_failing_connection(self):
+        """
+        Helper method for pooling a connection that fails once the request has been sent
+
+        :return: Mock connection
+        """
+        connection = Mock(sock=None)
+        connection.getresponse.side_effect = http_client.BadStatusLine('')
+        self.pool._release(('http', '127.0.0.1', self.server.server_address[1]), connection)
+        return connection
+
+    def test_reused_connection_failure(self):
+        """
+        Requests that fail over a reused connection may have been received, so should not be repeated by default
+        """
+        connection = self.get_failing_connection()
+        self.assertRaises(http_client.HTTPException, self.pool.request, 'POST', self.server.url, body=b'{}')
+        connection.request.assert_called_once_with('POST', '/', body=b'{}', headers={})
+        self.assertEqual(self.server.requests, [])
+
+    def test_reused_connection_retry(self):
+        """
+        Requests that fail over a reused connection should be repeated over a new connection if asked to,
+        and by default for idempotent methods
+        """
+        self.get_failing_connection()
+        self.assertEqual(self.pool.request('POST', self.server.url, body=b'{}', retry_reused=True)[0], 200)
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.pool.clear()
+        self.get_failing_connection()
+        # The stand in server only implements POST, so answers the repeated PUT with 501
+        self.assertEqual(self.pool.request('PUT', self.server.url, body=b'{}')[0], 501)
+
+    @override_settings(OMNI_FORMS_WEBHOOK_POOL_SIZE=1)
+    def test_max_idle(self):
+        """
+        Connections should be closed rather than returned to a full pool
+        """
+        connection = Mock()
+        self.pool._release(('http', '127.0.0.1', 80), Mock())
+        self.pool._release(('http', '127.0.0.1', 80), connection)
+        connection.close.assert_called_once_with()
+
+    def test_invalid_url(self):
+        """
+        Only http and https URLs should be accepted
+        """
+        self.assertRaises(ValueError, self.pool.request, 'POST', 'ftp://example.com/')
+        self.assertRaises(ValueError, self.pool.request, 'POST', '/hook/')
+
+
+@patch.object(WebhookClient, 'sleep')
+class WebhookClientTestCase(StandInServerTestCase):
+    """
+    Tests the WebhookClient class
+    """
+    def setUp(self):
+        super(WebhookClientTestCase, self).setUp()
+        self.client = WebhookClient(self.pool)
+
+    def test_post(self, sleep):
+        """
+        The post method should post the body and return the response body
+        """
+        self.assertEqual(self.client.post(self.server.url, b'{}', {'X-Test': 'yes'}), b'ok')
+        self.assertEqual(self.server.requests[0]['headers']['X-Test'], 'yes')
+        self.assertFalse(sleep.called)
+
+    @override_settings(OMNI_FORMS_WEBHOOK_BACKOFF=2)
+    def test_retry(self, sleep):
+        """
+        Server errors should be retried with exponential backoff
+        """
+        self.server.statuses = [503, 429, 500]
+        self.assertEqual(self.client.post(self.server.url, b'{}', max_retries=3), b'ok')
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual([call[0][0] for call in sleep.call_args_list], [2, 4, 8])
+
+    def test_retries_exhausted(self, sleep):
+        """
+        An error should be raised once every retry has failed
+        """
+        self.server.statuses = [500, 502, 503]
+        with self.assertRaises(WebhookError) as context:
+            self.client.post(self.server.url, b'{}', max_retries=2)
+        self.assertEqual(context.exception.status, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_error_not_retried(self, sleep):
+        """
+        Client errors should not be retried
+        """
+        self.server.statuses = [400]
+        with self.assertRaises(WebhookError) as context:
+            self.client.post(self.server.url, b'{}')
+        self.assertEqual(context.exception.status, 400)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertFalse(sleep.called)
+
+    def test_connection_error(self, sleep):
+        """
+        Connection failures should be retried, then raised as WebhookError
+        """
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{0}/'.format(listener.getsockname()[1])
+        listener.close()
+        with self.assertRaises(WebhookError) as context:
+            self.client.post(url, b'{}', max_retries=1)
+        self.assertIsNone(context.exception.status)
+        self.assertEqual(sleep.call_count, 1)
+
+
+class WebhookBatcherTestCase(SimpleTestCase):
+    """
+    Tests the WebhookBatcher class
+    """
+    def setUp(self):
+        super(WebhookBatcherTestCase, self).setUp()
+        self.batcher = WebhookBatcher()
+        self.handler = Mock(pk=1, batch_size=3, batch_window=60)
+
+    def tearDown(self):
+        super(WebhookBatcherTestCase, self).tearDown()
+        for timer in self.batcher._timers.values():
+            timer.cancel()
+
+    def test_full_batch(self):
+        """
+        Batches should be sent in the background as soon as they are full
+        """
+        for i in range(4):
+            self.batcher.add(self.handler, {'i': i})
+        self.batcher.wait()
+        self.handler.send.assert_called_once_with([{'i': 0}, {'i': 1}, {'i': 2}])
+        self.assertEqual(self.batcher.pending, 1)
+
+    def test_no_window(self):
+        """
+        Submissions for handlers without a batch window should be sent in the background straight away
+        """
+        sending = threading.Event()
+        send = threading.Event()
+        self.handler.batch_window = 0
+        self.handler.send.side_effect = lambda payloads: sending.set() or send.wait(5)
+        self.batcher.add(self.handler, {'i': 0})
+        self.assertTrue(sending.wait(5))
+        self.assertEqual(self.batcher.pending, 0)
+        send.set()
+        self.batcher.wait()
+        self.handler.send.assert_called_once_with([{'i': 0}])
+        self.assertEqual(self.batcher._threads, set())
+
+    def test_send_in_background_failure_logged(self):
+        """
+        Failures sending in the background should be logged without stopping the batches after them
+        """
+        self.handler.send.side_effect = [WebhookError('Nope'), None]
+        with patch('omniforms.webhooks.logger') as logger:
+            self.batcher.send_in_background(self.handler, [[{'i': 0}], [{'i': 1}]])
+            self.batcher.wait()
+        logger.exception.assert_called_once()
+        self.assertEqual(self.handler.send.call_count, 2)
+
+    def test_window(self):
+        """
+        Batches should be sent when their window closes
+        """
+        sent = threading.Event()
+        self.handler.batch_window = 0.01
+        self.handler.send.side_effect = lambda payloads: sent.set()
+        self.batcher.add(self.handler, {'i': 0})
+        self.assertTrue(sent.wait(5))
+        self.handler.send.assert_called_once_with([{'i': 0}])
+        self.assertEqual(self.batcher.pending, 0)
+
+    def test_window_failure_logged(self):
+        """
+        Failures sending batches in the background should be logged
+        """
+        self.handler.send.side_effect = WebhookError('Nope')
+        self.batcher.add(self.handler, {'i': 0})
+        with patch('omniforms.webhooks.logger') as logger:
+            self.batcher._flush_in_background(1)
+        logger.exception.assert_called_once()
+        self.assertEqual(self.batcher.pending, 0)
+
+    def test_flush_all(self):
+        """
+        The flush_all method should send every batch held back
+        """
+        other_handler = Mock(pk=2, batch_size=3, batch_window=60)
+        self.batcher.add(self.handler, {'i': 0})
+        self.batcher.add(other_handler, {'i': 1})
+        self.batcher.flush_all()
+        self.handler.send.assert_called_once_with([{'i': 0}])
+        other_handler.send.assert_called_once_with([{'i': 1}])
+        self.assertEqual(self.batcher._timers, {})
+
+    def test_unsaved_handler(self):
+        """
+        Submissions for unsaved handlers (for instance from form definitions) should be batched per instance
+        """
+        handler = Mock(pk=None, batch_size=2, batch_window=60)
+        other_handler = Mock(pk=None, batch_size=2, batch_window=60)
+        self.batcher.add(handler, {'i': 0})
+        self.batcher.add(other_handler, {'i': 1})
+        self.assertFalse(handler.send.called)
+        self.assertEqual(self.batcher.pending, 2)
+        self.batcher.flush_all()
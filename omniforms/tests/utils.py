@@ -6,7 +6,9 @@ from __future__ import unicode_literals
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.test import TestCase
+from django.utils.six.moves import BaseHTTPServer, socketserver
 from omniforms.tests.factories import OmniFormFactory, OmniModelFormFactory
+import threading
 
 
 class UserTestCaseStub(TestCase):
@@ -84,3 +86,77 @@ class OmniBasicFormAdminTestCaseStub(OmniBasicFormTestCaseStub):
         self.user.user_permissions.add(self.change_form_permission)
         self.user.user_permissions.add(self.add_handler_permission)
         self.user.user_permissions.add(self.change_handler_permission)
+
+
+class StandInRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Request handler for the StandInServer.  Records each request and responds with the next queued status
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        """
+        Counts the connections made to the server
+        """
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        """
+        Records the request and responds
+        """
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append({'path': self.path, 'headers': dict(self.headers.items()), 'body': body})
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        if self.server.close_connections == 'announce':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(b'ok')
+        if self.server.close_connections:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        """
+        Keeps test output quiet
+        """
+        pass
+
+
+class StandInServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local HTTP server standing in for the services webhooks post to.  Connections are kept alive unless
+    close_connections is set, either to 'announce' (sending a 'Connection: close' header) or to True
+    (closing the connection without warning, as a server dropping idle connections would)
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        """
+        Starts the server on a free port in a background thread
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInRequestHandler)
+        self.requests = []
+        self.statuses = []
+        self.connections = 0
+        self.close_connections = False
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.01})
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def url(self):
+        """
+        The base URL of the server
+
+        :return: URL
+        """
+        return 'http://127.0.0.1:{0}'.format(self.server_address[1])
+
+    def stop(self):
+        """
+        Stops the server
+        """
+        self.shutdown()
+        self.server_close()
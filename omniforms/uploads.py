@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Upload handling for the omniforms app.  Files are checked against the maximum upload size of their
+field while they are received, so oversized uploads are cut off as soon as they exceed the limit
+rather than once the whole request has been received.  Files for fields storing their uploads
+deduplicated (see omniforms.storage) are hashed as they are received
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils.datastructures import MultiValueDict
+from io import BytesIO
+import hashlib
+
+
+class RejectedUpload(UploadedFile):
+    """
+    Stands in for a file that was cut off part way through the upload.  The size is the number of bytes
+    received before the upload was cut off, which is larger than the limit, so the form field rejects
+    the file (see omniforms.forms.UploadSizeMixin).  No content is held
+    """
+    def __init__(self, name, content_type, size, charset=None, content_type_extra=None):
+        """
+        Sets up the file
+
+        :param name: The name of the uploaded file
+        :param content_type: The content type sent for the file
+        :param size: The number of bytes received
+        :param charset: The charset sent for the file
+        :param content_type_extra: Dict of extra content type parameters
+        """
+        super(RejectedUpload, self).__init__(BytesIO(), name, content_type, size, charset, content_type_extra)
+
+
+class BoundedUploadHandler(FileUploadHandler):
+    """
+    Upload handler enforcing the maximum upload size of each file field of a form while the request is
+    received.  Accepted files are written to a temporary file on disk a chunk at a time, so are never held
+    in memory in full.  As soon as the bytes received for a field exceed its limit the partial file is deleted
+    and the rest of the request is left unread; the file is then replaced by a RejectedUpload (see rejected),
+    and any fields following it in the request are missing.  Files for fields the form does not have are
+    limited to 0 bytes.  The SHA-256 digest of files for the hashed fields is calculated a chunk at a time
+    and set as the sha256 attribute of the uploaded file, so the file is not read again to be hashed
+    """
+    # Allowance for the multipart boundaries and headers when limiting the size of the whole request
+    request_overhead = 256 * 1024
+
+    def __init__(self, request=None, limits=None, hashed=()):
+        """
+        Sets up the handler
+
+        :param request: The request
+        :param limits: Dict of maximum upload sizes in bytes (None for no limit) keyed by field name
+        :param hashed: The names of the fields whose files are hashed
+        """
+        super(BoundedUploadHandler, self).__init__(request)
+        self.limits = limits or {}
+        self.hashed = frozenset(hashed)
+        self.digest = None
+        self.received = {}
+        self.rejected = MultiValueDict()
+
+    @property
+    def max_content_length(self):
+        """
+        The size of the largest request body that can hold a valid submission.  The size is not known unless
+        every file field has a maximum upload size and the size of the other fields is limited by the
+        DATA_UPLOAD_MAX_MEMORY_SIZE setting
+
+        :return: The size in bytes, or None if it is not known
+        """
+        limits = list(self.limits.values())
+        if None in limits or settings.DATA_UPLOAD_MAX_MEMORY_SIZE is None:
+            return None
+        return sum(limits) + settings.DATA_UPLOAD_MAX_MEMORY_SIZE + self.request_overhead
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        """
+        Opens the temporary file for a new upload, cutting the upload off straight away if the
+        content length sent for the file already exceeds the limit
+
+        :param field_name: The name of the field
+        :param file_name: The name of the uploaded file
+        :param content_type: The content type sent for the file
+        :param content_length: The content length sent for the file, if any
+        :param charset: The charset sent for the file
+        :param content_type_extra: Dict of extra content type parameters
+        :raises: StopUpload if the file is too large
+        """
+        super(BoundedUploadHandler, self).new_file(
+            field_name, file_name, content_type, content_length, charset, content_type_extra
+        )
+        self.limit = self.limits.get(field_name, 0)
+        self.digest = hashlib.sha256() if field_name in self.hashed else None
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        if content_length is not None:
+            self.check_size(content_length)
+
+    def check_size(self, size):
+        """
+        Cuts the upload off if the bytes received for the field exceed its limit
+
+        :param size: The number of bytes of the current file received (or about to be received)
+        :raises: StopUpload if the limit is exceeded
+        """
+        received = self.received.get(self.field_name, 0) + size
+        if self.limit is None or received <= self.limit:
+            return
+        self.file.close()
+        self.rejected.appendlist(self.field_name, RejectedUpload(
+            self.file_name,
+            self.content_type,
+            received,
+            self.charset,
+            self.content_type_extra
+        ))
+        raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        """
+        Writes a chunk of the file to the temporary file (hashing it for hashed fields),
+        unless the chunk takes the file over the limit
+
+        :param raw_data: The chunk of data
+        :param start: The position of the chunk in the file
+        :raises: StopUpload if the limit is exceeded
+        """
+        self.check_size(start + len(raw_data))
+        self.file.write(raw_data)
+        if self.digest is not None:
+            self.digest.update(raw_data)
+
+    def file_complete(self, file_size):
+        """
+        Completes the upload of a file
+
+        :param file_size: The size of the file in bytes
+        :return: TemporaryUploadedFile instance
+        """
+        self.received[self.field_name] = self.received.get(self.field_name, 0) + file_size
+        self.file.seek(0)
+        self.file.size = file_size
+        if self.digest is not None:
+            self.file.sha256 = self.digest.hexdigest()
+        return self.file
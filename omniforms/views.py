@@ -0,0 +1,730 @@
+# -*- coding: utf-8 -*-
+"""
+Public views for the omniforms app
+"""
+from __future__ import unicode_literals
+from calendar import timegm
+from django import forms
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import router, transaction
+from django.forms.utils import ErrorList
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.template.loader import get_template
+from django.utils import translation
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.generic import FormView, TemplateView, View
+from omniforms.cache import definition_cache
+from omniforms.models import OmniForm
+from omniforms.rendering import form_html_cache
+from omniforms.uploads import BoundedUploadHandler
+import hashlib
+import json
+
+
+class OmniFormMixin(object):
+    """
+    Mixin for views acting on an omni form identified by the pk URL keyword argument.
+    Set the model attribute to OmniModelForm (or pass it to as_view) for model forms
+    """
+    model = OmniForm
+    pk_url_kwarg = 'pk'
+
+    def get_pk(self):
+        """
+        Method for getting the primary key of the form
+
+        :return: Primary key
+        """
+        return self.kwargs[self.pk_url_kwarg]
+
+    def get_version(self):
+        """
+        Method for getting the current definition version of the form
+
+        :return: Definition version
+        :raises: Http404 if the form does not exist
+        """
+        try:
+            return definition_cache.get_version(self.model, self.get_pk())
+        except self.model.DoesNotExist:
+            raise Http404('No {0} found matching the query'.format(self.model._meta.verbose_name))
+
+    def get_form_class(self):
+        """
+        Method for getting the compiled form class for the form
+
+        :return: Form class
+        :raises: Http404 if the form does not exist
+        """
+        try:
+            return definition_cache.get_form_class(self.model, self.get_pk())
+        except self.model.DoesNotExist:
+            raise Http404('No {0} found matching the query'.format(self.model._meta.verbose_name))
+
+
+def csrf_middleware_installed():
+    """
+    Checks whether or not CsrfViewMiddleware, or a subclass of it, is installed
+
+    :return: bool
+    """
+    middleware = settings.MIDDLEWARE if settings.MIDDLEWARE is not None else settings.MIDDLEWARE_CLASSES
+    for middleware_path in middleware:
+        middleware_class = import_string(middleware_path)
+        if isinstance(middleware_class, type) and issubclass(middleware_class, CsrfViewMiddleware):
+            return True
+    return False
+
+
+def get_content_length(request):
+    """
+    Gets the content length of a request, treating missing or invalid values as 0 as HttpRequest does
+
+    :param request: The request
+    :return: int
+    """
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+class UploadLimitMixin(object):
+    """
+    Mixin for views receiving file uploads for an omni form.  The upload handler enforcing the maximum
+    upload size of the forms file fields (see omniforms.uploads.BoundedUploadHandler) is installed before
+    the request body is read, and requests larger than any valid submission receive a 413 response without
+    the body being read at all.
+
+    CsrfViewMiddleware reads the request body before the view runs, which would leave the default upload
+    handlers to receive the files, so the view is exempt from the middleware and makes the same check itself
+    once the upload handler has been installed
+    """
+    upload_handler_class = BoundedUploadHandler
+    upload_handler = None
+
+    def get_upload_handler(self):
+        """
+        Method for getting the upload handler for the request
+
+        :return: omniforms.uploads.BoundedUploadHandler instance
+        """
+        form_class = self.get_form_class()
+        return self.upload_handler_class(
+            self.request,
+            form_class.get_upload_limits(),
+            form_class.get_hashed_uploads()
+        )
+
+    def get_files(self):
+        """
+        Method for getting the uploaded files, including the files that were cut off part way through
+        the upload so that the form rejects them
+
+        :return: MultiValueDict of uploaded files
+        """
+        files = self.request.FILES
+        if self.upload_handler is not None and self.upload_handler.rejected:
+            files = files.copy()
+            files.update(self.upload_handler.rejected)
+        return files
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Installs the upload handler for POST requests before dispatching the request
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: Response
+        """
+        dispatch = super(UploadLimitMixin, self).dispatch
+        if request.method != 'POST':
+            return dispatch(request, *args, **kwargs)
+
+        self.upload_handler = self.get_upload_handler()
+        max_content_length = self.upload_handler.max_content_length
+        if max_content_length is not None and get_content_length(request) > max_content_length:
+            return HttpResponse(status=413)
+        request.upload_handlers = [self.upload_handler]
+        if csrf_middleware_installed():
+            dispatch = csrf_protect(dispatch)
+        return dispatch(request, *args, **kwargs)
+
+
+class OmniFormView(UploadLimitMixin, OmniFormMixin, FormView):
+    """
+    View for displaying and handling an omni form, identified by the pk URL keyword argument.
+    Set the model attribute to OmniModelForm (or pass it to as_view) for model forms.
+
+    Unbound forms are rendered using the cached form HTML (see omniforms.rendering) and GET
+    responses carry ETag and Last-Modified headers derived from the forms definition version,
+    meaning conditional requests for an unchanged form receive a 304 response without the form
+    being compiled or rendered.  Valid submissions are passed to the forms handlers.  Uploaded files
+    are cut off as soon as they exceed the maximum upload size of their field (see UploadLimitMixin).
+
+    The page template receives the rendered form as form_html, along with the bound form as form
+    when a submission is not valid.
+    """
+    template_name = 'omniforms/omniform_form.html'
+    form_template_name = None
+
+    def get_etag(self, version):
+        """
+        Method for getting the ETag for the page.  The ETag changes whenever the definition version,
+        the active language or the users CSRF token changes, as each of these change the HTML
+
+        :param version: The definition version
+        :return: Quoted ETag
+        """
+        value = '{0}:{1}:{2}:{3}:{4}'.format(
+            definition_cache.get_key(self.model, self.get_pk()),
+            version,
+            translation.get_language(),
+            self.request.META.get('CSRF_COOKIE', ''),
+            self.template_name
+        )
+        return quote_etag(hashlib.md5(value.encode('utf-8')).hexdigest())
+
+    def get_last_modified(self, version):
+        """
+        Method for getting the time the form was last modified
+
+        :param version: The definition version
+        :return: Timestamp
+        """
+        return timegm(definition_cache.get_modified(self.model, self.get_pk(), version).utctimetuple())
+
+    def get_success_url(self):
+        """
+        Method for getting the URL to redirect to once the form has been handled
+
+        :return: The success URL if set, or the current URL
+        """
+        return self.success_url or self.request.get_full_path()
+
+    def get(self, request, *args, **kwargs):
+        """
+        Renders the unbound form.  Conditional requests for an unchanged form receive a 304 response.
+        Responses for forms with per request initial values are not conditional
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: Response
+        """
+        version = self.get_version()
+        initial = self.get_initial()
+        if initial:
+            return self.render_unbound_form(initial)
+
+        etag = self.get_etag(version)
+        last_modified = self.get_last_modified(version)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.render_unbound_form(initial)
+        if not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        return response
+
+    def render_unbound_form(self, initial):
+        """
+        Renders the page using the cached form HTML
+
+        :param initial: Dict of per request initial values keyed by field name
+        :return: Response
+        """
+        form_html = form_html_cache.render(
+            self.request,
+            self.model,
+            self.get_pk(),
+            initial=initial,
+            template_name=self.form_template_name
+        )
+        return self.render_to_response(self.get_context_data(form=None, form_html=form_html))
+
+    def get_form_kwargs(self):
+        """
+        Binds the form to the uploaded files, including any cut off part way through the upload
+
+        :return: Dict of form constructor kwargs
+        """
+        kwargs = super(OmniFormView, self).get_form_kwargs()
+        if 'files' in kwargs:
+            kwargs['files'] = self.get_files()
+        return kwargs
+
+    def form_valid(self, form):
+        """
+        Passes the submission to the forms handlers before redirecting to the success URL
+
+        :param form: The valid form
+        :return: Redirect response
+        """
+        form.handle()
+        return super(OmniFormView, self).form_valid(form)
+
+    def form_invalid(self, form):
+        """
+        Renders the page with the bound form
+
+        :param form: The invalid form
+        :return: Response
+        """
+        template = get_template(self.form_template_name or form_html_cache.default_template_name)
+        form_html = template.render({'form': form}, self.request)
+        return self.render_to_response(self.get_context_data(form=form, form_html=form_html))
+
+
+class OmniFormSubmissionView(OmniFormMixin, View):
+    """
+    View accepting JSON submissions for an omni form, identified by the pk URL keyword argument.
+    The request body must be a JSON object of values keyed by field name, which is validated using
+    the compiled form class (see omniforms.cache).  Valid submissions are passed to the forms handlers
+    and receive a {"valid": true} response, invalid submissions receive a 400 response holding the
+    errors for each field: {"valid": false, "errors": {"name": [{"message": "...", "code": "..."}]}}
+    """
+    http_method_names = ['post']
+
+    @staticmethod
+    def get_errors(form):
+        """
+        Method for getting the errors of an invalid form as JSON serializable data
+
+        :param form: The invalid form
+        :return: Dict of lists of errors keyed by field name
+        """
+        return {name: errors.get_json_data() for name, errors in form.errors.items()}
+
+    @staticmethod
+    def error_response(message):
+        """
+        Method for creating the response for a request that could not be processed
+
+        :param message: The error message
+        :return: JsonResponse instance
+        """
+        return JsonResponse({'valid': False, 'error': message}, status=400)
+
+    def load_data(self, expected_type):
+        """
+        Method for loading the JSON request body
+
+        :param expected_type: The type the decoded body must be an instance of
+        :return: The decoded body
+        :raises: ValueError if the body is not valid JSON of the expected type
+        """
+        try:
+            data = json.loads(self.request.body.decode(self.request.encoding or 'utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            raise ValueError('The request body must be valid JSON')
+        if not isinstance(data, expected_type):
+            raise ValueError('The request body must be a JSON {0}'.format(
+                'array' if expected_type is list else 'object'
+            ))
+        return data
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validates and handles the submission
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: JsonResponse instance
+        """
+        try:
+            data = self.load_data(dict)
+        except ValueError as e:
+            return self.error_response('{0}'.format(e))
+
+        form = self.get_form_class()(data=data)
+        if not form.is_valid():
+            return JsonResponse({'valid': False, 'errors': self.get_errors(form)}, status=400)
+
+        form.handle()
+        return JsonResponse({'valid': True})
+
+
+class OmniFormBulkSubmissionView(OmniFormSubmissionView):
+    """
+    View accepting a number of JSON submissions for an omni form at once.  The request body must be
+    a JSON array of submissions (see OmniFormSubmissionView), all of which are validated before any are
+    handled.  If every submission is valid they are handled together in a single transaction using the
+    handlers batch mode (see OmniFormBaseForm.handle_batch) and a {"valid": true, "count": n} response
+    is returned.  Otherwise nothing is handled and a 400 response is returned holding the errors of each
+    invalid submission along with its position in the array:
+    {"valid": false, "errors": [{"index": 0, "errors": {"name": [...]}}]}
+    """
+    max_submissions = 1000
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validates and handles the submissions
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: JsonResponse instance
+        """
+        try:
+            data = self.load_data(list)
+        except ValueError as e:
+            return self.error_response('{0}'.format(e))
+
+        if len(data) > self.max_submissions:
+            return self.error_response('No more than {0} submissions may be sent at once'.format(self.max_submissions))
+        if not all(isinstance(submission, dict) for submission in data):
+            return self.error_response('Each submission must be a JSON object')
+
+        form_class = self.get_form_class()
+        forms = [form_class(data=submission) for submission in data]
+        errors = [
+            {'index': index, 'errors': self.get_errors(form)}
+            for index, form in enumerate(forms)
+            if not form.is_valid()
+        ]
+        if errors:
+            return JsonResponse({'valid': False, 'errors': errors}, status=400)
+
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            form_class.handle_batch(forms)
+        return JsonResponse({'valid': True, 'count': len(forms)})
+
+
+class OmniFormFieldValidationView(OmniFormSubmissionView):
+    """
+    View validating the value of a single field of an omni form, for inline feedback while the form
+    is being filled in.  The request body must be a JSON object holding the field name and value:
+    {"field": "email", "value": "..."}.  The value is cleaned by the field of the compiled form class
+    (see omniforms.cache) on its own, so neither the form nor its other fields are built and no handlers
+    are run.  Once the form class is cached no database queries are made.  The response holds the
+    outcome: {"valid": true} or {"valid": false, "errors": [{"message": "...", "code": "..."}]}
+
+    Only the field itself is validated.  Validation depending on other fields or on the database, such
+    as model instance validation for model forms, happens when the form is submitted.
+    """
+    def clean_field(self, form_class, name, value):
+        """
+        Method for cleaning a field value in the same way as a form submission would
+
+        :param form_class: The compiled form class
+        :param name: The field name
+        :param value: The submitted value
+        :return: The errors of the field, or an empty list if the value is valid
+        """
+        field = form_class.base_fields[name]
+        if field.disabled:
+            return []
+        value = field.widget.value_from_datadict({name: value}, {}, name)
+        try:
+            field.clean(value)
+        except ValidationError as e:
+            return ErrorList(e.error_list).get_json_data()
+        return []
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validates the field value
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: JsonResponse instance
+        """
+        try:
+            data = self.load_data(dict)
+        except ValueError as e:
+            return self.error_response('{0}'.format(e))
+
+        form_class = self.get_form_class()
+        name = data.get('field')
+        try:
+            field = form_class.base_fields[name]
+        except (KeyError, TypeError):
+            return self.error_response('The form has no field named "{0}"'.format(name))
+        if isinstance(field, forms.FileField):
+            return self.error_response('File fields cannot be validated on their own')
+
+        errors = self.clean_field(form_class, name, data.get('value'))
+        if errors:
+            return JsonResponse({'valid': False, 'errors': errors})
+        return JsonResponse({'valid': True})
+
+
+class OmniFormManifestView(OmniFormMixin, View):
+    """
+    View serving the validation manifest of an omni form, identified by the pk URL keyword argument:
+    its definition version along with the JSON Schema describing the submissions it accepts, which
+    browsers can use to validate submissions before posting them (see FormDefinitionCache.get_manifest).
+    Responses are public, carry ETag and Last-Modified headers derived from the definition version and
+    may be cached for max_age seconds.  Conditional requests for an unchanged form receive a 304 response.
+    """
+    http_method_names = ['get', 'head']
+    max_age = 300
+
+    def get_manifest(self):
+        """
+        Method for getting the manifest of the form
+
+        :return: Manifest dict
+        :raises: Http404 if the form does not exist
+        """
+        try:
+            return definition_cache.get_manifest(self.model, self.get_pk())
+        except self.model.DoesNotExist:
+            raise Http404('No {0} found matching the query'.format(self.model._meta.verbose_name))
+
+    def get_etag(self, version):
+        """
+        Method for getting the ETag of the manifest
+
+        :param version: The definition version
+        :return: Quoted ETag
+        """
+        value = '{0}:{1}'.format(definition_cache.get_key(self.model, self.get_pk()), version)
+        return quote_etag(hashlib.md5(value.encode('utf-8')).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        """
+        Serves the manifest.  Conditional requests for an unchanged form receive a 304 response
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: Response
+        """
+        version = self.get_version()
+        etag = self.get_etag(version)
+        last_modified = timegm(definition_cache.get_modified(self.model, self.get_pk(), version).utctimetuple())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = JsonResponse(self.get_manifest())
+        if not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=self.max_age)
+        return response
+
+
+class OmniFormWizardView(UploadLimitMixin, OmniFormMixin, TemplateView):
+    """
+    View for filling in an omni form one step at a time, identified by the pk URL keyword argument.
+    The fields of the form are split into steps by the fields flagged as page breaks (see
+    OmniFormBaseForm.get_steps), and each request builds and validates only the fields of the current
+    step.  The values of completed steps are stored in the users session along with the definition
+    version of the form (a draft of the submission is discarded once the definition changes).  Once
+    the final step is completed the whole submission is validated, passed to the forms handlers and
+    redirected to the success URL.
+
+    The page template receives the form for the current step as form, along with step (the index
+    of the current step), step_count and completed_steps (the number of steps completed so far).
+    Earlier steps can be revisited using the step query string parameter.  Uploaded files are not
+    stored between steps, so file fields should be placed on the final step.
+    """
+    template_name = 'omniforms/omniform_wizard.html'
+    success_url = None
+    session_key_prefix = 'omniforms:draft:'
+
+    def get_success_url(self):
+        """
+        Method for getting the URL to redirect to once the form has been handled
+
+        :return: The success URL if set, or the current path
+        """
+        return self.success_url or self.request.path
+
+    def get_session_key(self):
+        """
+        Method for getting the key the draft is stored under in the session
+
+        :return: Session key
+        """
+        return self.session_key_prefix + definition_cache.get_key(self.model, self.get_pk())
+
+    def get_draft(self, version):
+        """
+        Method for getting the draft of the submission, discarding drafts for other definition versions
+
+        :param version: The current definition version
+        :return: Draft dict holding the number of completed steps and the values entered so far
+        """
+        draft = self.request.session.get(self.get_session_key())
+        if draft is None or draft.get('version') != version:
+            draft = {'version': version, 'completed': 0, 'data': {}}
+        return draft
+
+    def set_draft(self, draft):
+        """
+        Method for storing the draft of the submission
+
+        :param draft: Draft dict
+        """
+        self.request.session[self.get_session_key()] = draft
+
+    def clear_draft(self):
+        """
+        Method for discarding the draft of the submission
+        """
+        self.request.session.pop(self.get_session_key(), None)
+
+    def get_step(self, draft, step_count):
+        """
+        Method for getting the index of the step to display or validate.  Steps up to the first
+        step not yet completed can be requested using the step query string parameter
+
+        :param draft: Draft dict
+        :param step_count: The number of steps in the form
+        :return: Step index
+        """
+        last_step = min(draft['completed'], step_count - 1)
+        try:
+            return max(0, min(int(self.request.GET.get('step', last_step)), last_step))
+        except (TypeError, ValueError):
+            return last_step
+
+    @staticmethod
+    def get_step_data(form):
+        """
+        Method for getting the values submitted for the fields of a valid step form, as read by the
+        field widgets, for storing in the draft.  Uploaded files are not stored
+
+        :param form: The valid step form
+        :return: Dict of values keyed by field name
+        """
+        return {
+            name: field.widget.value_from_datadict(form.data, form.files, form.add_prefix(name))
+            for name, field in form.fields.items()
+            if not isinstance(field, forms.FileField)
+        }
+
+    def get_step_form_data(self, step_form_class, draft):
+        """
+        Method for getting the data for validating a step: the submitted data along with the values stored
+        in the draft for fields of other steps, which the conditions of the step's fields may depend on
+        (see OmniFormBaseForm.get_condition_graph)
+
+        :param step_form_class: The form class for the step
+        :param draft: Draft dict
+        :return: QueryDict
+        """
+        data = self.request.POST.copy()
+        for name, value in draft['data'].items():
+            if name not in step_form_class.base_fields and name not in data:
+                data.setlist(name, value if isinstance(value, list) else [value])
+        return data
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the step details to the template context
+
+        :param kwargs: Default keyword args
+        :return: Context dict
+        """
+        context = super(OmniFormWizardView, self).get_context_data(**kwargs)
+        context['is_last_step'] = context['step'] == context['step_count'] - 1
+        return context
+
+    def render_step(self, form, step, step_count, draft):
+        """
+        Renders the page for a step
+
+        :param form: The form for the step
+        :param step: The index of the step
+        :param step_count: The number of steps in the form
+        :param draft: Draft dict
+        :return: Response
+        """
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            step=step,
+            step_count=step_count,
+            completed_steps=draft['completed']
+        ))
+
+    def get(self, request, *args, **kwargs):
+        """
+        Renders the current step, filled in with any values entered for it previously
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: Response
+        """
+        form_class = self.get_form_class()
+        draft = self.get_draft(self.get_version())
+        step_count = len(form_class.get_steps())
+        step = self.get_step(draft, step_count)
+        step_form_class = form_class.get_step_form_class(step)
+        initial = {name: value for name, value in draft['data'].items() if name in step_form_class.base_fields}
+        return self.render_step(step_form_class(initial=initial), step, step_count, draft)
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validates the current step, storing its values and moving on to the next step if they are valid.
+        The whole submission is validated and handled once the final step is valid
+
+        :param request: The request
+        :param args: Default positional args
+        :param kwargs: Default keyword args
+        :return: Response
+        """
+        form_class = self.get_form_class()
+        draft = self.get_draft(self.get_version())
+        step_count = len(form_class.get_steps())
+        step = self.get_step(draft, step_count)
+        step_form_class = form_class.get_step_form_class(step)
+        form = step_form_class(data=self.get_step_form_data(step_form_class, draft), files=self.get_files())
+        if not form.is_valid():
+            return self.render_step(form, step, step_count, draft)
+
+        draft['data'].update(self.get_step_data(form))
+        draft['completed'] = max(draft['completed'], step + 1)
+        if draft['completed'] < step_count:
+            self.set_draft(draft)
+            return HttpResponseRedirect('{0}?step={1}'.format(request.path, draft['completed']))
+
+        submission = form_class(data=draft['data'], files=self.get_files())
+        if not submission.is_valid():
+            return self.submission_invalid(submission, step_count, draft)
+
+        submission.handle()
+        self.clear_draft()
+        return HttpResponseRedirect(self.get_success_url())
+
+    def submission_invalid(self, submission, step_count, draft):
+        """
+        Renders the first step holding an error when the whole submission is not valid, which may
+        happen when validation depends on fields of more than one step
+
+        :param submission: The invalid form for the whole submission
+        :param step_count: The number of steps in the form
+        :param draft: Draft dict
+        :return: Response
+        """
+        form_class = submission.__class__
+        steps = form_class.get_steps()
+        step = next(
+            (index for index, names in enumerate(steps) if any(name in submission.errors for name in names)),
+            step_count - 1
+        )
+        form = form_class.get_step_form_class(step)(data=draft['data'], files=self.get_files())
+        form.is_valid()
+        for name, errors in submission.errors.as_data().items():
+            if name == NON_FIELD_ERRORS:
+                form.add_error(None, errors)
+            elif name in form.fields and name not in form.errors:
+                form.add_error(name, errors)
+        draft['completed'] = step
+        self.set_draft(draft)
+        return self.render_step(form, step, step_count, draft)
@@ -6,6 +6,7 @@ from django.core.exceptions import ImproperlyConfigured, PermissionDenied
 from django.http import HttpResponseBadRequest, Http404
 from django.shortcuts import get_object_or_404, redirect
 from omniforms.admin_forms import AddRelatedForm, FieldForm
+from omniforms.admin_views import HandlerHelpTextMixin
 from omniforms.models import OmniField, OmniFormHandler
 from wagtail.contrib.modeladmin.views import ModelFormView, InstanceSpecificView
 from wagtail.wagtailadmin import messages
@@ -334,7 +335,7 @@ class FieldFormView(RelatedFormView):
         return widgets
 
 
-class HandlerFormView(RelatedFormView):
+class HandlerFormView(HandlerHelpTextMixin, RelatedFormView):
     """
     Base view class for working with omni form handlers
     """
@@ -11,7 +11,7 @@ from django.test import override_settings, TestCase
 from wagtail.wagtailcore.models import Page
 
 from omniforms.admin_forms import AddRelatedForm
-from omniforms.models import OmniCharField, OmniField, OmniFormHandler, OmniFormEmailHandler
+from omniforms.models import OmniCharField, OmniField, OmniFormHandler, OmniFormEmailHandler, TemplateHelpTextLazy
 from omniforms.tests.factories import OmniFormFactory, OmniCharFieldFactory, OmniFormEmailHandlerFactory, UserFactory
 from omniforms.wagtail import model_admin_views
 from omniforms.wagtail.forms import WagtailOmniFormCloneForm
@@ -51,6 +51,10 @@ class ModelAdminTestCaseStub(TestCase):
         cls.delete_emailconfirmationhandler_permission = Permission.objects.get(
             codename='delete_omniformemailconfirmationhandler'
         )
+        # Handler permissions
+        cls.add_webhookhandler_permission = Permission.objects.get(codename='add_omniformwebhookhandler')
+        cls.change_webhookhandler_permission = Permission.objects.get(codename='change_omniformwebhookhandler')
+        cls.delete_webhookhandler_permission = Permission.objects.get(codename='delete_omniformwebhookhandler')
         # Create a user to work with
         cls.user = UserFactory.create(is_staff=True)
 
@@ -71,6 +75,10 @@ class ModelAdminTestCaseStub(TestCase):
         self.user.user_permissions.add(self.add_emailconfirmationhandler_permission)
         self.user.user_permissions.add(self.change_emailconfirmationhandler_permission)
         self.user.user_permissions.add(self.delete_emailconfirmationhandler_permission)
+        # Assign omni handlers permissions to user
+        self.user.user_permissions.add(self.add_webhookhandler_permission)
+        self.user.user_permissions.add(self.change_webhookhandler_permission)
+        self.user.user_permissions.add(self.delete_webhookhandler_permission)
         # Assign editor group to user
         self.user.groups.add(self.editor_group)
         # Save the user
@@ -716,6 +724,15 @@ class AddHandlerViewTestCase(ModelAdminTestCaseStub):
             'Add {0} to form'.format(self.handler_content_type.name)
         )
 
+    def test_template_help_text(self):
+        """
+        The template field help text should be generated for the new handler instance
+        """
+        response = self.client.get(self.url)
+        help_text = response.context['form'].fields['template'].help_text
+        self.assertIsInstance(help_text, TemplateHelpTextLazy)
+        self.assertEqual(help_text.instance, response.context['form'].instance)
+
     @patch('omniforms.wagtail.model_admin_views.AddHandlerView._get_base_form_class')
     def test_uses_correct_form_class(self, get_base_form_class):
         """
@@ -1182,6 +1199,16 @@ class ChangeHandlerViewTestCase(ModelAdminTestCaseStub):
             'Change {0} handler'.format(self.handler.name)
         )
 
+    def test_template_help_text(self):
+        """
+        The template field help text should list the tokens available for the handlers form
+        """
+        OmniCharFieldFactory.create(name='title', form=self.form)
+        response = self.client.get(self.url)
+        help_text = response.context['form'].fields['template'].help_text
+        self.assertEqual(help_text.instance, self.handler)
+        self.assertIn('Available tokens are {{ title }}', '{0}'.format(help_text))
+
     def test_form(self):
         """
         The form should be constructed correctly
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+Process wide HTTP client used by the webhook handler of the omniforms app.  Connections are kept
+alive and pooled per host, so posting submissions does not open a new connection every time.
+Submissions are sent in background threads, and may be held back briefly to be sent together
+in a single request
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.parse import urlsplit
+import atexit
+import logging
+import select
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookError(Exception):
+    """
+    Raised when a webhook request fails
+    """
+    def __init__(self, message, status=None):
+        """
+        Sets up the error
+
+        :param message: Description of the failure
+        :param status: The HTTP status of the response, if one was received
+        """
+        super(WebhookError, self).__init__(message)
+        self.status = status
+
+
+class ConnectionPool(object):
+    """
+    Pool of keep-alive HTTP connections keyed on the scheme, host and port they connect to.
+    Connections are taken out of the pool while a request is made, so each is only used by one
+    thread at a time, and are put back once the response has been read in full
+    """
+    connection_classes = {
+        'http': http_client.HTTPConnection,
+        'https': http_client.HTTPSConnection,
+    }
+    idempotent_methods = ('DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT', 'TRACE')
+
+    def __init__(self):
+        """
+        Sets up the pool
+        """
+        super(ConnectionPool, self).__init__()
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_idle(self):
+        """
+        The number of idle connections kept per host
+
+        :return: int
+        """
+        return getattr(settings, 'OMNI_FORMS_WEBHOOK_POOL_SIZE', 10)
+
+    def _get_connection(self, key, timeout):
+        """
+        Takes an idle connection for the host out of the pool, or opens a new one
+
+        :param key: Tuple of scheme, host and port
+        :param timeout: Timeout in seconds
+        :return: Tuple of the connection and whether or not it was reused
+        """
+        with self._lock:
+            idle = self._connections.get(key)
+            connection = idle.pop() if idle else None
+        if connection is not None and self._is_dropped(connection):
+            connection.close()
+            connection = None
+        if connection is None:
+            scheme, host, port = key
+            return self.connection_classes[scheme](host, port, timeout=timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    @staticmethod
+    def _is_dropped(connection):
+        """
+        Whether or not the server has closed an idle connection.  Idle connections have nothing to read
+        unless the server has closed them, so they are checked for readability without waiting
+
+        :param connection: The idle connection
+        :return: bool
+        """
+        if connection.sock is None:
+            return False
+        try:
+            return bool(select.select([connection.sock], [], [], 0)[0])
+        except (socket.error, ValueError):
+            return True
+
+    def _release(self, key, connection):
+        """
+        Puts a connection back into the pool, closing it if the pool for the host is full
+
+        :param key: Tuple of scheme, host and port
+        :param connection: The connection
+        """
+        with self._lock:
+            idle = self._connections.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, body=None, headers=None, timeout=10, retry_reused=None):
+        """
+        Makes a request over a pooled connection.  Idle connections the server has closed are discarded
+        before they are used.  If a reused connection still fails, the server may or may not have received
+        the request, so it is only repeated over a new connection if retry_reused is set
+
+        :param method: The HTTP method
+        :param url: The absolute http or https URL
+        :param body: The request body as bytes
+        :param headers: Dict of request headers
+        :param timeout: Timeout in seconds
+        :param retry_reused: Whether or not to repeat the request once if a reused connection fails,
+            defaults to True for idempotent methods only
+        :return: Tuple of the response status and body
+        :raises: ValueError if the URL is not an http or https URL
+        :raises: socket.error or http_client.HTTPException if the request fails
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in self.connection_classes or not parts.hostname:
+            raise ValueError('\'{0}\' is not an http or https URL'.format(url))
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path = '{0}?{1}'.format(path, parts.query)
+        if retry_reused is None:
+            retry_reused = method.upper() in self.idempotent_methods
+
+        while True:
+            connection, reused = self._get_connection(key, timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                content = response.read()
+            except (socket.error, http_client.HTTPException):
+                connection.close()
+                if reused and retry_reused:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return response.status, content
+
+    def clear(self):
+        """
+        Closes every idle connection
+        """
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for idle in connections.values():
+            for connection in idle:
+                connection.close()
+
+
+class WebhookClient(object):
+    """
+    Posts webhook requests over the pooled connections, retrying failed requests with exponential backoff.
+    Connection failures, timeouts and responses with a 429 or 5xx status are retried; other error responses
+    are not, as repeating the request would give the same result
+    """
+    def __init__(self, pool=None):
+        """
+        Sets up the client
+
+        :param pool: ConnectionPool instance, a new pool is created if not given
+        """
+        super(WebhookClient, self).__init__()
+        self.pool = pool or ConnectionPool()
+
+    @property
+    def backoff(self):
+        """
+        The number of seconds to wait before the first retry.  The wait doubles for each retry after that
+
+        :return: float
+        """
+        return getattr(settings, 'OMNI_FORMS_WEBHOOK_BACKOFF', 0.5)
+
+    @staticmethod
+    def sleep(seconds):
+        """
+        Waits before retrying a request
+
+        :param seconds: The number of seconds to wait
+        """
+        time.sleep(seconds)
+
+    def post(self, url, body, headers=None, timeout=10, max_retries=3):
+        """
+        Posts the body to the URL
+
+        :param url: The absolute http or https URL
+        :param body: The request body as bytes
+        :param headers: Dict of request headers
+        :param timeout: Timeout in seconds for each attempt
+        :param max_retries: The number of times a failed request is retried
+        :return: The response body
+        :raises: WebhookError if the request fails and cannot be retried (any more)
+        """
+        attempt = 0
+        while True:
+            try:
+                status, content = self.pool.request('POST', url, body=body, headers=headers, timeout=timeout)
+            except (socket.error, http_client.HTTPException) as e:
+                error = WebhookError('Request to {0} failed: {1!r}'.format(url, e))
+            else:
+                if status < 300:
+                    return content
+                error = WebhookError('Request to {0} failed with status {1}'.format(url, status), status)
+                if status != 429 and status < 500:
+                    raise error
+            if attempt >= max_retries:
+                raise error
+            self.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+
+class WebhookBatcher(object):
+    """
+    Sends submissions in background threads, so that requests, retries and the waits between them do not
+    hold up the request that received the submission.  Submissions for handlers with a batch window are
+    held back, so that the submissions received within the window are sent in a single request.  A batch
+    is sent as soon as it holds as many submissions as the handler allows, or when the window closes,
+    whichever happens first.  Batches still held back when the process exits are sent then.  Failures
+    are logged, as there is nobody to raise them to
+    """
+    def __init__(self):
+        """
+        Sets up the batcher
+        """
+        super(WebhookBatcher, self).__init__()
+        self._batches = {}
+        self._timers = {}
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(handler):
+        """
+        Gets the key submissions for the handler are batched under
+
+        :param handler: OmniFormWebhookHandler instance
+        :return: Batch key
+        """
+        return handler.pk if handler.pk is not None else id(handler)
+
+    def add(self, handler, payload):
+        """
+        Adds a submission to the batch for the handler, sending the batch in the background if it is full
+        or the handler has no batch window
+
+        :param handler: OmniFormWebhookHandler instance
+        :param payload: The submission payload
+        """
+        key = self.get_key(handler)
+        with self._lock:
+            batch_handler, payloads = self._batches.setdefault(key, (handler, []))
+            payloads.append(payload)
+            if handler.batch_window and len(payloads) < handler.batch_size:
+                if key not in self._timers:
+                    timer = threading.Timer(handler.batch_window, self._flush_in_background, [key])
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+                return
+            timer = self._timers.pop(key, None)
+            del self._batches[key]
+        if timer is not None:
+            timer.cancel()
+        self.send_in_background(batch_handler, [payloads])
+
+    def send_in_background(self, handler, batches):
+        """
+        Sends batches of submissions one after the other in a background thread
+
+        :param handler: OmniFormWebhookHandler instance
+        :param batches: List of lists of submission payloads, each sent in a single request
+        """
+        thread = threading.Thread(target=self._send, args=[handler, batches])
+        thread.daemon = True
+        with self._lock:
+            self._threads.add(thread)
+        thread.start()
+
+    def _send(self, handler, batches):
+        """
+        Sends batches of submissions, logging failures
+
+        :param handler: OmniFormWebhookHandler instance
+        :param batches: List of lists of submission payloads
+        """
+        try:
+            for payloads in batches:
+                try:
+                    handler.send(payloads)
+                except Exception:
+                    logger.exception('Sending a batch of webhook submissions failed')
+        finally:
+            with self._lock:
+                self._threads.discard(threading.current_thread())
+
+    def flush(self, key):
+        """
+        Sends the batch held back under the key, if any
+
+        :param key: The batch key
+        :raises: WebhookError if the batch cannot be sent
+        """
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            batch = self._batches.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if batch is not None:
+            handler, payloads = batch
+            handler.send(payloads)
+
+    def _flush_in_background(self, key):
+        """
+        Sends a batch once its window closes.  Failures are logged, as there is nobody to raise them to
+
+        :param key: The batch key
+        """
+        try:
+            self.flush(key)
+        except Exception:
+            logger.exception('Sending a batch of webhook submissions failed')
+
+    def flush_all(self):
+        """
+        Sends every batch held back, and waits for the batches being sent in the background
+        """
+        for key in list(self._batches):
+            self._flush_in_background(key)
+        self.wait()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the batches being sent in the background
+
+        :param timeout: The maximum number of seconds to wait for each thread, waits until they finish if not given
+        """
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+    @property
+    def pending(self):
+        """
+        The number of submissions held back
+
+        :return: int
+        """
+        with self._lock:
+            return sum(len(payloads) for handler, payloads in self._batches.values())
+
+
+webhook_client = WebhookClient()
+webhook_batcher = WebhookBatcher()
+atexit.register(webhook_batcher.flush_all)
@@ -45,5 +45,6 @@ setup(
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
     ],
     keywords=['form builder', 'django', 'wagtail'],
-    install_requires=['django-braces==1.9.0']
+    install_requires=['django-braces==1.9.0'],
+    extras_require={'yaml': ['PyYAML']}
 )